@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 """
-銀行信用卡優惠統一爬蟲 v1
+銀行信用卡優惠統一爬蟲 v2
+各銀行的爬取邏輯與設定統一由 scrapers.AVAILABLE_SCRAPERS 提供:
 - 中國信託 (CTBC)
 - 國泰世華 (Cathay)
 - 聯邦銀行 (Union Bank / UBot)
@@ -9,698 +10,282 @@
 
 import asyncio
 import json
-import csv
 import os
+from dataclasses import dataclass
 from datetime import datetime
 from playwright.async_api import async_playwright
+from scrapers import AVAILABLE_SCRAPERS, DatabaseStateStore, PageBatch, get_scraper
+from scrapers.telemetry import telemetry
 
 # 檢測是否在 CI 環境 (GitHub Actions)
 IS_CI = os.environ.get("CI") == "true" or os.environ.get("GITHUB_ACTIONS") == "true"
 
-# ============================================================
-# 中國信託 (CTBC) 設定
-# ============================================================
-CTBC_CATEGORIES = [
-    {"name": "精選．中信卡優惠", "url": "https://www.ctbcbank.com/twrbo/zh_tw/cc_index/cc_offer/cc_special_offer.html"},
-    {"name": "餐飲優惠", "url": "https://www.ctbcbank.com/twrbo/zh_tw/cc_index/cc_offer/cc_offer_food.html"},
-    {"name": "旅遊玩家", "url": "https://www.ctbcbank.com/twrbo/zh_tw/cc_index/cc_offer/cc_offer_travel.html"},
-    {"name": "百貨藥妝", "url": "https://www.ctbcbank.com/twrbo/zh_tw/cc_index/cc_offer/cc_offer_grocery.html"},
-    {"name": "行動支付", "url": "https://www.ctbcbank.com/twrbo/zh_tw/cc_index/cc_offer/cc_offer_payment.html"},
-    {"name": "超商量販", "url": "https://www.ctbcbank.com/twrbo/zh_tw/cc_index/cc_offer/cc_offer_retail.html"},
-    {"name": "線上購物", "url": "https://www.ctbcbank.com/twrbo/zh_tw/cc_index/cc_offer/cc_offer_shopping.html"},
-    {"name": "更多優惠", "url": "https://www.ctbcbank.com/twrbo/zh_tw/cc_index/cc_offer/cc_offer_others.html"},
-]
-
-# 中國信託提取優惠的 JavaScript
-CTBC_EXTRACT_SCRIPT = r"""
-() => {
-    const offers = [];
-    const seen = new Set();
-    
-    // 工具函式: 判斷是否為無效圖示 (如時鐘標籤)
-    const isGenericIcon = (src) => {
-        if (!src) return false;
-        const low = src.toLowerCase();
-        return low.includes('icon_clock') || low.includes('icon_dark') || low.includes('.svg');
-    };
-
-    // 工具函式: 尋找卡片內的最佳圖片
-    const findBestImage = (card) => {
-        // 1. 優先找 data-src (常見於延遲載入的宣傳圖)
-        const lazyImg = card.querySelector('[data-src]');
-        if (lazyImg) {
-            const src = lazyImg.getAttribute('data-src');
-            if (src && !isGenericIcon(src)) return src;
-        }
-
-        // 2. 找所有 img 標籤，排除時鐘圖示
-        const imgs = Array.from(card.querySelectorAll('img'));
-        for (const img of imgs) {
-            const src = img.src || img.getAttribute('src');
-            if (src && !isGenericIcon(src)) return src;
-        }
-
-        // 3. 找 background-image
-        const bgEls = Array.from(card.querySelectorAll('[style*="background-image"]'));
-        for (const el of bgEls) {
-            const style = el.getAttribute('style');
-            const match = style.match(/background-image:\s*url\(['"]?(.*?)['"]?\)/);
-            if (match && !isGenericIcon(match[1])) return match[1];
-        }
-
-        // 如果真的沒找到，才勉強用第一個 img (即使是 icon)
-        const firstImg = card.querySelector('img');
-        return firstImg ? firstImg.src : null;
-    };
-
-    // 模式 1: 通用卡片結構
-    const cards = Array.from(document.querySelectorAll('a.twrbo-c-thumb, .twrbo-l-productCard, div.ng-scope, li.ng-scope'));
-    cards.forEach(el => {
-        // 標題提取
-        const titleEl = el.querySelector('h3, .twrbo-c-h3, .twrbo-c-thumb__title, strong') || (el.classList.contains('twrbo-c-thumb') ? el : null);
-        let title = titleEl ? (titleEl.getAttribute('title') || titleEl.innerText.trim()) : "";
-        if (!title || seen.has(title)) return;
-
-        // 連結提取
-        let href = el.getAttribute('href');
-        if (!href) {
-            const link = el.querySelector('a[href^="http"]');
-            href = link ? link.getAttribute('href') : null;
-        }
-        if (!href || href === '#' || href.startsWith('tel:')) return;
-
-        // 圖片提取
-        const image = findBestImage(el);
-
-        seen.add(title);
-        offers.push({ title, url: href, image });
-    });
-
-    return offers.map(o => {
-        // 處理相對路徑
-        let finalUrl = o.url;
-        if (finalUrl && !finalUrl.startsWith('http')) {
-        }
-        // 處理圖片相對路徑
-        let finalImage = o.image;
-        if (finalImage && !finalImage.startsWith('http')) {
-            try {
-                finalImage = new URL(finalImage, window.location.href).href;
-            } catch(e) {
-                finalImage = null;
-            }
-        }
-        return { title: o.title, url: finalUrl, image: finalImage };
-    });
-}
-"""
-
-CTBC_CHECK_NEXT_PAGE_SCRIPT = """
-() => {
-    const nextBtn = document.querySelector('.twrbo-c-controller--next');
-    if (!nextBtn) return { hasNext: false };
-    
-    const isDisabled = nextBtn.classList.contains('ng-hide') || 
-                       nextBtn.classList.contains('disabled') ||
-                       nextBtn.getAttribute('disabled') !== null ||
-                       nextBtn.style.display === 'none';
-    
-    return { hasNext: !isDisabled, selector: '.twrbo-c-controller--next' };
-}
-"""
-
-
-# ============================================================
-# 國泰世華 (Cathay) 設定
-# ============================================================
-CATHAY_URL = "https://www.cathay-cube.com.tw/cathaybk/personal/event/overview"
-
-CATHAY_EXTRACT_SCRIPT = """
-() => {
-    const offers = [];
-    const seen = new Set();
-    
-    // 嘗試多種選擇器
-    const cards = document.querySelectorAll('a.eventcard, a[class*="eventcard"], div[class*="event"] a[href*="/event/"]');
-    cards.forEach(card => {
-        // 找圖片
-        const img = card.querySelector('img');
-        let image = img ? img.src : null;
-        
-        // 找標題 (嘗試多種方式)
-        let title = null;
-        const titleEl = card.querySelector('h3, h4, .title, [class*="title"]');
-        if (titleEl) {
-            title = titleEl.innerText.trim();
-        } else {
-            // 從 alt 屬性或 innerText 取得
-            title = (img && img.alt) || card.innerText.trim().split('\\n')[0];
-        }
-        
-        let href = card.getAttribute('href');
-        
-        if (title && href && !seen.has(title) && title.length > 2) {
-            seen.add(title);
-            // 處理相對路徑
-            if (!href.startsWith('http')) {
-                href = window.location.origin + href;
-            }
-            if (image && !image.startsWith('http')) {
-                image = window.location.origin + image;
-            }
-            offers.push({ title, url: href, image });
-        }
-    });
-    
-    return offers;
-}
-"""
-
-
-# ============================================================
-# 聯邦銀行 (UBot) 設定
-# ============================================================
-UBOT_CATEGORIES = [
-    {"name": "強打優惠", "url": "https://card.ubot.com.tw/CardActivity?category=強打優惠"},
-    {"name": "卡片優惠", "url": "https://card.ubot.com.tw/CardActivity?category=卡片優惠"},
-    {"name": "百貨零售", "url": "https://card.ubot.com.tw/CardActivity?category=百貨零售"},
-    {"name": "旅遊優惠", "url": "https://card.ubot.com.tw/CardActivity?category=旅遊優惠"},
-    {"name": "交通汽修", "url": "https://card.ubot.com.tw/CardActivity?category=交通汽修"},
-    {"name": "網購數位", "url": "https://card.ubot.com.tw/CardActivity?category=網購數位"},
-    {"name": "生活繳費", "url": "https://card.ubot.com.tw/CardActivity?category=生活繳費"},
-    {"name": "購物娛樂", "url": "https://card.ubot.com.tw/CardActivity?category=購物娛樂"},
-]
-
-UBOT_EXTRACT_SCRIPT = """
-() => {
-    const offers = [];
-    const seen = new Set();
-    
-    document.querySelectorAll('.card').forEach(card => {
-        // 找圖片
-        const img = card.querySelector('img');
-        let image = img ? img.src : null;
-        
-        // 找標題 (card-body 內第一個文字區塊)
-        const body = card.querySelector('.card-body');
-        if (!body) return;
-        
-        // 嘗試多種方式取得標題
-        let title = null;
-        const titleEl = body.querySelector('h3, h4, h5, .card-title');
-        if (titleEl) {
-            title = titleEl.innerText.trim();
-        } else {
-            // 取 card-body 內第一段文字
-            const texts = body.innerText.split('\\n').filter(t => t.trim());
-            title = texts[0] ? texts[0].trim() : null;
-        }
-        
-        if (!title || seen.has(title)) return;
-        
-        // 找連結
-        const linkEl = card.closest('a') || card.querySelector('a');
-        let href = linkEl ? linkEl.getAttribute('href') : null;
-        
-        if (href && !href.startsWith('http')) {
-            href = window.location.origin + href;
-        }
-        if (image && !image.startsWith('http')) {
-            image = window.location.origin + image;
-        }
-        
-        if (title && href) {
-            seen.add(title);
-            offers.push({ title, url: href, image });
-        }
-    });
-    
-    return offers;
+# 與後端常駐瀏覽器池 (src/backend/core/browser_pool.py) 共用的啟動與 context 設定
+LAUNCH_OPTIONS = {"args": ["--disable-blink-features=AutomationControlled"]}
+CONTEXT_OPTIONS = {
+    "user_agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+    "viewport": {"width": 1920, "height": 1080},
 }
-"""
 
-UBOT_GET_PAGES_SCRIPT = """
-() => {
-    const pages = document.querySelectorAll('.pagingNumber');
-    return Array.from(pages).map(p => p.innerText.trim()).filter(t => t);
-}
-"""
 
+# 爬蟲與寫入端之間的佇列上限 (分頁數)：寫入端落後時爬蟲在 put 等待，記憶體不隨銀行數與分頁數成長
+STAGE_QUEUE_SIZE = 16
 
-# ============================================================
-# 玉山銀行 (E.SUN) 設定
-# ============================================================
-ESUN_URL = "https://www.esunbank.com/zh-tw/personal/credit-card/discount/shops/all"
 
-ESUN_EXTRACT_SCRIPT = """
-() => {
-    const offers = [];
-    const seen = new Set();
-    const cards = document.querySelectorAll('a.l-cardDiscountAllContent__discount');
-    
-    cards.forEach(card => {
-        let title = card.getAttribute('title');
-        if (!title) {
-            const pTags = card.querySelectorAll('p');
-            title = Array.from(pTags).map(p => p.innerText.trim()).join(' ');
-        }
-        const img = card.querySelector('img');
-        let image = img ? img.src : null;
-        let href = card.getAttribute('href');
-        
-        if (title && !seen.has(title)) {
-            seen.add(title);
-            if (href && !href.startsWith('http')) href = window.location.origin + href;
-            if (image && !image.startsWith('http')) image = window.location.origin + image;
-            offers.push({ title, url: href, image });
-        }
-    });
-    return offers;
-}
-"""
+@dataclass
+class BankEvent:
+    """佇列中的銀行訊號：status 為 "start" (開始爬取)、"ok" (完成，合併暫存) 或 "failed" (丟棄暫存)"""
+    bank: str
+    status: str
 
 
-# ============================================================
-# 爬蟲功能
-# ============================================================
-
-async def scrape_ctbc(page) -> list:
-    """爬取中國信託所有分類優惠"""
-    print("\n" + "=" * 50)
-    print("開始爬取: 中國信託 (CTBC)")
-    print("=" * 50)
-    
-    all_offers = []
-    
-    for cat in CTBC_CATEGORIES:
-        print(f"\n  分類: {cat['name']}...")
+async def write_offers(queue: asyncio.Queue, state_store, expired_urls) -> dict:
+    """
+    唯一的資料庫寫入端：依序處理佇列中的分頁 (寫入暫存) 與銀行訊號，收到 None 時結束。
+    銀行完成時才在同一個 transaction 內合併暫存並刪除這次沒爬到的優惠；
+    爬取失敗或有分頁暫存失敗的銀行丟棄暫存，不更新資料庫以防止誤刪。
+    回傳 銀行 -> commit_staged_offers 的結果。
+    """
+    from database import commit_staged_offers, discard_staged_offers, record_bank_crawl, stage_offers
+    results = {}
+    broken = set()
+    while True:
+        item = await queue.get()
         try:
-            await page.goto(cat["url"], wait_until="networkidle", timeout=60000)
-            await page.wait_for_timeout(3000)
-            
-            # 先嘗試在主文檔提取 (精選優惠頁面的內容在主文檔)
-            main_offers = await page.evaluate(CTBC_EXTRACT_SCRIPT)
-            
-            if main_offers and len(main_offers) > 0:
-                print(f"    從主文檔找到 {len(main_offers)} 筆")
-                existing_titles = {o["title"] for o in all_offers}
-                for offer in main_offers:
-                    if offer["title"] not in existing_titles:
-                        offer["bank"] = "中國信託"
-                        offer["category"] = cat["name"]
-                        all_offers.append(offer)
-            
-            # 再嘗試取得 iframe (其他分類頁面使用 iframe)
-            iframe_element = await page.query_selector("#frameweb")
-            if iframe_element:
-                iframe = await iframe_element.content_frame()
-                if iframe:
-                    await page.wait_for_timeout(2000)
-                    
-                    page_num = 1
-                    max_pages = 20
-                    
-                    while page_num <= max_pages:
-                        # 滾動以觸發延遲載入
-                        for _ in range(3):
-                            await iframe.evaluate("window.scrollTo(0, document.body.scrollHeight)")
-                            await page.wait_for_timeout(500)
-                        
-                        # 提取當前頁面的優惠
-                        current_offers = await iframe.evaluate(CTBC_EXTRACT_SCRIPT)
-                        
-                        existing_titles = {o["title"] for o in all_offers}
-                        for offer in current_offers:
-                            if offer["title"] not in existing_titles:
-                                offer["bank"] = "中國信託"
-                                offer["category"] = cat["name"]
-                                all_offers.append(offer)
-                        
-                        # 檢查是否有下一頁
-                        next_page_info = await iframe.evaluate(CTBC_CHECK_NEXT_PAGE_SCRIPT)
-                        
-                        if not next_page_info.get("hasNext", False):
-                            break
-                        
-                        try:
-                            next_btn = await iframe.query_selector(".twrbo-c-controller--next")
-                            if next_btn:
-                                await next_btn.click()
-                                await page.wait_for_timeout(2000)
-                                page_num += 1
-                            else:
-                                break
-                        except Exception:
-                            break
-            
-            print(f"    累計: {len(all_offers)} 筆")
-            
+            if item is None:
+                return results
+            if isinstance(item, PageBatch):
+                if item.bank not in broken:
+                    await asyncio.to_thread(stage_offers, item.bank, item.category_order, item.offers)
+            elif item.status == "start":
+                # 清除上次中斷留下的暫存
+                broken.discard(item.bank)
+                await asyncio.to_thread(discard_staged_offers, item.bank)
+            elif item.status == "ok" and item.bank not in broken:
+                with telemetry.span("upsert", bank=item.bank):
+                    result = await asyncio.to_thread(commit_staged_offers, item.bank, expired_urls)
+                results[item.bank] = result
+                await asyncio.to_thread(state_store.clear_checkpoints, item.bank)
+                # 變更筆數與瀏覽器耗時供排程器估計各銀行的變更率 (src/backend/core/scheduler.py)
+                try:
+                    changes = len(result["inserted_ids"]) + len(result["changed_ids"]) + len(result["deleted_ids"])
+                    await asyncio.to_thread(record_bank_crawl, item.bank, changes, result["offers"],
+                                            telemetry.banks.get(item.bank, {}).get("duration_seconds"))
+                except Exception as e:
+                    print(f"[{item.bank}] 記錄變更率失敗: {e}")
+            elif item.status in ("ok", "failed"):
+                reason = "部分分頁暫存失敗" if item.status == "ok" else "爬取失敗"
+                print(f"[{item.bank}] {reason}，跳過資料庫更新以防止誤刪。")
+                await asyncio.to_thread(discard_staged_offers, item.bank)
         except Exception as e:
-            print(f"    錯誤: {e}")
-    
-    print(f"\n  中國信託總計: {len(all_offers)} 筆")
-    return all_offers
-
-
-async def scrape_cathay(page) -> list:
-    """爬取國泰世華優惠"""
-    print("\n" + "=" * 50)
-    print("開始爬取: 國泰世華 (Cathay)")
-    print("=" * 50)
-    
-    all_offers = []
-    
+            print(f"[{item.bank}] 更新至資料庫出錯: {e}")
+            # 暫存不完整 (或殘留上次的資料) 時不可合併，等下次開始爬取時清除
+            broken.add(item.bank)
+        finally:
+            queue.task_done()
+
+
+async def scrape_banks(scrapers: list, context, state_store) -> dict:
+    """
+    依序爬取各銀行：每完成一個分頁就放入佇列，由單一寫入端暫存到資料庫，銀行完成後才合併。
+    回傳 銀行 -> 合併結果 (失敗的銀行不更新資料庫、不在結果中)。
+    資料表由 main() 的 init_db 建立。
+    """
+    # 活動頁面已確認結束、但仍掛在銀行列表上的優惠不寫入資料庫
     try:
-        await page.goto(CATHAY_URL, wait_until="domcontentloaded", timeout=90000)
-        await page.wait_for_timeout(8000)  # 增加等待時間讓 React 完全渲染
-        
-        # 先滾動幾次觸發內容載入
-        for _ in range(3):
-            await page.evaluate("window.scrollTo(0, document.body.scrollHeight)")
-            await page.wait_for_timeout(1000)
-        
-        # 檢查目前有多少卡片
-        initial_count = await page.evaluate("document.querySelectorAll('a.eventcard, a[class*=\"eventcard\"]').length")
-        print(f"  初始載入: {initial_count} 筆")
-        
-        # 持續點擊「展開更多」直到沒有更多
-        max_clicks = 50  # 增加最大點擊次數 (共140項需要更多次)
-        for i in range(max_clicks):
-            # 滾動到底部
-            await page.evaluate("window.scrollTo(0, document.body.scrollHeight)")
-            await page.wait_for_timeout(800)
-            
-            # 找「展開更多」按鈕 (嘗試多種選擇器)
-            load_more = await page.query_selector('a.dot-animate-wrapper')
-            if not load_more:
-                load_more = await page.query_selector('[class*="dot-animate"]')
-            if not load_more:
-                load_more = await page.query_selector('text=展開更多')
-            if not load_more:
-                # 嘗試含有「展開」文字的連結
-                load_more = await page.query_selector('a:has-text("展開")')
-            
-            if not load_more:
-                print(f"  已展開全部內容 (點擊 {i} 次)")
-                break
-            
-            # 檢查按鈕是否可見
-            is_visible = await load_more.is_visible()
-            if not is_visible:
-                print(f"  已展開全部內容 (點擊 {i} 次)")
-                break
-            
-            try:
-                await load_more.click()
-                await page.wait_for_timeout(1200)
-                if (i + 1) % 5 == 0:
-                    current_count = await page.evaluate("document.querySelectorAll('a.eventcard, a[class*=\"eventcard\"]').length")
-                    print(f"  點擊展開更多... ({i + 1}) - 目前 {current_count} 筆")
-            except Exception as click_err:
-                print(f"  點擊失敗: {click_err}")
-                break
-        
-        # 最後滾動確保全部載入
-        for _ in range(5):
-            await page.evaluate("window.scrollTo(0, document.body.scrollHeight)")
-            await page.wait_for_timeout(500)
-        
-        # 提取所有優惠
-        offers = await page.evaluate(CATHAY_EXTRACT_SCRIPT)
-        
-        for offer in offers:
-            offer["bank"] = "國泰世華"
-            offer["category"] = "信用卡優惠"
-            all_offers.append(offer)
-        
-        print(f"\n  國泰世華總計: {len(all_offers)} 筆")
-        
+        from enrichment import recently_expired_urls
+        expired_urls = await asyncio.to_thread(recently_expired_urls)
     except Exception as e:
-        print(f"  錯誤: {e}")
-        import traceback
-        traceback.print_exc()
-    
-    return all_offers
+        print(f"讀取已結束活動清單失敗: {e}")
+        expired_urls = set()
 
-
-async def scrape_ubot(page) -> list:
-    """爬取聯邦銀行所有分類優惠"""
-    print("\n" + "=" * 50)
-    print("開始爬取: 聯邦銀行 (UBot)")
-    print("=" * 50)
-    
-    all_offers = []
-    
-    for cat in UBOT_CATEGORIES:
-        print(f"\n  分類: {cat['name']}...")
-        try:
-            await page.goto(cat["url"], wait_until="networkidle", timeout=60000)
-            await page.wait_for_timeout(3000)
-            
-            # 取得頁數
-            page_numbers = await page.evaluate(UBOT_GET_PAGES_SCRIPT)
-            total_pages = len(page_numbers) if page_numbers else 1
-            print(f"    共 {total_pages} 頁")
-            
-            for p in range(1, total_pages + 1):
-                if p > 1:
-                    # 點擊頁碼
-                    page_btn = await page.query_selector(f'.pagingNumber:text("{p}")')
-                    if page_btn:
-                        await page_btn.click()
-                        await page.wait_for_timeout(2000)
-                
-                # 滾動以確保所有卡片載入
-                await page.evaluate("window.scrollTo(0, document.body.scrollHeight)")
-                await page.wait_for_timeout(500)
-                
-                # 提取當前頁面的優惠
-                current_offers = await page.evaluate(UBOT_EXTRACT_SCRIPT)
-                
-                existing_titles = {o["title"] for o in all_offers}
-                for offer in current_offers:
-                    if offer["title"] not in existing_titles:
-                        offer["bank"] = "聯邦銀行"
-                        offer["category"] = cat["name"]
-                        all_offers.append(offer)
-            
-            print(f"    累計: {len(all_offers)} 筆")
-            
-        except Exception as e:
-            print(f"    錯誤: {e}")
-    
-    print(f"\n  聯邦銀行總計: {len(all_offers)} 筆")
-    return all_offers
-
-
-async def scrape_esun(page) -> list:
-    """爬取玉山銀行優惠"""
-    print("\n" + "=" * 50)
-    print("開始爬取: 玉山銀行 (E.SUN)")
-    print("=" * 50)
-    
-    all_offers = []
+    queue = asyncio.Queue(maxsize=STAGE_QUEUE_SIZE)
+    writer = asyncio.create_task(write_offers(queue, state_store, expired_urls))
     try:
-        await page.goto(ESUN_URL, wait_until="networkidle", timeout=60000)
-        await page.wait_for_timeout(3000)
-        
-        page_num = 1
-        while True:
-            print(f"  正在處理第 {page_num} 頁...")
-            await page.evaluate("window.scrollTo(0, document.body.scrollHeight)")
-            await page.wait_for_timeout(1000)
-            
-            current_offers = await page.evaluate(ESUN_EXTRACT_SCRIPT)
-            existing_titles = {o["title"] for o in all_offers}
-            for offer in current_offers:
-                if offer["title"] not in existing_titles:
-                    offer["bank"] = "玉山銀行"
-                    offer["category"] = "全台優惠"
-                    all_offers.append(offer)
-            
-            # 分頁處理
-            next_page_clicked = False
-            next_btn = await page.query_selector('a.page-link[title="前往下一頁"]')
-            if next_btn:
-                # 確保按鈕在視圖中
-                await next_btn.scroll_into_view_if_needed()
-                await page.wait_for_timeout(500)
-                
-                is_disabled = await next_btn.evaluate('el => el.classList.contains("disabled") || el.parentElement.classList.contains("disabled")')
-                if not is_disabled:
-                    try:
-                        # 使用 evaluate 進行點擊以繞過可視性檢查
-                        await next_btn.evaluate('el => el.click()')
-                        await page.wait_for_timeout(3000)
-                        page_num += 1
-                        next_page_clicked = True
-                    except Exception as e:
-                        print(f"  點擊下一頁失敗: {e}")
-                else:
-                    print("  已達最後一頁。")
-            else:
-                print("  找不到下一頁按鈕。")
-            
-            if not next_page_clicked or page_num > 40:
-                break
-                
-        print(f"\n  玉山銀行總計: {len(all_offers)} 筆")
-    except Exception as e:
-        print(f"  錯誤: {e}")
-        
-    return all_offers
-
-
-def deduplicate(offers: list) -> list:
-    """去除重複"""
-    seen = set()
-    unique = []
-    for o in offers:
-        key = (o["bank"], o["title"], o["url"])
-        if key not in seen:
-            seen.add(key)
-            unique.append(o)
-    return unique
-
-
-def save_to_csv(offers: list, filename: str = "all_bank_offers.csv"):
-    """儲存為 CSV"""
-    with open(filename, "w", newline="", encoding="utf-8-sig") as f:
-        writer = csv.DictWriter(f, fieldnames=["bank", "category", "title", "url", "image"])
-        writer.writeheader()
-        writer.writerows(offers)
-    print(f"已儲存 CSV: {filename}")
-
-
-def save_to_json(offers: list, filename: str = "all_bank_offers.json"):
-    """儲存為 JSON"""
-    with open(filename, "w", encoding="utf-8") as f:
-        json.dump(offers, f, ensure_ascii=False, indent=2)
-    print(f"已儲存 JSON: {filename}")
-
-
-async def main():
+        for scraper in scrapers:
+            await queue.put(BankEvent(scraper.bank_name, "start"))
+            status = "failed"
+            try:
+                # 各分類使用獨立分頁以增加穩定性
+                with telemetry.span("bank", bank=scraper.bank_name) as bank_event:
+                    bank_event["offers"] = await scraper.stream(context, queue)
+                status = "ok"
+            except Exception as e:
+                print(f"[{scraper.bank_name}] 爬取過程中斷: {e}")
+            await queue.put(BankEvent(scraper.bank_name, status))
+        await queue.put(None)
+    except BaseException:
+        # 工作逾時或取消：未完成的銀行只留下暫存，下次爬取開始時清除
+        writer.cancel()
+        raise
+    return await writer
+
+
+async def main(bank_codes: list = None, context=None):
+    """
+    執行爬蟲。
+    bank_codes 為 None 時爬取全部銀行並輸出 CSV/JSON；指定銀行代碼時只更新這些銀行的資料庫內容。
+    context 為 None 時自行啟動 Chromium；後端工作則傳入從瀏覽器池租用的 BrowserContext。
+    後端工作直接在 API 的事件迴圈上執行 main()，所以同步的資料庫與 CPU 階段都以 asyncio.to_thread 執行，
+    進度事件也由背景執行緒寫入，更新期間 API 延遲不受影響。
+    """
+    full_run = not bank_codes
+    bank_codes = list(AVAILABLE_SCRAPERS) if full_run else [c.lower() for c in bank_codes]
+    # 檢查點與斷路器狀態存於資料庫：中斷後重新執行會從最後完成的分頁續爬
+    state_store = DatabaseStateStore()
+    # 未知代碼會拋出 ValueError
+    scrapers = [get_scraper(code, state_store=state_store) for code in bank_codes]
+    
     print("=" * 60)
     print("銀行信用卡優惠統一爬蟲")
     print(f"開始時間: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     print("=" * 60)
     
-    status_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), "status.json")
+    telemetry.reset()
     try:
-        with open(status_file, "w", encoding="utf-8") as f:
-            json.dump({"status": "更新中..."}, f, ensure_ascii=False)
+        from database import init_db
+        print("\n正在初始化資料庫...")
+        await asyncio.to_thread(init_db)  # 確保資料表 (含暫存與進度表) 存在；每次執行只呼叫一次
     except Exception as e:
-        print(f"初始化 status.json 失敗: {e}")
-
+        print(f"資料庫初始化失敗: {e}")
+    try:
+        # 透過共用的 SQLite 進度表把事件即時推給後端 (/api/status/stream)
+        from database import add_progress_event
+        telemetry.add_sink(add_progress_event, background=True)
+    except Exception as e:
+        print(f"進度事件通道初始化失敗: {e}")
+    telemetry.emit("run_start", banks=[scraper.bank_name for scraper in scrapers])
+    run_status = "error"
     try:
-        all_offers = []
+        if context is None:
+            async with async_playwright() as p:
+                browser = await p.chromium.launch(
+                    headless=IS_CI,  # CI 環境用 headless，本機可開視窗
+                    **LAUNCH_OPTIONS
+                )
+                context = await browser.new_context(**CONTEXT_OPTIONS)
+                telemetry.track_context_bytes(context)
+                await scrape_banks(scrapers, context, state_store)
+                await browser.close()
+        else:
+            # 後端常駐瀏覽器池租用的 context，不需冷啟動 Chromium
+            await scrape_banks(scrapers, context, state_store)
         
-        async with async_playwright() as p:
-            browser = await p.chromium.launch(
-                headless=IS_CI,  # CI 環境用 headless，本機可開視窗
-                args=["--disable-blink-features=AutomationControlled"]
-            )
-            context = await browser.new_context(
-                user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-                viewport={"width": 1920, "height": 1080}
-            )
-            # 爬取各銀行 (隔離分頁執行以增加穩定性)
-            async def run_safely(bank_name, func, context):
-                try:
-                    page = await context.new_page()
-                    results = await func(page)
-                    await page.close()
-                    return results
-                except Exception as e:
-                    print(f"[{bank_name}] 爬取過程中斷: {e}")
-                    return None
-
-            # 初始化資料庫
-            try:
-                from database import init_db, upsert_bank_offers
-                print("\n正在初始化資料庫...")
-                init_db()  # 確保資料表存在且包含 created_at 欄位
-            except Exception as e:
-                print(f"資料庫初始化失敗: {e}")
-                upsert_bank_offers = None
-
-            # 爬取 中國信託
-            ctbc_offers = await run_safely("中國信託", scrape_ctbc, context)
-            if ctbc_offers is not None:
-                all_offers.extend(ctbc_offers)
-                if upsert_bank_offers:
-                    try:
-                        upsert_bank_offers("中國信託", ctbc_offers)
-                    except Exception as e:
-                        print(f"[中國信託] 更新至資料庫出錯: {e}")
-            else:
-                print("[中國信託] 爬取失敗，跳過資料庫更新以防止誤刪。")
-            
-            # 爬取 國泰世華
-            cathay_offers = await run_safely("國泰世華", scrape_cathay, context)
-            if cathay_offers is not None:
-                all_offers.extend(cathay_offers)
-                if upsert_bank_offers:
-                    try:
-                        upsert_bank_offers("國泰世華", cathay_offers)
-                    except Exception as e:
-                        print(f"[國泰世華] 更新至資料庫出錯: {e}")
-            else:
-                print("[國泰世華] 爬取失敗，跳過資料庫更新以防止誤刪。")
-            
-            # 爬取 聯邦銀行
-            ubot_offers = await run_safely("聯邦銀行", scrape_ubot, context)
-            if ubot_offers is not None:
-                all_offers.extend(ubot_offers)
-                if upsert_bank_offers:
-                    try:
-                        upsert_bank_offers("聯邦銀行", ubot_offers)
-                    except Exception as e:
-                        print(f"[聯邦銀行] 更新至資料庫出錯: {e}")
-            else:
-                print("[聯邦銀行] 爬取失敗，跳過資料庫更新以防止誤刪。")
-            
-            # 爬取 玉山銀行
-            esun_offers = await run_safely("玉山銀行", scrape_esun, context)
-            if esun_offers is not None:
-                all_offers.extend(esun_offers)
-                if upsert_bank_offers:
-                    try:
-                        upsert_bank_offers("玉山銀行", esun_offers)
-                    except Exception as e:
-                        print(f"[玉山銀行] 更新至資料庫出錯: {e}")
-            else:
-                print("[玉山銀行] 爬取失敗，跳過資料庫更新以防止誤刪。")
-            
-            await browser.close()
+        # 活動頁面補充：並行解析新優惠的起訖日與條款，並刪除活動已結束的優惠
+        try:
+            from enrichment import enrich_pending_offers
+            with telemetry.span("enrich") as enrich_event:
+                enrich_event.update(await enrich_pending_offers())
+        except Exception as e:
+            print(f"活動頁面解析失敗: {e}")
+        
+        # 圖片檢查：並行下載新圖片，記錄狀態與尺寸 (API 只回傳可用的圖片) 並預熱圖片代理快取
+        try:
+            from image_checks import check_pending_images
+            with telemetry.span("image_check") as image_event:
+                image_event.update(await check_pending_images())
+        except Exception as e:
+            print(f"圖片檢查失敗: {e}")
+        
+        # 特店座標：以 Nominatim 查詢新特店的座標並寫入 R*Tree (/api/offers/near)，每秒最多一次請求
+        try:
+            from geo import geocode_pending_merchants
+            with telemetry.span("geocode") as geocode_event:
+                geocode_event.update(await asyncio.to_thread(geocode_pending_merchants))
+        except Exception as e:
+            print(f"特店座標查詢失敗: {e}")
         
-        # 去重
-        all_offers = deduplicate(all_offers)
+        # 近似重複分群 (同一優惠以不同標題出現在多個分類)
+        try:
+            from near_duplicates import update_clusters
+            with telemetry.span("cluster") as cluster_event:
+                cluster_event.update(await asyncio.to_thread(update_clusters))
+        except Exception as e:
+            print(f"近似重複分群失敗: {e}")
+        
+        # 跨銀行分類正規化 (以規則判定的優惠訓練標題分類器，補判規則無法判斷的優惠)
+        try:
+            from categories import update_canonical_categories
+            with telemetry.span("categorize") as categorize_event:
+                categorize_event.update(await asyncio.to_thread(update_canonical_categories))
+        except Exception as e:
+            print(f"分類正規化失敗: {e}")
+        
+        # 新優惠通知：upsert 時已比對儲存的搜尋並寫入 outbox，這裡送出 (本機 JSONL / webhook)
+        try:
+            from saved_searches import deliver_notifications
+            with telemetry.span("notify") as notify_event:
+                notify_event.update(await asyncio.to_thread(deliver_notifications))
+        except Exception as e:
+            print(f"通知傳送失敗: {e}")
         
+        # 優惠只存在資料庫中 (爬蟲逐頁寫入)，統計與匯出都從資料庫讀取
+        from database import get_offer_stats
+        offer_stats = await asyncio.to_thread(get_offer_stats)
         print("\n" + "=" * 60)
-        print(f"總計: {len(all_offers)} 筆優惠 (已去重)")
+        print(f"資料庫總計: {offer_stats['total']} 筆優惠")
         print("=" * 60)
         
-        # 儲存
-        save_to_csv(all_offers)
-        save_to_json(all_offers)
+        # 匯出 (只爬部分銀行時不覆寫完整的匯出檔)；直接從資料庫串流並原子性替換，內容未變則不改寫
+        if full_run:
+            try:
+                from exporters import export_offers
+                await asyncio.to_thread(export_offers)
+            except Exception as e:
+                print(f"匯出優惠資料失敗: {e}")
+            try:
+                from database import compact_offer_changes
+                await asyncio.to_thread(compact_offer_changes)
+            except Exception as e:
+                print(f"清除過舊變更紀錄失敗: {e}")
+            try:
+                from static_build import build_static_data
+                await asyncio.to_thread(build_static_data)
+            except Exception as e:
+                print(f"建置靜態資料失敗: {e}")
         
         # 顯示各銀行統計
         print("\n各銀行統計:")
-        from collections import Counter
-        bank_counts = Counter(o["bank"] for o in all_offers)
-        for bank, count in sorted(bank_counts.items(), key=lambda x: -x[1]):
+        for bank, count in sorted(offer_stats["by_bank"].items(), key=lambda x: -x[1]):
             print(f"  {bank}: {count} 筆")
         
         print(f"\n完成時間: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+        run_status = "ok" if all(b["status"] == "ok" for b in telemetry.banks.values()) else "partial"
     finally:
+        summary = telemetry.summary(run_status)
+        telemetry.emit("run_end", status=run_status, duration_ms=round(summary["duration_seconds"] * 1000, 1))
         try:
-            with open(status_file, "w", encoding="utf-8") as f:
-                json.dump({"status": "空閒"}, f, ensure_ascii=False)
-            print("已將狀態重設為空閒。")
+            from database import save_scrape_run
+            await asyncio.to_thread(save_scrape_run, summary)
         except Exception as e:
-            print(f"將 status 設回空閒失敗: {e}")
+            print(f"寫入執行摘要失敗: {e}")
+        # 等待進度事件 (含 run_end) 寫入進度表，SSE 訂閱端才能結束等待
+        await asyncio.to_thread(telemetry.flush)
+
+
+def write_status(status: str):
+    """單獨執行時寫入 status.json (由後端執行時由 JobManager 負責，佇列中還有工作時不會顯示為空閒)"""
+    status_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), "status.json")
+    try:
+        with open(status_file, "w", encoding="utf-8") as f:
+            json.dump({"status": status}, f, ensure_ascii=False)
+    except Exception as e:
+        print(f"寫入 status.json 失敗: {e}")
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    import argparse
+    parser = argparse.ArgumentParser(description="銀行信用卡優惠統一爬蟲")
+    parser.add_argument("--bank", action="append", choices=list(AVAILABLE_SCRAPERS),
+                        help="只爬取指定銀行 (可重複指定)，預設為全部銀行")
+    parser.add_argument("--no-status", action="store_true",
+                        help="不寫入 status.json (由後端工作管理以子行程執行時使用)")
+    args = parser.parse_args()
+    if not args.no_status:
+        write_status("更新中...")
+    try:
+        asyncio.run(main(args.bank))
+    finally:
+        if not args.no_status:
+            write_status("空閒")
+            print("已將狀態重設為空閒。")
@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+"""
+跨銀行分類正規化
+各銀行的分類名稱不一致 (中信「餐飲優惠」/「旅遊玩家」、聯邦「旅遊優惠」/「網購數位」、
+國泰只有「信用卡優惠」、玉山只有「全台優惠」)，無法跨銀行篩選。
+每筆優惠另外指定一個標準分類 (offers.canonical_category)，依序:
+
+1. 來源分類對照表：分類名稱本身已明確的 (例如「餐飲優惠」) 直接對應
+2. 標題關鍵字規則：「信用卡優惠」這類籠統分類依標題判斷
+3. 標題分類器：以規則已判定的優惠為訓練資料，學習具鑑別力的字元二字組，
+   只在規則無法判斷且證據充分時採用
+4. 其餘歸為「其他優惠」
+
+1、2 在 upsert 時即寫入；3 由 update_canonical_categories() 在爬蟲結束後執行。
+各標準分類 × 銀行的筆數存放於 category_facets 資料表，供 /api/facets 直接讀取。
+"""
+
+import unicodedata
+from datetime import datetime
+from typing import Dict, List, Optional, Set, Tuple
+
+from near_duplicates import strip_bank_tokens
+
+# 標準分類 (key -> 顯示名稱)，順序即前端下拉選單的順序
+CANONICAL_CATEGORIES = {
+    "dining": "餐飲美食",
+    "travel": "旅遊住宿",
+    "transport": "交通加油",
+    "online": "網購數位",
+    "shopping": "百貨購物",
+    "payment": "行動支付",
+    "living": "生活繳費",
+    "entertainment": "休閒娛樂",
+    "other": "其他優惠",
+}
+DEFAULT_CATEGORY = "other"
+
+# 名稱已明確的來源分類
+SOURCE_CATEGORIES = {
+    "餐飲優惠": "dining",
+    "旅遊玩家": "travel",
+    "旅遊優惠": "travel",
+    "百貨藥妝": "shopping",
+    "百貨零售": "shopping",
+    "超商量販": "shopping",
+    "行動支付": "payment",
+    "線上購物": "online",
+    "網購數位": "online",
+    "交通汽修": "transport",
+    "生活繳費": "living",
+}
+
+# 範圍較廣的來源分類：標題規則判斷不出來時才採用
+SOURCE_FALLBACKS = {
+    "購物娛樂": "shopping",
+}
+
+# 標題關鍵字規則 (比對 NFKC + 小寫後的標題)，依序比對，第一個命中的分類勝出
+KEYWORD_RULES: List[Tuple[str, Tuple[str, ...]]] = [
+    ("travel", ("旅遊", "旅行", "訂房", "住宿", "飯店", "酒店", "旅館", "民宿", "渡假", "度假", "機票", "航空",
+                "虎航", "機場", "免稅", "團旅", "agoda", "klook", "kkday", "trip.com", "hotels.com", "booking",
+                "esim", "wifi", "租車", "貴賓室", "日本", "韓國", "海外")),
+    ("dining", ("餐廳", "美食", "餐飲", "咖啡", "星巴克", "麥當勞", "foodpanda", "ubereats", "uber eats",
+                "自助餐", "吃到飽", "訂位", "料理", "燒肉", "火鍋", "鐵板燒", "陶板屋", "王品", "甜點")),
+    ("transport", ("加油", "中油", "台塑石油", "停車", "etag", "捷運", "高鐵", "台鐵", "計程車", "uber",
+                   "汽車", "機車", "汽修", "充電", "交通")),
+    ("payment", ("pay", "錢包", "wallet", "綁定", "感應支付", "全支付", "悠遊付", "街口")),
+    ("online", ("momo", "pchome", "蝦皮", "shopee", "酷澎", "coupang", "淘寶", "網購", "線上購物",
+                "購物網", "yahoo", "博客來", "apple", "google", "netflix", "spotify", "disney+", "3c", "數位")),
+    ("shopping", ("百貨", "購物中心", "outlet", "商場", "廣場", "量販", "全聯", "家樂福", "好市多", "costco",
+                  "愛買", "超商", "便利商店", "全家", "7-eleven", "寶雅", "康是美", "屈臣氏", "藥妝", "家具", "家電")),
+    ("entertainment", ("演唱會", "音樂會", "音樂節", "劇團", "售票", "購票", "門票", "樂園", "展覽", "電影",
+                       "影城", "見面會", "spa", "健身", "親子", "水族館", "xpark")),
+    ("living", ("繳費", "繳稅", "扣繳", "保險", "投保", "產險", "壽險", "電信", "水費", "電費", "瓦斯",
+                "保費", "學費", "醫療")),
+]
+
+# 標題分類器參數：只採用在訓練資料中出現至少 MIN_SUPPORT 次、且 MIN_PURITY 以上屬於同一分類的二字詞
+NGRAM = 2
+MIN_SUPPORT = 3
+MIN_PURITY = 0.8
+MIN_VOTES = 1.5
+MIN_CONFIDENCE = 0.75
+MIN_TRAINING_SAMPLES = 30
+
+
+def _normalize(text: str) -> str:
+    return unicodedata.normalize("NFKC", text or "").lower()
+
+
+def classify_by_rules(category: Optional[str], title: Optional[str]) -> Optional[str]:
+    """依來源分類與標題關鍵字判斷標準分類，規則無法判斷時回傳 None"""
+    if category in SOURCE_CATEGORIES:
+        return SOURCE_CATEGORIES[category]
+    text = _normalize(title)
+    for canonical, keywords in KEYWORD_RULES:
+        if any(keyword in text for keyword in keywords):
+            return canonical
+    return SOURCE_FALLBACKS.get(category)
+
+
+def classify_offer(category: Optional[str], title: Optional[str]) -> str:
+    """upsert 時使用：只套用規則，判斷不出來時歸為其他"""
+    return classify_by_rules(category, title) or DEFAULT_CATEGORY
+
+
+def _features(title: str) -> Set[str]:
+    """去除銀行名稱與標點後的字元二字組 (銀行名稱幾乎每個標題都有，會讓分類偏向該銀行優惠最多的分類)"""
+    text = "".join(ch for ch in strip_bank_tokens(_normalize(title)) if ch.isalnum())
+    if len(text) <= NGRAM:
+        return {text} if text else set()
+    return {text[i:i + NGRAM] for i in range(len(text) - NGRAM + 1)}
+
+
+class TitleClassifier:
+    """
+    以規則已判定的優惠學習「具鑑別力的二字詞」(例如「長榮」幾乎只出現在旅遊優惠)，
+    預測時由標題中的鑑別詞依純度加權投票。寧可不判也不亂判：票數或得票率不足時回傳 None。
+    """
+
+    def __init__(self, samples: List[Tuple[str, str]]):
+        distribution: Dict[str, Dict[str, int]] = {}
+        for title, label in samples:
+            for feature in _features(title):
+                counts = distribution.setdefault(feature, {})
+                counts[label] = counts.get(label, 0) + 1
+        self.features: Dict[str, Tuple[str, float]] = {}
+        for feature, counts in distribution.items():
+            support = sum(counts.values())
+            label = max(counts, key=counts.get)
+            purity = counts[label] / support
+            if support >= MIN_SUPPORT and purity >= MIN_PURITY:
+                self.features[feature] = (label, purity)
+
+    def predict(self, title: str) -> Tuple[Optional[str], float]:
+        """回傳 (分類, 得票率)；證據不足時回傳 (None, 0.0)"""
+        votes: Dict[str, float] = {}
+        for feature in _features(title):
+            if feature in self.features:
+                label, purity = self.features[feature]
+                votes[label] = votes.get(label, 0.0) + purity
+        if not votes:
+            return None, 0.0
+        best = max(votes, key=votes.get)
+        confidence = votes[best] / sum(votes.values())
+        if votes[best] < MIN_VOTES:
+            return None, 0.0
+        return best, confidence
+
+
+def update_canonical_categories(conn=None) -> Dict:
+    """
+    重新計算所有優惠的標準分類並更新 category_facets，回傳統計。
+    規則判斷不出來的優惠以分類器 (以規則判定的優惠訓練) 補判；變更會寫入 offer_changes 供前端增量同步。
+    """
+    from database import _log_offer_change, _refresh_category_facets
+
+    own_conn = conn is None
+    if own_conn:
+        from database import get_connection
+        conn = get_connection()
+    try:
+        rows = conn.execute(
+            "SELECT id, bank, category, title, url, image, canonical_category FROM offers"
+        ).fetchall()
+        by_rules = {row["id"]: classify_by_rules(row["category"], row["title"]) for row in rows}
+        samples = [(row["title"], by_rules[row["id"]]) for row in rows if by_rules[row["id"]]]
+        classifier = TitleClassifier(samples) if len(samples) >= MIN_TRAINING_SAMPLES else None
+
+        classified = 0
+        changed = []
+        for row in rows:
+            canonical = by_rules[row["id"]]
+            if canonical is None and classifier is not None:
+                label, confidence = classifier.predict(row["title"])
+                if label and confidence >= MIN_CONFIDENCE:
+                    canonical = label
+                    classified += 1
+            canonical = canonical or DEFAULT_CATEGORY
+            if canonical != row["canonical_category"]:
+                changed.append((row, canonical))
+
+        now = datetime.now().isoformat()
+        cursor = conn.cursor()
+        for row, canonical in changed:
+            cursor.execute("UPDATE offers SET canonical_category = ? WHERE id = ?", (canonical, row["id"]))
+            _log_offer_change(cursor, "update", row["id"], row["bank"], row["category"], row["title"],
+                              row["url"], row["image"], now)
+        _refresh_category_facets(cursor)
+        conn.commit()
+    finally:
+        if own_conn:
+            conn.close()
+
+    stats = {
+        "offers": len(rows),
+        "by_rules": sum(1 for v in by_rules.values() if v),
+        "by_classifier": classified,
+        "updated": len(changed),
+    }
+    print(f"分類正規化完成: {stats}")
+    return stats
+
+
+if __name__ == "__main__":
+    update_canonical_categories()
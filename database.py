@@ -6,8 +6,15 @@
 
 import sqlite3
 import os
-from datetime import datetime
-from typing import List, Dict, Optional
+import json
+from datetime import datetime, timedelta
+from typing import Iterable, List, Dict, Optional
+
+from categories import classify_offer
+from merchants import index_offer_merchants, merchant_index_version
+from models import Card, Offer, fetch_models, normalize_title
+from recommendations import bump_cards_version, card_index_version, index_card_offers, index_offer_cards
+from saved_searches import index_saved_search, parse_query, percolate_offers, saved_search_index_version
 
 # 使用相對路徑確保在不同執行目錄下都能讀取到資料庫
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -21,6 +28,22 @@ def get_connection():
     return conn
 
 
+# 後來加入 offers 的欄位 (舊資料庫於 init_db 時以 ALTER TABLE 補上)
+OFFER_EXTRA_COLUMNS = {
+    # 活動頁面補充資訊 (enrichment.py)
+    "start_date": "TEXT",
+    "end_date": "TEXT",
+    "terms": "TEXT",
+    "enriched_at": "DATETIME",
+    # 近似重複分群的代表優惠 id (near_duplicates.py)
+    "cluster_id": "INTEGER",
+    # 跨銀行的標準分類 (categories.py)
+    "canonical_category": "TEXT",
+    # 圖片檢查結果 (image_checks.py)：1 可用、0 不可用、NULL 尚未檢查；API 只回傳 1 的圖片
+    "image_ok": "INTEGER",
+}
+
+
 def init_db():
     """初始化資料庫"""
     conn = get_connection()
@@ -53,6 +76,11 @@ def init_db():
         except Exception as e:
             print(f"新增 created_at 欄位失敗: {e}")
     
+    # 活動起訖日 (YYYY-MM-DD)、重點條款 (JSON 陣列)、近似重複分群
+    for column, column_type in OFFER_EXTRA_COLUMNS.items():
+        if column not in columns:
+            cursor.execute(f"ALTER TABLE offers ADD COLUMN {column} {column_type}")
+    
     # 信用卡表
     cursor.execute("""
         CREATE TABLE IF NOT EXISTS cards (
@@ -69,9 +97,277 @@ def init_db():
         )
     """)
     
+    # 爬蟲執行摘要表 (每次執行一筆，詳細的各銀行統計存於 summary JSON)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS scrape_runs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            run_id TEXT NOT NULL UNIQUE,
+            status TEXT,
+            started_at DATETIME,
+            finished_at DATETIME,
+            duration_seconds REAL,
+            total_offers INTEGER,
+            retries INTEGER,
+            bytes INTEGER,
+            summary TEXT
+        )
+    """)
+    
+    # 爬蟲逐頁寫入的暫存優惠：銀行爬取完成後由 commit_staged_offers 在同一個 transaction 內合併到 offers
+    # (category_order 為分類順序，同一銀行內相同標題以先出現的分類為準)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS offer_staging (
+            bank TEXT NOT NULL,
+            category_order INTEGER NOT NULL,
+            category TEXT,
+            title TEXT NOT NULL,
+            url TEXT,
+            image TEXT,
+            UNIQUE (bank, category_order, title)
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_offer_staging_title ON offer_staging(bank, title, category_order)")
+    
+    # 各銀行的變更率與爬取成本 (src/backend/core/scheduler.py 依此安排爬取間隔)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS bank_crawl_stats (
+            bank TEXT PRIMARY KEY,
+            crawls INTEGER NOT NULL DEFAULT 0,
+            last_crawled_at DATETIME,
+            last_changes INTEGER,
+            offers INTEGER,
+            change_rate REAL,
+            duration_seconds REAL
+        )
+    """)
+    
+    # 爬蟲即時進度事件表 (爬蟲行程寫入，後端 SSE 讀取)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS scrape_progress (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            run_id TEXT,
+            event TEXT NOT NULL,
+            bank TEXT,
+            payload TEXT,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    
+    # 爬蟲檢查點：每完成一頁保存該頁新增的優惠，重新執行時從此續爬 (page = -1 代表分類已完成)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS scrape_checkpoints (
+            bank TEXT NOT NULL,
+            category TEXT NOT NULL,
+            page INTEGER NOT NULL,
+            offers TEXT,
+            updated_at DATETIME NOT NULL,
+            PRIMARY KEY (bank, category, page)
+        )
+    """)
+    
+    # 各銀行的斷路器狀態 (連續失敗次數、暫停到何時)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS circuit_breakers (
+            bank TEXT PRIMARY KEY,
+            failures INTEGER NOT NULL DEFAULT 0,
+            trips INTEGER NOT NULL DEFAULT 0,
+            opened_until DATETIME,
+            last_error TEXT,
+            updated_at DATETIME NOT NULL
+        )
+    """)
+    
+    # 優惠變更紀錄 (append-only，seq 單調遞增，供用戶端增量同步)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS offer_changes (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            offer_id INTEGER NOT NULL,
+            op TEXT NOT NULL,
+            bank TEXT,
+            category TEXT,
+            title TEXT,
+            url TEXT,
+            image TEXT,
+            changed_at DATETIME NOT NULL
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_offer_changes_changed_at ON offer_changes(changed_at)")
+    
+    # 優惠歷史：身分 (bank, title, url) 只存一次，內容 (分類 / 圖片) 以有效區間記錄。
+    # 每次執行只在出現、內容變更、下架時新增或結束區間，儲存量與變更數成正比而非天數 × 優惠數。
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS offer_identities (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            bank TEXT NOT NULL,
+            title TEXT NOT NULL,
+            url TEXT NOT NULL DEFAULT '',
+            first_seen DATETIME NOT NULL,
+            last_seen DATETIME NOT NULL,
+            UNIQUE (bank, title, url)
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS offer_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            identity_id INTEGER NOT NULL REFERENCES offer_identities(id),
+            category TEXT,
+            image TEXT,
+            valid_from DATETIME NOT NULL,
+            valid_to DATETIME,
+            last_seen DATETIME NOT NULL
+        )
+    """)
+    # 時間點查詢：valid_from <= t AND (valid_to IS NULL OR valid_to > t)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_offer_history_valid ON offer_history(valid_from, valid_to)")
+    # 每次執行更新 / 結束目前有效的區間
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_offer_history_open ON offer_history(identity_id, valid_to)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_offer_identities_bank ON offer_identities(bank)")
+    _backfill_offer_history(cursor)
+    
+    # 活動頁面的 HTTP 快取：保存驗證器 (ETag / Last-Modified) 與解析結果，不保存頁面內容
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS http_cache (
+            url TEXT PRIMARY KEY,
+            etag TEXT,
+            last_modified TEXT,
+            status INTEGER,
+            start_date TEXT,
+            end_date TEXT,
+            terms TEXT,
+            fetched_at DATETIME NOT NULL
+        )
+    """)
+    
+    # 通用的鍵值設定表 (例如變更紀錄已清除到的序號)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS app_meta (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        )
+    """)
+    
+    # 標準分類 × 銀行的優惠筆數，與 offers 在同一個 transaction 內更新
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS category_facets (
+            canonical_category TEXT NOT NULL,
+            bank TEXT NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (canonical_category, bank)
+        )
+    """)
+    _backfill_canonical_categories(cursor)
+    
+    # 圖片檢查結果 (以圖片網址為鍵，多筆優惠共用同一張圖片時只檢查一次)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS image_checks (
+            url TEXT PRIMARY KEY,
+            status INTEGER,
+            content_type TEXT,
+            bytes INTEGER,
+            width INTEGER,
+            height INTEGER,
+            ok INTEGER NOT NULL,
+            reason TEXT,
+            checked_at DATETIME NOT NULL
+        )
+    """)
+    
+    # 特店 (merchants.py) 與特店 → 優惠的倒排列表；以主鍵 (merchant_id, offer_id) 直接查詢
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS merchants (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            key TEXT NOT NULL UNIQUE,
+            name TEXT NOT NULL,
+            source TEXT NOT NULL
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS merchant_offers (
+            merchant_id INTEGER NOT NULL,
+            offer_id INTEGER NOT NULL,
+            PRIMARY KEY (merchant_id, offer_id)
+        ) WITHOUT ROWID
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_merchant_offers_offer ON merchant_offers(offer_id)")
+    _backfill_merchant_index(cursor)
+    
+    # 卡片 × 優惠適用索引 (recommendations.py)，新優惠與卡片異動時增量維護
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS card_offers (
+            card_id INTEGER NOT NULL,
+            offer_id INTEGER NOT NULL,
+            score REAL NOT NULL,
+            PRIMARY KEY (card_id, offer_id)
+        ) WITHOUT ROWID
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_card_offers_offer ON card_offers(offer_id)")
+    _backfill_card_index(cursor)
+    
+    # 特店座標 (geo.py)：以特店正規化名稱為鍵 (特店索引重建時 merchants.id 會改變)，
+    # 查到的座標另寫入 R*Tree (id 與 merchant_locations.id 相同)，供附近優惠的外接矩形預篩
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS merchant_locations (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            key TEXT NOT NULL UNIQUE,
+            query TEXT,
+            lat REAL,
+            lon REAL,
+            ok INTEGER NOT NULL,
+            reason TEXT,
+            geocoded_at DATETIME NOT NULL
+        )
+    """)
+    cursor.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS merchant_geo USING rtree(
+            id, min_lat, max_lat, min_lon, max_lon
+        )
+    """)
+    
+    # 儲存的搜尋 (saved_searches.py)、搜尋的錨點反向索引與待送出的新優惠通知
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS saved_searches (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT,
+            query TEXT NOT NULL,
+            bank TEXT,
+            category TEXT,
+            webhook_url TEXT,
+            created_at DATETIME NOT NULL
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS saved_search_terms (
+            gram TEXT NOT NULL,
+            search_id INTEGER NOT NULL,
+            PRIMARY KEY (gram, search_id)
+        ) WITHOUT ROWID
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_saved_search_terms_search ON saved_search_terms(search_id)")
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS notification_outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            search_id INTEGER NOT NULL,
+            offer_id INTEGER NOT NULL,
+            payload TEXT NOT NULL,
+            created_at DATETIME NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            last_error TEXT,
+            delivered_at DATETIME,
+            UNIQUE (search_id, offer_id)
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_notification_outbox_pending ON notification_outbox(delivered_at, id)")
+    _backfill_saved_search_index(cursor)
+    _normalize_offer_titles(cursor)
+    
     # 建立索引
     cursor.execute("CREATE INDEX IF NOT EXISTS idx_offers_bank ON offers(bank)")
     cursor.execute("CREATE INDEX IF NOT EXISTS idx_offers_category ON offers(category)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_offers_end_date ON offers(end_date)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_offers_start_date ON offers(start_date)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_offers_enriched_at ON offers(enriched_at)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_offers_cluster_id ON offers(cluster_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_offers_canonical_category ON offers(canonical_category, bank)")
     cursor.execute("CREATE INDEX IF NOT EXISTS idx_cards_bank ON cards(bank)")
     
     conn.commit()
@@ -119,78 +415,730 @@ def add_offers(offers: List[Dict]):
     print(f"已新增 {len(offers)} 筆優惠")
 
 
-def upsert_bank_offers(bank: str, offers: List[Dict]):
+def _backfill_offer_history(cursor):
+    """既有資料庫第一次建立歷史表時，以目前的優惠作為起點 (created_at 為出現時間)"""
+    if cursor.execute("SELECT 1 FROM offer_identities LIMIT 1").fetchone():
+        return
+    cursor.execute("""
+        INSERT OR IGNORE INTO offer_identities (bank, title, url, first_seen, last_seen)
+        SELECT bank, title, COALESCE(url, ''),
+               COALESCE(created_at, scraped_at, CURRENT_TIMESTAMP),
+               COALESCE(scraped_at, created_at, CURRENT_TIMESTAMP)
+        FROM offers
+        ORDER BY id
+    """)
+    cursor.execute("""
+        INSERT INTO offer_history (identity_id, category, image, valid_from, last_seen)
+        SELECT i.id, o.category, o.image, i.first_seen, i.last_seen
+        FROM offer_identities i
+        JOIN offers o ON o.bank = i.bank AND o.title = i.title AND COALESCE(o.url, '') = i.url
+        GROUP BY i.id
+    """)
+    if cursor.rowcount > 0:
+        print(f"已從現有優惠建立 {cursor.rowcount} 筆歷史區間")
+
+
+def _open_offer_interval(cursor, bank: str, title, url, category, image, now: str):
+    """優惠出現或內容變更：取得 (或建立) 身分並開啟新的有效區間"""
+    url = url or ""  # NULL 在 UNIQUE 中互不相等，統一以空字串表示沒有連結
+    cursor.execute("""
+        INSERT OR IGNORE INTO offer_identities (bank, title, url, first_seen, last_seen)
+        VALUES (?, ?, ?, ?, ?)
+    """, (bank, title, url, now, now))
+    identity_id = cursor.execute(
+        "SELECT id FROM offer_identities WHERE bank = ? AND title = ? AND url = ?", (bank, title, url or "")
+    ).fetchone()[0]
+    _close_offer_interval(cursor, identity_id, now)
+    cursor.execute("""
+        INSERT INTO offer_history (identity_id, category, image, valid_from, last_seen)
+        VALUES (?, ?, ?, ?, ?)
+    """, (identity_id, category, image, now, now))
+
+
+def _close_offer_interval(cursor, identity_id: int, now: str):
+    cursor.execute(
+        "UPDATE offer_history SET valid_to = ? WHERE identity_id = ? AND valid_to IS NULL",
+        (now, identity_id),
+    )
+
+
+def _close_offer_interval_by_key(cursor, bank: str, title, url, now: str):
+    row = cursor.execute(
+        "SELECT id FROM offer_identities WHERE bank = ? AND title = ? AND url = ?", (bank, title, url or "")
+    ).fetchone()
+    if row:
+        _close_offer_interval(cursor, row[0], now)
+
+
+def _normalize_offer_titles(cursor):
+    """
+    舊資料升級：以 Offer.from_scraped 相同的規則正規化標題 (換行、連續空白)。
+    upsert 以 (title, url) 比對，未正規化的舊標題會在下一次爬取時被刪除再新增，
+    造成變更紀錄、歷史區間、儲存搜尋通知與活動頁面解析全部重來。
+    """
+    now = datetime.now().isoformat()
+    renamed = [
+        (row["id"], row["bank"], row["category"], normalize_title(row["title"]), row["url"], row["image"])
+        for row in cursor.execute("SELECT id, bank, category, title, url, image FROM offers").fetchall()
+        if normalize_title(row["title"]) != row["title"]
+    ]
+    for offer_id, bank, category, title, url, image in renamed:
+        cursor.execute("UPDATE offers SET title = ? WHERE id = ?", (title, offer_id))
+        # 特店與適用卡片由標題擷取
+        cursor.execute("DELETE FROM merchant_offers WHERE offer_id = ?", (offer_id,))
+        index_offer_merchants(cursor, offer_id, title)
+        cursor.execute("DELETE FROM card_offers WHERE offer_id = ?", (offer_id,))
+        index_offer_cards(cursor, offer_id, bank, title)
+        # 增量同步的用戶端也要換上新標題
+        _log_offer_change(cursor, "update", offer_id, bank, category, title, url, image, now)
+
+    # 歷史的身分 (bank, title, url) 同樣正規化；正規化後與既有身分相同時合併為一個
+    for row in cursor.execute("SELECT id, bank, title, url, first_seen, last_seen FROM offer_identities").fetchall():
+        title = normalize_title(row["title"])
+        if title == row["title"]:
+            continue
+        existing = cursor.execute(
+            "SELECT id FROM offer_identities WHERE bank = ? AND title = ? AND url = ?", (row["bank"], title, row["url"])
+        ).fetchone()
+        if existing is None:
+            cursor.execute("UPDATE offer_identities SET title = ? WHERE id = ?", (title, row["id"]))
+            continue
+        cursor.execute("UPDATE offer_history SET identity_id = ? WHERE identity_id = ?", (existing["id"], row["id"]))
+        cursor.execute("""
+            UPDATE offer_identities SET first_seen = MIN(first_seen, ?), last_seen = MAX(last_seen, ?) WHERE id = ?
+        """, (row["first_seen"], row["last_seen"], existing["id"]))
+        cursor.execute("DELETE FROM offer_identities WHERE id = ?", (row["id"],))
+    if renamed:
+        print(f"已正規化 {len(renamed)} 筆優惠標題的空白")
+
+
+def _backfill_canonical_categories(cursor):
+    """舊資料庫升級：為尚未正規化的優惠套用分類規則並重建 category_facets"""
+    rows = cursor.execute("SELECT id, category, title FROM offers WHERE canonical_category IS NULL").fetchall()
+    if rows:
+        cursor.executemany(
+            "UPDATE offers SET canonical_category = ? WHERE id = ?",
+            [(classify_offer(row[1], row[2]), row[0]) for row in rows],
+        )
+    _refresh_category_facets(cursor)
+
+
+def _backfill_merchant_index(cursor):
+    """
+    特店字典或標題樣式改變 (merchant_index_version 不同) 時重建整個特店索引；
+    之後的新優惠在 upsert 時即寫入索引。
+    """
+    version = merchant_index_version()
+    row = cursor.execute("SELECT value FROM app_meta WHERE key = 'merchant_index_version'").fetchone()
+    if row and row[0] == version:
+        return
+    cursor.execute("DELETE FROM merchant_offers")
+    cursor.execute("DELETE FROM merchants")
+    for offer_id, title in cursor.execute("SELECT id, title FROM offers").fetchall():
+        index_offer_merchants(cursor, offer_id, title)
+    cursor.execute(
+        "INSERT OR REPLACE INTO app_meta (key, value) VALUES ('merchant_index_version', ?)", (version,)
+    )
+
+
+def _backfill_card_index(cursor):
+    """比對規則改變 (card_index_version 不同) 時重建整個 card_offers"""
+    version = card_index_version()
+    row = cursor.execute("SELECT value FROM app_meta WHERE key = 'card_index_version'").fetchone()
+    if row and row[0] == version:
+        return
+    cursor.execute("DELETE FROM card_offers")
+    for (card_id,) in cursor.execute("SELECT id FROM cards").fetchall():
+        index_card_offers(cursor, card_id)
+    cursor.execute(
+        "INSERT OR REPLACE INTO app_meta (key, value) VALUES ('card_index_version', ?)", (version,)
+    )
+    bump_cards_version(cursor)
+
+
+def _backfill_saved_search_index(cursor):
+    """錨點規則改變 (saved_search_index_version 不同) 時重建 saved_search_terms"""
+    version = saved_search_index_version()
+    row = cursor.execute("SELECT value FROM app_meta WHERE key = 'saved_search_index_version'").fetchone()
+    if row and row[0] == version:
+        return
+    cursor.execute("DELETE FROM saved_search_terms")
+    for search in cursor.execute("SELECT id, query, bank, category FROM saved_searches").fetchall():
+        index_saved_search(cursor, search["id"], search["query"], search["bank"], search["category"])
+    cursor.execute(
+        "INSERT OR REPLACE INTO app_meta (key, value) VALUES ('saved_search_index_version', ?)", (version,)
+    )
+
+
+def _refresh_category_facets(cursor):
+    """重建 category_facets (與 API 相同，略過空白或過短的標題)"""
+    cursor.execute("DELETE FROM category_facets")
+    cursor.execute("""
+        INSERT INTO category_facets (canonical_category, bank, count)
+        SELECT canonical_category, bank, COUNT(*) FROM offers
+        WHERE canonical_category IS NOT NULL AND LENGTH(title) > 2
+        GROUP BY canonical_category, bank
+    """)
+
+
+def _log_offer_change(cursor, op: str, offer_id: int, bank: str, category, title, url, image, now: str):
+    """寫入一筆變更紀錄 (與 upsert 在同一個 transaction 內)"""
+    cursor.execute("""
+        INSERT INTO offer_changes (offer_id, op, bank, category, title, url, image, changed_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    """, (offer_id, op, bank, category, title, url, image, now))
+
+
+def _delete_offers(cursor, rows, now: str) -> List[int]:
+    """
+    刪除優惠列 (需含 id, bank, category, title, url, image)，
+    並在同一個 transaction 內寫入變更紀錄、結束歷史區間。
+    """
+    delete_ids = [row["id"] for row in rows]
+    if not delete_ids:
+        return delete_ids
+    for row in rows:
+        _log_offer_change(cursor, "delete", row["id"], row["bank"], row["category"], row["title"], row["url"], row["image"], now)
+        _close_offer_interval_by_key(cursor, row["bank"], row["title"], row["url"], now)
+    placeholders = ",".join("?" for _ in delete_ids)
+    cursor.execute(f"""
+        DELETE FROM offers 
+        WHERE id IN ({placeholders})
+    """, tuple(delete_ids))
+    cursor.execute(f"DELETE FROM merchant_offers WHERE offer_id IN ({placeholders})", tuple(delete_ids))
+    cursor.execute(f"DELETE FROM card_offers WHERE offer_id IN ({placeholders})", tuple(delete_ids))
+    return delete_ids
+
+
+def upsert_bank_offers(bank: str, offers: List[Dict]) -> Optional[Dict]:
     """
     增量更新特定銀行的優惠。
+    offers 為爬蟲驗證過的 models.Offer (dict 也可，視為該銀行的優惠)。
     如果 offers 為 None，代表爬取失敗，不對資料庫做任何該銀行的變更以防止誤刪。
+    新增、內容變更與刪除都會在同一個 transaction 內寫入 offer_changes 變更紀錄。
+    
+    新增的優惠會比對儲存的搜尋 (saved_searches.py)，符合的在同一個 transaction 內寫入 notification_outbox。
+    
+    Returns:
+        {"inserted_ids": [...], "updated": int, "changed_ids": [...], "deleted_ids": [...], "notifications": int}
     """
     if offers is None:
         print(f"\n[{bank}] 傳入之優惠資料為 None (可能爬取失敗)，跳過資料庫更新以防止誤刪。")
-        return
+        return None
         
     conn = get_connection()
     cursor = conn.cursor()
-    now = datetime.now().isoformat()
-    
     try:
-        # 1. 取得資料庫中該銀行現有的所有優惠
-        cursor.execute("SELECT id, title, url FROM offers WHERE bank = ?", (bank,))
-        db_rows = cursor.fetchall()
-        
-        # 建立 (title, url) -> id 的對照表
-        db_offers = {}
-        for row in db_rows:
-            db_offers[(row["title"], row["url"])] = row["id"]
-            
-        keep_ids = set()
-        
-        # 2. 遍歷本次爬到的優惠進行新增或更新
-        insert_count = 0
-        update_count = 0
+        result = _upsert_offers(cursor, bank, offers, datetime.now().isoformat())
+        conn.commit()
+        print(f"[{bank}] 增量更新完成。新增 {len(result['inserted_ids'])} 筆，更新 {result['updated']} 筆。")
+        return result
+    except Exception as e:
+        conn.rollback()
+        print(f"[{bank}] 增量更新失敗: {e}")
+        raise e
+    finally:
+        conn.close()
+
+
+def _upsert_offers(cursor, bank: str, offers: Iterable, now: str) -> Dict:
+    """upsert_bank_offers 的本體：offers 可為任意可迭代物件 (逐筆處理，不需整批載入)，不 commit"""
+    # 1. 取得資料庫中該銀行現有的所有優惠
+    cursor.execute("SELECT id, bank, category, title, url, image FROM offers WHERE bank = ?", (bank,))
+    db_rows = cursor.fetchall()
+    
+    # 建立 (title, url) -> row 的對照表
+    db_offers = {}
+    for row in db_rows:
+        db_offers[(row["title"], row["url"])] = row
         
-        for o in offers:
-            title = o.get("title")
-            url = o.get("url")
-            category = o.get("category")
-            image = o.get("image")
-            
-            key = (title, url)
-            if key in db_offers:
-                db_id = db_offers[key]
-                cursor.execute("""
-                    UPDATE offers 
-                    SET category = ?, image = ?, scraped_at = ?
-                    WHERE id = ?
-                """, (category, image, now, db_id))
-                keep_ids.add(db_id)
-                update_count += 1
-            else:
-                cursor.execute("""
-                    INSERT INTO offers (bank, category, title, url, image, scraped_at, created_at)
-                    VALUES (?, ?, ?, ?, ?, ?, ?)
-                """, (bank, category, title, url, image, now, now))
-                insert_count += 1
-                
-        # 3. 刪除該銀行在資料庫中已失效（即本次沒爬到）的舊優惠
-        all_db_ids = set(db_offers.values())
-        delete_ids = all_db_ids - keep_ids
+    keep_ids = set()
+    
+    # 2. 遍歷本次爬到的優惠進行新增或更新
+    inserted_ids = []
+    inserted_offers = []
+    changed_ids = []
+    update_count = 0
+    
+    for o in offers:
+        if not isinstance(o, Offer):
+            o = Offer.from_dict({"bank": bank, **o})
+        title, url, category, image = o.title, o.url, o.category, o.image
         
-        if delete_ids:
-            placeholders = ",".join("?" for _ in delete_ids)
-            cursor.execute(f"""
-                DELETE FROM offers 
-                WHERE id IN ({placeholders})
-            """, tuple(delete_ids))
-            print(f"[{bank}] 已從資料庫刪除 {len(delete_ids)} 筆失效優惠")
+        key = (title, url)
+        if key in db_offers:
+            row = db_offers[key]
+            db_id = row["id"]
+            if db_id in keep_ids:
+                continue
+            cursor.execute("""
+                UPDATE offers 
+                SET category = ?, image = ?, scraped_at = ?
+                WHERE id = ?
+            """, (category, image, now, db_id))
+            keep_ids.add(db_id)
+            update_count += 1
+            # 來源分類改變時重新套用規則；未改變則保留 (可能由分類器補判的) 標準分類
+            if row["category"] != category:
+                cursor.execute("UPDATE offers SET canonical_category = ? WHERE id = ?",
+                               (classify_offer(category, title), db_id))
+            # 圖片換了就沿用新網址已知的檢查結果 (未檢查過為 NULL，等待 image_checks.py 檢查)
+            if row["image"] != image:
+                cursor.execute("UPDATE offers SET image_ok = (SELECT ok FROM image_checks WHERE url = ?) WHERE id = ?",
+                               (image, db_id))
+            # 只有內容真的改變才記錄，避免每日更新 scraped_at 灌爆變更紀錄
+            if row["category"] != category or row["image"] != image:
+                _log_offer_change(cursor, "update", db_id, bank, category, title, url, image, now)
+                _open_offer_interval(cursor, bank, title, url, category, image, now)
+                changed_ids.append(db_id)
+        else:
+            canonical_category = classify_offer(category, title)
+            cursor.execute("""
+                INSERT INTO offers (bank, category, title, url, image, scraped_at, created_at, canonical_category, image_ok)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, (SELECT ok FROM image_checks WHERE url = ?))
+            """, (bank, category, title, url, image, now, now, canonical_category, image))
+            db_id = cursor.lastrowid
+            # 標題不會變 (title 是比對鍵的一部分)，特店只需在新增時擷取
+            index_offer_merchants(cursor, db_id, title)
+            index_offer_cards(cursor, db_id, bank, title)
+            _log_offer_change(cursor, "insert", db_id, bank, category, title, url, image, now)
+            _open_offer_interval(cursor, bank, title, url, category, image, now)
+            db_offers[key] = {"id": db_id, "category": category, "image": image}
+            keep_ids.add(db_id)
+            inserted_ids.append(db_id)
+            inserted_offers.append({"id": db_id, "bank": bank, "category": category,
+                                    "canonical_category": canonical_category, "title": title, "url": url})
             
+    # 只拿這批新增的優惠比對錨點相符的候選搜尋
+    notification_count = percolate_offers(cursor, inserted_offers, now)
+    
+    # 3. 刪除該銀行在資料庫中已失效（即本次沒爬到）的舊優惠
+    delete_ids = _delete_offers(cursor, [row for row in db_rows if row["id"] not in keep_ids], now)
+    if delete_ids:
+        print(f"[{bank}] 已從資料庫刪除 {len(delete_ids)} 筆失效優惠")
+    _refresh_category_facets(cursor)
+    
+    # 4. 本次仍在架上的優惠只延長 last_seen，不新增歷史列
+    cursor.execute("""
+        UPDATE offer_history SET last_seen = ?
+        WHERE valid_to IS NULL
+          AND identity_id IN (SELECT id FROM offer_identities WHERE bank = ?)
+    """, (now, bank))
+    cursor.execute("""
+        UPDATE offer_identities SET last_seen = ?
+        WHERE bank = ?
+          AND id IN (SELECT identity_id FROM offer_history WHERE valid_to IS NULL)
+    """, (now, bank))
+    return {
+        "inserted_ids": inserted_ids,
+        "updated": update_count,
+        "changed_ids": changed_ids,
+        "deleted_ids": delete_ids,
+        "notifications": notification_count,
+    }
+
+
+def stage_offers(bank: str, category_order: int, offers: List[Offer]) -> int:
+    """
+    暫存一個分頁爬到的優惠 (每批各自 commit)，回傳新增筆數。
+    同一分類內相同標題只保留第一筆 (分類重試或續爬時重複放入的分頁不會重複暫存)。
+    """
+    conn = get_connection()
+    try:
+        cursor = conn.executemany("""
+            INSERT OR IGNORE INTO offer_staging (bank, category_order, category, title, url, image)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, [(bank, category_order, o.category, o.title, o.url, o.image) for o in offers])
         conn.commit()
-        print(f"[{bank}] 增量更新完成。新增 {insert_count} 筆，更新 {update_count} 筆。")
+        return cursor.rowcount
+    finally:
+        conn.close()
+
+
+def discard_staged_offers(bank: str) -> int:
+    """丟棄銀行的暫存優惠 (爬取失敗，或開始新的一次爬取前清除上次中斷留下的資料)"""
+    conn = get_connection()
+    try:
+        cursor = conn.execute("DELETE FROM offer_staging WHERE bank = ?", (bank,))
+        conn.commit()
+        return cursor.rowcount
+    finally:
+        conn.close()
+
+
+def commit_staged_offers(bank: str, exclude_urls=()) -> Dict:
+    """
+    銀行爬取完成：把暫存的優惠合併到 offers (新增、更新、刪除這次沒爬到的優惠) 並清除暫存，
+    全部在同一個 transaction 內完成；失敗時 rollback，offers 與暫存都維持原狀。
+    暫存依分類順序逐列讀取，同一銀行內相同標題以先出現的分類為準；exclude_urls 中的網址不寫入。
+    
+    Returns:
+        與 upsert_bank_offers 相同，另含 "offers" (合併的筆數)
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        staged = conn.execute("""
+            SELECT category, title, url, image FROM offer_staging s
+            WHERE bank = ? AND category_order = (
+                SELECT MIN(category_order) FROM offer_staging WHERE bank = s.bank AND title = s.title
+            )
+            ORDER BY category_order, rowid
+        """, (bank,))
+        counter = {"offers": 0}
+
+        def staged_offers():
+            for row in staged:
+                if row["url"] in exclude_urls:
+                    continue
+                counter["offers"] += 1
+                yield Offer(bank, row["title"], row["category"], row["url"], row["image"])
+
+        result = _upsert_offers(cursor, bank, staged_offers(), datetime.now().isoformat())
+        cursor.execute("DELETE FROM offer_staging WHERE bank = ?", (bank,))
+        conn.commit()
+        print(f"[{bank}] 增量更新完成。新增 {len(result['inserted_ids'])} 筆，更新 {result['updated']} 筆。")
+        return {**result, "offers": counter["offers"]}
     except Exception as e:
         conn.rollback()
         print(f"[{bank}] 增量更新失敗: {e}")
-        raise e
+        raise
+    finally:
+        conn.close()
+
+
+# 變更紀錄保留天數，超過的部分由 compact_offer_changes 清除
+OFFER_CHANGES_RETENTION_DAYS = 30
+
+
+def compact_offer_changes(retention_days: int = OFFER_CHANGES_RETENTION_DAYS) -> int:
+    """
+    清除過舊的變更紀錄，並記下已清除到的最大序號。
+    since 小於此序號的用戶端必須重新下載完整資料 (reset required)。
+    """
+    cutoff = (datetime.now() - timedelta(days=retention_days)).isoformat()
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT MAX(seq) FROM offer_changes WHERE changed_at < ?", (cutoff,))
+        compacted_seq = cursor.fetchone()[0]
+        if compacted_seq is None:
+            return 0
+        cursor.execute("DELETE FROM offer_changes WHERE seq <= ?", (compacted_seq,))
+        removed = cursor.rowcount
+        cursor.execute("""
+            INSERT INTO app_meta (key, value) VALUES ('offer_changes_compacted_seq', ?)
+            ON CONFLICT(key) DO UPDATE SET value = excluded.value
+        """, (str(compacted_seq),))
+        conn.commit()
+        print(f"已清除 {removed} 筆過舊的優惠變更紀錄 (序號 <= {compacted_seq})")
+        return removed
+    finally:
+        conn.close()
+
+
+# ============================================================
+# 活動頁面補充資訊
+# ============================================================
+
+def get_offers_to_enrich(limit: Optional[int] = None) -> List[Dict]:
+    """尚未解析活動頁面的優惠 (新加入的優惠 enriched_at 為 NULL)"""
+    conn = get_connection()
+    query = "SELECT id, bank, url FROM offers WHERE enriched_at IS NULL AND url IS NOT NULL AND url != '' ORDER BY id"
+    if limit:
+        query += f" LIMIT {int(limit)}"
+    rows = [dict(row) for row in conn.execute(query).fetchall()]
+    conn.close()
+    return rows
+
+
+def get_http_cache(urls: List[str]) -> Dict[str, Dict]:
+    """url -> 快取列"""
+    conn = get_connection()
+    cache = {}
+    for i in range(0, len(urls), 500):
+        batch = urls[i:i + 500]
+        placeholders = ",".join("?" for _ in batch)
+        for row in conn.execute(f"SELECT * FROM http_cache WHERE url IN ({placeholders})", batch):
+            cache[row["url"]] = dict(row)
+    conn.close()
+    return cache
+
+
+def save_enrichment(results: List[Dict]):
+    """
+    寫入解析結果並更新 HTTP 快取。
+    results 每筆: {"offer_ids": [...], "url", "etag", "last_modified", "status",
+                   "start_date", "end_date", "terms": [...], "fetched_at"}
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    now = datetime.now().isoformat()
+    try:
+        for r in results:
+            terms = json.dumps(r.get("terms") or [], ensure_ascii=False)
+            cursor.execute("""
+                INSERT INTO http_cache (url, etag, last_modified, status, start_date, end_date, terms, fetched_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(url) DO UPDATE SET
+                    etag = excluded.etag, last_modified = excluded.last_modified, status = excluded.status,
+                    start_date = excluded.start_date, end_date = excluded.end_date,
+                    terms = excluded.terms, fetched_at = excluded.fetched_at
+            """, (r["url"], r.get("etag"), r.get("last_modified"), r.get("status"),
+                  r.get("start_date"), r.get("end_date"), terms, r.get("fetched_at") or now))
+            cursor.executemany("""
+                UPDATE offers SET start_date = ?, end_date = ?, terms = ?, enriched_at = ?
+                WHERE id = ?
+            """, [(r.get("start_date"), r.get("end_date"), terms, now, offer_id) for offer_id in r["offer_ids"]])
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+def get_expired_urls(today: str, fetched_after: str) -> set:
+    """
+    快取中在 fetched_after 之後確認已過期的活動網址。
+    爬蟲可據此略過仍掛在列表上、但活動已結束的優惠，避免每天新增又刪除。
+    """
+    conn = get_connection()
+    try:
+        rows = conn.execute(
+            "SELECT url FROM http_cache WHERE end_date IS NOT NULL AND end_date < ? AND fetched_at >= ?",
+            (today, fetched_after),
+        ).fetchall()
+    except sqlite3.OperationalError:
+        rows = []
+    conn.close()
+    return {row[0] for row in rows}
+
+
+def prune_expired_offers(today: Optional[str] = None) -> List[int]:
+    """刪除活動結束日已過的優惠 (與 upsert 共用刪除流程，會寫入變更紀錄與歷史區間)"""
+    today = today or datetime.now().strftime("%Y-%m-%d")
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        rows = cursor.execute(
+            "SELECT id, bank, category, title, url, image FROM offers WHERE end_date IS NOT NULL AND end_date < ?",
+            (today,),
+        ).fetchall()
+        delete_ids = _delete_offers(cursor, rows, datetime.now().isoformat())
+        if delete_ids:
+            _refresh_category_facets(cursor)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    if delete_ids:
+        print(f"已刪除 {len(delete_ids)} 筆活動已結束的優惠")
+    return delete_ids
+
+
+# ============================================================
+# 圖片檢查
+# ============================================================
+
+def get_images_to_check(checked_before: str, limit: Optional[int] = None) -> List[str]:
+    """尚未檢查 (image_ok 為 NULL) 或上次檢查早於 checked_before 的圖片網址"""
+    conn = get_connection()
+    query = """
+        SELECT DISTINCT image FROM offers
+        WHERE image IS NOT NULL AND image != ''
+          AND (image_ok IS NULL OR image IN (SELECT url FROM image_checks WHERE checked_at < ?))
+        ORDER BY image
+    """
+    if limit:
+        query += f" LIMIT {int(limit)}"
+    urls = [row[0] for row in conn.execute(query, (checked_before,)).fetchall()]
+    conn.close()
+    return urls
+
+
+def save_image_checks(results: List[Dict]) -> int:
+    """
+    寫入圖片檢查結果並更新使用這些圖片的優惠的 image_ok。
+    可用與否改變的優惠會寫入變更紀錄 (前端增量同步時才會拿掉 / 補上圖片)，回傳改變的優惠筆數。
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    now = datetime.now().isoformat()
+    changed = 0
+    try:
+        for r in results:
+            ok = 1 if r["ok"] else 0
+            cursor.execute("""
+                INSERT INTO image_checks (url, status, content_type, bytes, width, height, ok, reason, checked_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(url) DO UPDATE SET
+                    status = excluded.status, content_type = excluded.content_type, bytes = excluded.bytes,
+                    width = excluded.width, height = excluded.height, ok = excluded.ok,
+                    reason = excluded.reason, checked_at = excluded.checked_at
+            """, (r["url"], r.get("status"), r.get("content_type"), r.get("bytes"), r.get("width"),
+                  r.get("height"), ok, r.get("reason"), r.get("checked_at") or now))
+            rows = cursor.execute(
+                "SELECT id, bank, category, title, url, image, image_ok FROM offers WHERE image = ?", (r["url"],)
+            ).fetchall()
+            for row in rows:
+                if row["image_ok"] == ok:
+                    continue
+                cursor.execute("UPDATE offers SET image_ok = ? WHERE id = ?", (ok, row["id"]))
+                # 尚未檢查的圖片本來就不會回傳，NULL -> 0 不影響用戶端
+                if ok or row["image_ok"] is not None:
+                    _log_offer_change(cursor, "update", row["id"], row["bank"], row["category"], row["title"],
+                                      row["url"], row["image"], now)
+                changed += 1
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    return changed
+
+
+# ============================================================
+# 特店座標
+# ============================================================
+
+def get_merchants_to_geocode(retry_before: str, limit: Optional[int] = None) -> List[Dict]:
+    """尚未查詢過座標，或查詢失敗且早於 retry_before 的特店 (優惠多的特店優先)"""
+    conn = get_connection()
+    query = """
+        SELECT m.key, m.name, COUNT(mo.offer_id) AS offers FROM merchants m
+        JOIN merchant_offers mo ON mo.merchant_id = m.id
+        LEFT JOIN merchant_locations ml ON ml.key = m.key
+        WHERE ml.id IS NULL OR (ml.ok = 0 AND ml.geocoded_at < ?)
+        GROUP BY m.id
+        ORDER BY offers DESC, m.key
+    """
+    if limit:
+        query += f" LIMIT {int(limit)}"
+    merchants = [dict(row) for row in conn.execute(query, (retry_before,)).fetchall()]
+    conn.close()
+    return merchants
+
+
+def save_geocodes(results: List[Dict]) -> int:
+    """寫入特店座標查詢結果並同步 R*Tree，回傳有座標的特店數"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    now = datetime.now().isoformat()
+    located = 0
+    try:
+        for r in results:
+            ok = 1 if r["ok"] else 0
+            cursor.execute("""
+                INSERT INTO merchant_locations (key, query, lat, lon, ok, reason, geocoded_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(key) DO UPDATE SET
+                    query = excluded.query, lat = excluded.lat, lon = excluded.lon,
+                    ok = excluded.ok, reason = excluded.reason, geocoded_at = excluded.geocoded_at
+            """, (r["key"], r.get("query"), r.get("lat"), r.get("lon"), ok, r.get("reason"),
+                  r.get("geocoded_at") or now))
+            location_id = cursor.execute("SELECT id FROM merchant_locations WHERE key = ?", (r["key"],)).fetchone()[0]
+            cursor.execute("DELETE FROM merchant_geo WHERE id = ?", (location_id,))
+            if ok:
+                cursor.execute(
+                    "INSERT INTO merchant_geo (id, min_lat, max_lat, min_lon, max_lon) VALUES (?, ?, ?, ?, ?)",
+                    (location_id, r["lat"], r["lat"], r["lon"], r["lon"]),
+                )
+                located += 1
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
     finally:
         conn.close()
+    return located
+
+
+# ============================================================
+# 儲存的搜尋與通知
+# ============================================================
+
+def add_saved_search(query: str, name: str = None, bank: str = None, category: str = None,
+                     webhook_url: str = None) -> int:
+    """儲存搜尋 (詞以空白或 + 分隔，彼此為 AND)；之後新增的優惠符合時寫入通知"""
+    query = (query or "").strip()
+    if not parse_query(query) and not bank and not category:
+        raise ValueError("搜尋至少需要一個詞、銀行或分類")
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute("""
+        INSERT INTO saved_searches (name, query, bank, category, webhook_url, created_at)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, (name or query, query, bank or None, category or None, webhook_url or None, datetime.now().isoformat()))
+    search_id = cursor.lastrowid
+    index_saved_search(cursor, search_id, query, bank, category)
+    conn.commit()
+    conn.close()
+    return search_id
+
+
+def get_saved_searches() -> List[Dict]:
+    """取得所有儲存的搜尋 (含尚未送出的通知數)"""
+    conn = get_connection()
+    try:
+        rows = conn.execute("""
+            SELECT s.*, (
+                SELECT COUNT(*) FROM notification_outbox n WHERE n.search_id = s.id AND n.delivered_at IS NULL
+            ) AS pending_notifications
+            FROM saved_searches s ORDER BY s.id
+        """).fetchall()
+    except sqlite3.OperationalError:
+        # 尚未執行過 init_db 的舊資料庫
+        rows = []
+    conn.close()
+    return [dict(row) for row in rows]
+
+
+def delete_saved_search(search_id: int) -> bool:
+    """刪除儲存的搜尋、其錨點與尚未送出的通知"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM saved_searches WHERE id = ?", (search_id,))
+    deleted = cursor.rowcount > 0
+    cursor.execute("DELETE FROM saved_search_terms WHERE search_id = ?", (search_id,))
+    cursor.execute("DELETE FROM notification_outbox WHERE search_id = ? AND delivered_at IS NULL", (search_id,))
+    conn.commit()
+    conn.close()
+    return deleted
+
+
+def get_pending_notifications(max_attempts: int, limit: Optional[int] = None) -> List[Dict]:
+    """尚未送出且重試次數未達上限的通知 (依建立順序)"""
+    conn = get_connection()
+    query = """
+        SELECT n.id, n.search_id, n.offer_id, n.payload, n.attempts, s.webhook_url
+        FROM notification_outbox n JOIN saved_searches s ON s.id = n.search_id
+        WHERE n.delivered_at IS NULL AND n.attempts < ?
+        ORDER BY n.id
+    """
+    if limit:
+        query += f" LIMIT {int(limit)}"
+    rows = conn.execute(query, (max_attempts,)).fetchall()
+    conn.close()
+    return [{**dict(row), "payload": json.loads(row["payload"])} for row in rows]
+
+
+def mark_notifications(results: List[Dict], now: str):
+    """記錄傳送結果：成功的標記 delivered_at，失敗的累加 attempts 並記錄錯誤"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    for r in results:
+        if r.get("error") is None:
+            cursor.execute("UPDATE notification_outbox SET delivered_at = ?, attempts = attempts + 1 WHERE id = ?",
+                           (now, r["id"]))
+        else:
+            cursor.execute("UPDATE notification_outbox SET last_error = ?, attempts = attempts + 1 WHERE id = ?",
+                           (r["error"], r["id"]))
+    conn.commit()
+    conn.close()
 
 
 def get_offers(search: str = "", bank: str = "", category: str = "") -> List[Dict]:
@@ -273,13 +1221,218 @@ def get_categories(bank: str = "") -> List[str]:
     return categories
 
 
+# ============================================================
+# 爬蟲檢查點與斷路器 (scrapers/resilience.py 的 DatabaseStateStore)
+# ============================================================
+
+_CATEGORY_COMPLETE = -1
+
+
+def save_scrape_checkpoint(bank: str, category: str, page: int, offers: List[Dict]):
+    """保存一頁爬取結果 (該頁新增的優惠)"""
+    conn = get_connection()
+    try:
+        conn.execute("""
+            INSERT OR REPLACE INTO scrape_checkpoints (bank, category, page, offers, updated_at)
+            VALUES (?, ?, ?, ?, ?)
+        """, (bank, category, page, json.dumps(offers, ensure_ascii=False), datetime.now().isoformat()))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def complete_scrape_checkpoint(bank: str, category: str):
+    """標記分類已完整爬取"""
+    save_scrape_checkpoint(bank, category, _CATEGORY_COMPLETE, [])
+
+
+def load_scrape_checkpoints(bank: str, updated_after: str) -> Dict[str, Dict]:
+    """
+    讀取銀行的檢查點: {分類: {"pages": {頁碼: [優惠]}, "complete": bool}}。
+    早於 updated_after 的檢查點已過期，會被清除而不沿用。
+    """
+    conn = get_connection()
+    try:
+        conn.execute("DELETE FROM scrape_checkpoints WHERE bank = ? AND updated_at < ?", (bank, updated_after))
+        conn.commit()
+        rows = conn.execute(
+            "SELECT category, page, offers FROM scrape_checkpoints WHERE bank = ?", (bank,)
+        ).fetchall()
+    finally:
+        conn.close()
+    checkpoints: Dict[str, Dict] = {}
+    for row in rows:
+        state = checkpoints.setdefault(row["category"], {"pages": {}, "complete": False})
+        if row["page"] == _CATEGORY_COMPLETE:
+            state["complete"] = True
+        else:
+            state["pages"][row["page"]] = json.loads(row["offers"]) if row["offers"] else []
+    return checkpoints
+
+
+def clear_scrape_checkpoints(bank: str):
+    """銀行資料已寫入資料庫後清除檢查點，下一次執行從頭爬取"""
+    conn = get_connection()
+    try:
+        conn.execute("DELETE FROM scrape_checkpoints WHERE bank = ?", (bank,))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def get_circuit_breaker(bank: str) -> Dict:
+    conn = get_connection()
+    try:
+        row = conn.execute(
+            "SELECT failures, trips, opened_until, last_error FROM circuit_breakers WHERE bank = ?", (bank,)
+        ).fetchone()
+    finally:
+        conn.close()
+    return dict(row) if row else {}
+
+
+def save_circuit_breaker(bank: str, state: Dict):
+    conn = get_connection()
+    try:
+        conn.execute("""
+            INSERT OR REPLACE INTO circuit_breakers (bank, failures, trips, opened_until, last_error, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, (bank, state.get("failures", 0), state.get("trips", 0), state.get("opened_until"),
+              state.get("last_error"), datetime.now().isoformat()))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+# ============================================================
+# 爬蟲執行紀錄
+# ============================================================
+
+def save_scrape_run(summary: Dict):
+    """寫入一次爬蟲執行的摘要"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute("""
+        INSERT OR REPLACE INTO scrape_runs
+            (run_id, status, started_at, finished_at, duration_seconds, total_offers, retries, bytes, summary)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, (
+        summary["run_id"], summary.get("status"), summary.get("started_at"), summary.get("finished_at"),
+        summary.get("duration_seconds"), summary.get("total_offers"), summary.get("retries"),
+        summary.get("bytes"), json.dumps(summary, ensure_ascii=False),
+    ))
+    conn.commit()
+    conn.close()
+
+
+# 變更率與爬取耗時的指數移動平均權重 (越大越重視最近一次)
+CRAWL_STATS_ALPHA = 0.3
+
+
+def record_bank_crawl(bank: str, changes: int, offers: int, duration_seconds: Optional[float],
+                      now: Optional[str] = None) -> Dict:
+    """
+    記錄一次成功的銀行爬取。
+    change_rate 為每小時變更筆數 (新增 + 內容變更 + 刪除 ÷ 距上次爬取的時數) 的移動平均；
+    第一次爬取無法得知經過時間，變更率維持未知。duration_seconds 為爬取所花的瀏覽器時間。
+    """
+    now = now or datetime.now().isoformat()
+    conn = get_connection()
+    try:
+        row = conn.execute("SELECT * FROM bank_crawl_stats WHERE bank = ?", (bank,)).fetchone()
+        stats = dict(row) if row else {"crawls": 0, "last_crawled_at": None, "change_rate": None,
+                                       "duration_seconds": None}
+        change_rate = stats["change_rate"]
+        if stats["last_crawled_at"]:
+            hours = (datetime.fromisoformat(now) - datetime.fromisoformat(stats["last_crawled_at"])).total_seconds() / 3600
+            observed = changes / max(hours, 1 / 60)
+            change_rate = observed if change_rate is None else \
+                CRAWL_STATS_ALPHA * observed + (1 - CRAWL_STATS_ALPHA) * change_rate
+        duration = stats["duration_seconds"]
+        if duration_seconds is not None:
+            duration = duration_seconds if duration is None else \
+                CRAWL_STATS_ALPHA * duration_seconds + (1 - CRAWL_STATS_ALPHA) * duration
+        stats = {"bank": bank, "crawls": stats["crawls"] + 1, "last_crawled_at": now, "last_changes": changes,
+                 "offers": offers, "change_rate": change_rate, "duration_seconds": duration}
+        conn.execute("""
+            INSERT OR REPLACE INTO bank_crawl_stats
+                (bank, crawls, last_crawled_at, last_changes, offers, change_rate, duration_seconds)
+            VALUES (:bank, :crawls, :last_crawled_at, :last_changes, :offers, :change_rate, :duration_seconds)
+        """, stats)
+        conn.commit()
+        return stats
+    finally:
+        conn.close()
+
+
+def get_bank_crawl_stats() -> Dict[str, Dict]:
+    """銀行名稱 -> 變更率與爬取成本"""
+    conn = get_connection()
+    try:
+        return {row["bank"]: dict(row) for row in conn.execute("SELECT * FROM bank_crawl_stats")}
+    finally:
+        conn.close()
+
+
+# 寫入進度表的事件類型 (wait / extract 等細部事件只寫入 JSON Lines)
+PROGRESS_EVENTS = {"run_start", "run_end", "bank_start", "bank", "category_start", "category", "page", "upsert"}
+# 進度表保留最近幾次執行的事件
+PROGRESS_KEEP_RUNS = 5
+
+
+def add_progress_event(record: Dict):
+    """將遙測事件寫入 scrape_progress，供後端即時推播"""
+    event = record.get("event")
+    if event not in PROGRESS_EVENTS:
+        return
+    conn = get_connection()
+    cursor = conn.cursor()
+    if event == "run_end" and not record.get("run_id"):
+        # 由外部 (例如後端工作管理) 補寫的結束事件，歸屬到最近一次執行
+        cursor.execute("SELECT run_id FROM scrape_progress WHERE event = 'run_start' ORDER BY id DESC LIMIT 1")
+        row = cursor.fetchone()
+        record = dict(record, run_id=row["run_id"] if row else None)
+    if event == "run_start":
+        # 新的一次執行開始時，清除過舊的進度事件
+        cursor.execute("""
+            DELETE FROM scrape_progress WHERE id < (
+                SELECT COALESCE(MIN(id), 0) FROM (
+                    SELECT id FROM scrape_progress WHERE event = 'run_start' ORDER BY id DESC LIMIT ?
+                )
+            )
+        """, (PROGRESS_KEEP_RUNS - 1,))
+    cursor.execute("""
+        INSERT INTO scrape_progress (run_id, event, bank, payload, created_at)
+        VALUES (?, ?, ?, ?, ?)
+    """, (record.get("run_id"), event, record.get("bank"),
+          json.dumps(record, ensure_ascii=False), datetime.now().isoformat()))
+    conn.commit()
+    conn.close()
+
+
+def get_scrape_runs(limit: int = 30) -> List[Dict]:
+    """查詢最近的爬蟲執行摘要 (新到舊)"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT * FROM scrape_runs ORDER BY id DESC LIMIT ?", (limit,))
+    rows = cursor.fetchall()
+    conn.close()
+    runs = []
+    for row in rows:
+        run = dict(row)
+        run["summary"] = json.loads(run["summary"]) if run["summary"] else {}
+        runs.append(run)
+    return runs
+
+
 # ============================================================
 # 信用卡 CRUD
 # ============================================================
 
 def add_card(bank: str, card_name: str, card_type: str = "", annual_fee: str = "", 
              billing_day: int = None, payment_day: int = None, notes: str = "") -> int:
-    """新增信用卡"""
+    """新增信用卡 (資料不完整時拋出 models.InvalidCard)"""
+    card = Card.create(bank, card_name, card_type, annual_fee, billing_day, payment_day, notes)
     conn = get_connection()
     cursor = conn.cursor()
     now = datetime.now().isoformat()
@@ -287,9 +1440,13 @@ def add_card(bank: str, card_name: str, card_type: str = "", annual_fee: str = "
     cursor.execute("""
         INSERT INTO cards (bank, card_name, card_type, annual_fee, billing_day, payment_day, notes, created_at, updated_at)
         VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-    """, (bank, card_name, card_type, annual_fee, billing_day, payment_day, notes, now, now))
+    """, (card.bank, card.card_name, card.card_type, card.annual_fee, card.billing_day, card.payment_day,
+          card.notes, now, now))
     
     card_id = cursor.lastrowid
+    # 預先計算這張卡適用的優惠 (推薦引擎使用)
+    index_card_offers(cursor, card_id)
+    bump_cards_version(cursor)
     conn.commit()
     conn.close()
     return card_id
@@ -298,7 +1455,7 @@ def add_card(bank: str, card_name: str, card_type: str = "", annual_fee: str = "
 def update_card(card_id: int, bank: str = None, card_name: str = None, 
                 card_type: str = None, annual_fee: str = None, 
                 billing_day: int = None, payment_day: int = None, notes: str = None):
-    """更新信用卡"""
+    """更新信用卡 (更新後的資料不完整時拋出 models.InvalidCard)"""
     conn = get_connection()
     cursor = conn.cursor()
     
@@ -318,12 +1475,23 @@ def update_card(card_id: int, bank: str = None, card_name: str = None,
     new_payment_day = payment_day if payment_day is not None else row["payment_day"]
     new_notes = notes if notes is not None else row["notes"]
     now = datetime.now().isoformat()
+    try:
+        card = Card.create(new_bank, new_card_name, new_card_type, new_annual_fee, new_billing_day, new_payment_day,
+                           new_notes)
+    except ValueError:
+        conn.close()
+        raise
+    new_bank, new_card_name = card.bank, card.card_name
     
     cursor.execute("""
         UPDATE cards 
         SET bank = ?, card_name = ?, card_type = ?, annual_fee = ?, billing_day = ?, payment_day = ?, notes = ?, updated_at = ?
         WHERE id = ?
     """, (new_bank, new_card_name, new_card_type, new_annual_fee, new_billing_day, new_payment_day, new_notes, now, card_id))
+    # 銀行、卡名或卡種改變時適用的優惠可能不同
+    if (new_bank, new_card_name, new_card_type) != (row["bank"], row["card_name"], row["card_type"]):
+        index_card_offers(cursor, card_id)
+        bump_cards_version(cursor)
     
     conn.commit()
     conn.close()
@@ -336,34 +1504,39 @@ def delete_card(card_id: int) -> bool:
     cursor = conn.cursor()
     cursor.execute("DELETE FROM cards WHERE id = ?", (card_id,))
     affected = cursor.rowcount
+    if affected:
+        cursor.execute("DELETE FROM card_offers WHERE card_id = ?", (card_id,))
+        bump_cards_version(cursor)
     conn.commit()
     conn.close()
     return affected > 0
 
 
-def get_cards(bank: str = "") -> List[Dict]:
+def get_cards(bank: str = "") -> List[Card]:
     """查詢信用卡"""
     conn = get_connection()
     cursor = conn.cursor()
+    cursor.row_factory = None
     
     if bank:
         cursor.execute("SELECT * FROM cards WHERE bank = ? ORDER BY bank, card_name", (bank,))
     else:
         cursor.execute("SELECT * FROM cards ORDER BY bank, card_name")
     
-    rows = cursor.fetchall()
+    cards = fetch_models(cursor, Card)
     conn.close()
-    return [dict(row) for row in rows]
+    return cards
 
 
-def get_card(card_id: int) -> Optional[Dict]:
+def get_card(card_id: int) -> Optional[Card]:
     """取得單張信用卡"""
     conn = get_connection()
     cursor = conn.cursor()
+    cursor.row_factory = None
     cursor.execute("SELECT * FROM cards WHERE id = ?", (card_id,))
-    row = cursor.fetchone()
+    cards = fetch_models(cursor, Card)
     conn.close()
-    return dict(row) if row else None
+    return cards[0] if cards else None
 
 
 # 初始化
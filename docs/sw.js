@@ -0,0 +1,54 @@
+// 信用卡優惠戰情室 Service Worker
+// 代理圖片 (/api/image-proxy) 採 stale-while-revalidate：先回傳快取，同時在背景更新，
+// 讓重複造訪時卡片圖片不必等待 Render 後端冷啟動。
+// 只快取 CORS 請求取得的成功回應：opaque 回應無法判斷成功與否 (失效圖片也會被留下)，
+// 且瀏覽器以數 MB 的填充大小計算其配額，400 張就可能占用上 GB。
+
+const IMAGE_CACHE = 'offer-images-v2';
+const IMAGE_CACHE_LIMIT = 400;
+
+self.addEventListener('install', () => self.skipWaiting());
+
+self.addEventListener('activate', event => {
+    event.waitUntil((async () => {
+        // 清掉舊版本的圖片快取
+        const keys = await caches.keys();
+        await Promise.all(keys.filter(k => k.startsWith('offer-images-') && k !== IMAGE_CACHE).map(k => caches.delete(k)));
+        await self.clients.claim();
+    })());
+});
+
+self.addEventListener('fetch', event => {
+    const request = event.request;
+    if (request.method !== 'GET') return;
+    if (!new URL(request.url).pathname.endsWith('/api/image-proxy')) return;
+    event.respondWith(staleWhileRevalidate(event));
+});
+
+async function staleWhileRevalidate(event) {
+    const cache = await caches.open(IMAGE_CACHE);
+    const cached = await cache.match(event.request);
+
+    // <img> 的跨網域請求為 no-cors，改以 CORS 向後端 (已設定 CORS) 重新請求，才能確認是成功的圖片
+    const network = fetch(new Request(event.request.url, { mode: 'cors', credentials: 'omit' })).then(async response => {
+        if (response.ok) {
+            await cache.put(event.request, response.clone());
+            await trimCache(cache);
+        }
+        return response;
+    }, () => fetch(event.request));  // 代理失敗時會轉址到銀行網站 (不允許 CORS)，以原請求載入且不快取
+
+    if (cached) {
+        event.waitUntil(network.catch(() => undefined));
+        return cached;
+    }
+    return network;
+}
+
+// 依寫入順序刪除最舊的項目，避免快取無限成長
+async function trimCache(cache) {
+    const keys = await cache.keys();
+    for (let i = 0; i < keys.length - IMAGE_CACHE_LIMIT; i++) {
+        await cache.delete(keys[i]);
+    }
+}
@@ -0,0 +1,263 @@
+# -*- coding: utf-8 -*-
+"""
+活動頁面補充資訊
+爬蟲更新資料庫後，並行抓取新優惠的活動頁面，解析活動起訖日與重點條款:
+
+- 全域並行上限 + 每個網域的並行上限與最小請求間隔，避免對銀行網站造成負擔
+- http_cache 資料表保存 ETag / Last-Modified 與解析結果；有效期限內直接沿用，
+  過期後以條件式請求 (If-None-Match / If-Modified-Since) 重新驗證，304 時沿用舊結果
+- 日期支援西元與民國年 (例如 2026/01/31、115年1月31日)
+"""
+
+import asyncio
+import html
+import json
+import os
+import re
+import time
+import urllib.error
+import urllib.request
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+
+MAX_CONCURRENCY = int(os.environ.get("ENRICH_CONCURRENCY", "8"))
+PER_HOST_CONCURRENCY = 2
+PER_HOST_INTERVAL = 0.5      # 同一網域兩次請求之間至少間隔的秒數
+REQUEST_TIMEOUT = 15
+MAX_BODY_BYTES = 2 * 1024 * 1024
+# 快取有效天數：期限內不重新請求，也用來判斷「已確認過期」的資訊是否仍可信
+CACHE_TTL_DAYS = int(os.environ.get("ENRICH_CACHE_TTL_DAYS", "7"))
+MAX_TERMS = 8
+
+# ============================================================
+# 解析
+# ============================================================
+
+_SEP = r"\s*[/\.\-年]\s*"
+_DATE_RE = re.compile(
+    rf"(?<!\d)(?P<year>20\d{{2}}|1\d{{2}}){_SEP}(?P<month>\d{{1,2}}){_SEP.replace('年', '月')}(?P<day>\d{{1,2}})\s*日?(?!\d)"
+)
+_PERIOD_KEYWORDS = re.compile(r"(活動期間|活動時間|優惠期間|活動日期|登錄期間|即日起)")
+_RANGE_RE = re.compile(r"[~～至到\-－—]")
+_TAG_RE = re.compile(r"<[^>]+>")
+_SCRIPT_RE = re.compile(r"<(script|style|noscript)[^>]*>.*?</\1>", re.S | re.I)
+
+_TERM_PATTERNS = [
+    re.compile(r"(?:最高|享)?\s*\d+(?:\.\d+)?\s*%\s*(?:回饋|現金回饋|折扣|刷卡金)?"),
+    re.compile(r"\d+\s*折"),
+    re.compile(r"滿\s*\d[\d,]*\s*元"),
+    re.compile(r"(?:回饋|贈送|折抵)?上限\s*\d[\d,]*\s*(?:元|點|次)"),
+    re.compile(r"(?:需|須|限)?(?:事先)?登錄"),
+    re.compile(r"限量\s*\d*[\d,]*\s*(?:名|份|組)?"),
+    re.compile(r"(?:限)?新戶"),
+]
+
+
+def html_to_text(body: str) -> str:
+    body = _SCRIPT_RE.sub(" ", body)
+    body = _TAG_RE.sub(" ", body)
+    return re.sub(r"\s+", " ", html.unescape(body))
+
+
+def _to_date(match) -> Optional[date]:
+    year = int(match.group("year"))
+    if year < 1000:
+        year += 1911  # 民國年
+    try:
+        return date(year, int(match.group("month")), int(match.group("day")))
+    except ValueError:
+        return None
+
+
+def extract_dates(text: str) -> Tuple[Optional[str], Optional[str]]:
+    """
+    回傳 (start_date, end_date)，格式 YYYY-MM-DD。
+    優先使用「活動期間」等關鍵字後方的日期；沒有關鍵字時取第一組「日期 ~ 日期」。
+    """
+    for keyword in _PERIOD_KEYWORDS.finditer(text):
+        window = text[keyword.end():keyword.end() + 80]
+        dates = [d for d in map(_to_date, _DATE_RE.finditer(window)) if d]
+        if not dates:
+            continue
+        if keyword.group(1) == "即日起" or len(dates) == 1:
+            return None, dates[0].isoformat()
+        return dates[0].isoformat(), dates[1].isoformat()
+
+    matches = list(_DATE_RE.finditer(text))
+    for first, second in zip(matches, matches[1:]):
+        between = text[first.end():second.start()]
+        if len(between) <= 6 and _RANGE_RE.search(between):
+            start, end = _to_date(first), _to_date(second)
+            if start and end and start <= end:
+                return start.isoformat(), end.isoformat()
+    return None, None
+
+
+def extract_terms(text: str) -> List[str]:
+    """重點條款 (回饋比例、門檻、上限、登錄、限量、新戶)，依出現順序去重"""
+    terms = []
+    for pattern in _TERM_PATTERNS:
+        for match in pattern.finditer(text):
+            term = re.sub(r"\s+", "", match.group(0))
+            if term and term not in terms:
+                terms.append(term)
+            if len(terms) >= MAX_TERMS:
+                return terms
+    return terms
+
+
+# ============================================================
+# 抓取
+# ============================================================
+
+def _fetch(url: str, cached: Optional[Dict]) -> Dict:
+    """同步的條件式 GET (於 asyncio.to_thread 中執行)"""
+    headers = {"User-Agent": USER_AGENT, "Accept-Language": "zh-TW,zh;q=0.9"}
+    if cached:
+        if cached.get("etag"):
+            headers["If-None-Match"] = cached["etag"]
+        if cached.get("last_modified"):
+            headers["If-Modified-Since"] = cached["last_modified"]
+    request = urllib.request.Request(url, headers=headers)
+    try:
+        with urllib.request.urlopen(request, timeout=REQUEST_TIMEOUT) as response:
+            raw = response.read(MAX_BODY_BYTES)
+            charset = response.headers.get_content_charset() or "utf-8"
+            return {
+                "status": response.status,
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+                "body": raw.decode(charset, errors="replace"),
+            }
+    except urllib.error.HTTPError as e:
+        return {"status": e.code}
+
+
+class HostLimiter:
+    """每個網域的並行上限與最小請求間隔"""
+
+    def __init__(self, concurrency: int = PER_HOST_CONCURRENCY, interval: float = PER_HOST_INTERVAL):
+        self.concurrency = concurrency
+        self.interval = interval
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._last_request: Dict[str, float] = {}
+
+    def semaphore(self, host: str) -> asyncio.Semaphore:
+        if host not in self._semaphores:
+            self._semaphores[host] = asyncio.Semaphore(self.concurrency)
+            self._locks[host] = asyncio.Lock()
+        return self._semaphores[host]
+
+    async def wait_turn(self, host: str):
+        async with self._locks[host]:
+            delay = self._last_request.get(host, 0) + self.interval - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self._last_request[host] = time.monotonic()
+
+
+async def enrich_urls(urls: List[str], cache: Dict[str, Dict], fetch=_fetch) -> Dict[str, Dict]:
+    """
+    並行處理網址，回傳 url -> 結果 (含 etag / last_modified / status / start_date / end_date / terms / fetched_at)。
+    快取仍在有效期限內的網址不發出請求。
+    """
+    fresh_after = (datetime.now() - timedelta(days=CACHE_TTL_DAYS)).isoformat()
+    pool = asyncio.Semaphore(MAX_CONCURRENCY)
+    hosts = HostLimiter()
+    results: Dict[str, Dict] = {}
+
+    async def process(url: str):
+        cached = cache.get(url)
+        if cached and cached["fetched_at"] >= fresh_after:
+            results[url] = {**cached, "terms": _load_terms(cached.get("terms")), "from_cache": True}
+            return
+        host = urlsplit(url).netloc
+        # 先取得網域名額再佔用全域名額，避免等待同一網域時卡住其他網域
+        async with hosts.semaphore(host), pool:
+            await hosts.wait_turn(host)
+            try:
+                response = await asyncio.to_thread(fetch, url, cached)
+            except Exception as e:
+                print(f"  抓取活動頁面失敗 ({url}): {e}")
+                return
+        now = datetime.now().isoformat()
+        if response["status"] == 304 and cached:
+            results[url] = {**cached, "terms": _load_terms(cached.get("terms")), "fetched_at": now, "from_cache": True}
+            return
+        start_date, end_date, terms = None, None, []
+        if response["status"] == 200 and response.get("body"):
+            text = html_to_text(response["body"])
+            start_date, end_date = extract_dates(text)
+            terms = extract_terms(text)
+        results[url] = {
+            "url": url,
+            "status": response["status"],
+            "etag": response.get("etag"),
+            "last_modified": response.get("last_modified"),
+            "start_date": start_date,
+            "end_date": end_date,
+            "terms": terms,
+            "fetched_at": now,
+        }
+
+    await asyncio.gather(*(process(url) for url in urls))
+    return results
+
+
+def _load_terms(value) -> List[str]:
+    if isinstance(value, list):
+        return value
+    try:
+        return json.loads(value) if value else []
+    except ValueError:
+        return []
+
+
+async def enrich_pending_offers(limit: Optional[int] = None) -> Dict:
+    """
+    解析所有尚未處理的優惠並寫回資料庫，最後刪除活動已結束的優惠。
+    回傳統計 {"offers", "urls", "fetched", "cached", "dated", "pruned"}。
+    """
+    from database import get_offers_to_enrich, get_http_cache, save_enrichment, prune_expired_offers
+
+    # 資料庫讀寫在執行緒中進行，後端行程內執行時不阻塞 API 的事件迴圈
+    offers = await asyncio.to_thread(get_offers_to_enrich, limit)
+    by_url: Dict[str, List[int]] = {}
+    for offer in offers:
+        by_url.setdefault(offer["url"], []).append(offer["id"])
+    urls = list(by_url)
+
+    results = await enrich_urls(urls, await asyncio.to_thread(get_http_cache, urls)) if urls else {}
+    await asyncio.to_thread(save_enrichment, [{**r, "offer_ids": by_url[url]} for url, r in results.items()])
+    pruned = await asyncio.to_thread(prune_expired_offers)
+
+    stats = {
+        "offers": len(offers),
+        "urls": len(urls),
+        "fetched": sum(1 for r in results.values() if not r.get("from_cache")),
+        "cached": sum(1 for r in results.values() if r.get("from_cache")),
+        "dated": sum(1 for r in results.values() if r.get("end_date")),
+        "pruned": len(pruned),
+    }
+    print(f"活動頁面解析完成: {stats}")
+    return stats
+
+
+def recently_expired_urls() -> set:
+    """快取有效期限內已確認結束的活動網址 (爬蟲寫入資料庫前用來排除)"""
+    from database import get_expired_urls
+    today = date.today().isoformat()
+    fresh_after = (datetime.now() - timedelta(days=CACHE_TTL_DAYS)).isoformat()
+    return get_expired_urls(today, fresh_after)
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="解析優惠活動頁面的起訖日與重點條款")
+    parser.add_argument("--limit", type=int, help="最多處理的優惠筆數")
+    args = parser.parse_args()
+    asyncio.run(enrich_pending_offers(args.limit))
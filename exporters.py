@@ -0,0 +1,233 @@
+# -*- coding: utf-8 -*-
+"""
+優惠資料匯出
+- 直接從資料庫 cursor 分批讀取 (fetchmany)，記憶體用量不隨資料量成長
+- 先寫入同目錄的暫存檔，完成後以 os.replace 原子性替換，中途失敗不會留下截斷的檔案
+- 新內容的雜湊與現有檔案相同時不替換，避免每日排程產生無意義的 git 提交
+- 與 API 相同，未通過圖片檢查 (image_checks.py) 的圖片輸出為空值
+
+支援格式:
+    csv      UTF-8 BOM 的 CSV (Excel 可直接開啟)
+    json     最小化的 JSON 陣列
+    ndjson   每行一筆 JSON
+    parquet  欄式格式 (需要選用套件 pyarrow)
+    arrow    Arrow IPC 串流 (需要選用套件 pyarrow)
+"""
+
+import codecs
+import csv
+import hashlib
+import io
+import json
+import os
+import sqlite3
+import stat
+import tempfile
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:  # 選用相依套件，未安裝時略過欄式格式
+    pyarrow = None
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+FIELDS = ["bank", "category", "title", "url", "image"]
+CHUNK_SIZE = 500
+DEFAULT_FORMATS = ("csv", "json", "ndjson", "parquet")
+
+
+# ============================================================
+# 原子寫入
+# ============================================================
+
+# 新檔案的權限 (mkstemp 建立的暫存檔為 0600，替換後其他使用者與網頁伺服器將無法讀取)
+DEFAULT_FILE_MODE = 0o644
+
+def file_digest(path: str) -> Optional[str]:
+    """檔案內容的 SHA-256，檔案不存在時回傳 None"""
+    digest = hashlib.sha256()
+    try:
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 16), b""):
+                digest.update(block)
+    except FileNotFoundError:
+        return None
+    return digest.hexdigest()
+
+
+def atomic_write(path: str, write: Callable[[str], None]) -> bool:
+    """
+    呼叫 write(暫存檔路徑) 產生內容，再原子性地替換 path。
+    內容與現有檔案相同時捨棄暫存檔，回傳是否有替換。
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{os.path.basename(path)}.", suffix=".tmp", dir=directory)
+    os.close(fd)
+    try:
+        write(tmp_path)
+        if file_digest(tmp_path) == file_digest(path):
+            os.remove(tmp_path)
+            return False
+        with open(tmp_path, "rb") as f:
+            os.fsync(f.fileno())
+        try:
+            mode = stat.S_IMODE(os.stat(path).st_mode)
+        except FileNotFoundError:
+            mode = DEFAULT_FILE_MODE
+        os.chmod(tmp_path, mode)
+        os.replace(tmp_path, path)
+        return True
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def atomic_write_chunks(path: str, chunks: Iterable[bytes]) -> bool:
+    """將逐段產生的位元組原子性寫入 path"""
+    def write(tmp_path):
+        with open(tmp_path, "wb") as f:
+            for chunk in chunks:
+                f.write(chunk)
+    return atomic_write(path, write)
+
+
+def atomic_write_bytes(path: str, data: bytes) -> bool:
+    return atomic_write_chunks(path, [data])
+
+
+# ============================================================
+# 資料來源
+# ============================================================
+
+def iter_offer_chunks(conn, chunk_size: int = CHUNK_SIZE) -> Iterator[List[tuple]]:
+    """依 id 順序分批讀取優惠 (每批為 FIELDS 順序的 tuple 列表)；只輸出通過檢查的圖片"""
+    columns = ["CASE WHEN image_ok = 1 THEN image END" if f == "image" else f for f in FIELDS]
+    try:
+        cursor = conn.execute(f"SELECT {', '.join(columns)} FROM offers ORDER BY id")
+    except sqlite3.OperationalError:
+        # 舊資料庫尚無 image_ok 欄位，圖片維持原樣 (與 models.LEGACY_DEFAULTS 相同)
+        cursor = conn.execute(f"SELECT {', '.join(FIELDS)} FROM offers ORDER BY id")
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            break
+        yield [tuple(row) for row in rows]
+
+
+# ============================================================
+# 各格式的串流編碼
+# ============================================================
+
+def _csv_chunks(chunks) -> Iterator[bytes]:
+    yield codecs.BOM_UTF8
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\r\n")
+    writer.writerow(FIELDS)
+    for rows in chunks:
+        writer.writerows(rows)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue().encode("utf-8")
+
+
+def _json_chunks(chunks) -> Iterator[bytes]:
+    yield b"["
+    first = True
+    for rows in chunks:
+        parts = [_dumps(dict(zip(FIELDS, row))) for row in rows]
+        if parts:
+            yield (("" if first else ",") + ",".join(parts)).encode("utf-8")
+            first = False
+    yield b"]"
+
+
+def _ndjson_chunks(chunks) -> Iterator[bytes]:
+    for rows in chunks:
+        yield "".join(_dumps(dict(zip(FIELDS, row))) + "\n" for row in rows).encode("utf-8")
+
+
+def _dumps(record: Dict) -> str:
+    return json.dumps(record, ensure_ascii=False, separators=(",", ":"))
+
+
+def _arrow_schema():
+    return pyarrow.schema([(field, pyarrow.string()) for field in FIELDS])
+
+
+def _arrow_batches(chunks):
+    schema = _arrow_schema()
+    for rows in chunks:
+        columns = list(zip(*rows))
+        yield pyarrow.record_batch([pyarrow.array(col, type=pyarrow.string()) for col in columns], schema=schema)
+
+
+def _write_parquet(chunks):
+    def write(tmp_path):
+        with pyarrow.parquet.ParquetWriter(tmp_path, _arrow_schema(), compression="zstd") as writer:
+            for batch in _arrow_batches(chunks):
+                writer.write_batch(batch)
+    return write
+
+
+def _write_arrow(chunks):
+    def write(tmp_path):
+        with pyarrow.OSFile(tmp_path, "wb") as sink:
+            with pyarrow.ipc.new_stream(sink, _arrow_schema()) as writer:
+                for batch in _arrow_batches(chunks):
+                    writer.write_batch(batch)
+    return write
+
+
+TEXT_FORMATS = {"csv": _csv_chunks, "json": _json_chunks, "ndjson": _ndjson_chunks}
+COLUMNAR_FORMATS = {"parquet": _write_parquet, "arrow": _write_arrow}
+
+
+def export_offers(
+    formats: Iterable[str] = DEFAULT_FORMATS,
+    basename: str = os.path.join(BASE_DIR, "all_bank_offers"),
+    conn=None,
+    chunk_size: int = CHUNK_SIZE,
+) -> Dict[str, bool]:
+    """
+    匯出資料庫中的優惠，回傳 {檔案路徑: 是否有改寫}。
+    conn 為 None 時使用 database.get_connection()。
+    """
+    own_conn = conn is None
+    if own_conn:
+        from database import get_connection
+        conn = get_connection()
+    results = {}
+    try:
+        for fmt in formats:
+            path = f"{basename}.{fmt}"
+            chunks = iter_offer_chunks(conn, chunk_size)
+            if fmt in TEXT_FORMATS:
+                written = atomic_write_chunks(path, TEXT_FORMATS[fmt](chunks))
+            elif fmt in COLUMNAR_FORMATS:
+                if pyarrow is None:
+                    print(f"未安裝 pyarrow，略過 {fmt} 匯出")
+                    continue
+                written = atomic_write(path, COLUMNAR_FORMATS[fmt](chunks))
+            else:
+                raise ValueError(f"未知的匯出格式: {fmt}")
+            results[path] = written
+            print(f"{'已儲存' if written else '內容未變更，略過'} {fmt.upper()}: {os.path.basename(path)}")
+    finally:
+        if own_conn:
+            conn.close()
+    return results
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="匯出資料庫中的優惠資料")
+    parser.add_argument("--format", action="append", choices=list(TEXT_FORMATS) + list(COLUMNAR_FORMATS),
+                        help="匯出格式 (可重複指定)，預設為 csv / json / ndjson / parquet")
+    args = parser.parse_args()
+    export_offers(args.format or DEFAULT_FORMATS)
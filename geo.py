@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+"""
+特店座標與附近優惠
+/api/map-locate 每次都以 Nominatim 即時查詢一個地點，沒有存下任何座標，也就無法回答「我附近有哪些優惠」。
+爬蟲更新資料庫後的 geocode 階段:
+
+- 對尚未查詢過的特店 (merchants.py 擷取的特店) 以 Nominatim 查詢座標，遵守每秒一次的使用規範
+- 結果以特店正規化名稱為鍵存在 merchant_locations (特店索引重建時 merchants.id 會改變，名稱不會)，
+  座標同時寫入 SQLite R*Tree 虛擬表 merchant_geo
+- 查不到的特店也記錄下來，GEOCODE_RETRY_DAYS 天後才再查詢
+
+/api/offers/near 先以 R*Tree 做外接矩形預篩，再對候選點計算精確的 haversine 距離並排序，
+不必即時查詢地理編碼服務。連鎖特店只有一個代表座標 (查詢地區內的第一筆結果)。
+"""
+
+import importlib.util
+import math
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+GEOCODE_REGION = os.environ.get("GEOCODE_REGION", "台北市")
+GEOCODE_LIMIT = int(os.environ.get("GEOCODE_LIMIT", "200"))  # 每次更新最多查詢的特店數
+GEOCODE_RETRY_DAYS = int(os.environ.get("GEOCODE_RETRY_DAYS", "30"))
+GEOCODE_INTERVAL_SECONDS = 1.0  # Nominatim 使用規範：每秒最多一次請求
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE_LAT = 111.32
+
+
+def bounding_box(lat: float, lon: float, radius_km: float) -> Tuple[float, float, float, float]:
+    """以 (lat, lon) 為中心、半徑 radius_km 的外接矩形 (min_lat, max_lat, min_lon, max_lon)"""
+    dlat = radius_km / KM_PER_DEGREE_LAT
+    cos_lat = math.cos(math.radians(lat))
+    # 接近極點時經度範圍涵蓋全部
+    dlon = 180.0 if cos_lat < 1e-6 else min(180.0, radius_km / (KM_PER_DEGREE_LAT * cos_lat))
+    return max(-90.0, lat - dlat), min(90.0, lat + dlat), max(-180.0, lon - dlon), min(180.0, lon + dlon)
+
+
+def haversine_km(lat: float, lon: float, lats: Sequence[float], lons: Sequence[float]) -> List[float]:
+    """
+    (lat, lon) 到每個候選點的大圓距離 (公里)。
+    有 numpy (pandas 的相依套件) 時一次對整批候選點向量化計算，否則逐點計算。
+    """
+    if not lats:
+        return []
+    try:
+        import numpy as np
+    except ImportError:
+        np = None
+    if np is not None:
+        phi1 = np.radians(lat)
+        phi2 = np.radians(np.asarray(lats, dtype=float))
+        dphi = phi2 - phi1
+        dlmb = np.radians(np.asarray(lons, dtype=float) - lon)
+        a = np.sin(dphi / 2) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin(dlmb / 2) ** 2
+        return (2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))).tolist()
+    phi1 = math.radians(lat)
+    cos_phi1 = math.cos(phi1)
+    distances = []
+    for lat2, lon2 in zip(lats, lons):
+        phi2 = math.radians(lat2)
+        a = math.sin((phi2 - phi1) / 2) ** 2 + cos_phi1 * math.cos(phi2) * math.sin(math.radians(lon2 - lon) / 2) ** 2
+        distances.append(2 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(a, 1.0))))
+    return distances
+
+
+def _nominatim_geocode(query: str) -> Optional[Tuple[float, float]]:
+    # 延遲載入 geopy (與 /api/map-locate 共用同一個 user agent)
+    from geopy.geocoders import Nominatim
+    location = Nominatim(user_agent="ccard_war_room").geocode(query, timeout=10)
+    return (location.latitude, location.longitude) if location else None
+
+
+def geocode_merchants(merchants: List[Dict], geocode: Callable = _nominatim_geocode,
+                      interval: float = GEOCODE_INTERVAL_SECONDS) -> List[Dict]:
+    """
+    依序查詢特店座標 (merchants 需含 key, name)。
+    回傳 [{"key", "query", "lat", "lon", "ok", "reason"}]；查詢失敗的特店 ok 為 False。
+    """
+    results = []
+    last = None
+    for merchant in merchants:
+        if last is not None and interval:
+            time.sleep(max(0.0, interval - (time.monotonic() - last)))
+        query = f"{merchant['name']} {GEOCODE_REGION}".strip()
+        result = {"key": merchant["key"], "query": query, "lat": None, "lon": None, "ok": False, "reason": None}
+        last = time.monotonic()
+        try:
+            point = geocode(query)
+        except Exception as e:
+            result["reason"] = type(e).__name__
+        else:
+            if point:
+                result.update(lat=float(point[0]), lon=float(point[1]), ok=True)
+            else:
+                result["reason"] = "not_found"
+        results.append(result)
+    return results
+
+
+def geocode_pending_merchants(limit: Optional[int] = GEOCODE_LIMIT, geocode: Callable = _nominatim_geocode) -> Dict:
+    """
+    查詢尚未有座標紀錄 (或查詢失敗超過 GEOCODE_RETRY_DAYS 天) 的特店並寫回資料庫。
+    回傳統計 {"merchants", "located", "not_found", "errors"}。
+    """
+    from database import get_merchants_to_geocode, save_geocodes
+
+    if geocode is _nominatim_geocode and importlib.util.find_spec("geopy") is None:
+        print("未安裝 geopy，略過特店座標查詢")
+        return {"merchants": 0, "located": 0, "not_found": 0, "errors": 0}
+    retry_before = (datetime.now() - timedelta(days=GEOCODE_RETRY_DAYS)).isoformat()
+    merchants = get_merchants_to_geocode(retry_before, limit)
+    # 每秒一次是 Nominatim 的使用規範，其他地理編碼函式不限速
+    interval = GEOCODE_INTERVAL_SECONDS if geocode is _nominatim_geocode else 0
+    results = geocode_merchants(merchants, geocode, interval) if merchants else []
+    # 逾時等暫時性錯誤不寫入，下次更新時再查詢；查無結果才等 GEOCODE_RETRY_DAYS 天
+    save_geocodes([r for r in results if r["ok"] or r["reason"] == "not_found"])
+
+    stats = {
+        "merchants": len(merchants),
+        "located": sum(1 for r in results if r["ok"]),
+        "not_found": sum(1 for r in results if r["reason"] == "not_found"),
+        "errors": sum(1 for r in results if not r["ok"] and r["reason"] != "not_found"),
+    }
+    print(f"特店座標查詢完成: {stats}")
+    return stats
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="查詢特店座標 (供 /api/offers/near 使用)")
+    parser.add_argument("--limit", type=int, default=GEOCODE_LIMIT, help="最多查詢的特店數")
+    args = parser.parse_args()
+    geocode_pending_merchants(args.limit)
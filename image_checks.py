@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+"""
+優惠圖片檢查
+爬到的 image 常是失效網址、延遲載入的佔位圖或小圖示，前端經由 /api/image-proxy 載入失敗後
+才在 onerror 換成預設圖，每張卡片都浪費一次往返。爬蟲更新資料庫後:
+
+- 以有上限的並行數 (每個網域另有並行上限與請求間隔，見 enrichment.HostLimiter) 下載尚未檢查的圖片
+- 記錄狀態碼、Content-Type、大小與尺寸 (直接解析 PNG / GIF / JPEG / WebP 檔頭) 於 image_checks 資料表，
+  並寫回 offers.image_ok；API 與靜態資料只回傳 image_ok = 1 的圖片
+- 通過檢查的圖片存入圖片代理的磁碟快取，/api/image-proxy 不必再向銀行網站下載
+
+需要尺寸與快取內容，因此直接 GET (HEAD 拿不到尺寸，且多數銀行網站的 HEAD 回應不可靠)。
+"""
+
+import asyncio
+import os
+import struct
+import urllib.error
+import urllib.request
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from enrichment import USER_AGENT, HostLimiter
+
+MAX_CONCURRENCY = int(os.environ.get("IMAGE_CHECK_CONCURRENCY", "8"))
+REQUEST_TIMEOUT = 10
+MAX_IMAGE_BYTES = 5 * 1024 * 1024
+MIN_DIMENSION = 48            # 寬或高小於此值視為圖示 / 佔位圖
+MIN_UNKNOWN_BYTES = 4 * 1024  # 無法解析尺寸的格式 (例如 SVG、AVIF) 至少要有的大小
+RECHECK_DAYS = int(os.environ.get("IMAGE_RECHECK_DAYS", "7"))
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+IMAGE_CACHE_DIR = os.environ.get("IMAGE_CACHE_DIR", os.path.join(PROJECT_DIR, ".image_cache"))
+IMAGE_CACHE_TTL_SECONDS = RECHECK_DAYS * 24 * 3600
+IMAGE_CACHE_MAX_BYTES = int(os.environ.get("IMAGE_CACHE_MAX_BYTES", str(200 * 1024 * 1024)))
+
+
+@lru_cache(maxsize=1)
+def get_image_cache():
+    """圖片代理與圖片檢查共用的磁碟快取"""
+    from src.backend.core.browser_pool import DiskCache
+    return DiskCache(IMAGE_CACHE_DIR, IMAGE_CACHE_TTL_SECONDS, IMAGE_CACHE_MAX_BYTES)
+
+
+def request_headers(url: str) -> Dict[str, str]:
+    """下載銀行圖片用的標頭 (Referer 依 scrapers 的 image_hosts 設定繞過防盜連)"""
+    from scrapers import image_referer
+    return {"User-Agent": USER_AGENT, "Referer": image_referer(url), "Accept": "image/*,*/*;q=0.8"}
+
+
+# ============================================================
+# 尺寸解析
+# ============================================================
+
+def image_dimensions(data: bytes) -> Optional[Tuple[int, int]]:
+    """由檔頭解析 (寬, 高)，不支援的格式回傳 None"""
+    if data[:8] == b"\x89PNG\r\n\x1a\n" and len(data) >= 24:
+        return struct.unpack(">II", data[16:24])
+    if data[:6] in (b"GIF87a", b"GIF89a") and len(data) >= 10:
+        return struct.unpack("<HH", data[6:10])
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP" and len(data) >= 30:
+        chunk = data[12:16]
+        if chunk == b"VP8 ":
+            w, h = struct.unpack("<HH", data[26:30])
+            return w & 0x3FFF, h & 0x3FFF
+        if chunk == b"VP8L":
+            bits = int.from_bytes(data[21:25], "little")
+            return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+        if chunk == b"VP8X":
+            return int.from_bytes(data[24:27], "little") + 1, int.from_bytes(data[27:30], "little") + 1
+        return None
+    if data[:2] == b"\xff\xd8":
+        return _jpeg_dimensions(data)
+    return None
+
+
+def _jpeg_dimensions(data: bytes) -> Optional[Tuple[int, int]]:
+    # 依序走訪區段，直到 SOF (Start Of Frame) 標記
+    i = 2
+    while i + 9 < len(data):
+        if data[i] != 0xFF:
+            return None
+        marker = data[i + 1]
+        if marker == 0xFF:
+            i += 1
+            continue
+        if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:
+            i += 2
+            continue
+        length = struct.unpack(">H", data[i + 2:i + 4])[0]
+        if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            h, w = struct.unpack(">HH", data[i + 5:i + 9])
+            return w, h
+        i += 2 + length
+    return None
+
+
+def evaluate(status: Optional[int], content_type: Optional[str], size: int,
+             dimensions: Optional[Tuple[int, int]]) -> Tuple[bool, Optional[str]]:
+    """(是否可用, 不可用的原因)"""
+    if status != 200:
+        return False, f"http_{status}" if status else "unreachable"
+    if not (content_type or "").lower().startswith("image/"):
+        return False, "not_image"
+    if dimensions is None:
+        return (True, None) if size >= MIN_UNKNOWN_BYTES else (False, "unreadable")
+    if min(dimensions) < MIN_DIMENSION:
+        return False, "too_small"
+    return True, None
+
+
+# ============================================================
+# 抓取
+# ============================================================
+
+def _fetch(url: str) -> Dict:
+    """同步 GET (於 asyncio.to_thread 中執行)，內容超過 MAX_IMAGE_BYTES 時不保留"""
+    request = urllib.request.Request(url, headers=request_headers(url))
+    try:
+        with urllib.request.urlopen(request, timeout=REQUEST_TIMEOUT) as response:
+            body = response.read(MAX_IMAGE_BYTES + 1)
+            return {
+                "status": response.status,
+                "content_type": response.headers.get_content_type(),
+                "body": body,
+            }
+    except urllib.error.HTTPError as e:
+        return {"status": e.code}
+
+
+async def check_images(urls: List[str], fetch=_fetch, cache=None) -> Dict[str, Dict]:
+    """
+    並行檢查圖片，回傳 url -> {"url", "status", "content_type", "bytes", "width", "height", "ok", "reason", "checked_at"}。
+    cache 不為 None 時，通過檢查的圖片會寫入該快取 (預熱圖片代理)。
+    """
+    pool = asyncio.Semaphore(MAX_CONCURRENCY)
+    hosts = HostLimiter()
+    results: Dict[str, Dict] = {}
+
+    async def process(url: str):
+        now = datetime.now().isoformat()
+        result = {"url": url, "status": None, "content_type": None, "bytes": None,
+                  "width": None, "height": None, "checked_at": now}
+        if urlsplit(url).scheme not in ("http", "https"):
+            # data: URI 等延遲載入的佔位圖
+            results[url] = {**result, "ok": False, "reason": "not_http"}
+            return
+        host = urlsplit(url).netloc
+        async with hosts.semaphore(host), pool:
+            await hosts.wait_turn(host)
+            try:
+                response = await asyncio.to_thread(fetch, url)
+            except Exception as e:
+                results[url] = {**result, "ok": False, "reason": type(e).__name__}
+                return
+        body = response.get("body") or b""
+        dimensions = image_dimensions(body[:64 * 1024]) if body else None
+        ok, reason = evaluate(response["status"], response.get("content_type"), len(body), dimensions)
+        results[url] = {
+            **result,
+            "status": response["status"],
+            "content_type": response.get("content_type"),
+            "bytes": len(body) if body else None,
+            "width": dimensions[0] if dimensions else None,
+            "height": dimensions[1] if dimensions else None,
+            "ok": ok,
+            "reason": reason,
+        }
+        if ok and cache is not None and len(body) <= MAX_IMAGE_BYTES:
+            cache.put(url, 200, {"Content-Type": response["content_type"]}, body)
+            results[url]["prewarmed"] = True
+
+    await asyncio.gather(*(process(url) for url in urls))
+    return results
+
+
+async def check_pending_images(limit: Optional[int] = None) -> Dict:
+    """
+    檢查尚未檢查 (或超過 RECHECK_DAYS 天) 的圖片並寫回資料庫。
+    回傳統計 {"images", "ok", "bad", "prewarmed", "offers_updated"}。
+    """
+    from database import get_images_to_check, save_image_checks
+
+    checked_before = (datetime.now() - timedelta(days=RECHECK_DAYS)).isoformat()
+    # 資料庫讀寫與快取清理在執行緒中進行，後端行程內執行時不阻塞 API 的事件迴圈
+    urls = await asyncio.to_thread(get_images_to_check, checked_before, limit)
+    cache = get_image_cache()
+    results = await check_images(urls, cache=cache) if urls else {}
+    updated = await asyncio.to_thread(save_image_checks, list(results.values()))
+    await asyncio.to_thread(cache.prune)
+
+    stats = {
+        "images": len(urls),
+        "ok": sum(1 for r in results.values() if r["ok"]),
+        "bad": sum(1 for r in results.values() if not r["ok"]),
+        "prewarmed": sum(1 for r in results.values() if r.get("prewarmed")),
+        "offers_updated": updated,
+    }
+    print(f"圖片檢查完成: {stats}")
+    return stats
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="檢查優惠圖片並預熱圖片代理快取")
+    parser.add_argument("--limit", type=int, help="最多檢查的圖片數")
+    args = parser.parse_args()
+    asyncio.run(check_pending_images(args.limit))
@@ -0,0 +1,232 @@
+# -*- coding: utf-8 -*-
+"""
+特店擷取與特店 → 優惠索引
+「哪張卡在某家店有優惠」原本只能對標題做 LIKE 子字串比對。upsert 時從標題擷取特店:
+
+1. 特店字典 (MERCHANTS)：標準名稱與別名，以最長別名優先、互不重疊的方式比對
+   (例如「大全聯」不會同時算成「全聯」)
+2. 標題樣式：字典沒有命中時，取「【中信卡】某某」、「某某 刷玉山卡…」、「某某刷聯邦卡…」中的特店名稱，
+   過濾「日本旅遊」、「8.8購物節」這類泛稱
+
+結果寫入 merchants (正規化名稱唯一) 與 merchant_offers (特店 → 優惠的倒排列表，主鍵即為索引)，
+/api/merchants/{name}/offers 以索引直接查詢，查詢成本只與該特店的優惠筆數有關，與總筆數無關。
+"""
+
+import hashlib
+import json
+import re
+import unicodedata
+from typing import Dict, List, Optional
+
+from near_duplicates import BANK_TOKENS
+
+# 標準名稱 -> 別名 (比對前會做 NFKC 與小寫；標準名稱本身也是別名)
+MERCHANTS: Dict[str, List[str]] = {
+    # 餐飲外送
+    "星巴克": ["starbucks"],
+    "麥當勞": ["mcdonald", "mcdonald's"],
+    "肯德基": ["kfc"],
+    "摩斯漢堡": ["摩斯", "mos burger"],
+    "王品": ["王品集團"],
+    "瓦城": [],
+    "饗賓": ["饗饗", "旭集"],
+    "EZTABLE": ["簡單桌"],
+    "foodpanda": ["空腹熊貓"],
+    "Uber Eats": ["ubereats"],
+    "路易莎": ["louisa"],
+    # 超商量販
+    "7-ELEVEN": ["7-11", "統一超商", "小七"],
+    "全家": ["全家便利商店", "familymart"],
+    "萊爾富": [],
+    "OK超商": ["ok mart"],
+    "全聯": ["全聯福利中心", "px pay"],
+    "大全聯": [],
+    "家樂福": ["carrefour"],
+    "好市多": ["costco"],
+    "IKEA": ["宜家"],
+    "小北百貨": [],
+    "美廉社": [],
+    "AEON": ["永旺"],
+    # 藥妝百貨
+    "屈臣氏": ["watsons"],
+    "康是美": ["cosmed"],
+    "寶雅": ["poya"],
+    "新光三越": [],
+    "SOGO": ["遠東sogo", "太平洋sogo"],
+    "遠東百貨": [],
+    "微風": ["微風廣場", "breeze"],
+    "統一時代百貨": [],
+    "漢神百貨": ["漢神"],
+    "誠品": ["eslite"],
+    "昇恆昌": [],
+    "UNIQLO": [],
+    "環球購物中心": ["global mall"],
+    "World Gym": [],
+    "大丸百貨": ["大丸", "大丸松坂屋"],
+    "BicCamera": ["bic camera"],
+    "LaLaport": ["三井outlet", "mitsui outlet"],
+    # 網購
+    "蝦皮購物": ["蝦皮", "shopee"],
+    "momo購物網": ["momo"],
+    "PChome": ["pchome24h"],
+    "Yahoo購物": ["yahoo奇摩購物"],
+    "博客來": [],
+    "Coupang": ["酷澎"],
+    "淘寶": ["taobao", "天貓"],
+    "Amazon": ["亞馬遜"],
+    "GOMAJI": ["好麻吉"],
+    "小樹購": [],
+    # 旅遊
+    "Agoda": [],
+    "Hotels.com": [],
+    "Booking.com": [],
+    "Expedia": [],
+    "Trip.com": ["攜程"],
+    "AsiaYo": [],
+    "雲朗觀光": [],
+    "KKday": [],
+    "Klook": ["客路"],
+    "雄獅旅遊": ["雄獅"],
+    "可樂旅遊": ["康福旅遊"],
+    "山富旅遊": [],
+    "易遊網": ["eztravel"],
+    "東南旅遊": [],
+    "長榮航空": ["eva air"],
+    "中華航空": ["華航", "china airlines"],
+    "星宇航空": ["starlux"],
+    "台灣高鐵": ["高鐵", "tgo"],
+    "長榮酒店": ["長榮桂冠"],
+    # 交通加油
+    "台灣中油": ["中油", "中國石油"],
+    "台塑石油": ["台塑石化"],
+    "Gogoro": [],
+    "Tesla": ["特斯拉"],
+    "Uber": [],
+    "eTag": ["遠通電收"],
+    # 行動支付 / 票證
+    "LINE Pay": ["linepay"],
+    "街口支付": ["街口"],
+    "全支付": [],
+    "Apple Pay": [],
+    "Google Pay": [],
+    "Samsung Pay": [],
+    "iPASS": ["一卡通", "ipass money"],
+    "悠遊卡": ["easycard"],
+    "悠遊付": [],
+    # 數位娛樂 / 3C
+    "Netflix": [],
+    "Spotify": [],
+    "Disney+": ["disney plus"],
+    "YouTube Premium": [],
+    "燦坤": ["燦坤3c"],
+    "順發3C": ["順發"],
+    "神腦": ["神腦國際"],
+}
+
+# 標題樣式擷取出的候選名稱若符合這些泛稱，不視為特店
+_GENERIC_RE = re.compile(
+    r"^(?:日本|韓國|日韓|海外|國外|國內|全台|台灣|全球|精選|指定)*"
+    r"(?:旅遊|購物|餐廳|美食|餐飲|加油|租車|分期|繳費|保費|訂房|機票|網購|百貨|超商|外送|電影|交通|特店|商店|飯店)?$"
+)
+_GENERIC_PARTS = ("優惠", "回饋", "信用卡", "刷卡", "卡友", "新戶", "首刷", "活動", "情報", "好康", "專屬", "滿額",
+                  "限量", "加碼", "紅利", "點數", "現金", "利率", "聯名卡", "簽帳")
+_BANK_RE = "|".join(map(re.escape, BANK_TOKENS + ["cube"]))
+_STOP = r"\s，,。！!|｜∣:：、&＆•"
+# 【中信卡】某某 / 某某 刷玉山卡享… / 某某刷聯邦卡… / 某某 玉山卡享…
+_TITLE_PATTERNS = [
+    re.compile(rf"^【[^】]*卡】\s*(?P<name>[^{_STOP}]{{2,24}})"),
+    re.compile(rf"^(?P<name>[^{_STOP}]{{2,24}}?)\s*(?:刷|使用|綁定)\s*(?:{_BANK_RE})"),
+    re.compile(rf"^(?P<name>[^{_STOP}]{{2,24}})\s+(?:\S+\s+)?(?:{_BANK_RE})"),
+]
+
+
+def merchant_key(name: str) -> str:
+    """正規化名稱 (NFKC、小寫、去除空白與標點)，merchants.key 與 API 查詢共用"""
+    text = unicodedata.normalize("NFKC", name or "").lower()
+    return re.sub(r"[\W_]+", "", text)
+
+
+def _build_alias_index():
+    aliases = {}
+    for canonical, names in MERCHANTS.items():
+        for alias in [canonical] + names:
+            aliases[unicodedata.normalize("NFKC", alias).lower()] = canonical
+    # 長的別名放前面：regex 交替由左至右嘗試，同一位置以最長者優先
+    pattern = re.compile("|".join(re.escape(a) for a in sorted(aliases, key=len, reverse=True)))
+    return pattern, aliases, {merchant_key(a): c for a, c in aliases.items()}
+
+
+_ALIAS_RE, _ALIASES, _ALIAS_KEYS = _build_alias_index()
+
+
+def _is_generic(name: str) -> bool:
+    return (
+        bool(_GENERIC_RE.match(name))
+        or any(part in name for part in _GENERIC_PARTS)
+        or re.search(_BANK_RE, name, re.I) is not None
+        or name.endswith("節")
+        or not re.search(r"[^\d\W]", name)
+    )
+
+
+def extract_merchants(title: str) -> List[str]:
+    """
+    回傳標題中的特店名稱 (依出現順序、不重複)。
+    字典有命中時只採用字典結果；否則嘗試標題樣式，仍找不到時回傳空列表。
+    """
+    text = unicodedata.normalize("NFKC", title or "").lower()
+    found = []
+    for match in _ALIAS_RE.finditer(text):
+        canonical = _ALIASES[match.group(0)]
+        if canonical not in found:
+            found.append(canonical)
+    if found:
+        return found
+    original = unicodedata.normalize("NFKC", title or "").strip()
+    for pattern in _TITLE_PATTERNS:
+        match = pattern.match(original)
+        if match:
+            name = match.group("name").strip()
+            if len(merchant_key(name)) >= 2 and not _is_generic(name):
+                return [name]
+    return []
+
+
+def resolve_merchant_key(name: str) -> str:
+    """查詢名稱 -> merchants.key (別名會對應到標準名稱，例如 starbucks -> 星巴克)"""
+    key = merchant_key(name)
+    canonical = _ALIAS_KEYS.get(key)
+    return merchant_key(canonical) if canonical else key
+
+
+def merchant_index_version() -> str:
+    """字典與標題樣式的雜湊；改變時 database.init_db() 會重建整個特店索引"""
+    source = json.dumps([MERCHANTS, [p.pattern for p in _TITLE_PATTERNS], _GENERIC_RE.pattern, _GENERIC_PARTS],
+                        ensure_ascii=False, sort_keys=True)
+    return hashlib.sha1(source.encode("utf-8")).hexdigest()[:12]
+
+
+def index_offer_merchants(cursor, offer_id: int, title: str) -> List[str]:
+    """
+    擷取特店並寫入 merchants / merchant_offers (與 upsert 在同一個 transaction 內)。
+    回傳擷取到的特店名稱。
+    """
+    names = extract_merchants(title)
+    for name in names:
+        key = merchant_key(name)
+        source = "dictionary" if name in MERCHANTS else "pattern"
+        cursor.execute(
+            "INSERT INTO merchants (key, name, source) VALUES (?, ?, ?) ON CONFLICT(key) DO NOTHING",
+            (key, name, source),
+        )
+        cursor.execute("""
+            INSERT OR IGNORE INTO merchant_offers (merchant_id, offer_id)
+            SELECT id, ? FROM merchants WHERE key = ?
+        """, (offer_id, key))
+    return names
+
+
+def find_merchant(query: str) -> Optional[str]:
+    """自由文字 (例如地圖查詢的優惠標題) 中的第一個特店名稱"""
+    names = extract_merchants(query)
+    return names[0] if names else None
@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+"""
+優惠與信用卡的資料模型
+優惠原本在各處都是 dict：爬蟲提取後直接修改 (offer["bank"] = ...)、upsert 以 o.get 讀取、
+API 每列以 dict(row) 重建，再交給 FastAPI 的通用 JSON 編碼器逐層轉換。
+
+- Offer / Card 為 __slots__ dataclass，每筆不帶 __dict__，型別與欄位集中在一處
+- 驗證只在邊界做一次：爬蟲提取的資料以 Offer.from_scraped 建立 (標題過短、缺少銀行名稱時拋出 InvalidOffer)，
+  讀取資料庫時不再逐列檢查
+- fetch_models 依查詢的欄位順序預先算好取值方式，每列只做一次 tuple 取值與建構；
+  舊資料庫缺少的欄位為 None
+- 特店、附近、推薦與時間點查詢附加的欄位 (距離、適用卡片、歷史區間) 以 AnnotatedOffer 包裝，不加進 Offer
+- to_json / offers_json 直接以 json.dumps 輸出，不經過 FastAPI 的 jsonable_encoder；
+  Offer / Card 一律經由 to_dict 序列化
+"""
+
+import json
+import re
+from dataclasses import dataclass, fields
+from functools import lru_cache
+from operator import attrgetter, itemgetter
+from typing import Callable, Dict, Iterable, List, Optional
+
+MIN_TITLE_LENGTH = 3  # 「優惠」、「更多」這類過短的標題多為按鈕或分類名稱
+_SPACE_RE = re.compile(r"\s+")
+
+
+def normalize_title(title) -> str:
+    """換行與連續空白合併為一個空白 (標題是 upsert 比對鍵的一部分，舊資料以 init_db 同樣正規化)"""
+    return _SPACE_RE.sub(" ", str(title or "")).strip()
+
+
+class InvalidOffer(ValueError):
+    """爬到的資料不是有效的優惠"""
+
+
+class InvalidCard(ValueError):
+    """信用卡資料不完整"""
+
+
+@dataclass(slots=True)
+class Offer:
+    bank: str
+    title: str
+    category: Optional[str] = None
+    url: Optional[str] = None
+    image: Optional[str] = None
+    id: Optional[int] = None
+    scraped_at: Optional[str] = None
+    created_at: Optional[str] = None
+    start_date: Optional[str] = None
+    end_date: Optional[str] = None
+    terms: Optional[str] = None
+    enriched_at: Optional[str] = None
+    cluster_id: Optional[int] = None
+    canonical_category: Optional[str] = None
+    # 圖片檢查結果：1 可用、0 不可用、None 尚未檢查 (不輸出到 API)
+    image_ok: Optional[int] = None
+    # collapse=true 時同一近似重複群的優惠筆數 (不在資料表中)
+    cluster_size: Optional[int] = None
+
+    @classmethod
+    def from_scraped(cls, raw: Dict, bank: str, category: Optional[str] = None) -> "Offer":
+        """爬蟲提取結果 -> Offer；標題正規化空白後過短或缺少銀行名稱時拋出 InvalidOffer"""
+        title = normalize_title(raw.get("title"))
+        if len(title) < MIN_TITLE_LENGTH:
+            raise InvalidOffer(f"標題過短: {title!r}")
+        bank = bank or raw.get("bank")
+        if not bank:
+            raise InvalidOffer(f"缺少銀行名稱: {title}")
+        return cls(
+            bank=bank,
+            title=title,
+            category=category or raw.get("category"),
+            url=(raw.get("url") or "").strip() or None,
+            image=(raw.get("image") or "").strip() or None,
+        )
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "Offer":
+        """dict (檢查點、測試資料) -> Offer，忽略未知的鍵，不做驗證"""
+        return cls(**{name: data[name] for name in OFFER_FIELDS if name in data})
+
+    def visible_image(self) -> Optional[str]:
+        """只回傳通過圖片檢查的圖片"""
+        return self.image if self.image_ok == 1 else None
+
+    def to_dict(self) -> Dict:
+        """API 輸出：不含 image_ok，圖片未通過檢查時為 None；cluster_size 只在摺疊時輸出"""
+        data = dict(zip(_API_FIELDS, _api_values(self)))
+        data["image"] = self.visible_image()
+        if self.cluster_size is not None:
+            data["cluster_size"] = self.cluster_size
+        return data
+
+    def to_scraped(self) -> Dict:
+        """爬蟲檢查點保存的欄位"""
+        return {"bank": self.bank, "category": self.category, "title": self.title, "url": self.url,
+                "image": self.image}
+
+
+@dataclass(slots=True)
+class Card:
+    bank: str
+    card_name: str
+    card_type: Optional[str] = ""
+    annual_fee: Optional[str] = ""
+    billing_day: Optional[int] = None
+    payment_day: Optional[int] = None
+    notes: Optional[str] = ""
+    id: Optional[int] = None
+    created_at: Optional[str] = None
+    updated_at: Optional[str] = None
+
+    @classmethod
+    def create(cls, bank: str, card_name: str, card_type: str = "", annual_fee: str = "",
+               billing_day: int = None, payment_day: int = None, notes: str = "") -> "Card":
+        """新增卡片時的驗證：銀行與卡名必填，繳款 / 結帳日需為 1–31"""
+        bank = (bank or "").strip()
+        card_name = (card_name or "").strip()
+        if not bank or not card_name:
+            raise InvalidCard("銀行與卡片名稱為必填")
+        for label, day in (("結帳日", billing_day), ("繳款日", payment_day)):
+            if day is not None and not 1 <= int(day) <= 31:
+                raise InvalidCard(f"{label}必須介於 1 與 31: {day}")
+        return cls(bank, card_name, card_type or "", annual_fee or "", billing_day, payment_day, notes or "")
+
+    def to_dict(self) -> Dict:
+        return dict(zip(CARD_FIELDS, _card_values(self)))
+
+
+@dataclass(slots=True)
+class AnnotatedOffer:
+    """查詢結果附加的欄位 (不在 offers 資料表中)；屬性讀取轉給 offer，輸出時與 offer 的欄位合併"""
+    offer: Offer
+    extra: Dict
+
+    def __getattr__(self, name):
+        return getattr(self.offer, name)
+
+    def to_dict(self) -> Dict:
+        return {**self.offer.to_dict(), **self.extra}
+
+
+OFFER_FIELDS = tuple(f.name for f in fields(Offer))
+CARD_FIELDS = tuple(f.name for f in fields(Card))
+_API_FIELDS = tuple(name for name in OFFER_FIELDS if name not in ("image_ok", "cluster_size"))
+_api_values = attrgetter(*_API_FIELDS)
+_card_values = attrgetter(*CARD_FIELDS)
+# 舊資料庫 (尚無 image_ok 欄位) 的圖片維持原樣輸出
+LEGACY_DEFAULTS = {Offer: {"image_ok": 1}}
+
+
+@lru_cache(maxsize=64)
+def _row_getter(model, columns: tuple) -> Callable:
+    """查詢欄位順序 -> 由 tuple 建立 model 的函式 (每種查詢只算一次)；查詢缺少的欄位補上預設值"""
+    defaults = LEGACY_DEFAULTS.get(model, {})
+    index = {name: i for i, name in enumerate(columns)}
+    names = tuple(f.name for f in fields(model))
+    missing = [name for name in names if name not in index]
+    tail = tuple(defaults.get(name) for name in missing)
+    positions = [index[name] if name in index else len(columns) + missing.index(name) for name in names]
+    pick = itemgetter(*positions)
+    return lambda values: model(*pick(values + tail))
+
+
+def fetch_models(cursor, model, extras: tuple = ()) -> List:
+    """
+    已執行查詢的 cursor -> model 列表 (取代逐列 dict(row))。
+    cursor 需以 tuple 回傳資料列 (cursor.row_factory = None)。
+    extras 為查詢中不屬於 model 的欄位，指定時回傳 (model, {欄位: 值}) 的列表。
+    """
+    columns = tuple(d[0] for d in cursor.description)
+    build = _row_getter(model, columns)
+    if not extras:
+        return [build(row) for row in cursor.fetchall()]
+    positions = [columns.index(name) for name in extras]
+    return [(build(row), {name: row[i] for name, i in zip(extras, positions)}) for row in cursor.fetchall()]
+
+
+def _encode(value):
+    if isinstance(value, (Offer, Card, AnnotatedOffer)):
+        return value.to_dict()
+    raise TypeError(f"無法序列化 {type(value).__name__}")
+
+
+def to_json(payload) -> bytes:
+    """API 回應 -> JSON bytes (緊湊格式、保留中文)；其中的 Offer / Card 以 to_dict 輸出"""
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":"), default=_encode).encode("utf-8")
+
+
+def offers_json(offers: Iterable[Offer]) -> bytes:
+    """優惠列表 -> JSON bytes"""
+    return to_json(list(offers))
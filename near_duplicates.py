@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+"""
+近似重複優惠分群
+同一優惠常以略有差異的標題出現在多個分類 (例如聯邦銀行的「Agoda」與
+「AgodaAgoda訂房刷聯邦卡…2026/04/01-2026/12/31」)，精確比對無法去除。
+
+流程:
+1. 標題正規化 (NFKC、小寫、去除【中信卡】標籤、日期區間、「｜…優惠活動」網站後綴與標點)
+2. 去除銀行名稱後，以字元二字組 (shingle) 計算 MinHash 簽章
+3. LSH 分段 (band) 分桶，另以正規化標題的前綴分桶以找出「短標題被長標題包含」的情形；
+   只比較同桶的候選對，整體為次平方複雜度
+4. 以實際的 Jaccard / 前綴 / 包含率驗證候選對後合併成群
+
+每群以資訊最完整 (正規化標題最長) 的優惠作為代表，offers.cluster_id 寫入代表的 id。
+只合併同一銀行的優惠：不同銀行的同一商家優惠適用的卡片不同，對使用者而言並非重複。
+"""
+
+import hashlib
+import re
+import unicodedata
+from typing import Dict, Iterable, List, Set, Tuple
+
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+PREFIX_LEN = 4
+JACCARD_THRESHOLD = 0.85
+CONTAINMENT_THRESHOLD = 0.9
+MIN_SHINGLES = 4
+
+_MERSENNE = (1 << 61) - 1
+# 固定的亂數參數，讓每次執行的簽章一致
+_PERMUTATIONS = [
+    (int.from_bytes(hashlib.sha1(f"a{i}".encode()).digest()[:8], "big") % _MERSENNE | 1,
+     int.from_bytes(hashlib.sha1(f"b{i}".encode()).digest()[:8], "big") % _MERSENNE)
+    for i in range(NUM_PERM)
+]
+
+# 幾乎每個標題都有的銀行名稱，計算相似度前移除以免拉高分數
+BANK_TOKENS = ["中國信託", "中信", "國泰世華", "國泰", "聯邦", "玉山"]
+
+_TAG_RE = re.compile(r"[【\[<][^】\]>]{0,12}[】\]>]")
+_DATE_RANGE_RE = re.compile(r"\d{2,4}/\d{1,2}/\d{1,2}(\s*[-~]\s*\d{2,4}/\d{1,2}/\d{1,2})?")
+_SITE_SUFFIX_RE = re.compile(r"[|｜][^|｜]*優惠活動$")
+_NON_WORD_RE = re.compile(r"[\W_]+")
+
+
+def normalize_title(title: str) -> str:
+    """NFKC、小寫，去除【中信卡】等標籤、日期區間、「｜…優惠活動」網站後綴與標點"""
+    text = unicodedata.normalize("NFKC", title or "").lower()
+    text = _SITE_SUFFIX_RE.sub("", text)
+    text = _TAG_RE.sub("", text)
+    text = _DATE_RANGE_RE.sub("", text)
+    return _NON_WORD_RE.sub("", text)
+
+
+def strip_bank_tokens(text: str) -> str:
+    for token in BANK_TOKENS:
+        text = text.replace(token, "")
+    return text
+
+
+def shingles(text: str, k: int = 2) -> Set[str]:
+    if len(text) <= k:
+        return {text} if text else set()
+    return {text[i:i + k] for i in range(len(text) - k + 1)}
+
+
+def minhash(items: Iterable[str]) -> Tuple[int, ...]:
+    hashes = [int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "big") for s in items]
+    if not hashes:
+        return tuple([_MERSENNE] * NUM_PERM)
+    return tuple(min((a * h + b) % _MERSENNE for h in hashes) for a, b in _PERMUTATIONS)
+
+
+def jaccard(a: Set[str], b: Set[str]) -> float:
+    return len(a & b) / len(a | b) if a and b else 0.0
+
+
+def containment(short: Set[str], long: Set[str]) -> float:
+    """short 的 shingle 有多少比例出現在 long 中"""
+    return len(short & long) / len(short) if short else 0.0
+
+
+def cluster(offers: List[Dict]) -> Dict[int, int]:
+    """
+    offers 每筆需含 id、bank、title，回傳 offer id -> 代表優惠 id。
+
+    1. 同桶且 Jaccard >= JACCARD_THRESHOLD 的優惠以 union-find 合併 (對稱關係)
+    2. 仍單獨成群的短標題，若是另一個較長標題的前綴 (或 shingle 幾乎都包含在其中)，
+       只併入最相符的那一群；短標題不會成為其他優惠的合併目標，避免「台灣虎航」把多個不同活動串成一群
+    """
+    normalized = {o["id"]: normalize_title(o["title"]) for o in offers}
+    sets = {oid: shingles(strip_bank_tokens(text)) for oid, text in normalized.items()}
+    bank_of = {o["id"]: o["bank"] for o in offers}
+
+    buckets: Dict[tuple, List[int]] = {}
+    for oid, items in sets.items():
+        if items:
+            signature = minhash(items)
+            for band in range(BANDS):
+                buckets.setdefault(("band", bank_of[oid], band, signature[band * ROWS:(band + 1) * ROWS]), []).append(oid)
+        if len(normalized[oid]) >= PREFIX_LEN:
+            buckets.setdefault(("prefix", bank_of[oid], normalized[oid][:PREFIX_LEN]), []).append(oid)
+
+    candidates: Set[Tuple[int, int]] = set()
+    for members in buckets.values():
+        for i, a in enumerate(members):
+            for b in members[i + 1:]:
+                candidates.add((a, b) if a < b else (b, a))
+
+    parent = {o["id"]: o["id"] for o in offers}
+
+    def find(x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    for a, b in candidates:
+        if jaccard(sets[a], sets[b]) >= JACCARD_THRESHOLD:
+            parent[find(a)] = find(b)
+
+    sizes: Dict[int, int] = {}
+    for oid in parent:
+        sizes[find(oid)] = sizes.get(find(oid), 0) + 1
+
+    best: Dict[int, Tuple[float, int, int]] = {}
+    for a, b in candidates:
+        short, long = (a, b) if len(normalized[a]) < len(normalized[b]) else (b, a)
+        if len(normalized[short]) == len(normalized[long]) or sizes[find(short)] > 1:
+            continue
+        if normalized[long].startswith(normalized[short]):
+            score = 1.0
+        elif len(sets[short]) >= MIN_SHINGLES:
+            score = containment(sets[short], sets[long])
+        else:
+            continue
+        if score >= CONTAINMENT_THRESHOLD:
+            match = (score, len(normalized[long]), long)
+            if short not in best or match > best[short]:
+                best[short] = match
+    for short, (_, _, long) in best.items():
+        parent[short] = find(long)
+
+    groups: Dict[int, List[int]] = {}
+    for oid in parent:
+        groups.setdefault(find(oid), []).append(oid)
+
+    assignment = {}
+    for members in groups.values():
+        representative = max(members, key=lambda oid: (len(normalized[oid]), -oid))
+        for oid in members:
+            assignment[oid] = representative
+    return assignment
+
+
+def update_clusters(conn=None) -> Dict:
+    """重新計算所有優惠的 cluster_id，回傳統計"""
+    own_conn = conn is None
+    if own_conn:
+        from database import get_connection
+        conn = get_connection()
+    try:
+        rows = conn.execute("SELECT id, bank, title, cluster_id FROM offers").fetchall()
+        assignment = cluster([{"id": r[0], "bank": r[1], "title": r[2]} for r in rows])
+        changed = [(assignment[r[0]], r[0]) for r in rows if r[3] != assignment[r[0]]]
+        conn.executemany("UPDATE offers SET cluster_id = ? WHERE id = ?", changed)
+        conn.commit()
+    finally:
+        if own_conn:
+            conn.close()
+
+    clusters = len(set(assignment.values()))
+    stats = {"offers": len(assignment), "clusters": clusters, "duplicates": len(assignment) - clusters, "updated": len(changed)}
+    print(f"近似重複分群完成: {stats}")
+    return stats
+
+
+if __name__ == "__main__":
+    update_clusters()
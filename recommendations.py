@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+"""
+卡片 × 優惠適用索引
+cards 資料表是使用者的卡包，但原本沒有任何東西把卡片和 offers 連起來。
+每張卡 (bank + card_name) 適用哪些優惠預先算好存在 card_offers:
+
+- 優惠只適用於同一家銀行的卡
+- 標題指定卡別時 (例如「【中信JCB卡】」、「聯邦Visa御璽卡」、「玉山Unicard」、「CUBE信用卡」)
+  只適用於卡名 / 卡種含有這些字詞的卡；沒有指定卡別的優惠適用於該銀行所有的卡
+- 新優惠在 upsert 時只比對該銀行的卡，新增 / 修改卡片時只比對該銀行的優惠，不必重算所有組合
+
+score 為標題中可換算的回饋比例 (「最高享12%回饋」= 12、「85折」= 15)，指定卡別的優惠略為加分，
+/api/recommendations 依此排序。
+"""
+
+import hashlib
+import json
+import re
+import unicodedata
+from typing import Dict, FrozenSet, List
+
+# 卡別字詞的同義詞 (正規化後比對)
+SYNONYMS = {
+    "萬事達": "mastercard",
+    "mastercard": "mastercard",
+    "master": "mastercard",
+    "美國運通": "amex",
+    "americanexpress": "amex",
+    "銀聯": "unionpay",
+    "國民旅遊": "國旅",
+}
+NETWORKS = ("visa", "jcb", "mastercard", "amex", "unionpay")
+TIERS = ("無限", "世界", "御璽", "晶緻", "白金", "鈦金", "極致", "商務")
+# 只代表「某些卡」而非特定卡別的字詞
+VAGUE = {"指定", "信用", "聯名", "各", "全", "本行", "實體", "數位", "正", "副"}
+
+CARD_SPECIFIC_BONUS = 0.5
+MAX_PERCENT = 50  # 「100% 折抵」這類不代表回饋比例
+
+# 銀行名稱 (或國泰的 CUBE) 後接卡別、以「卡 / card」結尾，例如 中信JCB卡、玉山Unicard、CUBE信用卡
+_BANKS = r"中國信託|中信|國泰世華|國泰|聯邦|玉山|cube"
+_CARD_RE = re.compile(
+    rf"(?P<bank>{_BANKS})\s*"
+    rf"(?P<product>(?:(?!{_BANKS})[a-z0-9一-鿿 ]){{0,10}}?)\s*(?:信用)?(?P<suffix>卡|card)",
+    re.I,
+)
+# 同義詞一次替換 (長的優先)，避免 萬事達 -> mastercard 之後又被 master 再替換一次
+_SYNONYM_RE = re.compile("|".join(sorted(map(re.escape, SYNONYMS), key=len, reverse=True)))
+_PERCENT_RE = re.compile(r"(\d+(?:\.\d+)?)\s*%")
+_DISCOUNT_RE = re.compile(r"(?<![\d.])(\d{1,2})\s*折")
+
+
+def _apply_synonyms(text: str) -> str:
+    return _SYNONYM_RE.sub(lambda m: SYNONYMS[m.group(0)], unicodedata.normalize("NFKC", text or "").lower())
+
+
+def _normalize(text: str) -> str:
+    return re.sub(r"[\s\W_]+", "", _apply_synonyms(text))
+
+
+def _product_tokens(product: str) -> FrozenSet[str]:
+    """卡別字串 -> 必須全部出現在卡名 / 卡種中的字詞 (例如 visa御璽 -> {visa, 御璽})"""
+    rest = _normalize(product)
+    tokens = set()
+    for word in NETWORKS + TIERS:
+        if word in rest:
+            tokens.add(word)
+            rest = rest.replace(word, "")
+    for vague in VAGUE:
+        rest = rest.replace(vague, "")
+    if rest:
+        tokens.add(rest)
+    return frozenset(tokens)
+
+
+def card_scopes(title: str) -> List[FrozenSet[str]]:
+    """
+    標題指定的卡別，每個元素是一組必須同時符合的字詞，符合任一組即適用。
+    空列表代表適用於該銀行所有的卡。
+    """
+    text = unicodedata.normalize("NFKC", title or "")
+    scopes = []
+    for match in _CARD_RE.finditer(text):
+        product = match.group("product")
+        if match.group("bank").lower() == "cube":
+            product = "cube" + product
+        if match.group("suffix").lower() == "card" and product and product.isascii():
+            product += "card"  # 玉山Unicard
+        tokens = _product_tokens(product)
+        if tokens and tokens not in scopes:
+            scopes.append(tokens)
+    return scopes
+
+
+def _contains(card_text: str, token: str) -> bool:
+    if token.isascii() and len(token) <= 2:
+        # 「M卡」這類短代號需為獨立字詞，避免比對到其他英文卡名的一部分
+        return re.search(rf"(?<![a-z0-9]){re.escape(token)}(?![a-z0-9])", card_text) is not None
+    return token in card_text
+
+
+def card_matches(card: Dict, scopes: List[FrozenSet[str]]) -> bool:
+    if not scopes:
+        return True
+    card_text = re.sub(r"[\W_]+", " ", _apply_synonyms(f"{card.get('card_name') or ''} {card.get('card_type') or ''}"))
+    compact = card_text.replace(" ", "")
+    return any(all(_contains(card_text, t) or (len(t) > 2 and t in compact) for t in scope) for scope in scopes)
+
+
+def offer_value(title: str) -> float:
+    """標題中可換算的最高回饋比例 (%)，沒有時為 0"""
+    text = unicodedata.normalize("NFKC", title or "")
+    values = [float(v) for v in _PERCENT_RE.findall(text) if float(v) <= MAX_PERCENT]
+    for n in _DISCOUNT_RE.findall(text):
+        n = int(n)
+        discount = 100 - (n * 10 if n < 10 else n)
+        if 0 < discount <= MAX_PERCENT:
+            values.append(float(discount))
+    return max(values, default=0.0)
+
+
+def card_index_version() -> str:
+    """比對規則的雜湊；改變時 database.init_db() 會重建整個 card_offers"""
+    source = json.dumps([SYNONYMS, NETWORKS, TIERS, sorted(VAGUE), _CARD_RE.pattern, CARD_SPECIFIC_BONUS, MAX_PERCENT],
+                        ensure_ascii=False, sort_keys=True)
+    return hashlib.sha1(source.encode("utf-8")).hexdigest()[:12]
+
+
+def _score(title: str, scopes) -> float:
+    return offer_value(title) + (CARD_SPECIFIC_BONUS if scopes else 0.0)
+
+
+def index_offer_cards(cursor, offer_id: int, bank: str, title: str) -> int:
+    """新優惠寫入該銀行適用卡片的 card_offers (與 upsert 在同一個 transaction 內)，回傳適用的卡片數"""
+    scopes = card_scopes(title)
+    cards = cursor.execute("SELECT id, card_name, card_type FROM cards WHERE bank = ?", (bank,)).fetchall()
+    rows = [(card["id"], offer_id, _score(title, scopes)) for card in cards if card_matches(dict(card), scopes)]
+    cursor.executemany("INSERT OR REPLACE INTO card_offers (card_id, offer_id, score) VALUES (?, ?, ?)", rows)
+    return len(rows)
+
+
+def index_card_offers(cursor, card_id: int) -> int:
+    """重新計算一張卡適用的優惠 (新增或修改卡片時)，回傳適用的優惠數"""
+    cursor.execute("DELETE FROM card_offers WHERE card_id = ?", (card_id,))
+    card = cursor.execute("SELECT id, bank, card_name, card_type FROM cards WHERE id = ?", (card_id,)).fetchone()
+    if card is None:
+        return 0
+    card = dict(card)
+    rows = []
+    for offer_id, title in cursor.execute("SELECT id, title FROM offers WHERE bank = ?", (card["bank"],)).fetchall():
+        scopes = card_scopes(title)
+        if card_matches(card, scopes):
+            rows.append((card_id, offer_id, _score(title, scopes)))
+    cursor.executemany("INSERT INTO card_offers (card_id, offer_id, score) VALUES (?, ?, ?)", rows)
+    return len(rows)
+
+
+def bump_cards_version(cursor):
+    """卡包改變時更新 app_meta.cards_version，後端據此讓推薦結果的快取失效"""
+    row = cursor.execute("SELECT value FROM app_meta WHERE key = 'cards_version'").fetchone()
+    version = int(row[0]) + 1 if row else 1
+    cursor.execute("INSERT OR REPLACE INTO app_meta (key, value) VALUES ('cards_version', ?)", (str(version),))
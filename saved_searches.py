@@ -0,0 +1,257 @@
+# -*- coding: utf-8 -*-
+"""
+儲存的搜尋與新優惠通知 (反向索引 / percolator)
+使用者儲存「星巴克」、「旅遊 + 國泰世華」這類搜尋後，新優惠符合時要收到通知。
+每次爬蟲更新都拿所有搜尋比對所有優惠的成本是 搜尋數 × 優惠數，因此反過來索引搜尋:
+
+- 每個搜尋的詞彼此為 AND，詞可比對標題、銀行、來源分類或標準分類 (與 /api/offers 的 LIKE 相同，為子字串比對)；
+  特店別名會展開 (starbucks 也比對「星巴克」)，另可指定銀行 / 分類條件
+- saved_search_terms 只存每個搜尋的一個「錨點」：選定一個詞，取其 (每個別名的) 第一個二元字組；
+  只有條件沒有詞的搜尋以 bank: / category: 為錨點，什麼都沒指定的搜尋錨點為 *
+- upsert_bank_offers 新增的優惠在同一個 transaction 內取出標題等欄位的所有一元 / 二元字組，
+  以索引找出錨點相符的候選搜尋後才逐一完整比對，符合的寫入 notification_outbox
+
+通知由 deliver_notifications() 送出 (本機 JSONL 檔案，搜尋有設定 webhook_url 時另以 POST 送出)，
+失敗的通知保留在 outbox 中，下次再重試，最多 MAX_DELIVERY_ATTEMPTS 次。
+只通知儲存搜尋之後才新增的優惠。
+"""
+
+import hashlib
+import json
+import os
+import re
+import unicodedata
+import urllib.request
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional, Set
+
+from merchants import MERCHANTS, merchant_key, resolve_merchant_key
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+NOTIFICATIONS_FILE = os.environ.get("NOTIFICATIONS_FILE", os.path.join(PROJECT_DIR, "notifications.jsonl"))
+WEBHOOK_TIMEOUT = 10
+MAX_DELIVERY_ATTEMPTS = 5
+ANCHOR_SIZE = 2  # 錨點字組長度 (中文詞多為 2 字以上)
+_TERM_SPLIT_RE = re.compile(r"[\s+＋,，、&＆]+")
+_LOOKUP_BATCH = 500
+
+
+def parse_query(query: str) -> List[str]:
+    """「旅遊 + 國泰世華」-> ["旅遊", "國泰世華"] (正規化後的詞，去除重複)"""
+    terms = []
+    for part in _TERM_SPLIT_RE.split(unicodedata.normalize("NFKC", query or "")):
+        key = merchant_key(part)
+        if key and key not in terms:
+            terms.append(key)
+    return terms
+
+
+def _build_alias_keys():
+    groups = {}
+    for canonical, names in MERCHANTS.items():
+        keys = frozenset(merchant_key(alias) for alias in [canonical] + names)
+        groups[merchant_key(canonical)] = keys - {""}
+    return groups
+
+
+_ALIAS_KEYS = _build_alias_keys()
+
+
+def term_alternatives(term: str) -> Set[str]:
+    """詞的所有寫法：特店別名會展開為同一特店的所有別名，其他詞只有自己"""
+    return set(_ALIAS_KEYS.get(resolve_merchant_key(term), ())) | {term}
+
+
+def _anchor(text: str) -> str:
+    return text[:ANCHOR_SIZE]
+
+
+def search_anchors(terms: List[str], bank: Optional[str] = None, category: Optional[str] = None) -> Set[str]:
+    """
+    搜尋的錨點：取「最短寫法最長」的詞 (愈長的詞愈少優惠含有其字組)，每個寫法一個錨點。
+    優惠含有任一錨點時才需要完整比對。
+    """
+    if terms:
+        term = max(terms, key=lambda t: (min(len(a) for a in term_alternatives(t)), t))
+        return {_anchor(a) for a in term_alternatives(term)}
+    if bank:
+        return {f"bank:{bank}"}
+    if category:
+        return {f"category:{category}"}
+    return {"*"}
+
+
+def _offer_fields(offer: Dict) -> List[str]:
+    return [merchant_key(offer.get(field) or "") for field in ("title", "bank", "category", "canonical_category")]
+
+
+def offer_grams(offer: Dict) -> Set[str]:
+    """優惠可能命中的所有錨點：各欄位的一元 / 二元字組，加上銀行、分類與 *"""
+    grams = {"*", f"bank:{offer.get('bank')}"}
+    for category in (offer.get("category"), offer.get("canonical_category")):
+        if category:
+            grams.add(f"category:{category}")
+    for text in _offer_fields(offer):
+        for size in range(1, ANCHOR_SIZE + 1):
+            grams.update(text[i:i + size] for i in range(len(text) - size + 1))
+    return grams
+
+
+def search_matches(search: Dict, offer: Dict) -> bool:
+    """完整比對：銀行 / 分類條件相符，且每個詞 (任一寫法) 出現在某個欄位中"""
+    if search.get("bank") and search["bank"] != offer.get("bank"):
+        return False
+    if search.get("category") and search["category"] not in (offer.get("category"), offer.get("canonical_category")):
+        return False
+    fields = _offer_fields(offer)
+    return all(
+        any(alt in field for alt in term_alternatives(term) for field in fields)
+        for term in parse_query(search.get("query"))
+    )
+
+
+def saved_search_index_version() -> str:
+    """錨點規則的雜湊；改變時 database.init_db() 會重建 saved_search_terms"""
+    source = json.dumps([MERCHANTS, ANCHOR_SIZE, _TERM_SPLIT_RE.pattern], ensure_ascii=False, sort_keys=True)
+    return hashlib.sha1(source.encode("utf-8")).hexdigest()[:12]
+
+
+def index_saved_search(cursor, search_id: int, query: str, bank: Optional[str] = None,
+                       category: Optional[str] = None):
+    """寫入 (或重寫) 一個搜尋的錨點"""
+    cursor.execute("DELETE FROM saved_search_terms WHERE search_id = ?", (search_id,))
+    cursor.executemany(
+        "INSERT OR IGNORE INTO saved_search_terms (gram, search_id) VALUES (?, ?)",
+        [(gram, search_id) for gram in search_anchors(parse_query(query), bank, category)],
+    )
+
+
+def percolate_offers(cursor, offers: List[Dict], now: str) -> int:
+    """
+    新增的優惠 (需含 id, bank, category, canonical_category, title, url) 比對儲存的搜尋，
+    符合的寫入 notification_outbox (與 upsert 在同一個 transaction 內)。回傳寫入的通知數。
+    """
+    if not offers:
+        return 0
+    grams_by_offer = [(offer, offer_grams(offer)) for offer in offers]
+    all_grams = list(set().union(*(grams for _, grams in grams_by_offer)))
+    searches_by_gram: Dict[str, List[int]] = {}
+    for i in range(0, len(all_grams), _LOOKUP_BATCH):
+        batch = all_grams[i:i + _LOOKUP_BATCH]
+        placeholders = ",".join("?" for _ in batch)
+        for gram, search_id in cursor.execute(
+            f"SELECT gram, search_id FROM saved_search_terms WHERE gram IN ({placeholders})", batch
+        ).fetchall():
+            searches_by_gram.setdefault(gram, []).append(search_id)
+    if not searches_by_gram:
+        return 0
+
+    candidate_ids = sorted({sid for ids in searches_by_gram.values() for sid in ids})
+    placeholders = ",".join("?" for _ in candidate_ids)
+    searches = {
+        row["id"]: dict(row) for row in cursor.execute(
+            f"SELECT id, name, query, bank, category FROM saved_searches WHERE id IN ({placeholders})", candidate_ids
+        ).fetchall()
+    }
+    written = 0
+    for offer, grams in grams_by_offer:
+        candidates = {sid for gram in grams for sid in searches_by_gram.get(gram, ())}
+        for search_id in sorted(candidates):
+            search = searches.get(search_id)
+            if search is None or not search_matches(search, offer):
+                continue
+            payload = {
+                "search": {"id": search_id, "name": search["name"], "query": search["query"]},
+                "offer": {k: offer.get(k) for k in ("id", "bank", "category", "title", "url")},
+            }
+            cursor.execute("""
+                INSERT OR IGNORE INTO notification_outbox (search_id, offer_id, payload, created_at)
+                VALUES (?, ?, ?, ?)
+            """, (search_id, offer["id"], json.dumps(payload, ensure_ascii=False), now))
+            written += cursor.rowcount
+    return written
+
+
+# ============================================================
+# 通知傳送
+# ============================================================
+
+def file_sink(path: str = NOTIFICATIONS_FILE) -> Callable[[Dict], None]:
+    """每則通知附加一行 JSON 到本機檔案"""
+    def send(notification: Dict):
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(notification["payload"], ensure_ascii=False) + "\n")
+    return send
+
+
+def webhook_sink(notification: Dict):
+    """搜尋有設定 webhook_url 時以 POST 送出 JSON"""
+    url = notification.get("webhook_url")
+    if not url:
+        return
+    request = urllib.request.Request(
+        url, data=json.dumps(notification["payload"], ensure_ascii=False).encode("utf-8"),
+        headers={"Content-Type": "application/json"}, method="POST",
+    )
+    with urllib.request.urlopen(request, timeout=WEBHOOK_TIMEOUT) as response:
+        response.read()
+
+
+def deliver_notifications(sinks: Optional[Iterable[Callable[[Dict], None]]] = None,
+                          limit: Optional[int] = None) -> Dict:
+    """
+    送出 outbox 中尚未送出的通知，任一 sink 失敗時保留在 outbox 中，下次再重試。
+    回傳統計 {"pending", "delivered", "failed"}。
+    """
+    from database import get_pending_notifications, mark_notifications
+
+    sinks = list(sinks) if sinks is not None else [file_sink(), webhook_sink]
+    pending = get_pending_notifications(MAX_DELIVERY_ATTEMPTS, limit)
+    results = []
+    for notification in pending:
+        error = None
+        for sink in sinks:
+            try:
+                sink(notification)
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+                break
+        results.append({"id": notification["id"], "error": error})
+    mark_notifications(results, datetime.now().isoformat())
+
+    stats = {
+        "pending": len(pending),
+        "delivered": sum(1 for r in results if r["error"] is None),
+        "failed": sum(1 for r in results if r["error"] is not None),
+    }
+    print(f"通知傳送完成: {stats}")
+    return stats
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="管理儲存的搜尋並送出新優惠通知")
+    sub = parser.add_subparsers(dest="command", required=True)
+    add = sub.add_parser("add", help="儲存搜尋 (詞以空白或 + 分隔，彼此為 AND)")
+    add.add_argument("query")
+    add.add_argument("--name")
+    add.add_argument("--bank")
+    add.add_argument("--category")
+    add.add_argument("--webhook-url")
+    sub.add_parser("list", help="列出儲存的搜尋")
+    remove = sub.add_parser("remove", help="刪除儲存的搜尋")
+    remove.add_argument("search_id", type=int)
+    deliver = sub.add_parser("deliver", help="送出尚未送出的通知")
+    deliver.add_argument("--limit", type=int)
+    args = parser.parse_args()
+
+    import database
+    if args.command == "add":
+        print(database.add_saved_search(args.query, args.name, args.bank, args.category, args.webhook_url))
+    elif args.command == "list":
+        for search in database.get_saved_searches():
+            print(search)
+    elif args.command == "remove":
+        print(database.delete_saved_search(args.search_id))
+    else:
+        deliver_notifications(limit=args.limit)
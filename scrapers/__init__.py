@@ -1,9 +1,14 @@
 # -*- coding: utf-8 -*-
 """
 爬蟲模組統一介面
+各銀行的網址、選擇器、分頁策略與並行數都宣告在各自模組的 CONFIG 中，
+新增銀行只需新增模組並加入 SCRAPER_CLASSES。
 """
 
-from .base import BaseScraper
+from urllib.parse import urlsplit
+
+from .base import BaseScraper, PageBatch
+from .resilience import CircuitOpenError, DatabaseStateStore, MemoryStateStore
 from .ctbc import CTBCScraper
 from .cathay import CathayScraper
 from .ubot import UBotScraper
@@ -11,34 +16,45 @@ from .esun import ESUNScraper
 
 __all__ = [
     "BaseScraper",
+    "PageBatch",
+    "CircuitOpenError",
+    "DatabaseStateStore",
+    "MemoryStateStore",
     "CTBCScraper",
     "CathayScraper",
     "UBotScraper",
     "ESUNScraper",
 ]
 
-# 可用的爬蟲列表
-AVAILABLE_SCRAPERS = {
-    "ctbc": CTBCScraper,
-    "cathay": CathayScraper,
-    "ubot": UBotScraper,
-    "esun": ESUNScraper,
-}
+# 依執行順序排列的爬蟲類別
+SCRAPER_CLASSES = [
+    CTBCScraper,
+    CathayScraper,
+    UBotScraper,
+    ESUNScraper,
+]
+
+# 可用的爬蟲列表 (銀行代碼 -> 爬蟲類別)
+AVAILABLE_SCRAPERS = {cls.config["code"]: cls for cls in SCRAPER_CLASSES}
 
 
-def get_all_scrapers():
-    """取得所有爬蟲實例"""
-    return [
-        CTBCScraper(),
-        CathayScraper(),
-        UBotScraper(),
-        ESUNScraper(),
-    ]
+def get_all_scrapers(state_store=None):
+    """取得所有爬蟲實例 (state_store 為檢查點與斷路器狀態的保存位置，預設只存在記憶體中)"""
+    return [scraper_class(state_store=state_store) for scraper_class in AVAILABLE_SCRAPERS.values()]
 
 
-def get_scraper(bank_code: str) -> BaseScraper:
+def get_scraper(bank_code: str, state_store=None) -> BaseScraper:
     """根據銀行代碼取得爬蟲實例"""
     scraper_class = AVAILABLE_SCRAPERS.get(bank_code.lower())
     if scraper_class:
-        return scraper_class()
+        return scraper_class(state_store=state_store)
     raise ValueError(f"Unknown bank code: {bank_code}")
+
+
+def image_referer(url: str) -> str:
+    """圖片網址對應的 Referer (依各銀行 CONFIG 的 image_hosts)，不屬於任何銀行時回傳空字串"""
+    host = (urlsplit(url).hostname or "").lower()
+    for scraper_class in SCRAPER_CLASSES:
+        if any(host == h or host.endswith("." + h) for h in scraper_class.config.get("image_hosts", ())):
+            return scraper_class.config["image_referer"]
+    return ""
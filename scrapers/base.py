@@ -1,55 +1,406 @@
 # -*- coding: utf-8 -*-
 """
 爬蟲基礎類別
-定義統一介面供各銀行模組繼承
+各銀行模組只需提供宣告式設定 (CONFIG)，分頁、提取與並行邏輯統一由此處執行
+
+CONFIG 欄位:
+    code            銀行代碼 (AVAILABLE_SCRAPERS 的鍵)
+    bank_name       銀行名稱
+    image_hosts     (選填) 優惠圖片所在的網域 (含子網域)，圖片代理與圖片檢查據此帶上 image_referer
+    image_referer   (選填) 下載上述網域的圖片時使用的 Referer (繞過防盜連)
+    categories      [{"name": 分類名稱, "url": 網址}, ...]
+    extract_script  在頁面 (或 iframe) 內執行、回傳 [{title, url, image}] 的 JavaScript
+    goto            page.goto 參數，例如 {"wait_until": "networkidle", "timeout": 60000}
+    settle_ms       載入後等待畫面渲染的毫秒數
+    frame_selector  (選填) 內容位於 iframe 時的選擇器
+    extract_main_document  (選填) 使用 iframe 時是否先在主文檔提取一次
+    pagination      分頁策略設定，strategy 可為:
+                    "single"      單頁，只提取一次
+                    "next_button" 反覆點擊「下一頁」按鈕
+                    "numbered"    依頁碼按鈕逐頁點擊
+                    "load_more"   反覆點擊「展開更多」後一次提取
+    concurrency     同時爬取的分類數 (每個分類使用獨立分頁)
+    retry           (選填) 覆寫 resilience.DEFAULT_RETRY 的重試次數與退避時間
+
+分頁完成即保存檢查點、失敗時重試與斷路器見 resilience.py；
+保存位置由建構時注入的 state_store 決定 (預設只存在記憶體中)。
+
+stream() 每完成一個分頁就把新增的優惠以 PageBatch 放入 asyncio.Queue，由寫入端 (bank_offers_scraper)
+逐批寫入資料庫，爬蟲本身不累積整個銀行的優惠；scrape() 則收集全部分頁並合併為列表。
 """
 
-from abc import ABC, abstractmethod
-from typing import List, Dict
-from datetime import datetime
+import asyncio
+from abc import ABC
+from dataclasses import dataclass
+from typing import Iterable, List, Dict, Optional
+
+from models import InvalidOffer, Offer
+
+from .resilience import DEFAULT_RETRY, CircuitBreaker, CircuitOpenError, MemoryStateStore, retry_async
+from .telemetry import telemetry
+
+SCROLL_TO_BOTTOM = "window.scrollTo(0, document.body.scrollHeight)"
+
+DEFAULT_PAGINATION = {
+    "strategy": "single",
+    "max_pages": 1,
+    "scrolls": 1,           # 每頁提取前滾動到底部的次數
+    "scroll_wait_ms": 500,  # 每次滾動後的等待
+    "wait_ms": 2000,        # 換頁後的等待
+}
+
+
+@dataclass(slots=True)
+class PageBatch:
+    """一個分頁新增的優惠；category_order 為分類在 CONFIG 中的順序 (合併時先出現的分類優先)"""
+    bank: str
+    category: str
+    category_order: int
+    page: int
+    offers: List[Offer]
+
+
+class _CategoryOutput:
+    """單一分類的輸出：同分類內以標題去重，每個分頁的新增優惠放入佇列"""
+
+    __slots__ = ("queue", "bank", "category", "order", "titles", "count")
+
+    def __init__(self, queue: asyncio.Queue, bank: str, category: str, order: int):
+        self.queue = queue
+        self.bank = bank
+        self.category = category
+        self.order = order
+        self.titles = set()
+        self.count = 0
+
+    async def emit(self, page: int, offers: List[Offer]):
+        if offers:
+            self.count += len(offers)
+            await self.queue.put(PageBatch(self.bank, self.category, self.order, page, offers))
+
+
+def merge_batches(batches: Iterable[PageBatch]) -> List[Offer]:
+    """依分類順序合併分頁，同一銀行內以標題去重 (先出現的分類優先)"""
+    merged = []
+    seen = set()
+    for batch in sorted(batches, key=lambda b: b.category_order):
+        for offer in batch.offers:
+            key = (offer.bank, offer.title)
+            if key not in seen:
+                seen.add(key)
+                merged.append(offer)
+    return merged
 
 
 class BaseScraper(ABC):
     """銀行爬蟲基礎類別"""
-    
-    def __init__(self, bank_name: str):
-        self.bank_name = bank_name
-        self.offers: List[Dict] = []
-    
-    @abstractmethod
-    async def scrape(self, page) -> List[Dict]:
-        """
-        爬取優惠資料
-        
+
+    config: Dict = {}
+
+    def __init__(self, bank_name: Optional[str] = None, state_store=None):
+        self.bank_name = bank_name or self.config.get("bank_name")
+        self.code = self.config.get("code")
+        self.state_store = state_store or MemoryStateStore()
+        self.breaker = CircuitBreaker(self.bank_name, self.state_store)
+        self._checkpoints: Dict[str, Dict] = {}
+
+    @property
+    def pagination(self) -> Dict:
+        return {**DEFAULT_PAGINATION, **self.config.get("pagination", {})}
+
+    @property
+    def retry(self) -> Dict:
+        return {**DEFAULT_RETRY, **self.config.get("retry", {})}
+
+    async def _retry(self, operation, attempts: int, what: str):
+        cfg = self.retry
+        return await retry_async(operation, attempts, cfg["base_delay"], cfg["max_delay"], what, self.breaker)
+
+    async def scrape(self, context) -> List[Offer]:
+        """
+        爬取優惠資料並合併為列表 (依分類順序、同一銀行內以標題去重)。
+        整批寫入資料庫時改用 stream()，不必在記憶體中保留整個銀行的優惠。
+
         Args:
-            page: Playwright page 物件
-            
+            context: Playwright BrowserContext，每個分類會開啟獨立分頁並依 concurrency 並行
+
         Returns:
-            優惠列表，每筆格式：
-            {
-                "bank": str,      # 銀行名稱
-                "category": str,  # 分類
-                "title": str,     # 優惠標題
-                "url": str        # 連結
-            }
-        """
-        pass
-    
-    def deduplicate(self, offers: List[Dict]) -> List[Dict]:
-        """去除重複優惠"""
-        seen = set()
-        unique = []
-        for o in offers:
-            key = (o["bank"], o["title"], o["url"])
-            if key not in seen:
-                seen.add(key)
-                unique.append(o)
-        return unique
-    
-    def add_metadata(self, offers: List[Dict], category: str = None) -> List[Dict]:
-        """加入銀行名稱與分類"""
-        for o in offers:
-            o["bank"] = self.bank_name
-            if category:
-                o["category"] = category
-        return offers
+            優惠列表 (models.Offer，已設定 bank、category、title、url、image；標題過短等無效資料已略過)
+        """
+        queue = asyncio.Queue()
+        await self.stream(context, queue)
+        return merge_batches(queue.get_nowait() for _ in range(queue.qsize()))
+
+    async def stream(self, context, queue: asyncio.Queue) -> int:
+        """
+        爬取優惠資料，每完成一個分頁就把新增的優惠以 PageBatch 放入 queue
+        (有大小上限的佇列滿了會等待寫入端消化)。
+
+        分類重試或從檢查點續爬時，已放入的分頁會再放入一次，寫入端需以 (分類, 標題) 去重。
+        任一分類失敗時拋出例外：已放入的分頁不完整，寫入端不可據此刪除資料庫中的優惠。
+
+        Returns:
+            放入的優惠筆數 (分類間尚未去重)
+        """
+        print(f"\n{'='*50}")
+        print(f"開始爬取: {self.bank_name}")
+        print("="*50)
+
+        if not self.breaker.allow():
+            raise CircuitOpenError(f"斷路器開啟中，暫停爬取至 {self.breaker.state['opened_until']}")
+
+        categories = self.config.get("categories", [])
+        semaphore = asyncio.Semaphore(max(1, self.config.get("concurrency", 1)))
+        # 檢查點存於資料庫時是同步的 SQLite 讀寫，在執行緒中進行以免阻塞事件迴圈
+        self._checkpoints = await asyncio.to_thread(self.state_store.load_checkpoints, self.bank_name)
+        if self._checkpoints:
+            print(f"  從檢查點續爬 ({len(self._checkpoints)} 個分類已有進度)")
+
+        async def run_category(order, cat):
+            checkpoint = self._checkpoints.get(cat["name"], {})
+            if checkpoint.get("complete"):
+                output = _CategoryOutput(queue, self.bank_name, cat["name"], order)
+                for page_num in sorted(checkpoint["pages"]):
+                    await self._restore_page(output, page_num)
+                print(f"\n  分類: {cat['name']} (沿用檢查點 {output.count} 筆)")
+                return output.count
+
+            async def attempt():
+                if not self.breaker.allow():
+                    raise CircuitOpenError(f"斷路器開啟中，略過分類 {cat['name']}")
+                async with semaphore:
+                    page = await context.new_page()
+                    try:
+                        return await self.scrape_category(page, cat, _CategoryOutput(queue, self.bank_name, cat["name"], order))
+                    finally:
+                        await page.close()
+
+            try:
+                count = await self._retry(attempt, self.retry["category_attempts"], f"分類 {cat['name']} ")
+            except CircuitOpenError:
+                raise
+            except Exception as e:
+                self.breaker.record_failure(f"{cat['name']}: {e}")
+                raise
+            self.breaker.record_success()
+            return count
+
+        # 個別分類失敗時仍等待其他分類完成，讓它們的進度寫入檢查點
+        results = await asyncio.gather(*(run_category(order, cat) for order, cat in enumerate(categories)),
+                                       return_exceptions=True)
+        errors = [r for r in results if isinstance(r, BaseException)]
+        if errors:
+            # 不回傳部分結果：資料庫更新會把缺少的優惠視為下架而刪除
+            raise errors[0]
+
+        total = sum(results)
+        print(f"\n  {self.bank_name}總計: {total} 筆")
+        return total
+
+    async def scrape_category(self, page, cat: Dict, output: _CategoryOutput) -> int:
+        """
+        爬取單一分類，每個分頁的新增優惠交給 output 放入佇列，回傳筆數。
+        已有檢查點的分頁直接沿用，不再捲動與提取；
+        錯誤時拋出例外 (由 stream 以退避重試，重試時從檢查點續爬)。
+        """
+        print(f"\n  分類: {cat['name']}...")
+        try:
+            with telemetry.span("category", bank=self.bank_name, category=cat["name"]):
+                goto = {"wait_until": "networkidle", "timeout": 60000, **self.config.get("goto", {})}
+                await self._retry(lambda: page.goto(cat["url"], **goto), self.retry["page_attempts"], "載入頁面")
+                await telemetry.wait(page, self.config.get("settle_ms", 3000))
+
+                target = page
+                frame_selector = self.config.get("frame_selector")
+                if frame_selector:
+                    if self.config.get("extract_main_document"):
+                        # 先在主文檔提取 (例如中信精選優惠頁面的內容在主文檔)
+                        if not await self._restore_page(output, 0):
+                            with telemetry.span("page", page=0) as page_event:
+                                found = await self._retry(lambda: self.extract(page), self.retry["page_attempts"], "提取主文檔")
+                                added = self._collect(output, found)
+                                page_event["offers"] = len(added)
+                                await self._save_page(output, 0, added)
+                                if added:
+                                    print(f"    從主文檔找到 {len(added)} 筆")
+                    target = await self._find_frame(page, frame_selector)
+                    if target is None:
+                        print(f"    累計: {output.count} 筆")
+                        await asyncio.to_thread(self.state_store.complete_category, self.bank_name, cat["name"])
+                        return output.count
+                    await telemetry.wait(page, 2000)
+
+                strategy = self.pagination["strategy"]
+                paginate = getattr(self, f"_paginate_{strategy}", None)
+                if paginate is None:
+                    raise ValueError(f"未知的分頁策略: {strategy}")
+                await paginate(page, target, output)
+                await asyncio.to_thread(self.state_store.complete_category, self.bank_name, cat["name"])
+
+            print(f"    累計: {output.count} 筆")
+        except Exception as e:
+            print(f"    錯誤: {e} (已完成的分頁保存在檢查點)")
+            raise
+        return output.count
+
+    async def extract(self, target) -> List[Dict]:
+        """在頁面或 iframe 內執行提取腳本"""
+        with telemetry.span("extract"):
+            return await target.evaluate(self.config["extract_script"]) or []
+
+    # ------------------------------------------------------------
+    # 分頁策略
+    # ------------------------------------------------------------
+
+    async def _scroll(self, page, target, times: int, wait_ms: int):
+        for _ in range(times):
+            await target.evaluate(SCROLL_TO_BOTTOM)
+            await telemetry.wait(page, wait_ms)
+
+    async def _extract_page(self, page, target, output: _CategoryOutput, page_num: int):
+        """滾動、提取並記錄單一分頁 (失敗時重試)，完成後保存檢查點並放入佇列；已有檢查點時直接沿用"""
+        if await self._restore_page(output, page_num):
+            return
+        cfg = self.pagination
+
+        async def scroll_and_extract():
+            await self._scroll(page, target, cfg["scrolls"], cfg["scroll_wait_ms"])
+            return await self.extract(target)
+
+        with telemetry.span("page", page=page_num) as page_event:
+            found = await self._retry(scroll_and_extract, self.retry["page_attempts"], f"第 {page_num} 頁")
+            added = self._collect(output, found)
+            page_event["offers"] = len(added)
+        await self._save_page(output, page_num, added)
+
+    async def _restore_page(self, output: _CategoryOutput, page_num: int) -> bool:
+        """分頁已有檢查點時把保存的優惠放入佇列，回傳是否沿用"""
+        pages = self._checkpoints.get(output.category, {}).get("pages", {})
+        if page_num not in pages:
+            return False
+        await output.emit(page_num, self._collect(output, [dict(o) for o in pages[page_num]]))
+        return True
+
+    async def _save_page(self, output: _CategoryOutput, page_num: int, added: List[Offer]):
+        """保存分頁檢查點後才放入佇列 (重試時已放入的分頁一定能從檢查點還原)"""
+        saved = [o.to_scraped() for o in added]
+        await asyncio.to_thread(self.state_store.save_page, self.bank_name, output.category, page_num, saved)
+        self._checkpoints.setdefault(output.category, {"pages": {}, "complete": False})["pages"][page_num] = saved
+        await output.emit(page_num, added)
+
+    async def _paginate_single(self, page, target, output: _CategoryOutput):
+        await self._extract_page(page, target, output, 1)
+
+    async def _paginate_next_button(self, page, target, output: _CategoryOutput):
+        cfg = self.pagination
+        page_num = 1
+        while True:
+            if cfg.get("log_pages"):
+                print(f"  正在處理第 {page_num} 頁...")
+            await self._extract_page(page, target, output, page_num)
+
+            if page_num >= cfg["max_pages"]:
+                break
+            next_btn = await target.query_selector(cfg["next_selector"])
+            if not next_btn:
+                break
+            if cfg.get("scroll_into_view"):
+                # 確保按鈕在視圖中
+                await next_btn.scroll_into_view_if_needed()
+                await telemetry.wait(page, 500)
+            if await next_btn.evaluate(cfg["disabled_check"]):
+                break
+
+            async def click_next():
+                if cfg.get("click_via_js"):
+                    # 使用 evaluate 進行點擊以繞過可視性檢查
+                    await next_btn.evaluate("el => el.click()")
+                else:
+                    await next_btn.click()
+
+            # 換頁失敗會拋出例外，由分類層級重試並從檢查點續爬，不再把之後的分頁當作不存在
+            await self._retry(click_next, self.retry["page_attempts"], "點擊下一頁")
+            await telemetry.wait(page, cfg["wait_ms"])
+            page_num += 1
+
+    async def _paginate_numbered(self, page, target, output: _CategoryOutput):
+        cfg = self.pagination
+        page_numbers = await target.evaluate(cfg["pages_script"])
+        total_pages = min(len(page_numbers) if page_numbers else 1, cfg["max_pages"])
+        print(f"    共 {total_pages} 頁")
+
+        # 續爬時直接點擊第一個沒有檢查點的頁碼，已完成的分頁只還原保存的優惠
+        for p in range(1, total_pages + 1):
+            if await self._restore_page(output, p):
+                continue
+            if p > 1:
+                # 點擊頁碼
+                page_btn = await target.query_selector(cfg["page_selector"].format(page=p))
+                if page_btn:
+                    await self._retry(page_btn.click, self.retry["page_attempts"], f"點擊第 {p} 頁")
+                    await telemetry.wait(page, cfg["wait_ms"])
+            await self._extract_page(page, target, output, p)
+
+    async def _paginate_load_more(self, page, target, output: _CategoryOutput):
+        # 展開後的整份列表視為單一分頁，已有檢查點時不必再逐次展開
+        if await self._restore_page(output, 1):
+            return
+        cfg = self.pagination
+        count_script = f"document.querySelectorAll('{cfg['count_selector']}').length" if cfg.get("count_selector") else None
+
+        # 先滾動幾次觸發內容載入
+        await self._scroll(page, target, cfg.get("initial_scrolls", 0), cfg.get("initial_scroll_wait_ms", 1000))
+        if count_script:
+            print(f"  初始載入: {await target.evaluate(count_script)} 筆")
+
+        # 持續點擊「展開更多」直到沒有更多
+        for i in range(cfg["max_clicks"]):
+            await target.evaluate(SCROLL_TO_BOTTOM)
+            await telemetry.wait(page, cfg.get("click_scroll_wait_ms", 800))
+
+            load_more = None
+            for selector in cfg["load_more_selectors"]:
+                load_more = await target.query_selector(selector)
+                if load_more:
+                    break
+            if not load_more or not await load_more.is_visible():
+                print(f"  已展開全部內容 (點擊 {i} 次)")
+                break
+
+            try:
+                await load_more.click()
+                await telemetry.wait(page, cfg["wait_ms"])
+                if count_script and (i + 1) % 5 == 0:
+                    print(f"  點擊展開更多... ({i + 1}) - 目前 {await target.evaluate(count_script)} 筆")
+            except Exception as click_err:
+                print(f"  點擊失敗: {click_err}")
+                break
+
+        # 展開後的整份列表視為單一分頁
+        await self._extract_page(page, target, output, 1)
+
+    # ------------------------------------------------------------
+    # 工具
+    # ------------------------------------------------------------
+
+    async def _find_frame(self, page, selector: str):
+        element = await page.query_selector(selector)
+        if not element:
+            return None
+        return await element.content_frame()
+
+    def _collect(self, output: _CategoryOutput, found: List[Dict]) -> List[Offer]:
+        """
+        將新提取的資料驗證為 Offer，回傳同分類內尚未出現過的標題。
+        標題過短等無效資料在此略過，之後的資料庫與 API 不必再檢查。
+        """
+        added = []
+        for raw in found:
+            try:
+                offer = Offer.from_scraped(raw, self.bank_name, output.category)
+            except InvalidOffer:
+                continue
+            if offer.title not in output.titles:
+                output.titles.add(offer.title)
+                added.append(offer)
+        return added
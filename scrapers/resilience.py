@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+"""
+爬蟲容錯機制
+- 重試：分頁與分類層級的指數退避重試 (含隨機抖動)，每次重試計入遙測的 retries
+- 檢查點：每完成一頁就保存該頁新增的優惠；重新執行時已完成的分頁不再提取，已完成的分類直接沿用
+- 斷路器：同一銀行連續失敗達門檻後暫停爬取一段時間 (冷卻時間隨連續跳脫次數加倍)，
+  狀態會保存下來，下一次排程執行也不會立刻再打擾故障中的銀行網站
+
+狀態的保存位置由 store 決定：MemoryStateStore 只存在記憶體中 (單次執行內有效)，
+DatabaseStateStore 寫入 SQLite 的 scrape_checkpoints / circuit_breakers 資料表。
+"""
+
+import asyncio
+import random
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from .telemetry import telemetry
+
+DEFAULT_RETRY = {
+    "page_attempts": 3,       # 單一分頁 (捲動 / 提取 / 換頁) 的嘗試次數
+    "category_attempts": 2,   # 整個分類 (重新開啟分頁並從檢查點續爬) 的嘗試次數
+    "base_delay": 2.0,        # 第一次重試前的等待秒數，之後每次加倍
+    "max_delay": 30.0,
+}
+
+FAILURE_THRESHOLD = 3                 # 連續失敗幾次後跳脫
+BASE_COOLDOWN = timedelta(hours=1)    # 第一次跳脫的冷卻時間
+MAX_COOLDOWN = timedelta(hours=24)
+CHECKPOINT_MAX_AGE = timedelta(hours=12)  # 超過此時間的檢查點視為過期，從頭爬取
+
+
+class CircuitOpenError(Exception):
+    """斷路器開啟中，暫停爬取該銀行"""
+
+
+def backoff_delay(attempt: int, base_delay: float, max_delay: float) -> float:
+    """第 attempt 次失敗後的等待秒數 (指數成長，取 50%~100% 的隨機值避免同時重試)"""
+    return min(max_delay, base_delay * (2 ** (attempt - 1))) * random.uniform(0.5, 1.0)
+
+
+async def retry_async(
+    operation: Callable[[], Awaitable],
+    attempts: int,
+    base_delay: float,
+    max_delay: float,
+    what: str,
+    breaker: Optional["CircuitBreaker"] = None,
+):
+    """
+    執行 operation，失敗時以指數退避重試，全部失敗則拋出最後一次的例外。
+    斷路器已開啟時不再重試。
+    """
+    for attempt in range(1, attempts + 1):
+        try:
+            return await operation()
+        except CircuitOpenError:
+            raise
+        except Exception as e:
+            if attempt >= attempts or (breaker is not None and not breaker.allow()):
+                raise
+            delay = backoff_delay(attempt, base_delay, max_delay)
+            print(f"    {what}失敗 (第 {attempt} 次): {e}，{delay:.1f} 秒後重試")
+            telemetry.count_retry()
+            telemetry.emit("retry", target=what, attempt=attempt, delay_seconds=round(delay, 2), error=str(e))
+            await asyncio.sleep(delay)
+
+
+# ============================================================
+# 狀態保存
+# ============================================================
+
+class MemoryStateStore:
+    """
+    檢查點與斷路器狀態的保存介面 (記憶體版本)。
+    檢查點格式: {分類名稱: {"pages": {頁碼: [該頁新增的優惠]}, "complete": bool}}
+    """
+
+    def __init__(self):
+        self._checkpoints: Dict[str, Dict[str, Dict]] = {}
+        self._breakers: Dict[str, Dict] = {}
+
+    def load_checkpoints(self, bank: str) -> Dict[str, Dict]:
+        return {
+            category: {"pages": dict(state["pages"]), "complete": state["complete"]}
+            for category, state in self._checkpoints.get(bank, {}).items()
+        }
+
+    def save_page(self, bank: str, category: str, page: int, offers: List[Dict]):
+        state = self._checkpoints.setdefault(bank, {}).setdefault(category, {"pages": {}, "complete": False})
+        state["pages"][page] = [dict(o) for o in offers]
+
+    def complete_category(self, bank: str, category: str):
+        self._checkpoints.setdefault(bank, {}).setdefault(category, {"pages": {}, "complete": False})["complete"] = True
+
+    def clear_checkpoints(self, bank: str):
+        self._checkpoints.pop(bank, None)
+
+    def load_breaker(self, bank: str) -> Dict:
+        return dict(self._breakers.get(bank, {}))
+
+    def save_breaker(self, bank: str, state: Dict):
+        self._breakers[bank] = dict(state)
+
+
+class DatabaseStateStore:
+    """保存於 SQLite (database.py) 的檢查點與斷路器狀態，重新執行時可續爬"""
+
+    def __init__(self, max_age: timedelta = CHECKPOINT_MAX_AGE):
+        self.max_age = max_age
+
+    def load_checkpoints(self, bank: str) -> Dict[str, Dict]:
+        from database import load_scrape_checkpoints
+        return load_scrape_checkpoints(bank, (datetime.now() - self.max_age).isoformat())
+
+    def save_page(self, bank: str, category: str, page: int, offers: List[Dict]):
+        from database import save_scrape_checkpoint
+        save_scrape_checkpoint(bank, category, page, offers)
+
+    def complete_category(self, bank: str, category: str):
+        from database import complete_scrape_checkpoint
+        complete_scrape_checkpoint(bank, category)
+
+    def clear_checkpoints(self, bank: str):
+        from database import clear_scrape_checkpoints
+        clear_scrape_checkpoints(bank)
+
+    def load_breaker(self, bank: str) -> Dict:
+        from database import get_circuit_breaker
+        return get_circuit_breaker(bank)
+
+    def save_breaker(self, bank: str, state: Dict):
+        from database import save_circuit_breaker
+        save_circuit_breaker(bank, state)
+
+
+# ============================================================
+# 斷路器
+# ============================================================
+
+class CircuitBreaker:
+    """
+    單一銀行的斷路器。
+    closed → 連續失敗 FAILURE_THRESHOLD 次 → open (冷卻期間拒絕所有請求)
+    → 冷卻結束後 half-open：放行嘗試，成功則關閉，失敗則以加倍的冷卻時間再次開啟。
+    """
+
+    def __init__(self, bank: str, store, threshold: int = FAILURE_THRESHOLD,
+                 base_cooldown: timedelta = BASE_COOLDOWN, max_cooldown: timedelta = MAX_COOLDOWN):
+        self.bank = bank
+        self.store = store
+        self.threshold = threshold
+        self.base_cooldown = base_cooldown
+        self.max_cooldown = max_cooldown
+        self._state: Optional[Dict] = None
+
+    @property
+    def state(self) -> Dict:
+        # 第一次使用時才讀取 (建立爬蟲實例時資料表可能尚未初始化)
+        if self._state is None:
+            self._state = {"failures": 0, "trips": 0, "opened_until": None, "last_error": None,
+                           **self.store.load_breaker(self.bank)}
+        return self._state
+
+    @property
+    def opened_until(self) -> Optional[datetime]:
+        value = self.state.get("opened_until")
+        return datetime.fromisoformat(value) if value else None
+
+    def allow(self) -> bool:
+        opened_until = self.opened_until
+        return opened_until is None or datetime.now() >= opened_until
+
+    def record_success(self):
+        if self.state["failures"] or self.state["trips"] or self.state["opened_until"]:
+            self.state.update({"failures": 0, "trips": 0, "opened_until": None, "last_error": None})
+            self.store.save_breaker(self.bank, self.state)
+
+    def record_failure(self, error: str):
+        if not self.allow():
+            # 已跳脫 (例如並行中的其他分類稍後才失敗)，不重複延長冷卻時間
+            return
+        self.state["failures"] += 1
+        self.state["last_error"] = error
+        half_open = self.state["trips"] > 0
+        if self.state["failures"] >= self.threshold or half_open:
+            cooldown = min(self.max_cooldown, self.base_cooldown * (2 ** self.state["trips"]))
+            self.state["trips"] += 1
+            self.state["failures"] = 0
+            self.state["opened_until"] = (datetime.now() + cooldown).isoformat(timespec="seconds")
+            print(f"[{self.bank}] 連續失敗，暫停爬取至 {self.state['opened_until']}")
+            telemetry.emit("circuit_open", bank=self.bank, opened_until=self.state["opened_until"], error=error)
+        self.store.save_breaker(self.bank, self.state)
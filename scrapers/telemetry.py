@@ -0,0 +1,262 @@
+# -*- coding: utf-8 -*-
+"""
+爬蟲結構化遙測
+每個階段 (銀行、分類、分頁、提取腳本、等待、資料庫更新) 都會輸出一筆
+含耗時的 JSON Lines 事件，並彙整成整次執行的摘要供寫入 scrape_runs 資料表。
+事件檔在背景執行緒寫入，超過 SCRAPE_EVENTS_MAX_BYTES 時輪替為 .1 (只保留一份舊檔)。
+"""
+
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Dict, Optional
+
+# 預設事件輸出檔 (可用環境變數 SCRAPE_EVENTS_FILE 覆寫，設為空字串則不寫檔)
+DEFAULT_EVENTS_FILE = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scrape_events.jsonl"
+)
+# 事件檔大小上限 (位元組)，超過時輪替；常駐後端每次更新都會附加事件，不設上限會無限成長
+EVENTS_FILE_MAX_BYTES = int(os.environ.get("SCRAPE_EVENTS_MAX_BYTES", str(5 * 1024 * 1024)))
+
+# 目前所在的銀行 / 分類，透過 contextvars 傳遞給巢狀的 span 與並行的 task
+_current_bank: ContextVar[Optional[str]] = ContextVar("current_bank", default=None)
+_current_category: ContextVar[Optional[str]] = ContextVar("current_category", default=None)
+
+
+def _new_bank_stats() -> Dict:
+    return {
+        "status": "running",
+        "duration_seconds": 0.0,
+        "offers": 0,
+        "pages": 0,
+        "page_offers": [],
+        "categories": 0,
+        "retries": 0,
+        "bytes": 0,
+        "wait_seconds": 0.0,
+        "extract_seconds": 0.0,
+        "upsert_seconds": 0.0,
+    }
+
+
+class BackgroundSink:
+    """在背景執行緒依序呼叫 sink (例如寫入 SQLite)，emit 不必在事件迴圈上等待 I/O"""
+
+    def __init__(self, sink):
+        self.sink = sink
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def __call__(self, record: Dict):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="telemetry-sink", daemon=True)
+                self._thread.start()
+        self._queue.put(record)
+
+    def _run(self):
+        while True:
+            record = self._queue.get()
+            try:
+                self.sink(record)
+            except Exception as e:
+                print(f"遙測事件傳遞失敗: {e}")
+            finally:
+                self._queue.task_done()
+
+    def flush(self):
+        """等待已送出的事件全部寫完"""
+        self._queue.join()
+
+
+class ScrapeTelemetry:
+    """收集爬蟲事件並彙整執行摘要"""
+
+    def __init__(self, events_file: Optional[str] = None):
+        if events_file is None:
+            events_file = os.environ.get("SCRAPE_EVENTS_FILE", DEFAULT_EVENTS_FILE)
+        self.events_file = events_file or None
+        self.max_bytes = EVENTS_FILE_MAX_BYTES
+        self._file_sink = BackgroundSink(self._append_event)
+        self.sinks = []
+        self.reset()
+
+    def reset(self):
+        """開始新的一次執行"""
+        self.run_id = uuid.uuid4().hex[:12]
+        self.started_at = datetime.now()
+        self._start = time.perf_counter()
+        self.banks: Dict[str, Dict] = {}
+        # 事件回呼 (例如 response) 不在 span 的 context 內，另外記錄目前的銀行
+        self._active_bank: Optional[str] = None
+
+    def add_sink(self, sink, background: bool = False):
+        """
+        註冊額外的事件接收者 (callable，參數為事件 dict)；同一個 sink 只註冊一次。
+        background=True 時在背景執行緒呼叫 (會做 I/O 的 sink)，結束前以 flush() 等待寫完。
+        """
+        if any(s is sink or getattr(s, "sink", None) is sink for s in self.sinks):
+            return
+        self.sinks.append(BackgroundSink(sink) if background else sink)
+
+    def flush(self):
+        """等待事件檔與背景 sink 處理完已輸出的事件"""
+        self._file_sink.flush()
+        for sink in self.sinks:
+            if isinstance(sink, BackgroundSink):
+                sink.flush()
+
+    def _append_event(self, record: Dict):
+        """(背景執行緒) 附加一筆事件到事件檔，超過大小上限時先輪替"""
+        path = self.events_file
+        if not path:
+            return
+        try:
+            if self.max_bytes and os.path.exists(path) and os.path.getsize(path) >= self.max_bytes:
+                os.replace(path, path + ".1")
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        except OSError as e:
+            print(f"寫入遙測事件失敗: {e}")
+            self.events_file = None
+
+    def _bank_stats(self, bank: Optional[str]) -> Optional[Dict]:
+        if not bank:
+            return None
+        if bank not in self.banks:
+            self.banks[bank] = _new_bank_stats()
+        return self.banks[bank]
+
+    def emit(self, event: str, **fields):
+        """輸出一筆事件"""
+        record = {"ts": datetime.now().isoformat(timespec="milliseconds"), "run_id": self.run_id, "event": event}
+        bank = fields.pop("bank", None) or _current_bank.get()
+        category = fields.pop("category", None) or _current_category.get()
+        if bank:
+            record["bank"] = bank
+        if category:
+            record["category"] = category
+        record.update(fields)
+
+        if self.events_file:
+            self._file_sink(record)
+        for sink in self.sinks:
+            try:
+                sink(record)
+            except Exception as e:
+                print(f"遙測事件傳遞失敗: {e}")
+        return record
+
+    @contextmanager
+    def span(self, stage: str, **fields):
+        """
+        量測一個階段的耗時。
+        yield 出的 dict 可於區塊內補充欄位 (例如 offers 數量)，結束時一併輸出。
+        """
+        tokens = []
+        if stage == "bank" and "bank" in fields:
+            tokens.append((_current_bank, _current_bank.set(fields["bank"])))
+            self._active_bank = fields["bank"]
+        if stage == "category" and "category" in fields:
+            tokens.append((_current_category, _current_category.set(fields["category"])))
+
+        info = dict(fields)
+        if stage in ("bank", "category"):
+            # 讓進度訂閱端可以在階段開始時就顯示
+            self.emit(f"{stage}_start", **fields)
+        start = time.perf_counter()
+        status = "ok"
+        try:
+            yield info
+        except BaseException as e:
+            status = "error"
+            info.setdefault("error", str(e) or type(e).__name__)
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            info.setdefault("status", status)
+            self._aggregate(stage, info, elapsed)
+            self.emit(stage, duration_ms=round(elapsed * 1000, 1), **info)
+            for var, token in reversed(tokens):
+                var.reset(token)
+
+    def _aggregate(self, stage: str, info: Dict, elapsed: float):
+        stats = self._bank_stats(info.get("bank") or _current_bank.get())
+        if stats is None:
+            return
+        if stage == "bank":
+            stats["duration_seconds"] = round(elapsed, 3)
+            stats["status"] = info.get("status", "ok")
+            if "offers" in info:
+                stats["offers"] = info["offers"]
+        elif stage == "category":
+            stats["categories"] += 1
+        elif stage == "page":
+            stats["pages"] += 1
+            stats["page_offers"].append(info.get("offers", 0))
+        elif stage == "wait":
+            stats["wait_seconds"] += elapsed
+        elif stage == "extract":
+            stats["extract_seconds"] += elapsed
+        elif stage == "upsert":
+            stats["upsert_seconds"] += elapsed
+
+    async def wait(self, page, ms: int, **fields):
+        """page.wait_for_timeout 的計時版本"""
+        with self.span("wait", ms=ms, **fields):
+            await page.wait_for_timeout(ms)
+
+    def count_retry(self, bank: Optional[str] = None):
+        stats = self._bank_stats(bank or _current_bank.get())
+        if stats is not None:
+            stats["retries"] += 1
+
+    def track_context_bytes(self, context):
+        """統計瀏覽器下載的位元組數 (以 Content-Length 估算)，歸屬到目前正在爬取的銀行"""
+
+        def on_response(response):
+            stats = self._bank_stats(self._active_bank)
+            if stats is None:
+                return
+            try:
+                length = response.headers.get("content-length")
+                if length:
+                    stats["bytes"] += int(length)
+            except Exception:
+                pass
+
+        context.on("response", on_response)
+
+    def summary(self, status: str = "ok") -> Dict:
+        """彙整整次執行的摘要"""
+        finished_at = datetime.now()
+        banks = {}
+        for bank, stats in self.banks.items():
+            item = dict(stats)
+            page_offers = item.pop("page_offers")
+            item["offers_per_page"] = round(sum(page_offers) / len(page_offers), 2) if page_offers else 0
+            for key in ("wait_seconds", "extract_seconds", "upsert_seconds"):
+                item[key] = round(item[key], 3)
+            banks[bank] = item
+        return {
+            "run_id": self.run_id,
+            "status": status,
+            "started_at": self.started_at.isoformat(),
+            "finished_at": finished_at.isoformat(),
+            "duration_seconds": round(time.perf_counter() - self._start, 3),
+            "total_offers": sum(b["offers"] for b in banks.values()),
+            "retries": sum(b["retries"] for b in banks.values()),
+            "bytes": sum(b["bytes"] for b in banks.values()),
+            "banks": banks,
+        }
+
+
+# 全域共用實例
+telemetry = ScrapeTelemetry()
@@ -0,0 +1,293 @@
+# src/backend/core/browser_pool.py
+"""
+常駐瀏覽器池
+後端啟動時預先開啟 Chromium 與數個 BrowserContext，爬蟲工作直接租用 context，
+不必每次更新都啟動新行程與冷啟動瀏覽器:
+
+- lease() 取得一個已就緒的 context，用完歸還；使用 CONTEXT_MAX_USES 次後關閉並重建，避免記憶體持續累積
+- 瀏覽器斷線 (崩潰) 時下一次租用會自動重新啟動
+- 以 route 攔截圖片 / CSS / JS / 字型，存到磁碟快取 (BROWSER_CACHE_DIR)，
+  有效期限內直接由快取回應，重複更新不必再下載銀行網站的靜態資源；
+  有效期限依回應的 Cache-Control / Expires (見 cache_lifetime)，快取讀寫在執行緒中進行，不阻塞事件迴圈
+
+未安裝 playwright 時 available 為 False，工作管理改用子行程執行爬蟲。
+playwright 在 start() 時才載入，不拖慢後端的冷啟動。
+"""
+
+import asyncio
+import hashlib
+import importlib.util
+import json
+import os
+import time
+from contextlib import asynccontextmanager
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional
+
+from src.backend.core import metrics
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+POOL_SIZE = int(os.environ.get("BROWSER_POOL_SIZE", "2"))
+CONTEXT_MAX_USES = int(os.environ.get("BROWSER_CONTEXT_MAX_USES", "20"))
+CACHE_DIR = os.environ.get("BROWSER_CACHE_DIR", os.path.join(PROJECT_DIR, ".browser_cache"))
+CACHE_TTL_SECONDS = int(os.environ.get("BROWSER_CACHE_TTL", str(24 * 3600)))
+CACHE_MAX_BYTES = int(os.environ.get("BROWSER_CACHE_MAX_BYTES", str(200 * 1024 * 1024)))
+CACHEABLE_TYPES = ("image", "stylesheet", "script", "font")
+# 不保存會影響重新驗證或與連線相關的標頭
+_DROP_HEADERS = {"content-length", "content-encoding", "transfer-encoding", "connection", "set-cookie"}
+
+
+def cache_lifetime(headers: Dict[str, str], resource_type: str) -> Optional[int]:
+    """
+    依回應的 Cache-Control / Expires 決定可快取的秒數：0 表示不快取，None 表示沒有指定 (沿用快取的 TTL)。
+    no-store / no-cache 或已過期的回應不快取；沒有任何有效期限資訊的 script 也不快取，
+    銀行更新 JS 後不會再重播舊版本而讓爬蟲失效。
+    """
+    headers = {k.lower(): v for k, v in headers.items()}
+    directives = {}
+    for part in headers.get("cache-control", "").lower().split(","):
+        name, _, value = part.strip().partition("=")
+        if name:
+            directives[name] = value.strip('"')
+    if "no-store" in directives or "no-cache" in directives:
+        return 0
+    max_age = directives.get("s-maxage") or directives.get("max-age")
+    if max_age is not None:
+        try:
+            return max(0, int(max_age))
+        except ValueError:
+            return 0
+    if headers.get("expires"):
+        try:
+            expires = parsedate_to_datetime(headers["expires"]).timestamp()
+            date = parsedate_to_datetime(headers["date"]).timestamp() if headers.get("date") else time.time()
+        except (TypeError, ValueError):
+            return 0  # 無效的 Expires (例如 0) 視為已過期
+        return max(0, int(expires - date))
+    return 0 if resource_type == "script" else None
+
+
+class DiskCache:
+    """以網址雜湊為檔名的靜態資源快取 (<key>.body 為內容、<key>.json 為狀態碼與標頭)"""
+
+    def __init__(self, directory: str = CACHE_DIR, ttl: int = CACHE_TTL_SECONDS, max_bytes: int = CACHE_MAX_BYTES):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+
+    def _paths(self, url: str):
+        key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        base = os.path.join(self.directory, key[:2], key)
+        return base + ".json", base + ".body"
+
+    def get(self, url: str) -> Optional[Dict]:
+        meta_path, body_path = self._paths(url)
+        try:
+            if time.time() - os.path.getmtime(meta_path) > self.ttl:
+                return None
+            with open(meta_path, encoding="utf-8") as f:
+                meta = json.load(f)
+            if meta.pop("expires_at", float("inf")) < time.time():
+                return None
+            with open(body_path, "rb") as f:
+                meta["body"] = f.read()
+            return meta
+        except (OSError, ValueError):
+            return None
+
+    def put(self, url: str, status: int, headers: Dict[str, str], body: bytes, max_age: Optional[int] = None):
+        """max_age 為回應指定的有效秒數 (不超過 TTL)，None 時沿用 TTL"""
+        meta_path, body_path = self._paths(url)
+        expires_at = time.time() + min(self.ttl, max_age if max_age is not None else self.ttl)
+        try:
+            os.makedirs(os.path.dirname(meta_path), exist_ok=True)
+            with open(body_path, "wb") as f:
+                f.write(body)
+            # 最後才寫 meta：讀取端以 meta 是否存在判斷快取是否完整
+            with open(meta_path, "w", encoding="utf-8") as f:
+                json.dump({"status": status, "expires_at": expires_at,
+                           "headers": {k: v for k, v in headers.items() if k.lower() not in _DROP_HEADERS}}, f)
+        except OSError as e:
+            print(f"寫入瀏覽器快取失敗: {e}")
+
+    def prune(self):
+        """刪除過期檔案，總大小超過上限時再從最舊的開始刪除"""
+        entries = []
+        now = time.time()
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                if now - stat.st_mtime > self.ttl:
+                    os.remove(path)
+                else:
+                    entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            os.remove(path)
+            total -= size
+
+
+class _PooledContext:
+    __slots__ = ("context", "uses")
+
+    def __init__(self, context):
+        self.context = context
+        self.uses = 0
+
+
+class BrowserPool:
+    """常駐 Chromium 與 BrowserContext 池"""
+
+    def __init__(self, size: int = POOL_SIZE, max_uses: int = CONTEXT_MAX_USES, cache: Optional[DiskCache] = None):
+        self.size = max(1, size)
+        self.max_uses = max(1, max_uses)
+        self.cache = cache or DiskCache()
+        self._playwright = None
+        self._browser = None
+        self._idle: Optional[asyncio.Queue] = None
+        self._created = 0
+        self._alive = 0
+        self._lock = asyncio.Lock()
+
+    @property
+    def available(self) -> bool:
+        # 只檢查是否已安裝，不實際載入 (選用相依套件，未安裝時退回子行程模式)
+        return importlib.util.find_spec("playwright") is not None
+
+    @property
+    def running(self) -> bool:
+        return self._browser is not None and self._browser.is_connected()
+
+    async def start(self):
+        """啟動瀏覽器並預先建立所有 context (已在執行中則不做事)"""
+        async with self._lock:
+            if self.running:
+                return
+            await self._shutdown()
+            from playwright.async_api import async_playwright
+            from bank_offers_scraper import LAUNCH_OPTIONS
+            started = time.perf_counter()
+            await asyncio.to_thread(self.cache.prune)
+            self._playwright = await async_playwright().start()
+            self._browser = await self._playwright.chromium.launch(headless=True, **LAUNCH_OPTIONS)
+            self._idle = asyncio.Queue()
+            self._created = 0
+            self._alive = 0
+            for _ in range(self.size):
+                self._idle.put_nowait(await self._new_context())
+            print(f"瀏覽器池已就緒: {self.size} 個 context，耗時 {time.perf_counter() - started:.1f} 秒")
+
+    async def _new_context(self) -> _PooledContext:
+        from bank_offers_scraper import CONTEXT_OPTIONS
+        from scrapers.telemetry import telemetry
+        context = await self._browser.new_context(**CONTEXT_OPTIONS)
+        await context.route("**/*", self._handle_route)
+        telemetry.track_context_bytes(context)
+        self._created += 1
+        self._alive += 1
+        return _PooledContext(context)
+
+    async def _handle_route(self, route):
+        request = route.request
+        if request.method != "GET" or request.resource_type not in CACHEABLE_TYPES:
+            await route.continue_()
+            return
+        cached = await asyncio.to_thread(self.cache.get, request.url)
+        if cached is not None:
+            metrics.registry.inc("browser_cache_requests_total", (("result", "hit"),), help_text="Browser pool disk cache lookups.")
+            await route.fulfill(status=cached["status"], headers=cached["headers"], body=cached["body"])
+            return
+        metrics.registry.inc("browser_cache_requests_total", (("result", "miss"),), help_text="Browser pool disk cache lookups.")
+        try:
+            response = await route.fetch()
+            body = await response.body()
+        except Exception:
+            # 請求已送出過一次，不再以 continue_() 重送
+            await route.abort()
+            return
+        lifetime = cache_lifetime(response.headers, request.resource_type)
+        if response.status == 200 and lifetime != 0:
+            await asyncio.to_thread(self.cache.put, request.url, response.status, response.headers, body, lifetime)
+        await route.fulfill(response=response, body=body)
+
+    @asynccontextmanager
+    async def lease(self):
+        """租用一個 context；歸還時關閉所有分頁，達到使用上限則重建"""
+        if not self.running:
+            await self.start()
+        # 檢查與取出在鎖內進行，兩個同時的租用不會拿到同一個 context 或補建超過名額
+        async with self._lock:
+            idle = self._idle
+            pooled = idle.get_nowait() if not idle.empty() else None
+            if pooled is None and self._alive < self.size:
+                # 先前回收失敗而減少的名額在此補回
+                pooled = await self._new_context()
+        if pooled is None:
+            pooled = await idle.get()
+        metrics.registry.inc("browser_pool_leases_total", help_text="Browser contexts leased from the pool.")
+        try:
+            yield pooled.context
+        finally:
+            pooled.uses += 1
+            await self._release(pooled)
+
+    async def _release(self, pooled: _PooledContext):
+        retire = pooled.uses >= self.max_uses or not self.running
+        try:
+            if not retire:
+                for page in list(pooled.context.pages):
+                    await page.close()
+        except Exception as e:
+            print(f"清理瀏覽器 context 失敗，改為重建: {e}")
+            retire = True
+        if retire:
+            async with self._lock:
+                self._alive -= 1
+                try:
+                    await pooled.context.close()
+                    pooled = await self._new_context() if self.running else None
+                except Exception as e:
+                    # 名額由下一次 lease() 補回
+                    print(f"重建瀏覽器 context 失敗: {e}")
+                    pooled = None
+        if pooled is not None:
+            self._idle.put_nowait(pooled)
+
+    def stats(self) -> Dict:
+        return {
+            "available": self.available,
+            "running": self.running,
+            "size": self.size,
+            "idle": self._idle.qsize() if self._idle is not None else 0,
+            "contexts_created": self._created,
+            "max_uses": self.max_uses,
+        }
+
+    async def _shutdown(self):
+        if self._browser is not None:
+            try:
+                await self._browser.close()
+            except Exception:
+                pass
+        if self._playwright is not None:
+            try:
+                await self._playwright.stop()
+            except Exception:
+                pass
+        self._browser = None
+        self._playwright = None
+        self._idle = None
+
+    async def close(self):
+        async with self._lock:
+            await self._shutdown()
+
+
+browser_pool = BrowserPool()
@@ -1,29 +1,60 @@
 # src/backend/core/database.py
 import sqlite3
 import os
-import urllib.request
+import json
+import threading
+from collections import OrderedDict
 from datetime import datetime
+from src.backend.core.metrics import registry, span
+from categories import CANONICAL_CATEGORIES
+from merchants import resolve_merchant_key
+from geo import bounding_box, haversine_km
+from models import AnnotatedOffer, Card, Offer, fetch_models
 
 DB_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))), "credit_cards.db")
+# bootstrap_db 每次換上下載的資料庫時加一 (主檔在 WAL 模式下不一定立即改變，快取以此判斷資料已換過)
+DB_GENERATION = 0
 
 def bootstrap_db():
+    """
+    有設定 DB_DOWNLOAD_URL 時下載最新資料庫。
+    由 FastAPI lifespan 在背景執行 (不在 import 時執行)，下載期間仍以現有檔案回應請求。
+    下載完成後以 SQLite 線上備份 API 寫入現有資料庫，而不是以 os.replace 換掉主檔：
+    此時 SSE 串流或行程內的爬蟲工作可能仍持有連線，舊的 -wal / -shm 會被套用到新檔案而遺失寫入或損毀；
+    備份在 SQLite 的鎖內進行，其他連線等待後即讀到新內容。
+    """
+    global DB_GENERATION
     download_url = os.environ.get("DB_DOWNLOAD_URL")
-    if download_url:
-        try:
-            print(f"正在從 {download_url} 下載最新資料庫...")
-            os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
-            req = urllib.request.Request(
-                download_url, 
-                headers={'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64)'}
-            )
-            with urllib.request.urlopen(req) as response, open(DB_PATH, 'wb') as out_file:
-                out_file.write(response.read())
-            print("資料庫下載並更新完成！")
-        except Exception as e:
-            print(f"下載資料庫失敗: {e}，將使用現有的資料庫檔案。")
+    if not download_url:
+        return False
+    import urllib.request  # 只有設定下載網址時才需要 (約占 import 時間的一半)
 
-# 自動執行資料庫自適應載入
-bootstrap_db()
+    tmp_path = DB_PATH + ".download"
+    try:
+        print(f"正在從 {download_url} 下載最新資料庫...")
+        os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
+        req = urllib.request.Request(
+            download_url, 
+            headers={'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64)'}
+        )
+        with urllib.request.urlopen(req, timeout=60) as response, open(tmp_path, 'wb') as out_file:
+            out_file.write(response.read())
+        source = sqlite3.connect(tmp_path)
+        target = sqlite3.connect(DB_PATH, timeout=60)
+        try:
+            source.backup(target)
+        finally:
+            target.close()
+            source.close()
+        os.remove(tmp_path)
+        DB_GENERATION += 1
+        print("資料庫下載並更新完成！")
+        return True
+    except Exception as e:
+        print(f"下載資料庫失敗: {e}，將使用現有的資料庫檔案。")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return False
 
 def get_db():
     conn = sqlite3.connect(DB_PATH)
@@ -31,11 +62,39 @@ def get_db():
     conn.row_factory = sqlite3.Row
     return conn
 
-def fetch_offers(search=None, bank=None, category=None):
+def fetch_offers(search=None, bank=None, category=None, active_on=None, collapse=False, canonical_category=None):
+    """
+    目前的優惠 (models.Offer 列表)。標題長度等驗證在爬蟲邊界 (Offer.from_scraped) 完成，
+    這裡只以 SQL 排除舊資料中的過短標題，資料列直接建構為 Offer，不經過 dict。
+    """
     conn = get_db()
     cursor = conn.cursor()
-    query = "SELECT * FROM offers WHERE 1=1"
+    cursor.row_factory = None
+    with span("db"):
+        try:
+            cursor.execute(*_offers_query(search, bank, category, active_on, canonical_category))
+        except sqlite3.OperationalError:
+            # 舊資料庫缺少後來新增的欄位
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(offers)")}
+            if canonical_category and "canonical_category" not in columns:
+                # 尚未分類，沒有任何優惠屬於該標準分類 (與 get_facets 的空結果一致)
+                conn.close()
+                return []
+            if active_on and "start_date" not in columns:
+                # 尚未執行過活動頁面解析：沒有起訖日的優惠視為有效，略過此篩選
+                active_on = None
+            cursor.execute(*_offers_query(search, bank, category, active_on, canonical_category))
+        results = fetch_models(cursor, Offer)
+    conn.close()
+    return collapse_clusters(results) if collapse else results
+
+def _offers_query(search, bank, category, active_on, canonical_category):
+    query = "SELECT * FROM offers WHERE LENGTH(title) > 2"
     params = []
+    if active_on:
+        # 沒有解析到起訖日的優惠視為有效
+        query += " AND (start_date IS NULL OR start_date <= ?) AND (end_date IS NULL OR end_date >= ?)"
+        params += [active_on, active_on]
     if search:
         query += " AND title LIKE ?"
         params.append(f"%{search}%")
@@ -45,24 +104,319 @@ def fetch_offers(search=None, bank=None, category=None):
     if category:
         query += " AND category = ?"
         params.append(category)
-    cursor.execute(query, params)
-    results = [dict(row) for row in cursor.fetchall()]
-    conn.close()
-    return [r for r in results if r['title'] and len(str(r['title'])) > 2]
+    if canonical_category:
+        # 跨銀行的標準分類 (idx_offers_canonical_category 索引)
+        query += " AND canonical_category = ?"
+        params.append(canonical_category)
+    return query, params
+
+def _bad_images(conn, urls):
+    """檢查為不可用的圖片網址集合 (尚無 image_checks 資料表時為空集合)"""
+    urls = list({u for u in urls if u})
+    bad = set()
+    try:
+        for i in range(0, len(urls), 500):
+            batch = urls[i:i + 500]
+            placeholders = ",".join("?" for _ in batch)
+            bad.update(row[0] for row in conn.execute(
+                f"SELECT url FROM image_checks WHERE ok = 0 AND url IN ({placeholders})", batch
+            ))
+    except sqlite3.OperationalError:
+        pass
+    return bad
+
+def fetch_merchant_offers(name, bank=None):
+    """
+    特店的優惠：merchants.key 唯一索引找到特店後，以 merchant_offers 主鍵範圍查詢倒排列表，
+    成本只與該特店的優惠筆數有關。特店不存在 (或舊資料庫尚無索引) 時回傳 None。
+    """
+    key = resolve_merchant_key(name)
+    conn = get_db()
+    try:
+        with span("db"):
+            merchant = conn.execute("SELECT id, name FROM merchants WHERE key = ?", (key,)).fetchone()
+            if merchant is None:
+                return None
+            query = """
+                SELECT o.* FROM merchant_offers mo
+                JOIN offers o ON o.id = mo.offer_id
+                WHERE mo.merchant_id = ? AND LENGTH(o.title) > 2
+            """
+            params = [merchant["id"]]
+            if bank:
+                query += " AND o.bank = ?"
+                params.append(bank)
+            cursor = conn.cursor()
+            cursor.row_factory = None
+            cursor.execute(query + " ORDER BY o.id", params)
+            offers = fetch_models(cursor, Offer)
+    except sqlite3.OperationalError:
+        return None
+    finally:
+        conn.close()
+    return {"merchant": merchant["name"], "count": len(offers), "offers": offers}
+
+def fetch_merchant_location(name):
+    """geocode 階段存下的特店座標 (lat, lon)，沒有時回傳 None"""
+    conn = get_db()
+    try:
+        row = conn.execute(
+            "SELECT lat, lon FROM merchant_locations WHERE key = ? AND ok = 1", (resolve_merchant_key(name),)
+        ).fetchone()
+    except sqlite3.OperationalError:
+        return None
+    finally:
+        conn.close()
+    return (row["lat"], row["lon"]) if row else None
+
+def fetch_offers_near(lat, lon, radius_km=1.0, limit=200, bank=None):
+    """
+    (lat, lon) 半徑 radius_km 公里內特店的優惠，依距離排序。
+    先以 merchant_geo (R*Tree) 取外接矩形內的特店，再對這些候選點計算精確距離，
+    成本只與附近的特店數有關。舊資料庫尚無座標表時回傳空結果。
+    """
+    min_lat, max_lat, min_lon, max_lon = bounding_box(lat, lon, radius_km)
+    conn = get_db()
+    try:
+        with span("db"):
+            candidates = conn.execute("""
+                SELECT ml.key, ml.lat, ml.lon FROM merchant_geo g
+                JOIN merchant_locations ml ON ml.id = g.id
+                WHERE g.max_lat >= ? AND g.min_lat <= ? AND g.max_lon >= ? AND g.min_lon <= ?
+            """, (min_lat, max_lat, min_lon, max_lon)).fetchall()
+            distances = haversine_km(lat, lon, [c["lat"] for c in candidates], [c["lon"] for c in candidates])
+            nearby = sorted(
+                ((d, c) for d, c in zip(distances, candidates) if d <= radius_km), key=lambda item: item[0]
+            )
+            offers = []
+            for distance, location in nearby:
+                query = """
+                    SELECT o.*, m.name AS merchant FROM merchants m
+                    JOIN merchant_offers mo ON mo.merchant_id = m.id
+                    JOIN offers o ON o.id = mo.offer_id
+                    WHERE m.key = ? AND LENGTH(o.title) > 2
+                """
+                params = [location["key"]]
+                if bank:
+                    query += " AND o.bank = ?"
+                    params.append(bank)
+                cursor = conn.cursor()
+                cursor.row_factory = None
+                cursor.execute(query + " ORDER BY o.id", params)
+                for offer, extra in fetch_models(cursor, Offer, ("merchant",)):
+                    extra.update(lat=location["lat"], lon=location["lon"], distance_km=round(distance, 3))
+                    offers.append(AnnotatedOffer(offer, extra))
+                if len(offers) >= limit:
+                    break
+    except sqlite3.OperationalError:
+        offers = []
+    finally:
+        conn.close()
+    offers = offers[:limit]
+    return {"lat": lat, "lon": lon, "radius_km": radius_km, "count": len(offers), "offers": offers}
+
+# 推薦結果快取：鍵包含資料版本 (變更序號、卡包版本、索引版本)，任一改變即自然失效
+RECOMMENDATION_CACHE_SIZE = 128
+_recommendation_cache = OrderedDict()
+_recommendation_lock = threading.Lock()
+
+def _recommendation_versions(conn):
+    try:
+        meta = dict(conn.execute(
+            "SELECT key, value FROM app_meta WHERE key IN ('cards_version', 'card_index_version', 'merchant_index_version')"
+        ).fetchall())
+    except sqlite3.OperationalError:
+        meta = {}
+    return (DB_GENERATION, get_change_seq(conn), meta.get('cards_version'), meta.get('card_index_version'), meta.get('merchant_index_version'))
+
+def fetch_recommendations(merchant=None, card_ids=None, limit=20):
+    """
+    卡包 (cards) 中各卡適用的最佳優惠，可限定特店與卡片。
+    適用關係預先存於 card_offers (recommendations.py)，這裡只做索引查詢與排序；
+    每筆優惠附上適用的卡片。特店不存在時回傳 None。
+    """
+    card_ids = tuple(sorted(set(card_ids))) if card_ids else None
+    merchant_key = resolve_merchant_key(merchant) if merchant else None
+    conn = get_db()
+    try:
+        versions = _recommendation_versions(conn)
+        cache_key = (versions, merchant_key, card_ids, limit)
+        with _recommendation_lock:
+            if cache_key in _recommendation_cache:
+                _recommendation_cache.move_to_end(cache_key)
+                registry.inc("recommendation_cache_total", (("result", "hit"),), help_text="Recommendation cache lookups.")
+                return _recommendation_cache[cache_key]
+        registry.inc("recommendation_cache_total", (("result", "miss"),), help_text="Recommendation cache lookups.")
+        with span("db"):
+            result = _query_recommendations(conn, merchant_key, card_ids, limit)
+    except sqlite3.OperationalError:
+        # 舊資料庫尚無適用索引
+        return {"merchant": None, "cards": [], "offers": []}
+    finally:
+        conn.close()
+    if result is not None:
+        with _recommendation_lock:
+            _recommendation_cache[cache_key] = result
+            while len(_recommendation_cache) > RECOMMENDATION_CACHE_SIZE:
+                _recommendation_cache.popitem(last=False)
+    return result
+
+def _query_recommendations(conn, merchant_key, card_ids, limit):
+    merchant_name = None
+    query = "SELECT co.offer_id, MAX(co.score) AS score, GROUP_CONCAT(co.card_id) AS card_ids FROM card_offers co"
+    params = []
+    if merchant_key:
+        merchant = conn.execute("SELECT id, name FROM merchants WHERE key = ?", (merchant_key,)).fetchone()
+        if merchant is None:
+            return None
+        merchant_name = merchant["name"]
+        query += " JOIN merchant_offers mo ON mo.offer_id = co.offer_id AND mo.merchant_id = ?"
+        params.append(merchant["id"])
+    if card_ids:
+        query += f" WHERE co.card_id IN ({','.join('?' for _ in card_ids)})"
+        params += list(card_ids)
+    query += " GROUP BY co.offer_id ORDER BY score DESC, co.offer_id DESC LIMIT ?"
+    params.append(limit)
+    postings = conn.execute(query, params).fetchall()
+
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    card_query = "SELECT * FROM cards"
+    if card_ids:
+        card_query += f" WHERE id IN ({','.join('?' for _ in card_ids)})"
+    cursor.execute(card_query, list(card_ids or ()))
+    cards = {card.id: card for card in fetch_models(cursor, Card)}
+    offers = {}
+    if postings:
+        placeholders = ",".join("?" for _ in postings)
+        cursor.execute(f"SELECT * FROM offers WHERE id IN ({placeholders})", [p["offer_id"] for p in postings])
+        offers = {offer.id: offer for offer in fetch_models(cursor, Offer)}
+    results = []
+    for p in postings:
+        offer = offers.get(p["offer_id"])
+        if offer is None:
+            continue
+        applicable = [cards[int(i)] for i in p["card_ids"].split(",") if int(i) in cards]
+        results.append(AnnotatedOffer(offer, {"score": p["score"], "cards": applicable}))
+    return {"merchant": merchant_name, "cards": list(cards.values()), "offers": results}
+
+def collapse_clusters(results):
+    """
+    (Offer 列表) 每個近似重複群只保留一筆 (篩選後仍在結果內時優先保留代表優惠)，並附上 cluster_size。
+    尚未分群的新優惠 (cluster_id 為 NULL) 視為自成一群。
+    """
+    groups = {}
+    for r in results:
+        groups.setdefault(r.cluster_id or r.id, []).append(r)
+    collapsed = []
+    for cluster_id, members in groups.items():
+        keep = next((m for m in members if m.id == cluster_id), members[0])
+        keep.cluster_size = len(members)
+        collapsed.append(keep)
+    return collapsed
+
+def normalize_as_of(value):
+    """
+    將 as_of 參數轉為與資料庫相同的 ISO 字串 (資料庫以 datetime.now() 記錄本地時間)。
+    只給日期時視為當天結束時的狀態；帶時區的時間先換算為本地時間；格式錯誤時拋出 ValueError。
+    """
+    value = value.strip()
+    dt = datetime.fromisoformat(value)
+    if len(value) == 10:
+        dt = dt.replace(hour=23, minute=59, second=59, microsecond=999999)
+    if dt.tzinfo is not None:
+        dt = dt.astimezone().replace(tzinfo=None)
+    return dt.isoformat()
+
+HISTORY_FIELDS = ("first_seen", "last_seen", "valid_from", "valid_to")
+
+def fetch_offers_as_of(as_of, search=None, bank=None, category=None):
+    """
+    時間點查詢：回傳 as_of 當下有效的優惠 (AnnotatedOffer 列表)。
+    id 為 offer_identities 的身分 id (同一優惠下架再上架仍相同)，並附上 first_seen / last_seen 與該版本的有效區間。
+    """
+    conn = get_db()
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    query = """
+        SELECT i.id, i.bank, h.category, i.title, NULLIF(i.url, '') AS url, h.image,
+               i.first_seen, i.last_seen, h.valid_from, h.valid_to
+        FROM offer_history h
+        JOIN offer_identities i ON i.id = h.identity_id
+        WHERE h.valid_from <= ? AND (h.valid_to IS NULL OR h.valid_to > ?) AND LENGTH(i.title) > 2
+    """
+    params = [as_of, as_of]
+    if search:
+        query += " AND i.title LIKE ?"
+        params.append(f"%{search}%")
+    if bank:
+        query += " AND i.bank = ?"
+        params.append(bank)
+    if category:
+        query += " AND h.category = ?"
+        params.append(category)
+    try:
+        with span("db"):
+            cursor.execute(query, params)
+            rows = fetch_models(cursor, Offer, HISTORY_FIELDS)
+            # 過去版本的圖片可能從未檢查過 (查詢沒有 image_ok，預設為可用)，只隱藏已確認不可用的
+            bad = _bad_images(conn, [offer.image for offer, _ in rows])
+    except sqlite3.OperationalError:
+        # 尚未建立歷史表的舊資料庫
+        rows, bad = [], set()
+    finally:
+        conn.close()
+    for offer, _ in rows:
+        if offer.image in bad:
+            offer.image_ok = 0
+    return [AnnotatedOffer(offer, extra) for offer, extra in rows]
 
 def get_filters():
     conn = get_db()
     cursor = conn.cursor()
-    cursor.execute("SELECT DISTINCT bank FROM offers WHERE bank IS NOT NULL")
-    banks = [row[0] for row in cursor.fetchall()]
-    cursor.execute("SELECT DISTINCT category FROM offers WHERE category IS NOT NULL")
-    categories = [row[0] for row in cursor.fetchall()]
-    
-    # 查詢資料庫中最新的更新時間
-    cursor.execute("SELECT MAX(scraped_at) FROM offers")
-    last_update_val = cursor.fetchone()[0]
+    with span("db"):
+        cursor.execute("SELECT DISTINCT bank FROM offers WHERE bank IS NOT NULL")
+        banks = [row[0] for row in cursor.fetchall()]
+        cursor.execute("SELECT DISTINCT category FROM offers WHERE category IS NOT NULL")
+        categories = [row[0] for row in cursor.fetchall()]
+        
+        # 查詢資料庫中最新的更新時間
+        cursor.execute("SELECT MAX(scraped_at) FROM offers")
+        last_update_val = cursor.fetchone()[0]
     conn.close()
     
+    return {"banks": banks, "categories": categories, "last_update": format_last_update(last_update_val)}
+
+def get_facets(bank=None):
+    """
+    各標準分類的優惠筆數 (讀取預先計算的 category_facets)，依 CANONICAL_CATEGORIES 的順序排列。
+    指定 bank 時只計算該銀行。
+    """
+    conn = get_db()
+    query = "SELECT canonical_category, bank, count FROM category_facets"
+    params = []
+    if bank:
+        query += " WHERE bank = ?"
+        params.append(bank)
+    try:
+        with span("db"):
+            rows = conn.execute(query, params).fetchall()
+    except sqlite3.OperationalError:
+        # 舊版資料庫尚未建立 category_facets
+        rows = []
+    finally:
+        conn.close()
+
+    facets = {key: {"key": key, "label": label, "count": 0, "banks": {}} for key, label in CANONICAL_CATEGORIES.items()}
+    for row in rows:
+        facet = facets.get(row["canonical_category"])
+        if facet is None:
+            continue
+        facet["count"] += row["count"]
+        facet["banks"][row["bank"]] = row["count"]
+    return {"facets": [f for f in facets.values() if f["count"] > 0]}
+
+def format_last_update(last_update_val):
     last_update = "無資料"
     if last_update_val:
         # 將 ISO 格式轉為顯示格式
@@ -72,5 +426,171 @@ def get_filters():
             last_update = dt.strftime("%Y-%m-%d %H:%M")
         except:
             last_update = last_update_val
-        
-    return {"banks": banks, "categories": categories, "last_update": last_update}
+    return last_update
+
+def get_data_stamp():
+    """
+    低成本的資料版本檢查：變更序號 (與來源識別) + 最後更新時間。
+    前端快取的序號與來源相同時即可沿用 IndexedDB 中的資料，不需重新下載。
+    """
+    conn = get_db()
+    try:
+        with span("db"):
+            seq = get_change_seq(conn)
+            source = get_change_source(conn, seq)
+            last_update_val = conn.execute("SELECT MAX(scraped_at) FROM offers").fetchone()[0]
+    finally:
+        conn.close()
+    return {"seq": seq, "source": source, "last_update": format_last_update(last_update_val)}
+
+def fetch_progress_events(conn, after_id=0, limit=200):
+    """讀取 scrape_progress 中 id 大於 after_id 的進度事件 (由呼叫端持有連線以便長時間訂閱)"""
+    try:
+        cursor = conn.execute(
+            "SELECT id, event, payload FROM scrape_progress WHERE id > ? ORDER BY id LIMIT ?",
+            (after_id, limit),
+        )
+    except sqlite3.OperationalError:
+        # 舊版資料庫尚未建立進度表
+        return []
+    events = []
+    for row in cursor.fetchall():
+        try:
+            payload = json.loads(row["payload"]) if row["payload"] else {}
+        except ValueError:
+            payload = {}
+        payload["id"] = row["id"]
+        payload.setdefault("event", row["event"])
+        events.append(payload)
+    return events
+
+def get_progress_snapshot(conn):
+    """
+    取得進度訂閱的起點。
+    回傳 (起始 id, 是否仍在執行中)：執行中時從最近一次 run_start 之前開始重播以還原目前進度，
+    否則從最新一筆事件之後開始，只推送之後發生的事件。
+    """
+    try:
+        row = conn.execute(
+            "SELECT id, run_id FROM scrape_progress WHERE event = 'run_start' ORDER BY id DESC LIMIT 1"
+        ).fetchone()
+        if not row:
+            return 0, False
+        ended = conn.execute(
+            "SELECT 1 FROM scrape_progress WHERE run_id = ? AND event = 'run_end' LIMIT 1",
+            (row["run_id"],),
+        ).fetchone()
+        if ended is None:
+            return row["id"] - 1, True
+        latest_id = conn.execute("SELECT MAX(id) FROM scrape_progress").fetchone()[0]
+    except sqlite3.OperationalError:
+        return 0, False
+    return latest_id or 0, False
+
+def get_data_version(conn):
+    """PRAGMA data_version：其他連線寫入提交後會改變，可用來低成本偵測新資料"""
+    return conn.execute("PRAGMA data_version").fetchone()[0]
+
+def get_change_seq(conn=None):
+    """目前變更紀錄的最新序號 (用戶端完整下載後從此序號開始增量同步)"""
+    own_conn = conn is None
+    conn = conn or get_db()
+    try:
+        row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'offer_changes'").fetchone()
+        return row[0] if row else 0
+    except sqlite3.OperationalError:
+        return 0
+    finally:
+        if own_conn:
+            conn.close()
+
+def get_change_source(conn, seq):
+    """
+    變更序號 seq 的來源識別 (該筆變更紀錄的時間)。
+    後端下載 CI 的資料庫後若自行爬取，兩邊的序號各自遞增而指向不同的變更，只比對序號無法察覺；
+    用戶端同步時一併送出序號與來源識別，不一致即需重新下載。序號 0 或紀錄已清除時為空字串。
+    """
+    if not seq:
+        return ""
+    try:
+        row = conn.execute("SELECT changed_at FROM offer_changes WHERE seq = ?", (seq,)).fetchone()
+    except sqlite3.OperationalError:
+        return ""
+    return row[0] if row else ""
+
+def _current_offers(offer_ids):
+    """
+    變更紀錄不保存標準分類與圖片檢查結果，回傳時以優惠目前的值補上 (offer id -> 目前的資料列)
+    """
+    if not offer_ids:
+        return {}
+    conn = get_db()
+    try:
+        placeholders = ",".join("?" for _ in offer_ids)
+        rows = conn.execute(
+            f"SELECT * FROM offers WHERE id IN ({placeholders})", list(offer_ids)
+        ).fetchall()
+    except sqlite3.OperationalError:
+        rows = []
+    finally:
+        conn.close()
+    return {row["id"]: dict(row) for row in rows}
+
+def fetch_offer_changes(since=0, limit=1000, source=None):
+    """
+    回傳序號大於 since 的優惠變更。
+    同一筆優惠在區間內的多次變更只保留最後一次；since 早於已清除的紀錄時回傳 reset_required。
+    source 為用戶端取得 since 時的來源識別 (get_change_source)，與此資料庫不同時同樣回傳 reset_required。
+    """
+    conn = get_db()
+    try:
+        with span("db"):
+            latest_seq = get_change_seq(conn)
+            try:
+                row = conn.execute("SELECT value FROM app_meta WHERE key = 'offer_changes_compacted_seq'").fetchone()
+                compacted_seq = int(row[0]) if row else 0
+                # since 大於最新序號代表資料庫已被重建；來源不同代表序號來自另一個資料庫 (例如 CI 建置的靜態資料)
+                if (since < compacted_seq or since > latest_seq
+                        or (source is not None and get_change_source(conn, since) != source)):
+                    return {"since": since, "latest_seq": latest_seq, "next_since": latest_seq,
+                            "next_source": get_change_source(conn, latest_seq),
+                            "has_more": False, "reset_required": True, "changes": []}
+                rows = conn.execute(
+                    "SELECT * FROM offer_changes WHERE seq > ? ORDER BY seq LIMIT ?",
+                    (since, limit),
+                ).fetchall()
+            except sqlite3.OperationalError:
+                # 舊版資料庫沒有變更紀錄表
+                return {"since": since, "latest_seq": latest_seq, "next_since": latest_seq, "next_source": "",
+                        "has_more": False, "reset_required": True, "changes": []}
+    finally:
+        conn.close()
+
+    latest_by_offer = {}
+    for row in rows:
+        latest_by_offer.pop(row["offer_id"], None)
+        latest_by_offer[row["offer_id"]] = row
+    current = _current_offers([offer_id for offer_id, row in latest_by_offer.items() if row["op"] != "delete"])
+    changes = []
+    for row in latest_by_offer.values():
+        change = {"seq": row["seq"], "op": row["op"], "id": row["offer_id"]}
+        if row["op"] != "delete":
+            offer = current.get(row["offer_id"], {})
+            change.update({
+                "bank": row["bank"], "category": row["category"], "title": row["title"],
+                "url": row["url"], "image": row["image"], "scraped_at": row["changed_at"],
+                "canonical_category": offer.get("canonical_category"),
+            })
+            if "image_ok" in offer:
+                change["image"] = row["image"] if offer["image_ok"] == 1 else None
+        changes.append(change)
+    next_since = rows[-1]["seq"] if rows else since
+    return {
+        "since": since,
+        "latest_seq": latest_seq,
+        "next_since": next_since,
+        "next_source": rows[-1]["changed_at"] if rows else (source or ""),
+        "has_more": len(rows) == limit,
+        "reset_required": False,
+        "changes": changes,
+    }
@@ -0,0 +1,287 @@
+# src/backend/core/jobs.py
+"""
+爬蟲更新工作管理
+- 以單一 worker 依序執行佇列中的工作，確保同一時間只有一個 Chromium 在寫入 credit_cards.db
+- status.json 由此處負責：有工作在佇列或執行中時為「更新中」，全部結束才改為「空閒」
+- 相同銀行 (或全部銀行) 已在佇列或執行中時，重複請求會合併到既有工作
+- 每個工作有 id、逾時與取消機制，子行程結束後一定會被 wait() 回收，不會留下殭屍行程
+- 有常駐瀏覽器池 (browser_pool.py) 時直接在後端行程內執行爬蟲並租用已開啟的 context，
+  不必為每次更新冷啟動 Python 與 Chromium；未安裝 playwright 時退回子行程模式
+"""
+
+import asyncio
+import json
+import os
+import sys
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from src.backend.core.browser_pool import browser_pool
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+SCRAPER_SCRIPT = os.path.join(PROJECT_DIR, "bank_offers_scraper.py")
+STATUS_FILE = os.path.join(PROJECT_DIR, "status.json")
+
+# 逾時設定 (秒)：全部銀行與 GitHub Actions 相同為 30 分鐘，單一銀行 10 分鐘
+FULL_REFRESH_TIMEOUT = int(os.environ.get("REFRESH_JOB_TIMEOUT", "1800"))
+BANK_REFRESH_TIMEOUT = int(os.environ.get("REFRESH_BANK_JOB_TIMEOUT", "600"))
+# 保留在記憶體中的已完成工作數
+JOB_HISTORY_LIMIT = 50
+
+ALL_BANKS = "all"
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+TIMEOUT = "timeout"
+ACTIVE_STATES = (QUEUED, RUNNING)
+
+
+class RefreshJob:
+    """單一爬蟲更新工作"""
+
+    def __init__(self, bank_code: Optional[str], bank_name: Optional[str], timeout: int):
+        self.id = uuid.uuid4().hex[:12]
+        self.bank_code = bank_code
+        self.bank_name = bank_name
+        self.timeout = timeout
+        self.status = QUEUED
+        self.created_at = datetime.now().isoformat()
+        self.started_at: Optional[str] = None
+        self.finished_at: Optional[str] = None
+        self.returncode: Optional[int] = None
+        self.error: Optional[str] = None
+        self.merged_requests = 0
+        self.process: Optional[asyncio.subprocess.Process] = None
+        self.task: Optional[asyncio.Task] = None
+        self.mode: Optional[str] = None
+        self.cancel_requested = False
+
+    @property
+    def key(self) -> str:
+        return self.bank_code or ALL_BANKS
+
+    def to_dict(self) -> Dict:
+        return {
+            "id": self.id,
+            "bank": self.bank_code or ALL_BANKS,
+            "bank_name": self.bank_name,
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "returncode": self.returncode,
+            "error": self.error,
+            "merged_requests": self.merged_requests,
+            "timeout": self.timeout,
+            "mode": self.mode,
+        }
+
+
+class JobManager:
+    """爬蟲工作佇列"""
+
+    def __init__(self, browser_pool=None):
+        self.browser_pool = browser_pool
+        self._jobs: "OrderedDict[str, RefreshJob]" = OrderedDict()
+        self._active: Dict[str, RefreshJob] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        # 最近一次工作結束的時間 (排程器以此錯開兩次爬取)
+        self.last_finished_at: Optional[str] = None
+
+    def _ensure_worker(self):
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run_worker())
+
+    def submit(self, bank_code: Optional[str] = None, bank_name: Optional[str] = None) -> Tuple[RefreshJob, bool]:
+        """
+        加入一個更新工作。
+        回傳 (工作, 是否合併到既有工作)。
+        """
+        self._ensure_worker()
+        key = bank_code or ALL_BANKS
+        existing = self._active.get(key)
+        if existing is None and key != ALL_BANKS:
+            # 尚未開始的全部銀行更新已涵蓋此銀行
+            full = self._active.get(ALL_BANKS)
+            if full is not None and full.status == QUEUED:
+                existing = full
+        if existing is not None:
+            existing.merged_requests += 1
+            return existing, True
+
+        timeout = BANK_REFRESH_TIMEOUT if bank_code else FULL_REFRESH_TIMEOUT
+        job = RefreshJob(bank_code, bank_name, timeout)
+        self._jobs[job.id] = job
+        self._active[key] = job
+        self._queue.put_nowait(job)
+        self._trim_history()
+        write_status("更新中...")
+        return job, False
+
+    @property
+    def busy(self) -> bool:
+        """是否有工作在佇列或執行中"""
+        return bool(self._active)
+
+    def get(self, job_id: str) -> Optional[RefreshJob]:
+        return self._jobs.get(job_id)
+
+    def list(self) -> List[RefreshJob]:
+        return list(reversed(self._jobs.values()))
+
+    def cancel(self, job_id: str) -> Optional[RefreshJob]:
+        """取消佇列中或執行中的工作"""
+        job = self._jobs.get(job_id)
+        if job is None or job.status not in ACTIVE_STATES:
+            return job
+        job.cancel_requested = True
+        if job.status == QUEUED:
+            self._finish(job, CANCELLED)
+        elif job.process is not None and job.process.returncode is None:
+            job.process.terminate()
+        elif job.task is not None and not job.task.done():
+            job.task.cancel()
+        return job
+
+    async def shutdown(self):
+        """關閉 worker 並結束執行中的子行程"""
+        for job in list(self._active.values()):
+            self.cancel(job.id)
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+
+    def _trim_history(self):
+        while len(self._jobs) > JOB_HISTORY_LIMIT:
+            oldest_id, oldest = next(iter(self._jobs.items()))
+            if oldest.status in ACTIVE_STATES:
+                break
+            del self._jobs[oldest_id]
+
+    def _finish(self, job: RefreshJob, status: str, error: Optional[str] = None):
+        job.status = status
+        job.error = error
+        job.finished_at = datetime.now().isoformat()
+        self.last_finished_at = job.finished_at
+        if self._active.get(job.key) is job:
+            del self._active[job.key]
+        if not self._active:
+            write_status("空閒")
+
+    async def _run_worker(self):
+        while True:
+            job = await self._queue.get()
+            try:
+                if job.status == QUEUED:
+                    await self._run(job)
+            except Exception as e:
+                self._finish(job, FAILED, str(e))
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job: RefreshJob):
+        job.status = RUNNING
+        job.started_at = datetime.now().isoformat()
+        if self.browser_pool is not None and self.browser_pool.available:
+            await self._run_in_process(job)
+        else:
+            await self._run_subprocess(job)
+
+    async def _run_in_process(self, job: RefreshJob):
+        """在後端行程內執行爬蟲，使用瀏覽器池租用的 context"""
+        from bank_offers_scraper import main as run_scraper
+        job.mode = "pool"
+
+        async def run():
+            async with self.browser_pool.lease() as context:
+                await run_scraper([job.bank_code] if job.bank_code else None, context=context)
+
+        job.task = asyncio.create_task(run())
+        try:
+            await asyncio.wait_for(job.task, timeout=job.timeout)
+        except asyncio.TimeoutError:
+            # wait_for 已取消爬蟲 task；run_end 事件由爬蟲的 finally 區塊寫入
+            self._finish(job, TIMEOUT, f"超過 {job.timeout} 秒未完成")
+            return
+        except asyncio.CancelledError:
+            job.task.cancel()
+            self._finish(job, CANCELLED)
+            if not job.cancel_requested:
+                raise
+            return
+        except Exception as e:
+            self._finish(job, FAILED, str(e) or type(e).__name__)
+            return
+        self._finish(job, SUCCEEDED)
+
+    async def _run_subprocess(self, job: RefreshJob):
+        job.mode = "subprocess"
+        # status.json 由 JobManager 負責 (佇列中還有工作時維持「更新中」)
+        args = [sys.executable, SCRAPER_SCRIPT, "--no-status"]
+        if job.bank_code:
+            args += ["--bank", job.bank_code]
+        job.process = await asyncio.create_subprocess_exec(*args, cwd=PROJECT_DIR)
+        try:
+            job.returncode = await asyncio.wait_for(job.process.wait(), timeout=job.timeout)
+        except asyncio.TimeoutError:
+            await _stop_process(job.process)
+            job.returncode = job.process.returncode
+            await record_interrupted_run(job, "timeout")
+            self._finish(job, TIMEOUT, f"超過 {job.timeout} 秒未完成")
+            return
+        except asyncio.CancelledError:
+            await _stop_process(job.process)
+            self._finish(job, CANCELLED)
+            raise
+
+        if job.cancel_requested:
+            await record_interrupted_run(job, "cancelled")
+            self._finish(job, CANCELLED)
+        elif job.returncode == 0:
+            self._finish(job, SUCCEEDED)
+        else:
+            await record_interrupted_run(job, "failed")
+            self._finish(job, FAILED, f"爬蟲結束代碼 {job.returncode}")
+
+
+async def _stop_process(process: asyncio.subprocess.Process, grace: float = 10):
+    """先 terminate，寬限期後仍未結束則 kill，最後 wait() 回收行程"""
+    if process.returncode is not None:
+        return
+    process.terminate()
+    try:
+        await asyncio.wait_for(process.wait(), timeout=grace)
+    except asyncio.TimeoutError:
+        process.kill()
+        await process.wait()
+
+
+def write_status(status: str):
+    try:
+        with open(STATUS_FILE, "w", encoding="utf-8") as f:
+            json.dump({"status": status}, f, ensure_ascii=False)
+    except OSError as e:
+        print(f"寫入 status.json 失敗: {e}")
+
+
+async def record_interrupted_run(job: RefreshJob, reason: str):
+    """子行程被中止時不會寫出 run_end，這裡補上一筆讓 SSE 訂閱端結束等待 (在執行緒中寫入資料庫，不阻塞事件迴圈)"""
+    try:
+        from database import add_progress_event
+        await asyncio.to_thread(add_progress_event, {"event": "run_end", "status": reason, "job_id": job.id})
+    except Exception as e:
+        print(f"寫入中止事件失敗: {e}")
+
+
+job_manager = JobManager(browser_pool)
@@ -0,0 +1,185 @@
+# src/backend/core/metrics.py
+"""
+輕量級效能指標模組
+- 以路由為單位記錄延遲直方圖、回應大小與進行中請求數
+- span() 可在請求內量測細部階段 (SQLite 查詢、上游下載、地理編碼)
+- render_prometheus() 輸出 Prometheus 文字格式，server_timing_header() 產生 Server-Timing 標頭
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+# 當前請求收集到的 span: [(name, seconds), ...]，由 middleware 於請求開始時設定
+_request_spans: ContextVar[Optional[List[Tuple[str, float]]]] = ContextVar("request_spans", default=None)
+
+
+class Histogram:
+    """固定 bucket 的累積直方圖"""
+
+    __slots__ = ("buckets", "counts", "total", "count")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.total += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    """以 (指標名稱, 標籤) 為鍵的指標儲存區，執行緒安全"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms: Dict[str, Dict[Tuple, Histogram]] = {}
+        self._counters: Dict[str, Dict[Tuple, float]] = {}
+        self._gauges: Dict[str, Dict[Tuple, float]] = {}
+        self._help: Dict[str, Tuple[str, str]] = {}
+
+    def _describe(self, name: str, kind: str, help_text: str):
+        if name not in self._help:
+            self._help[name] = (kind, help_text)
+
+    def observe(self, name: str, value: float, labels: Tuple = (), buckets=LATENCY_BUCKETS, help_text: str = ""):
+        with self._lock:
+            self._describe(name, "histogram", help_text)
+            series = self._histograms.setdefault(name, {})
+            hist = series.get(labels)
+            if hist is None:
+                hist = series[labels] = Histogram(buckets)
+            hist.observe(value)
+
+    def inc(self, name: str, labels: Tuple = (), amount: float = 1, help_text: str = ""):
+        with self._lock:
+            self._describe(name, "counter", help_text)
+            series = self._counters.setdefault(name, {})
+            series[labels] = series.get(labels, 0) + amount
+
+    def add_gauge(self, name: str, amount: float, labels: Tuple = (), help_text: str = ""):
+        with self._lock:
+            self._describe(name, "gauge", help_text)
+            series = self._gauges.setdefault(name, {})
+            series[labels] = series.get(labels, 0) + amount
+
+    def render(self) -> str:
+        """輸出 Prometheus text exposition format (0.0.4)"""
+        lines = []
+        with self._lock:
+            for name in sorted(self._help):
+                kind, help_text = self._help[name]
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                if kind == "histogram":
+                    for labels, hist in self._histograms.get(name, {}).items():
+                        cumulative = 0
+                        for bound, count in zip(hist.buckets, hist.counts):
+                            cumulative += count
+                            lines.append(f"{name}_bucket{_format_labels(labels + (('le', _format_value(bound)),))} {cumulative}")
+                        lines.append(f"{name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {hist.count}")
+                        lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(hist.total)}")
+                        lines.append(f"{name}_count{_format_labels(labels)} {hist.count}")
+                else:
+                    source = self._counters if kind == "counter" else self._gauges
+                    for labels, value in source.get(name, {}).items():
+                        lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def _format_labels(labels: Tuple) -> str:
+    if not labels:
+        return ""
+    parts = []
+    for key, value in labels:
+        escaped = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        parts.append(f'{key}="{escaped}"')
+    return "{" + ",".join(parts) + "}"
+
+
+def _format_value(value: float) -> str:
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+registry = MetricsRegistry()
+
+
+@contextmanager
+def span(name: str):
+    """量測一段程式的耗時，寫入 span 直方圖並附加到當前請求的 Server-Timing"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        registry.observe(
+            "app_span_duration_seconds", elapsed, (("span", name),),
+            help_text="Duration of instrumented spans inside request handlers.",
+        )
+        spans = _request_spans.get()
+        if spans is not None:
+            spans.append((name, elapsed))
+
+
+def begin_request():
+    """於請求開始時建立 span 收集器，回傳 token 供 end_request 還原"""
+    return _request_spans.set([])
+
+
+def end_request(token) -> List[Tuple[str, float]]:
+    """結束請求並取回收集到的 span"""
+    spans = _request_spans.get() or []
+    _request_spans.reset(token)
+    return spans
+
+
+def server_timing_header(spans: List[Tuple[str, float]], total: float) -> str:
+    """將同名 span 加總後組成 Server-Timing 標頭 (單位: 毫秒)"""
+    merged: Dict[str, float] = {}
+    for name, elapsed in spans:
+        merged[name] = merged.get(name, 0.0) + elapsed
+    parts = [f"{name};dur={elapsed * 1000:.1f}" for name, elapsed in merged.items()]
+    parts.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(parts)
+
+
+def record_request(method: str, route: str, status: int, elapsed: float, size: Optional[int]):
+    """記錄單一請求的延遲、狀態碼與回應大小"""
+    labels = (("method", method), ("route", route))
+    registry.observe(
+        "http_request_duration_seconds", elapsed, labels,
+        help_text="HTTP request latency by route.",
+    )
+    registry.inc(
+        "http_requests_total", labels + (("status", str(status)),),
+        help_text="HTTP requests by route and status code.",
+    )
+    if size is not None:
+        registry.observe(
+            "http_response_size_bytes", size, labels, buckets=SIZE_BUCKETS,
+            help_text="HTTP response body size by route.",
+        )
+
+
+def track_in_flight(amount: int):
+    registry.add_gauge(
+        "http_requests_in_flight", amount,
+        help_text="HTTP requests currently being served.",
+    )
+
+
+def render_prometheus() -> str:
+    return registry.render()
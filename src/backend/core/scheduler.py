@@ -0,0 +1,208 @@
+# src/backend/core/scheduler.py
+"""
+依變更率排程的各銀行爬取
+GitHub Actions 每天固定爬一次全部銀行，不論資料是否有變動。排程器改以各銀行實際的變更率安排：
+
+- 每次成功爬取後 bank_offers_scraper 記錄變更筆數 (新增 + 內容變更 + 刪除) 與瀏覽器耗時 (bank_crawl_stats)
+- 在每日瀏覽器時間預算內分配各銀行的爬取間隔：間隔 ∝ √(耗時 ÷ 變更率)，
+  此分配讓「資料變更到被爬到之間的累計延遲」在相同預算下最小 (變更多的銀行較常爬、穩定的銀行較少爬)
+- 間隔介於 MIN_INTERVAL_HOURS 與 MAX_INTERVAL_HOURS 之間，但預算優先
+- 工作一律交給 JobManager 的單一 worker 執行，佇列中有工作時不排入，
+  前一個工作結束後至少間隔 STAGGER_SECONDS，兩個 Chromium 工作不會重疊
+
+後端設定 SCRAPE_SCHEDULER=1 時於 lifespan 啟動；也可單獨執行：
+    python -m src.backend.core.scheduler           # 常駐 worker
+    python -m src.backend.core.scheduler --plan    # 只印出目前的排程
+"""
+
+import asyncio
+import math
+import os
+import sqlite3
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from scrapers import AVAILABLE_SCRAPERS
+from src.backend.core.jobs import job_manager
+
+# 每日瀏覽器時間預算 (秒)；未設定時為「每天爬一次全部銀行」耗時的 BUDGET_RATIO 倍
+BUDGET_SECONDS = float(os.environ["SCRAPE_BUDGET_SECONDS"]) if os.environ.get("SCRAPE_BUDGET_SECONDS") else None
+BUDGET_RATIO = float(os.environ.get("SCRAPE_BUDGET_RATIO", "0.75"))
+MIN_INTERVAL_HOURS = 4
+MAX_INTERVAL_HOURS = 72
+STAGGER_SECONDS = 300
+# 排入後仍未成功爬取 (失敗或被取消) 的銀行，至少間隔此時數才再排入
+RETRY_HOURS = 1
+TICK_SECONDS = 60
+# 尚無紀錄時的估計值：耗時 (秒) 與每小時變更筆數；變更率下限避免從未變動的銀行間隔無限大
+DEFAULT_DURATION_SECONDS = 300.0
+DEFAULT_CHANGE_RATE = 1.0
+MIN_CHANGE_RATE = 0.01
+
+
+def plan_intervals(banks: Dict[str, Dict], budget_seconds: float,
+                   min_hours: float = MIN_INTERVAL_HOURS, max_hours: float = MAX_INTERVAL_HOURS) -> Dict[str, float]:
+    """
+    banks: 銀行 -> {"change_rate": 每小時變更筆數, "duration_seconds": 每次耗時}
+    回傳 銀行 -> 爬取間隔 (小時)，Σ 耗時 × 每日次數 不超過 budget_seconds。
+    """
+    if not banks:
+        return {}
+    budget = budget_seconds / 24  # 每小時可用的瀏覽器秒數
+    cost = {b: s.get("duration_seconds") or DEFAULT_DURATION_SECONDS for b, s in banks.items()}
+    rate = {b: max(s["change_rate"] if s.get("change_rate") is not None else DEFAULT_CHANGE_RATE, MIN_CHANGE_RATE)
+            for b, s in banks.items()}
+
+    # 超出上下限的銀行固定在界線上，其餘預算再依 √(耗時 × 變更率) 分給其他銀行：
+    # 先處理超過上限的 (固定在上限會多用預算)，再處理不到下限的 (固定在下限會省下預算)
+    fixed = {}
+    intervals = {}
+    while len(fixed) < len(banks):
+        free = [b for b in banks if b not in fixed]
+        remaining = budget - sum(cost[b] / h for b, h in fixed.items())
+        if remaining <= 0:
+            intervals = {b: max_hours for b in free}
+            break
+        k = sum(math.sqrt(cost[b] * rate[b]) for b in free) / remaining
+        intervals = {b: k * math.sqrt(cost[b] / rate[b]) for b in free}
+        long = {b: max_hours for b, h in intervals.items() if h > max_hours}
+        short = {b: min_hours for b, h in intervals.items() if h < min_hours}
+        if not long and not short:
+            break
+        fixed.update(long or short)
+        intervals = {}
+    intervals.update(fixed)
+
+    # 全部固定在上限仍超出預算時，預算優先：整體等比例拉長
+    spent = sum(cost[b] / h for b, h in intervals.items())
+    if spent > budget:
+        intervals = {b: h * spent / budget for b, h in intervals.items()}
+    return intervals
+
+
+def load_crawl_stats() -> Dict[str, Dict]:
+    from database import get_bank_crawl_stats
+    try:
+        return get_bank_crawl_stats()
+    except sqlite3.OperationalError:
+        # 尚未執行過記錄變更率的爬蟲 (舊資料庫沒有 bank_crawl_stats)
+        return {}
+
+
+class CrawlScheduler:
+    """定期檢查排程，把到期的銀行交給 JobManager"""
+
+    def __init__(self, job_manager, budget_seconds: Optional[float] = BUDGET_SECONDS):
+        self.job_manager = job_manager
+        self.budget_seconds = budget_seconds
+        self._attempts: Dict[str, datetime] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def plan(self, now: Optional[datetime] = None) -> Dict:
+        """目前的預算與各銀行的間隔、下次爬取時間 (依下次爬取時間排序)"""
+        now = now or datetime.now()
+        stats = load_crawl_stats()
+        banks = {cls.config["bank_name"]: code for code, cls in AVAILABLE_SCRAPERS.items()}
+        bank_stats = {name: stats.get(name, {}) for name in banks}
+        daily_full = sum(s.get("duration_seconds") or DEFAULT_DURATION_SECONDS for s in bank_stats.values())
+        budget = self.budget_seconds if self.budget_seconds is not None else daily_full * BUDGET_RATIO
+        intervals = plan_intervals(bank_stats, budget)
+
+        entries = []
+        for name, code in banks.items():
+            s = bank_stats[name]
+            hours = intervals[name]
+            last = s.get("last_crawled_at")
+            next_run = datetime.fromisoformat(last) + timedelta(hours=hours) if last else now
+            attempted = self._attempts.get(code)
+            if attempted and (not last or attempted > datetime.fromisoformat(last)):
+                next_run = max(next_run, attempted + timedelta(hours=RETRY_HOURS))
+            entries.append({
+                "bank": code,
+                "bank_name": name,
+                "change_rate": s.get("change_rate"),
+                "duration_seconds": s.get("duration_seconds"),
+                "interval_hours": round(hours, 2),
+                "last_crawled_at": last,
+                "next_run_at": next_run.isoformat(timespec="seconds"),
+                "due": next_run <= now,
+            })
+        entries.sort(key=lambda e: e["next_run_at"])
+        planned = sum((s.get("duration_seconds") or DEFAULT_DURATION_SECONDS) * 24 / intervals[name]
+                      for name, s in bank_stats.items())
+        return {
+            "running": self.running,
+            "budget_seconds": round(budget, 1),
+            "planned_seconds": round(planned, 1),
+            "daily_full_seconds": round(daily_full, 1),
+            "banks": entries,
+        }
+
+    def tick(self, now: Optional[datetime] = None):
+        """排入最早到期的一家銀行；有工作在執行或剛結束未滿 STAGGER_SECONDS 時不排入。回傳排入的工作或 None"""
+        now = now or datetime.now()
+        if self.job_manager.busy:
+            return None
+        finished = self.job_manager.last_finished_at
+        if finished and now < datetime.fromisoformat(finished) + timedelta(seconds=STAGGER_SECONDS):
+            return None
+        due = [e for e in self.plan(now)["banks"] if e["due"]]
+        if not due:
+            return None
+        entry = due[0]
+        job, _ = self.job_manager.submit(entry["bank"], entry["bank_name"])
+        self._attempts[entry["bank"]] = now
+        print(f"[排程] 排入 {entry['bank_name']} (間隔 {entry['interval_hours']} 小時)")
+        return job
+
+    async def run(self):
+        while True:
+            try:
+                self.tick()
+            except Exception as e:
+                print(f"排程檢查失敗: {e}")
+            await asyncio.sleep(TICK_SECONDS)
+
+    def start(self):
+        if not self.running:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+crawl_scheduler = CrawlScheduler(job_manager)
+
+
+async def _run_worker():
+    from src.backend.core.browser_pool import browser_pool
+    try:
+        await crawl_scheduler.run()
+    finally:
+        await job_manager.shutdown()
+        await browser_pool.close()
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+    parser = argparse.ArgumentParser(description="依變更率排程的各銀行爬取")
+    parser.add_argument("--plan", action="store_true", help="只印出目前的排程")
+    parser.add_argument("--budget", type=float, help="每日瀏覽器時間預算 (秒)")
+    args = parser.parse_args()
+    if args.budget is not None:
+        crawl_scheduler.budget_seconds = args.budget
+    if args.plan:
+        print(json.dumps(crawl_scheduler.plan(), ensure_ascii=False, indent=2))
+    else:
+        asyncio.run(_run_worker())
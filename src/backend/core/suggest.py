@@ -0,0 +1,183 @@
+# src/backend/core/suggest.py
+"""
+搜尋框的輸入提示 (/api/suggest)。
+
+以排序陣列 + bisect 做前綴查詢：每個標題從每個中文字 / 英數單字的起點取 n-gram (最長 MAX_KEY_CHARS 字)
+當作鍵，所以「巴克」也能提示「星巴克買一送一」；特店與分類名稱同樣建鍵，權重為優惠筆數。
+1–2 字的短前綴符合的鍵太多，建索引時直接算好前 MAX_LIMIT 名；較長的前綴在 bisect 找到的範圍內取前 k 名。
+
+索引只存在記憶體中，資料版本 (變更序號與資料庫檔案) 改變時重建，每秒最多檢查一次版本。
+"""
+import bisect
+import heapq
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from typing import Dict, List, Optional
+
+from categories import CANONICAL_CATEGORIES
+
+MAX_KEY_CHARS = 12
+SHORT_PREFIX = 2
+MAX_LIMIT = 20
+VERSION_CHECK_SECONDS = 1.0
+# 鍵的起點：中文字，或英數單字的第一個字元
+_START_RE = re.compile(r"[㐀-鿿豈-﫿]|(?<![0-9a-z])[0-9a-z]")
+_END = "\U0010ffff"
+
+
+def normalize(text: str) -> str:
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFKC", text or "").lower()).strip()
+
+
+class SuggestIndex:
+    """
+    entries: [{"text", "kind", "value", "count"}]，相同 (kind, text) 會合併並累加 count。
+    排名：從開頭就符合的優先，其次是 count 較多、文字較短的。
+    """
+
+    def __init__(self, entries: List[Dict]):
+        merged = {}
+        for entry in entries:
+            text = (entry.get("text") or "").strip()
+            if not text:
+                continue
+            key = (entry["kind"], text)
+            if key in merged:
+                merged[key]["count"] += entry.get("count", 1)
+            else:
+                merged[key] = {"text": text, "kind": entry["kind"], "value": entry.get("value", text),
+                               "count": entry.get("count", 1)}
+        self.entries = list(merged.values())
+        self._normalized = [normalize(e["text"]) for e in self.entries]
+
+        postings = []
+        for entry_id, text in enumerate(self._normalized):
+            seen = set()
+            for match in _START_RE.finditer(text):
+                start = match.start()
+                gram = text[start:start + MAX_KEY_CHARS]
+                if gram not in seen:
+                    seen.add(gram)
+                    postings.append((gram, entry_id, start == 0))
+        postings.sort()
+        self._keys = [p[0] for p in postings]
+        self._postings = [(p[1], p[2]) for p in postings]
+
+        # 短前綴的前幾名：每個 (前綴, 條目) 只保留最好的排名
+        best = {}
+        for gram, entry_id, at_start in postings:
+            for size in range(1, min(SHORT_PREFIX, len(gram)) + 1):
+                slot = best.setdefault(gram[:size], {})
+                slot[entry_id] = slot.get(entry_id, False) or at_start
+        self._top = {prefix: self._rank(hits.items(), MAX_LIMIT) for prefix, hits in best.items()}
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _rank(self, hits, limit):
+        return [entry_id for entry_id, _ in heapq.nsmallest(
+            limit, hits,
+            key=lambda hit: (not hit[1], -self.entries[hit[0]]["count"], len(self._normalized[hit[0]]),
+                             self._normalized[hit[0]]),
+        )]
+
+    def suggest(self, query: str, limit: int = 10) -> List[Dict]:
+        q = normalize(query)
+        if not q:
+            return []
+        limit = max(1, min(limit, MAX_LIMIT))
+        if len(q) <= SHORT_PREFIX and q in self._top:
+            ids = self._top[q][:limit]
+        else:
+            lo = bisect.bisect_left(self._keys, q[:MAX_KEY_CHARS])
+            hi = bisect.bisect_left(self._keys, q[:MAX_KEY_CHARS] + _END, lo)
+            hits = {}
+            for entry_id, at_start in self._postings[lo:hi]:
+                # 超過 MAX_KEY_CHARS 的查詢只比對到鍵的長度，再確認全文包含
+                if len(q) > MAX_KEY_CHARS and q not in self._normalized[entry_id]:
+                    continue
+                hits[entry_id] = hits.get(entry_id, False) or at_start
+            ids = self._rank(hits.items(), limit)
+        return [dict(self.entries[i]) for i in ids]
+
+
+def load_entries(conn) -> List[Dict]:
+    """標題、特店 (含優惠筆數) 與分類 (標準分類以中文名稱顯示，value 為分類代碼)"""
+    entries = []
+    for row in conn.execute("SELECT title, category FROM offers WHERE LENGTH(title) > 2"):
+        entries.append({"text": row["title"], "kind": "offer"})
+        if row["category"]:
+            entries.append({"text": row["category"], "kind": "category"})
+    try:
+        for row in conn.execute("""
+            SELECT m.name, COUNT(*) AS n FROM merchants m JOIN merchant_offers mo ON mo.merchant_id = m.id
+            GROUP BY m.id
+        """):
+            entries.append({"text": row["name"], "kind": "merchant", "count": row["n"]})
+        for row in conn.execute("""
+            SELECT canonical_category, COUNT(*) AS n FROM offers
+            WHERE canonical_category IS NOT NULL AND LENGTH(title) > 2 GROUP BY canonical_category
+        """):
+            label = CANONICAL_CATEGORIES.get(row["canonical_category"])
+            if label:
+                entries.append({"text": label, "kind": "canonical_category", "value": row["canonical_category"],
+                                "count": row["n"]})
+    except sqlite3.OperationalError:
+        # 舊版資料庫尚無特店索引與標準分類
+        pass
+    return entries
+
+
+class SuggestService:
+    """依資料版本快取 SuggestIndex；版本改變 (爬蟲更新或下載了新的資料庫) 時重建"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._index: Optional[SuggestIndex] = None
+        self._version = None
+        self._checked_at = 0.0
+        self.builds = 0
+
+    def _current_version(self, conn):
+        from src.backend.core import database
+        try:
+            stat = os.stat(database.DB_PATH)
+            file_id = (stat.st_ino, stat.st_mtime_ns)
+        except OSError:
+            file_id = None
+        return file_id, database.DB_GENERATION, database.get_change_seq(conn)
+
+    def index(self) -> SuggestIndex:
+        now = time.monotonic()
+        if self._index is not None and now - self._checked_at < VERSION_CHECK_SECONDS:
+            return self._index
+        with self._lock:
+            if self._index is not None and now - self._checked_at < VERSION_CHECK_SECONDS:
+                return self._index
+            from src.backend.core.database import get_db
+            conn = get_db()
+            try:
+                version = self._current_version(conn)
+                if self._index is None or version != self._version:
+                    self._index = SuggestIndex(load_entries(conn))
+                    self._version = version
+                    self.builds += 1
+            finally:
+                conn.close()
+            self._checked_at = time.monotonic()
+            return self._index
+
+    def invalidate(self):
+        with self._lock:
+            self._checked_at = 0.0
+            self._version = None
+
+    def suggest(self, query: str, limit: int = 10) -> List[Dict]:
+        return self.index().suggest(query, limit)
+
+
+suggest_service = SuggestService()
@@ -1,18 +1,64 @@
-from fastapi import FastAPI, Response, Header, HTTPException, Depends
+from fastapi import FastAPI, Request, Response, Header, HTTPException, Depends, Query
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import RedirectResponse
-from typing import Optional
-import uvicorn
-import sys
+from fastapi.responses import RedirectResponse, PlainTextResponse, StreamingResponse
+from typing import List, Optional
+from contextlib import asynccontextmanager
+from functools import lru_cache
 import os
-import requests
-from src.backend.core.database import fetch_offers, get_filters
-from geopy.geocoders import Nominatim
-import subprocess
+import time
+import traceback
+import asyncio
+from datetime import date
+from src.backend.core.database import (
+    bootstrap_db, fetch_offers, fetch_offers_as_of, normalize_as_of, get_filters, get_facets, get_db,
+    fetch_offer_changes, get_change_seq, get_change_source, get_data_stamp,
+    fetch_progress_events, get_progress_snapshot, get_data_version,
+    fetch_merchant_offers, fetch_recommendations, fetch_merchant_location, fetch_offers_near,
+)
+from src.backend.core import metrics
+from src.backend.core.jobs import job_manager
+from src.backend.core.browser_pool import browser_pool
+from src.backend.core.suggest import suggest_service
+from src.backend.core.scheduler import crawl_scheduler
+from scrapers import get_scraper
+from merchants import find_merchant
+from models import to_json
+from near_duplicates import strip_bank_tokens
 import json
 
-app = FastAPI(title="信用卡優惠 API")
-geolocator = Nominatim(user_agent="ccard_war_room")
+# 冷啟動時間：import 階段不做網路 / 磁碟 I/O，也不載入 geopy、requests、playwright 等較重的套件。
+# 資料庫下載與瀏覽器預熱都在 lifespan 中以背景工作執行，uvicorn 綁定埠號後即可回應 /api/status
+# (量測方式見 startup_profile.py)。
+@asynccontextmanager
+async def lifespan(app):
+    # 保留工作參照，避免背景工作在完成前被回收
+    app.state.startup_tasks = [asyncio.create_task(asyncio.to_thread(bootstrap_db))]
+    # 背景預熱 Chromium，第一次更新請求不必等待瀏覽器啟動 (BROWSER_POOL_WARM=0 可停用)
+    if browser_pool.available and os.environ.get("BROWSER_POOL_WARM", "1") != "0":
+        app.state.startup_tasks.append(asyncio.create_task(_start_browser_pool()))
+    # 依變更率自動排程各銀行的爬取 (SCRAPE_SCHEDULER=1 啟用，見 src/backend/core/scheduler.py)
+    if os.environ.get("SCRAPE_SCHEDULER") == "1":
+        crawl_scheduler.start()
+    try:
+        yield
+    finally:
+        await crawl_scheduler.stop()
+        await job_manager.shutdown()
+        await browser_pool.close()
+
+async def _start_browser_pool():
+    try:
+        await browser_pool.start()
+    except Exception as e:
+        print(f"預熱瀏覽器池失敗，更新工作將於需要時再啟動: {e}")
+
+app = FastAPI(title="信用卡優惠 API", lifespan=lifespan)
+
+@lru_cache(maxsize=1)
+def get_geolocator():
+    # 第一次查詢地點時才載入 geopy 並建立 Nominatim 用戶端
+    from geopy.geocoders import Nominatim
+    return Nominatim(user_agent="ccard_war_room")
 
 # 動態設定允許的 CORS 網域（從環境變數 ALLOWED_ORIGINS 讀取）
 allowed_origins_raw = os.environ.get("ALLOWED_ORIGINS")
@@ -27,8 +73,45 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "X-Change-Seq", "X-Change-Source"],
 )
 
+# 請求計時 middleware：記錄各路由延遲、回應大小與進行中請求數，並附上 Server-Timing 標頭
+@app.middleware("http")
+async def timing_middleware(request: Request, call_next):
+    start = time.perf_counter()
+    token = metrics.begin_request()
+    metrics.track_in_flight(1)
+    try:
+        response = await call_next(request)
+    except Exception:
+        # 未處理的例外在這裡轉成 500，回應同樣帶有 Server-Timing 並計入指標
+        traceback.print_exc()
+        response = PlainTextResponse("Internal Server Error", status_code=500)
+    finally:
+        metrics.track_in_flight(-1)
+    elapsed = time.perf_counter() - start
+    spans = metrics.end_request(token)
+    # 使用路由樣板 (例如 /api/offers) 而非原始路徑，避免標籤數量爆增
+    route_path = getattr(request.scope.get("route"), "path", "<unmatched>")
+    content_length = response.headers.get("content-length")
+    metrics.record_request(
+        request.method, route_path, response.status_code, elapsed,
+        int(content_length) if content_length else None,
+    )
+    response.headers["Server-Timing"] = metrics.server_timing_header(spans, elapsed)
+    return response
+
+def json_response(payload, headers=None):
+    """含 Offer / Card 的回應直接序列化為 JSON (models.to_json)，不經過 FastAPI 逐層轉換的通用編碼器"""
+    with metrics.span("serialize"):
+        body = to_json(payload)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    return PlainTextResponse(metrics.render_prometheus(), media_type="text/plain; version=0.0.4")
+
 # API 金鑰驗證依賴項
 async def verify_api_key(x_api_key: Optional[str] = Header(None)):
     expected_key = os.environ.get("API_KEY")
@@ -41,80 +124,311 @@ async def image_proxy(url: str):
     if not url:
         return Response(status_code=400)
     
-    # 根據網址決定 Referer 繞過防盜連
-    referer = ""
-    if "ctbcbank.com" in url:
-        referer = "https://www.ctbcbank.com/"
-    elif "cathay-cube.com" in url or "cathaybk.com" in url:
-        referer = "https://www.cathaybk.com.tw/"
-    elif "ubot.com.tw" in url:
-        referer = "https://card.ubot.com.tw/"
-    elif "esunbank.com" in url:
-        referer = "https://www.esunbank.com/"
-        
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-        "Referer": referer
-    }
-    
+    # 延遲載入，避免拖慢冷啟動
+    import requests
+    from image_checks import get_image_cache, request_headers
+
+    # 爬蟲結束後的圖片檢查 (image_checks.py) 已預先下載可用的圖片
+    cache = get_image_cache()
+    cached = await asyncio.to_thread(cache.get, url)
+    if cached is not None:
+        metrics.registry.inc("image_proxy_cache_total", (("result", "hit"),), help_text="Image proxy disk cache lookups.")
+        return Response(content=cached["body"], media_type=cached["headers"].get("Content-Type", "image/jpeg"))
+    metrics.registry.inc("image_proxy_cache_total", (("result", "miss"),), help_text="Image proxy disk cache lookups.")
+
     try:
-        r = requests.get(url, headers=headers, timeout=5)
+        with metrics.span("upstream"):
+            # Referer 依各銀行爬蟲設定的 image_hosts 決定，繞過防盜連
+            r = await asyncio.to_thread(requests.get, url, headers=request_headers(url), timeout=5)
         if r.status_code == 200:
             content_type = r.headers.get("Content-Type", "image/jpeg")
+            if content_type.startswith("image/"):
+                await asyncio.to_thread(cache.put, url, 200, {"Content-Type": content_type}, r.content)
             return Response(content=r.content, media_type=content_type)
         else:
+            metrics.registry.inc("image_proxy_fallback_total", (("reason", f"http_{r.status_code}"),), help_text="Image proxy requests redirected to the original URL.")
             print(f"圖片 Proxy 失敗 (HTTP {r.status_code})，網址: {url}。將重定向至原網址。")
             return RedirectResponse(url=url)
     except Exception as e:
+        metrics.registry.inc("image_proxy_fallback_total", (("reason", type(e).__name__),), help_text="Image proxy requests redirected to the original URL.")
         print(f"圖片 Proxy 異常 (錯誤: {e})，網址: {url}。將重定向至原網址。")
         return RedirectResponse(url=url)
 
 @app.get("/api/map-locate")
 async def get_location(query: str):
-    clean_query = query.replace("中國信託", "").replace("國泰世華", "").replace("聯邦銀行", "").replace("玉山銀行", "").replace("優惠", "").strip()
+    # 優先以特店字典 / 標題樣式擷取的特店名稱查詢，找不到時去除銀行名稱後以原字串查詢
+    merchant = find_merchant(query)
+    # geocode 階段已查過座標的特店直接回傳，不必即時查詢 Nominatim
+    point = fetch_merchant_location(merchant) if merchant else None
+    if point:
+        return {"lat": point[0], "lon": point[1]}
+    clean_query = merchant or strip_bank_tokens(query).replace("銀行", "").replace("優惠", "").strip()
     if len(clean_query) < 2:
         clean_query = query
         
-    location = geolocator.geocode(clean_query + " 台北市")
+    with metrics.span("geocode"):
+        location = get_geolocator().geocode(clean_query + " 台北市")
     if location:
         return {"lat": location.latitude, "lon": location.longitude}
     return {"error": "Location not found"}
 
+@app.get("/api/offers/near")
+async def get_offers_near(lat: float, lon: float, radius: float = 1.0, limit: int = 200, bank: Optional[str] = None):
+    """
+    附近特店的優惠 (radius 單位為公里)，依距離排序，每筆附上特店座標與 distance_km。
+    座標來自爬蟲更新後的 geocode 階段 (geo.py)，查詢時不呼叫地理編碼服務。
+    """
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        raise HTTPException(status_code=400, detail="lat 必須介於 -90 與 90、lon 必須介於 -180 與 180")
+    radius = max(0.05, min(radius, 50.0))
+    limit = max(1, min(limit, 1000))
+    return json_response(fetch_offers_near(lat, lon, radius, limit, bank))
+
+@app.get("/api/merchants/{name}/offers")
+async def get_merchant_offers(name: str, bank: Optional[str] = None):
+    """
+    某特店的所有優惠 (名稱可為別名，例如 starbucks)。
+    以特店索引直接查詢，不對標題做 LIKE 掃描。
+    """
+    result = fetch_merchant_offers(name, bank)
+    if result is None:
+        raise HTTPException(status_code=404, detail=f"找不到特店: {name}")
+    return json_response(result)
+
+@app.get("/api/recommendations")
+async def get_recommendations(
+    merchant: Optional[str] = None,
+    card_id: Optional[List[int]] = Query(None),
+    limit: int = 20,
+):
+    """
+    卡包中各卡適用的最佳優惠 (依回饋比例排序)，每筆附上適用的卡片。
+    merchant 限定特店 (可為別名)；card_id 可重複指定，只看部分卡片。
+    """
+    limit = max(1, min(limit, 200))
+    result = fetch_recommendations(merchant, card_id, limit)
+    if result is None:
+        raise HTTPException(status_code=404, detail=f"找不到特店: {merchant}")
+    return json_response(result)
+
+@app.get("/api/saved-searches")
+async def list_saved_searches():
+    from database import get_saved_searches
+    return get_saved_searches()
+
+@app.post("/api/saved-searches", dependencies=[Depends(verify_api_key)])
+async def create_saved_search(
+    query: str = "",
+    name: Optional[str] = None,
+    bank: Optional[str] = None,
+    category: Optional[str] = None,
+    webhook_url: Optional[str] = None,
+):
+    """
+    儲存搜尋 (詞以空白或 + 分隔，例如「旅遊 + 國泰世華」)。
+    之後新增的優惠符合時寫入通知 outbox，爬蟲更新後送出 (見 saved_searches.py)。
+    """
+    from database import add_saved_search
+    try:
+        search_id = add_saved_search(query, name, bank, category, webhook_url)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"id": search_id}
+
+@app.delete("/api/saved-searches/{search_id}", dependencies=[Depends(verify_api_key)])
+async def remove_saved_search(search_id: int):
+    from database import delete_saved_search
+    if not delete_saved_search(search_id):
+        raise HTTPException(status_code=404, detail="找不到此搜尋")
+    return {"deleted": search_id}
+
+@app.get("/api/suggest")
+async def get_suggestions(q: str = "", limit: int = 10):
+    """
+    搜尋框輸入提示：標題 (任意位置的中文 n-gram / 英數單字開頭)、特店與分類名稱。
+    索引常駐記憶體，資料更新後第一次查詢時重建。
+    """
+    with metrics.span("suggest"):
+        suggestions = suggest_service.suggest(q, limit)
+    return {"q": q, "suggestions": suggestions}
+
 @app.get("/api/filters")
 async def get_all_filters():
     # 直接回傳從 database.py 處理好的完整結果
     return get_filters()
 
-@app.get("/api/status")
-async def get_status():
+@app.get("/api/facets")
+async def get_category_facets(bank: Optional[str] = None):
+    """跨銀行標準分類的優惠筆數 (預先計算於 category_facets)"""
+    return get_facets(bank)
+
+# 進度串流：伺服器端檢查 SQLite 是否有新提交的間隔，以及無事件時送出 keepalive 的間隔
+STATUS_STREAM_POLL_SECONDS = 0.5
+STATUS_STREAM_KEEPALIVE_SECONDS = 15
+
+def read_status_file():
     status_file = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "status.json")
     if os.path.exists(status_file):
         with open(status_file, "r", encoding="utf-8") as f:
             return json.load(f)
     return {"status": "空閒"}
 
+def format_sse(event, data, event_id=None):
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, ensure_ascii=False)}")
+    return "\n".join(lines) + "\n\n"
+
+@app.get("/api/status")
+async def get_status():
+    return read_status_file()
+
+@app.get("/api/status/stream")
+async def status_stream(request: Request, last_event_id: Optional[str] = Header(None)):
+    """
+    以 Server-Sent Events 推送爬蟲進度。
+    爬蟲行程將事件寫入共用的 scrape_progress 資料表，這裡用 PRAGMA data_version 偵測新提交，
+    有變化時才查詢並推送，瀏覽器不需再每 3 秒輪詢。
+    """
+    async def event_source():
+        conn = get_db()
+        try:
+            last_id, running = get_progress_snapshot(conn)
+            if last_event_id and last_event_id.isdigit():
+                # 瀏覽器自動重連時從中斷處接續
+                last_id = int(last_event_id)
+            status = {"status": "更新中..."} if running else read_status_file()
+            yield format_sse("status", status)
+
+            version = None
+            idle = 0.0
+            while not await request.is_disconnected():
+                current_version = get_data_version(conn)
+                if current_version != version:
+                    version = current_version
+                    for event in fetch_progress_events(conn, last_id):
+                        last_id = event["id"]
+                        yield format_sse("progress", event, event_id=last_id)
+                        idle = 0.0
+                await asyncio.sleep(STATUS_STREAM_POLL_SECONDS)
+                idle += STATUS_STREAM_POLL_SECONDS
+                if idle >= STATUS_STREAM_KEEPALIVE_SECONDS:
+                    yield ": keepalive\n\n"
+                    idle = 0.0
+        finally:
+            conn.close()
+
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 @app.post("/api/refresh", dependencies=[Depends(verify_api_key)])
-async def refresh_data():
+async def refresh_data(bank: Optional[str] = None):
+    """
+    排入爬蟲更新工作。
+    不帶 bank 時更新全部銀行；帶銀行代碼 (例如 ?bank=ctbc) 時只更新該銀行。
+    相同目標已在佇列或執行中時會合併請求，不會再啟動第二個 Chromium。
+    """
+    bank_name = None
+    if bank:
+        try:
+            scraper = get_scraper(bank)
+        except ValueError:
+            raise HTTPException(status_code=400, detail=f"未知的銀行代碼: {bank}")
+        bank = bank.lower()
+        bank_name = scraper.bank_name
     try:
-        project_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-        scraper_script = os.path.join(project_dir, "bank_offers_scraper.py")
-        # 建立 status.json 初始狀態
-        with open(os.path.join(project_dir, "status.json"), "w", encoding="utf-8") as f:
-            import json
-            json.dump({"status": "更新中..."}, f, ensure_ascii=False)
-            
-        subprocess.Popen([sys.executable, scraper_script], cwd=project_dir)
-        return {"status": "開始更新"}
+        job, merged = job_manager.submit(bank, bank_name)
     except Exception as e:
         return {"error": str(e)}
+    return {"status": "已在更新中" if merged else "開始更新", "merged": merged, "job": job.to_dict()}
+
+@app.get("/api/jobs")
+async def list_jobs():
+    return [job.to_dict() for job in job_manager.list()]
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="找不到此工作")
+    return job.to_dict()
+
+@app.delete("/api/jobs/{job_id}", dependencies=[Depends(verify_api_key)])
+async def cancel_job(job_id: str):
+    job = job_manager.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="找不到此工作")
+    return job.to_dict()
+
+@app.get("/api/schedule")
+async def get_schedule():
+    """各銀行的變更率、爬取間隔與下次爬取時間，以及每日瀏覽器時間預算"""
+    return crawl_scheduler.plan()
+
+@app.get("/api/browser-pool")
+async def get_browser_pool():
+    return browser_pool.stats()
 
 @app.get("/api/offers")
 async def get_offers(
     search: Optional[str] = None,
     bank: Optional[str] = None,
-    category: Optional[str] = None
+    category: Optional[str] = None,
+    as_of: Optional[str] = None,
+    active_on: Optional[str] = None,
+    collapse: bool = False,
+    canonical_category: Optional[str] = None
 ):
-    return fetch_offers(search, bank, category)
+    # active_on：只回傳該日 (YYYY-MM-DD 或 today) 仍在活動期間內的優惠
+    if active_on:
+        try:
+            active_on = date.today().isoformat() if active_on == "today" else date.fromisoformat(active_on).isoformat()
+        except ValueError:
+            raise HTTPException(status_code=400, detail="active_on 必須為 YYYY-MM-DD 或 today")
+    # as_of：查詢過去某個時間點 (YYYY-MM-DD 或 ISO 8601) 仍有效的優惠
+    if as_of:
+        # 歷史版本沒有活動期間、近似重複群與標準分類
+        if active_on or collapse or canonical_category:
+            raise HTTPException(status_code=400, detail="as_of 不能與 active_on、collapse、canonical_category 同時使用")
+        try:
+            as_of = normalize_as_of(as_of)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="as_of 必須為 YYYY-MM-DD 或 ISO 8601 時間")
+        return json_response(fetch_offers_as_of(as_of, search, bank, category))
+    # 回傳目前的變更序號與來源識別，用戶端之後可用 /api/offers/changes?since=&source= 增量同步
+    conn = get_db()
+    try:
+        change_seq = get_change_seq(conn)
+        change_source = get_change_source(conn, change_seq)
+    finally:
+        conn.close()
+    # collapse=true：近似重複的優惠只回傳代表的一筆，並附上 cluster_size
+    # canonical_category：跨銀行的標準分類 (見 /api/facets)
+    offers = fetch_offers(search, bank, category, active_on, collapse, canonical_category)
+    return json_response(offers, headers={"X-Change-Seq": str(change_seq), "X-Change-Source": change_source})
+
+@app.get("/api/version")
+async def get_version(response: Response):
+    """前端背景檢查用：序號未變就不必重新下載 /api/offers"""
+    response.headers["Cache-Control"] = "no-store"
+    return get_data_stamp()
+
+@app.get("/api/offers/changes")
+async def get_offer_changes(since: int = 0, limit: int = 1000, source: Optional[str] = None):
+    """
+    增量同步：回傳序號大於 since 的新增 / 更新 / 刪除。
+    insert 與 update 皆可視為 upsert；reset_required 為 true 時請重新下載 /api/offers。
+    source 為取得 since 時一併取得的來源識別 (/api/version、X-Change-Source 或靜態 manifest)，
+    下一次請求改用回應的 next_since 與 next_source。
+    """
+    limit = max(1, min(limit, 5000))
+    return fetch_offer_changes(since, limit, source)
 
 if __name__ == "__main__":
+    import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8001)
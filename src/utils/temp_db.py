@@ -0,0 +1,28 @@
+# src/utils/temp_db.py
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+
+import database
+from src.backend.core import database as backend_db
+
+
+@contextmanager
+def temp_db(name: str = "test.db", source: str = None):
+    """
+    測試用的暫存資料庫：爬蟲端 (database.DB_NAME) 與後端 (DB_PATH) 同時指向新檔案並初始化，
+    結束時 (包含斷言失敗) 還原兩者，之後的測試不會寫到別的測試的資料庫。
+    source 指定時複製該檔案且不執行 init_db (用來測試尚未遷移的舊資料庫)。
+    """
+    path = os.path.join(tempfile.mkdtemp(), name)
+    original = database.DB_NAME, backend_db.DB_PATH
+    database.DB_NAME = backend_db.DB_PATH = path
+    try:
+        if source:
+            shutil.copy(source, path)
+        else:
+            database.init_db()
+        yield path
+    finally:
+        database.DB_NAME, backend_db.DB_PATH = original
@@ -0,0 +1,115 @@
+# src/utils/test_api_routes.py
+import asyncio
+import json
+import os
+import types
+
+import pytest
+
+import database
+from src.utils.temp_db import temp_db
+
+ROOT_DB = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "credit_cards.db")
+
+# 直接呼叫路由函式：main.py 漏掉的 import 會在這裡以 NameError 失敗，而不是等到上線後的第一個請求
+pytest.importorskip("fastapi")
+from fastapi import HTTPException  # noqa: E402
+from src.backend import main  # noqa: E402
+from src.backend.core import metrics  # noqa: E402
+
+
+def _call(handler, **kwargs):
+    response = asyncio.run(handler(**kwargs))
+    return json.loads(response.body)
+
+
+def _offers(**params):
+    query = {"search": None, "bank": None, "category": None, "as_of": None,
+             "active_on": None, "collapse": False, "canonical_category": None}
+    return _call(main.get_offers, **{**query, **params})
+
+
+def test_merchant_and_recommendation_routes():
+    print("正在測試特店與推薦 API...")
+    with temp_db("test_api_routes.db"):
+        card_id = database.add_card("測試銀行", "測試卡")
+        database.upsert_bank_offers("測試銀行", [
+            {"title": "星巴克買一送一", "url": "https://a"},
+            {"title": "全家便利商店刷卡滿額贈", "url": "https://b"},
+        ])
+
+        merchant = _call(main.get_merchant_offers, name="starbucks", bank=None)
+        assert merchant["merchant"] == "星巴克" and [o["title"] for o in merchant["offers"]] == ["星巴克買一送一"]
+        try:
+            asyncio.run(main.get_merchant_offers(name="不存在的店", bank=None))
+            assert False, "應該回傳 404"
+        except HTTPException as e:
+            assert e.status_code == 404
+
+        result = _call(main.get_recommendations, merchant="星巴克", card_id=None, limit=20)
+        assert [o["title"] for o in result["offers"]] == ["星巴克買一送一"]
+        assert [c["id"] for c in result["offers"][0]["cards"]] == [card_id]
+
+        # as_of 不能與只適用於目前優惠的篩選同時使用
+        try:
+            asyncio.run(main.get_offers(search=None, bank=None, category=None, as_of="2026-01-02",
+                                        active_on=None, collapse=True, canonical_category=None))
+            assert False, "應該回傳 400"
+        except HTTPException as e:
+            assert e.status_code == 400
+    print("✅ 特店與推薦 API 測試通過")
+
+
+def test_offers_route_on_legacy_db():
+    print("正在測試舊資料庫的優惠 API...")
+    # 提交在版本庫中的資料庫尚未遷移 (沒有起訖日、標準分類等欄位)
+    with temp_db("legacy.db", source=ROOT_DB):
+        everything = _offers()
+        assert everything
+        # 沒有起訖日的優惠視為有效
+        assert _offers(active_on="today") == everything
+        # 尚未分類：與 /api/facets 一樣沒有任何標準分類
+        assert _offers(canonical_category="travel") == []
+        assert _offers(canonical_category="travel", active_on="today", collapse=True) == []
+        assert asyncio.run(main.get_category_facets(bank=None)) == {"facets": []}
+        # 尚未建立儲存搜尋的資料表
+        assert asyncio.run(main.list_saved_searches()) == []
+    print("✅ 舊資料庫的優惠 API 測試通過")
+
+
+def test_timing_middleware_labels_and_errors():
+    print("正在測試請求計時 middleware...")
+    original, metrics.registry = metrics.registry, metrics.MetricsRegistry()
+    try:
+        def request(path):
+            return types.SimpleNamespace(method="GET", scope={"route": types.SimpleNamespace(path=path)})
+
+        async def ok(_):
+            with metrics.span("sqlite"):
+                pass
+            return main.Response(content=b"{}", media_type="application/json")
+
+        async def boom(_):
+            raise RuntimeError("boom")
+
+        response = asyncio.run(main.timing_middleware(request("/api/merchants/{name}"), ok))
+        assert response.status_code == 200
+        assert response.headers["Server-Timing"].startswith("sqlite;dur=")
+        # 未處理的例外同樣有 Server-Timing，並以 500 計入指標
+        response = asyncio.run(main.timing_middleware(request("/api/offers"), boom))
+        assert response.status_code == 500 and "total;dur=" in response.headers["Server-Timing"]
+
+        lines = metrics.render_prometheus().splitlines()
+        assert 'http_requests_total{method="GET",route="/api/merchants/{name}",status="200"} 1' in lines
+        assert 'http_requests_total{method="GET",route="/api/offers",status="500"} 1' in lines
+        assert "http_requests_in_flight 0" in lines
+    finally:
+        metrics.registry = original
+    print("✅ 請求計時 middleware 測試通過")
+
+
+if __name__ == "__main__":
+    test_merchant_and_recommendation_routes()
+    test_offers_route_on_legacy_db()
+    test_timing_middleware_labels_and_errors()
+    print("🎉 API 路由測試全部通過！")
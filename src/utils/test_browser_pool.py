@@ -0,0 +1,202 @@
+# src/utils/test_browser_pool.py
+import asyncio
+import os
+import sys
+import tempfile
+import time
+import types
+from contextlib import asynccontextmanager
+
+from scrapers.telemetry import ScrapeTelemetry
+from src.backend.core import jobs
+from src.backend.core.browser_pool import BrowserPool, DiskCache, _PooledContext, cache_lifetime
+
+
+def test_disk_cache_roundtrip_and_expiry():
+    print("正在測試瀏覽器磁碟快取...")
+    cache = DiskCache(tempfile.mkdtemp(), ttl=60, max_bytes=10)
+    cache.put("https://bank/logo.png", 200, {"Content-Type": "image/png", "Set-Cookie": "x"}, b"12345678")
+    hit = cache.get("https://bank/logo.png")
+    assert hit["body"] == b"12345678"
+    assert hit["headers"] == {"Content-Type": "image/png"}
+    assert cache.get("https://bank/other.png") is None
+
+    # 超過 TTL 視為未命中；prune 依大小上限刪除最舊的檔案
+    meta_path, body_path = cache._paths("https://bank/logo.png")
+    old = time.time() - 120
+    os.utime(meta_path, (old, old))
+    assert cache.get("https://bank/logo.png") is None
+    cache.prune()
+    assert not os.path.exists(meta_path)
+    print("✅ 瀏覽器磁碟快取測試通過")
+
+
+def test_cache_lifetime_follows_response_headers():
+    print("正在測試瀏覽器快取有效期限...")
+    assert cache_lifetime({"Cache-Control": "no-store"}, "image") == 0
+    assert cache_lifetime({"cache-control": "public, max-age=300"}, "script") == 300
+    assert cache_lifetime({"Cache-Control": "max-age=0"}, "stylesheet") == 0
+    assert cache_lifetime({"Expires": "Thu, 01 Jan 2026 00:10:00 GMT", "Date": "Thu, 01 Jan 2026 00:00:00 GMT"}, "font") == 600
+    assert cache_lifetime({"Expires": "0"}, "image") == 0
+    # 沒有有效期限資訊：script 不快取，其他資源沿用快取 TTL
+    assert cache_lifetime({}, "script") == 0
+    assert cache_lifetime({}, "image") is None
+
+    cache = DiskCache(tempfile.mkdtemp(), ttl=3600)
+    cache.put("https://bank/app.css", 200, {}, b"css", max_age=-1)
+    assert cache.get("https://bank/app.css") is None
+    cache.put("https://bank/app.css", 200, {}, b"css", max_age=60)
+    assert cache.get("https://bank/app.css")["body"] == b"css"
+    print("✅ 瀏覽器快取有效期限測試通過")
+
+
+class FakePool:
+    available = True
+
+    def __init__(self):
+        self.leases = 0
+
+    @asynccontextmanager
+    async def lease(self):
+        self.leases += 1
+        yield "context"
+
+
+def test_jobs_run_in_process_with_leased_context():
+    print("正在測試瀏覽器池工作執行...")
+    calls = []
+
+    async def fake_main(bank_codes=None, context=None):
+        calls.append((bank_codes, context))
+        if bank_codes == ["slow"]:
+            await asyncio.sleep(10)
+
+    sys.modules["bank_offers_scraper"] = types.SimpleNamespace(main=fake_main)
+    write_status, jobs.write_status = jobs.write_status, lambda status: None
+    try:
+        async def scenario():
+            pool = FakePool()
+            manager = jobs.JobManager(pool)
+            job, _ = manager.submit("ctbc", "中國信託")
+            slow, _ = manager.submit("slow", "測試銀行")
+            await asyncio.sleep(0.05)
+            manager.cancel(slow.id)
+            await asyncio.sleep(0.05)
+            await manager.shutdown()
+            return pool, job, slow
+
+        pool, job, slow = asyncio.run(scenario())
+    finally:
+        del sys.modules["bank_offers_scraper"]
+        jobs.write_status = write_status
+
+    assert calls[0] == (["ctbc"], "context")
+    assert pool.leases == 2
+    assert job.status == jobs.SUCCEEDED and job.mode == "pool"
+    assert slow.status == jobs.CANCELLED
+    print("✅ 瀏覽器池工作執行測試通過")
+
+
+def test_progress_sink_does_not_block_event_loop():
+    print("正在測試背景進度事件...")
+    written = []
+
+    def slow_sink(record):
+        time.sleep(0.05)  # 模擬 SQLite 寫入
+        written.append(record["event"])
+
+    telemetry = ScrapeTelemetry(events_file="")
+    telemetry.add_sink(slow_sink, background=True)
+    telemetry.add_sink(slow_sink, background=True)
+    start = time.perf_counter()
+    for event in ("run_start", "bank", "run_end"):
+        telemetry.emit(event)
+    assert time.perf_counter() - start < 0.05
+    telemetry.flush()
+    assert written == ["run_start", "bank", "run_end"]
+    print("✅ 背景進度事件測試通過")
+
+
+class FakeBrowser:
+    def is_connected(self):
+        return True
+
+
+class FakeBrowserContext:
+    pages = []
+
+
+def test_concurrent_leases_and_failed_fetch():
+    print("正在測試瀏覽器池並行租用...")
+
+    async def scenario():
+        pool = BrowserPool(size=1, cache=DiskCache(tempfile.mkdtemp()))
+        pool._browser = FakeBrowser()
+        pool._idle = asyncio.Queue()
+        pool._idle.put_nowait(_PooledContext(FakeBrowserContext()))
+        pool._alive = 1
+        in_use = []
+        overlaps = []
+
+        async def use():
+            async with pool.lease() as context:
+                overlaps.append(context in in_use)
+                in_use.append(context)
+                await asyncio.sleep(0.01)
+                in_use.remove(context)
+
+        await asyncio.gather(use(), use(), use())
+        assert overlaps == [False, False, False] and pool._alive == 1
+
+        calls = []
+
+        class FailingRoute:
+            request = types.SimpleNamespace(method="GET", resource_type="image", url="https://bank/x.png")
+
+            async def fetch(self):
+                calls.append("fetch")
+                raise RuntimeError("net::ERR_FAILED")
+
+            async def continue_(self):
+                calls.append("continue")
+
+            async def abort(self):
+                calls.append("abort")
+
+        await pool._handle_route(FailingRoute())
+        assert calls == ["fetch", "abort"]
+
+        # no-store 的 script 不進快取，下次仍向網站取得；一般圖片第二次由快取回應
+        fetched = []
+
+        class CachingRoute:
+            def __init__(self, url, resource_type, headers):
+                self.request = types.SimpleNamespace(method="GET", resource_type=resource_type, url=url)
+                self.headers = headers
+
+            async def fetch(self):
+                fetched.append(self.request.url)
+
+                async def body():
+                    return b"data"
+                return types.SimpleNamespace(status=200, headers=self.headers, body=body)
+
+            async def fulfill(self, **kwargs):
+                pass
+
+        for _ in range(2):
+            await pool._handle_route(CachingRoute("https://bank/app.js", "script", {"Cache-Control": "no-store"}))
+            await pool._handle_route(CachingRoute("https://bank/logo.png", "image", {"Content-Type": "image/png"}))
+        assert fetched == ["https://bank/app.js", "https://bank/logo.png", "https://bank/app.js"]
+
+    asyncio.run(scenario())
+    print("✅ 瀏覽器池並行租用測試通過")
+
+
+if __name__ == "__main__":
+    test_disk_cache_roundtrip_and_expiry()
+    test_cache_lifetime_follows_response_headers()
+    test_jobs_run_in_process_with_leased_context()
+    test_progress_sink_does_not_block_event_loop()
+    test_concurrent_leases_and_failed_fetch()
+    print("🎉 瀏覽器池測試全部通過！")
@@ -0,0 +1,66 @@
+# src/utils/test_categories.py
+import database
+from categories import TitleClassifier, classify_offer, update_canonical_categories
+from src.backend.core import database as backend_db
+from src.utils.temp_db import temp_db
+
+
+def test_rules_map_bank_categories():
+    print("正在測試分類規則...")
+    assert classify_offer("旅遊玩家", "【中信卡】某某") == "travel"
+    assert classify_offer("旅遊優惠", "Agoda") == "travel"
+    # 籠統的來源分類依標題判斷
+    assert classify_offer("信用卡優惠", "CUBE信用卡&麥當勞專屬優惠") == "dining"
+    assert classify_offer("全台優惠", "momo購物網 刷卡優惠") == "online"
+    assert classify_offer("全台優惠", "基金新朋友禮") == "other"
+    # 範圍較廣的來源分類：標題可判斷時以標題為準，否則採用預設對應
+    assert classify_offer("購物娛樂", "五月天演唱會購票") == "entertainment"
+    assert classify_offer("購物娛樂", "聯邦卡友日") == "shopping"
+    print("✅ 分類規則測試通過")
+
+
+def test_classifier_abstains_without_evidence():
+    print("正在測試標題分類器...")
+    samples = [(f"長榮航線{i}", "travel") for i in range(5)] + [(f"全家便利{i}", "shopping") for i in range(5)]
+    classifier = TitleClassifier(samples)
+    assert classifier.predict("長榮航空極致卡")[0] == "travel"
+    assert classifier.predict("基金新朋友禮") == (None, 0.0)
+    print("✅ 標題分類器測試通過")
+
+
+def test_facets_follow_upserts():
+    print("正在測試分類統計...")
+    with temp_db("test_categories.db"):
+        database.upsert_bank_offers("測試銀行", [
+            {"title": "Agoda 訂房優惠", "url": "https://a", "category": "信用卡優惠"},
+            {"title": "星巴克買一送一", "url": "https://b", "category": "信用卡優惠"},
+        ])
+        database.upsert_bank_offers("另一銀行", [
+            {"title": "日本旅遊回饋", "url": "https://c", "category": "旅遊優惠"},
+        ])
+        facets = {f["key"]: f for f in backend_db.get_facets()["facets"]}
+        assert facets["travel"]["count"] == 2
+        assert facets["travel"]["banks"] == {"測試銀行": 1, "另一銀行": 1}
+        assert facets["dining"]["count"] == 1
+        assert backend_db.get_facets("另一銀行")["facets"][0]["key"] == "travel"
+
+        travel = backend_db.fetch_offers(canonical_category="travel")
+        assert sorted(o.title for o in travel) == ["Agoda 訂房優惠", "日本旅遊回饋"]
+
+        # 下架後統計同步減少
+        database.upsert_bank_offers("測試銀行", [
+            {"title": "星巴克買一送一", "url": "https://b", "category": "信用卡優惠"},
+        ])
+        facets = {f["key"]: f for f in backend_db.get_facets()["facets"]}
+        assert facets["travel"]["banks"] == {"另一銀行": 1}
+
+        stats = update_canonical_categories(database.get_connection())
+        assert stats["offers"] == 2 and stats["updated"] == 0
+    print("✅ 分類統計測試通過")
+
+
+if __name__ == "__main__":
+    test_rules_map_bank_categories()
+    test_classifier_abstains_without_evidence()
+    test_facets_follow_upserts()
+    print("🎉 分類正規化測試全部通過！")
@@ -0,0 +1,65 @@
+# src/utils/test_enrichment.py
+import asyncio
+
+import database
+import enrichment
+from src.backend.core import database as backend_db
+from src.utils.temp_db import temp_db
+
+
+def test_extract_dates_and_terms():
+    print("正在測試活動頁面解析...")
+    text = enrichment.html_to_text(
+        "<h2>活動期間</h2><p>2026/01/01 ~ 2026/03/31</p><script>var x='2020/1/1';</script>"
+        "<p>刷卡享最高10%回饋，回饋上限500元，需登錄</p>"
+    )
+    assert enrichment.extract_dates(text) == ("2026-01-01", "2026-03-31")
+    assert enrichment.extract_terms(text) == ["最高10%回饋", "回饋上限500元", "需登錄"]
+    # 民國年與「即日起」
+    assert enrichment.extract_dates("即日起至115年6月30日止") == (None, "2026-06-30")
+    assert enrichment.extract_dates("本網站 © 2026") == (None, None)
+    print("✅ 活動頁面解析測試通過")
+
+
+def test_enrich_and_prune_expired():
+    print("正在測試活動頁面補充與過期刪除...")
+    with temp_db("test_enrich.db"):
+        database.upsert_bank_offers("測試銀行", [
+            {"title": "已結束的優惠", "url": "https://a.example/old", "category": "餐飲"},
+            {"title": "進行中的優惠", "url": "https://a.example/new", "category": "餐飲"},
+        ])
+
+        pages = {
+            "https://a.example/old": "活動期間：2020/01/01~2020/12/31",
+            "https://a.example/new": "活動期間：2026/01/01~2099/12/31 滿1,000元",
+        }
+        calls = []
+
+        def fake_fetch(url, cached):
+            calls.append((url, cached is not None))
+            return {"status": 200, "etag": '"v1"', "body": pages[url]}
+
+        offers = database.get_offers_to_enrich()
+        urls = [o["url"] for o in offers]
+        results = asyncio.run(enrichment.enrich_urls(urls, database.get_http_cache(urls), fetch=fake_fetch))
+        database.save_enrichment([{**r, "offer_ids": [o["id"] for o in offers if o["url"] == url]} for url, r in results.items()])
+
+        assert database.get_offers_to_enrich() == []
+        active = backend_db.fetch_offers(active_on="2026-10-19")
+        assert [o.title for o in active] == ["進行中的優惠"]
+        assert active[0].terms == '["滿1,000元"]'
+
+        # 過期的優惠會被刪除並寫入變更紀錄；快取內的結果讓下次爬蟲不再寫入
+        assert len(database.prune_expired_offers("2026-10-19")) == 1
+        assert backend_db.fetch_offer_changes(0)["changes"][-1]["op"] == "delete"
+        assert enrichment.recently_expired_urls() == {"https://a.example/old"}
+
+        # 快取有效期限內不重新請求
+        asyncio.run(enrichment.enrich_urls(urls, database.get_http_cache(urls), fetch=fake_fetch))
+        assert len(calls) == 2
+    print("✅ 活動頁面補充測試通過")
+
+
+if __name__ == "__main__":
+    test_extract_dates_and_terms()
+    test_enrich_and_prune_expired()
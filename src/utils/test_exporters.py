@@ -0,0 +1,95 @@
+# src/utils/test_exporters.py
+import csv
+import json
+import os
+import sqlite3
+import stat
+import tempfile
+
+import exporters
+
+
+def _offers_db(count):
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE offers (id INTEGER PRIMARY KEY, bank TEXT, category TEXT, title TEXT, url TEXT, image TEXT)")
+    conn.executemany(
+        "INSERT INTO offers (bank, category, title, url, image) VALUES (?, ?, ?, ?, ?)",
+        [("測試銀行", "餐飲", f"優惠{i}", f"https://x/{i}", None) for i in range(count)],
+    )
+    return conn
+
+
+def test_export_formats_and_skip_unchanged():
+    print("正在測試匯出格式...")
+    conn = _offers_db(7)
+    base = os.path.join(tempfile.mkdtemp(), "offers")
+    results = exporters.export_offers(["csv", "json", "ndjson"], base, conn, chunk_size=3)
+    assert all(results.values())
+
+    with open(base + ".csv", encoding="utf-8-sig", newline="") as f:
+        rows = list(csv.DictReader(f))
+    with open(base + ".json", encoding="utf-8") as f:
+        records = json.load(f)
+    with open(base + ".ndjson", encoding="utf-8") as f:
+        lines = [json.loads(line) for line in f]
+    assert len(rows) == len(records) == len(lines) == 7
+    assert records[0] == {"bank": "測試銀行", "category": "餐飲", "title": "優惠0", "url": "https://x/0", "image": None}
+    assert lines == records
+
+    # 內容相同時不改寫
+    assert not any(exporters.export_offers(["csv", "json", "ndjson"], base, conn, chunk_size=3).values())
+    print("✅ 匯出格式測試通過")
+
+
+def test_export_hides_failed_images():
+    print("正在測試匯出圖片檢查...")
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE offers (id INTEGER PRIMARY KEY, bank TEXT, category TEXT, title TEXT, url TEXT, image TEXT, image_ok INTEGER)")
+    conn.executemany(
+        "INSERT INTO offers (bank, category, title, url, image, image_ok) VALUES (?, ?, ?, ?, ?, ?)",
+        [("測試銀行", "餐飲", f"優惠{i}", f"https://x/{i}", f"https://img/{i}", ok) for i, ok in enumerate((1, 0, None))],
+    )
+    base = os.path.join(tempfile.mkdtemp(), "offers")
+    exporters.export_offers(["json"], base, conn)
+    with open(base + ".json", encoding="utf-8") as f:
+        # 與 API 相同：未通過或尚未檢查的圖片輸出為空值
+        assert [r["image"] for r in json.load(f)] == ["https://img/0", None, None]
+    print("✅ 匯出圖片檢查測試通過")
+
+
+def test_atomic_write_keeps_file_mode():
+    print("正在測試匯出檔案權限...")
+    path = os.path.join(tempfile.mkdtemp(), "offers.json")
+    exporters.atomic_write_bytes(path, b"[]")
+    # 暫存檔為 0600，替換後新檔案仍可供其他使用者讀取
+    assert stat.S_IMODE(os.stat(path).st_mode) == exporters.DEFAULT_FILE_MODE
+    os.chmod(path, 0o640)
+    exporters.atomic_write_bytes(path, b"[{}]")
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o640
+    print("✅ 匯出檔案權限測試通過")
+
+
+def test_failed_write_keeps_previous_file():
+    print("正在測試原子寫入...")
+    path = os.path.join(tempfile.mkdtemp(), "offers.json")
+    exporters.atomic_write_bytes(path, b"[]")
+
+    def broken_chunks():
+        yield b"[{"
+        raise RuntimeError("寫到一半中斷")
+
+    try:
+        exporters.atomic_write_chunks(path, broken_chunks())
+    except RuntimeError:
+        pass
+    with open(path, "rb") as f:
+        assert f.read() == b"[]"
+    assert os.listdir(os.path.dirname(path)) == ["offers.json"]
+    print("✅ 原子寫入測試通過")
+
+
+if __name__ == "__main__":
+    test_export_formats_and_skip_unchanged()
+    test_export_hides_failed_images()
+    test_atomic_write_keeps_file_mode()
+    test_failed_write_keeps_previous_file()
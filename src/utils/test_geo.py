@@ -0,0 +1,98 @@
+# src/utils/test_geo.py
+import database
+from geo import bounding_box, geocode_pending_merchants, haversine_km
+from src.backend.core import database as backend_db
+from src.utils.temp_db import temp_db
+
+TAIPEI_101 = (25.0340, 121.5645)
+POINTS = {
+    "星巴克 台北市": (25.0336, 121.5650),    # 約 60 公尺
+    "全家 台北市": (25.0410, 121.5645),      # 約 780 公尺
+    "好市多 台北市": (25.0478, 121.5170),    # 台北車站附近，約 5 公里
+}
+
+
+def _geo_rows():
+    conn = database.get_connection()
+    rows = conn.execute("""
+        SELECT ml.key, g.min_lat, g.max_lat, g.min_lon, g.max_lon
+        FROM merchant_geo g JOIN merchant_locations ml ON ml.id = g.id
+    """).fetchall()
+    conn.close()
+    points = {}
+    for key, min_lat, max_lat, min_lon, max_lon in rows:
+        assert abs(max_lat - min_lat) < 1e-4 and abs(max_lon - min_lon) < 1e-4
+        points[key] = (round(min_lat, 4), round(min_lon, 4))
+    return points
+
+
+def test_distance_and_bounding_box():
+    print("正在測試距離計算...")
+    assert haversine_km(0, 0, [], []) == []
+    one_degree = haversine_km(25.0, 121.5, [26.0, 25.0], [121.5, 121.5])
+    assert abs(one_degree[0] - 111.19) < 0.05 and one_degree[1] == 0
+    min_lat, max_lat, min_lon, max_lon = bounding_box(*TAIPEI_101, 1.0)
+    # 外接矩形的邊界點距離中心恰為半徑
+    edges = haversine_km(*TAIPEI_101, [max_lat, TAIPEI_101[0]], [TAIPEI_101[1], max_lon])
+    assert all(abs(d - 1.0) < 0.01 for d in edges), edges
+    assert min_lat < TAIPEI_101[0] < max_lat and min_lon < TAIPEI_101[1] < max_lon
+    print("✅ 距離計算測試通過")
+
+
+def test_offers_near_uses_geocoded_merchants():
+    print("正在測試附近優惠查詢...")
+    with temp_db("test_geo.db"):
+        database.upsert_bank_offers("測試銀行", [
+            {"title": "星巴克買一送一", "url": "https://a"},
+            {"title": "全家便利商店刷卡滿額贈", "url": "https://b"},
+            {"title": "好市多刷卡享回饋", "url": "https://c"},
+            {"title": "博客來滿額折扣", "url": "https://d"},
+        ])
+        database.upsert_bank_offers("另一銀行", [{"title": "星巴克數位飲料券", "url": "https://e"}])
+
+        queries = []
+
+        def fake_geocode(query):
+            queries.append(query)
+            if query.startswith("全家"):
+                raise TimeoutError()
+            return POINTS.get(query)
+
+        stats = geocode_pending_merchants(geocode=fake_geocode)
+        assert stats == {"merchants": 4, "located": 2, "not_found": 1, "errors": 1}
+        assert queries[0] == "星巴克 台北市"  # 優惠多的特店優先
+        # 查到的座標寫入 R*Tree (單點矩形，單精度儲存)；查無結果與逾時的特店沒有座標列
+        assert _geo_rows() == {"星巴克": POINTS["星巴克 台北市"], "好市多": POINTS["好市多 台北市"]}
+
+        # 逾時的特店下次再查；查無結果的特店在 GEOCODE_RETRY_DAYS 內不重查
+        queries.clear()
+        assert geocode_pending_merchants(geocode=lambda q: POINTS.get(q))["located"] == 1
+        assert queries == [] and backend_db.fetch_merchant_location("familymart") == POINTS["全家 台北市"]
+        assert set(_geo_rows()) == {"星巴克", "好市多", "全家"}
+
+        near = backend_db.fetch_offers_near(*TAIPEI_101, radius_km=1.0)
+        assert [(o.title, o.extra["merchant"]) for o in near["offers"]] == [
+            ("星巴克買一送一", "星巴克"), ("星巴克數位飲料券", "星巴克"), ("全家便利商店刷卡滿額贈", "全家"),
+        ]
+        assert near["offers"][0].extra["distance_km"] < 0.1 < near["offers"][2].extra["distance_km"] < 1.0
+        assert [o.title for o in backend_db.fetch_offers_near(*TAIPEI_101, 10.0, bank="測試銀行")["offers"]] == [
+            "星巴克買一送一", "全家便利商店刷卡滿額贈", "好市多刷卡享回饋",
+        ]
+        assert backend_db.fetch_offers_near(*TAIPEI_101, 10.0, limit=1)["count"] == 1
+        assert backend_db.fetch_offers_near(0.0, 0.0, 10.0)["offers"] == []
+
+        # 外接矩形預篩走 R*Tree 索引，不掃描所有座標
+        conn = database.get_connection()
+        plan = " ".join(row[-1] for row in conn.execute("""
+            EXPLAIN QUERY PLAN
+            SELECT id FROM merchant_geo WHERE max_lat >= 25 AND min_lat <= 26 AND max_lon >= 121 AND min_lon <= 122
+        """))
+        conn.close()
+        assert "VIRTUAL TABLE INDEX" in plan, plan
+    print("✅ 附近優惠查詢測試通過")
+
+
+if __name__ == "__main__":
+    test_distance_and_bounding_box()
+    test_offers_near_uses_geocoded_merchants()
+    print("🎉 附近優惠查詢測試全部通過！")
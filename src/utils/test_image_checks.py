@@ -0,0 +1,91 @@
+# src/utils/test_image_checks.py
+import asyncio
+import struct
+import tempfile
+
+import database
+from image_checks import check_images, evaluate, image_dimensions
+from scrapers import image_referer
+from src.backend.core import database as backend_db
+from src.backend.core.browser_pool import DiskCache
+from src.utils.temp_db import temp_db
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00\x00\x00\rIHDR" + struct.pack(">II", 640, 360) + b"\x00" * 16
+GIF_PIXEL = b"GIF89a" + struct.pack("<HH", 1, 1) + b"\x00" * 20
+JPEG = (b"\xff\xd8" + b"\xff\xe0" + struct.pack(">H", 16) + b"\x00" * 14
+        + b"\xff\xc0" + struct.pack(">HBHH", 17, 8, 300, 400) + b"\x00" * 12)
+WEBP = b"RIFF" + b"\x00" * 4 + b"WEBPVP8X" + b"\x00" * 8 + (799).to_bytes(3, "little") + (449).to_bytes(3, "little")
+
+
+def test_image_dimensions_and_evaluate():
+    print("正在測試圖片尺寸解析...")
+    assert image_dimensions(PNG) == (640, 360)
+    assert image_dimensions(GIF_PIXEL) == (1, 1)
+    assert image_dimensions(JPEG) == (400, 300)
+    assert image_dimensions(WEBP) == (800, 450)
+    assert image_dimensions(b"<svg></svg>") is None
+
+    assert evaluate(200, "image/png", len(PNG), (640, 360)) == (True, None)
+    assert evaluate(200, "image/gif", len(GIF_PIXEL), (1, 1)) == (False, "too_small")
+    assert evaluate(200, "text/html", 100, None) == (False, "not_image")
+    assert evaluate(404, None, 0, None) == (False, "http_404")
+    assert image_referer("https://www.ctbcbank.com/a.jpg") == "https://www.ctbcbank.com/"
+    assert image_referer("https://img.cathay-cube.com.tw/a.jpg") == ""
+    assert image_referer("https://cathay-cube.com/a.jpg") == "https://www.cathaybk.com.tw/"
+    print("✅ 圖片尺寸解析測試通過")
+
+
+def test_checks_hide_broken_images_and_prewarm_cache():
+    print("正在測試圖片檢查...")
+    with temp_db("test_image_checks.db"):
+        database.upsert_bank_offers("測試銀行", [
+            {"title": "好圖片優惠", "url": "https://a", "image": "https://img/good.png"},
+            {"title": "佔位圖優惠", "url": "https://b", "image": "https://img/pixel.gif"},
+            {"title": "延遲載入優惠", "url": "https://c", "image": "data:image/gif;base64,R0lGOD"},
+        ])
+        # 尚未檢查的圖片不回傳
+        assert {o.visible_image() for o in backend_db.fetch_offers()} == {None}
+        seq = backend_db.get_change_seq()
+
+        responses = {
+            "https://img/good.png": {"status": 200, "content_type": "image/png", "body": PNG},
+            "https://img/pixel.gif": {"status": 200, "content_type": "image/gif", "body": GIF_PIXEL},
+        }
+        fetched = []
+
+        def fake_fetch(url):
+            fetched.append(url)
+            return responses[url]
+
+        cache = DiskCache(tempfile.mkdtemp())
+        urls = database.get_images_to_check("2000-01-01")
+        assert len(urls) == 3
+        results = asyncio.run(check_images(urls, fetch=fake_fetch, cache=cache))
+        assert sorted(fetched) == ["https://img/good.png", "https://img/pixel.gif"]
+        assert results["data:image/gif;base64,R0lGOD"]["reason"] == "not_http"
+        assert results["https://img/good.png"]["width"] == 640
+        assert cache.get("https://img/good.png")["body"] == PNG
+        assert cache.get("https://img/pixel.gif") is None
+
+        assert database.save_image_checks(list(results.values())) == 3
+        images = {o.title: o.visible_image() for o in backend_db.fetch_offers()}
+        assert images == {"好圖片優惠": "https://img/good.png", "佔位圖優惠": None, "延遲載入優惠": None}
+        assert database.get_images_to_check("2000-01-01") == []
+
+        # 只有圖片變為可用的優惠需要同步給用戶端
+        changes = backend_db.fetch_offer_changes(seq)["changes"]
+        assert [(c["title"], c["image"]) for c in changes] == [("好圖片優惠", "https://img/good.png")]
+
+        # 其他優惠換成已檢查過的圖片時直接沿用結果
+        database.upsert_bank_offers("測試銀行", [
+            {"title": "好圖片優惠", "url": "https://a", "image": "https://img/good.png"},
+            {"title": "佔位圖優惠", "url": "https://b", "image": "https://img/good.png"},
+        ])
+        assert {o.visible_image() for o in backend_db.fetch_offers()} == {"https://img/good.png"}
+    print("✅ 圖片檢查測試通過")
+
+
+if __name__ == "__main__":
+    test_image_dimensions_and_evaluate()
+    test_checks_hide_broken_images_and_prewarm_cache()
+    print("🎉 圖片檢查測試全部通過！")
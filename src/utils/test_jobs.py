@@ -0,0 +1,169 @@
+# src/utils/test_jobs.py
+import asyncio
+import os
+import sys
+import tempfile
+import types
+from contextlib import asynccontextmanager
+
+import database
+from src.backend.core import database as backend_db
+from src.backend.core import jobs
+from src.utils.temp_db import temp_db
+
+
+class FakePool:
+    available = True
+
+    @asynccontextmanager
+    async def lease(self):
+        yield "context"
+
+
+class FakeScraper:
+    """取代 bank_offers_scraper.main：每次執行等到測試放行 (或逾時 / 取消) 才結束"""
+
+    def __init__(self):
+        self.calls = []
+        self.release = {}
+
+    async def main(self, bank_codes=None, context=None):
+        key = bank_codes[0] if bank_codes else jobs.ALL_BANKS
+        self.calls.append(key)
+        self.release.setdefault(key, asyncio.Event())
+        await self.release[key].wait()
+
+
+def _run_with_fake_scraper(scenario):
+    scraper = FakeScraper()
+    statuses = []
+    sys.modules["bank_offers_scraper"] = types.SimpleNamespace(main=scraper.main)
+    write_status, jobs.write_status = jobs.write_status, statuses.append
+    try:
+        asyncio.run(scenario(jobs.JobManager(FakePool()), scraper, statuses))
+    finally:
+        del sys.modules["bank_offers_scraper"]
+        jobs.write_status = write_status
+
+
+async def _until(condition, timeout=2.0):
+    for _ in range(int(timeout / 0.01)):
+        if condition():
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError("等待逾時")
+
+
+def test_submit_merges_requests_per_key():
+    print("正在測試更新工作合併...")
+
+    async def scenario(manager, scraper, statuses):
+        ctbc, merged = manager.submit("ctbc", "中國信託")
+        assert not merged and ctbc.timeout == jobs.BANK_REFRESH_TIMEOUT == 600
+        await _until(lambda: ctbc.status == jobs.RUNNING)
+
+        # 同一銀行執行中：合併到既有工作；不同銀行另開工作
+        again, merged = manager.submit("ctbc", "中國信託")
+        assert merged and again is ctbc and ctbc.merged_requests == 1
+        esun, merged = manager.submit("esun", "玉山")
+        assert not merged and esun is not ctbc
+
+        # 佇列中的全部銀行更新吸收之後的單一銀行請求 (已有工作的銀行仍合併到自己的工作)
+        full, merged = manager.submit(None, None)
+        assert not merged and full.key == jobs.ALL_BANKS and full.timeout == jobs.FULL_REFRESH_TIMEOUT == 1800
+        cathay, merged = manager.submit("cathay", "國泰")
+        assert merged and cathay is full
+        assert manager.submit(None, None) == (full, True) and full.merged_requests == 2
+        assert manager.submit("esun", "玉山") == (esun, True)
+
+        for key in ("ctbc", "esun"):
+            await _until(lambda: key in scraper.release)
+            scraper.release[key].set()
+        await _until(lambda: jobs.ALL_BANKS in scraper.release)
+        # 全部銀行更新開始執行後，新的單一銀行請求不再合併
+        cathay, merged = manager.submit("cathay", "國泰")
+        assert not merged and cathay is not full
+
+        scraper.release["cathay"] = asyncio.Event()
+        scraper.release["cathay"].set()
+        scraper.release[jobs.ALL_BANKS].set()
+        await _until(lambda: not manager.busy)
+        assert scraper.calls == ["ctbc", "esun", jobs.ALL_BANKS, "cathay"]
+        assert [j.status for j in (ctbc, esun, full, cathay)] == [jobs.SUCCEEDED] * 4
+        await manager.shutdown()
+
+    _run_with_fake_scraper(scenario)
+    print("✅ 更新工作合併測試通過")
+
+
+def test_timeout_cancel_and_status_file():
+    print("正在測試更新工作逾時與取消...")
+    bank_timeout = jobs.BANK_REFRESH_TIMEOUT
+    jobs.BANK_REFRESH_TIMEOUT = 0.05
+    try:
+        async def scenario(manager, scraper, statuses):
+            slow, _ = manager.submit("slow", "測試銀行")
+            queued, _ = manager.submit("queued", "測試銀行")
+            full, _ = manager.submit(None, None)
+            assert slow.timeout == 0.05 and full.timeout == jobs.FULL_REFRESH_TIMEOUT
+            assert statuses == ["更新中..."] * 3
+
+            # 佇列中的工作直接取消，worker 不會執行
+            manager.cancel(queued.id)
+            assert queued.status == jobs.CANCELLED
+            await _until(lambda: slow.status == jobs.TIMEOUT)
+            assert "0.05" in slow.error
+
+            # 執行中的工作取消後，佇列清空才寫回「空閒」
+            await _until(lambda: full.status == jobs.RUNNING)
+            assert "空閒" not in statuses
+            manager.cancel(full.id)
+            await _until(lambda: full.status == jobs.CANCELLED)
+            assert statuses[-1] == "空閒" and statuses.count("空閒") == 1
+            assert scraper.calls == ["slow", jobs.ALL_BANKS]
+            assert manager.cancel(full.id) is full and manager.cancel("missing") is None
+            assert [j.id for j in manager.list()] == [full.id, queued.id, slow.id]
+            await manager.shutdown()
+
+        _run_with_fake_scraper(scenario)
+    finally:
+        jobs.BANK_REFRESH_TIMEOUT = bank_timeout
+    print("✅ 更新工作逾時與取消測試通過")
+
+
+def test_subprocess_timeout_records_run_end():
+    print("正在測試子行程逾時...")
+    script = os.path.join(tempfile.mkdtemp(), "sleep.py")
+    with open(script, "w", encoding="utf-8") as f:
+        f.write("import time\ntime.sleep(30)\n")
+    saved = jobs.SCRAPER_SCRIPT, jobs.BANK_REFRESH_TIMEOUT, jobs.write_status
+    jobs.SCRAPER_SCRIPT, jobs.BANK_REFRESH_TIMEOUT, jobs.write_status = script, 0.2, lambda status: None
+    try:
+        with temp_db("test_jobs.db"):
+            database.add_progress_event({"event": "run_start", "run_id": "r1"})
+
+            async def scenario():
+                manager = jobs.JobManager()
+                job, _ = manager.submit("ctbc", "中國信託")
+                await _until(lambda: job.status == jobs.TIMEOUT, timeout=15)
+                await manager.shutdown()
+                return job
+
+            job = asyncio.run(scenario())
+            assert job.mode == "subprocess" and job.returncode is not None
+            conn = backend_db.get_db()
+            events = backend_db.fetch_progress_events(conn)
+            conn.close()
+            # 補寫的 run_end 歸屬到最近一次 run_start
+            assert events[-1]["event"] == "run_end" and events[-1]["status"] == "timeout"
+            assert events[-1]["job_id"] == job.id and events[-1]["run_id"] == "r1"
+    finally:
+        jobs.SCRAPER_SCRIPT, jobs.BANK_REFRESH_TIMEOUT, jobs.write_status = saved
+    print("✅ 子行程逾時測試通過")
+
+
+if __name__ == "__main__":
+    test_submit_merges_requests_per_key()
+    test_timeout_cancel_and_status_file()
+    test_subprocess_timeout_records_run_end()
+    print("🎉 更新工作管理測試全部通過！")
@@ -0,0 +1,63 @@
+# src/utils/test_merchants.py
+import database
+from merchants import extract_merchants, find_merchant, resolve_merchant_key
+from src.backend.core import database as backend_db
+from src.utils.temp_db import temp_db
+
+
+def test_extract_merchants():
+    print("正在測試特店擷取...")
+    # 字典：別名對應標準名稱，最長別名優先
+    assert extract_merchants("【中信卡】蝦皮") == ["蝦皮購物"]
+    assert extract_merchants("大全聯中元節刷聯邦卡滿額最高贈1,000元") == ["大全聯"]
+    assert extract_merchants("CUBE信用卡 & Hotels.com全球訂房享5%") == ["Hotels.com"]
+    assert extract_merchants("可樂旅遊高鐵假期") == ["可樂旅遊", "台灣高鐵"]
+    assert extract_merchants("ＳＴＡＲＢＵＣＫＳ 買一送一") == ["星巴克"]
+    # 標題樣式
+    assert extract_merchants("【中信卡】夏慕尼 新香榭鉄板燒") == ["夏慕尼"]
+    assert extract_merchants("台南晶英酒店 玉山國民旅遊卡 享訂房優惠") == ["台南晶英酒店"]
+    # 泛稱不算特店
+    assert extract_merchants("日本旅遊刷國泰世華Visa信用卡") == []
+    assert extract_merchants("8.8購物節刷聯邦卡滿額享88折") == []
+    assert extract_merchants("【中信JCB卡】日本優惠情報") == []
+    assert resolve_merchant_key("Starbucks") == resolve_merchant_key("星巴克")
+    assert find_merchant("國泰世華 屈臣氏每週二卡友日") == "屈臣氏"
+    print("✅ 特店擷取測試通過")
+
+
+def test_merchant_index_follows_upserts():
+    print("正在測試特店索引...")
+    with temp_db("test_merchants.db"):
+        database.upsert_bank_offers("測試銀行", [
+            {"title": "星巴克買一送一", "url": "https://a"},
+            {"title": "Starbucks 好友分享日", "url": "https://b"},
+            {"title": "全家便利商店刷卡滿額贈", "url": "https://c"},
+        ])
+        database.upsert_bank_offers("另一銀行", [{"title": "星巴克數位飲料券", "url": "https://d"}])
+
+        result = backend_db.fetch_merchant_offers("starbucks")
+        assert result["merchant"] == "星巴克" and result["count"] == 3
+        assert [o.title for o in backend_db.fetch_merchant_offers("星巴克", bank="另一銀行")["offers"]] == ["星巴克數位飲料券"]
+        assert backend_db.fetch_merchant_offers("不存在的店") is None
+
+        # 以主鍵範圍查詢倒排列表，不掃描 offers
+        conn = database.get_connection()
+        plan = " ".join(row[-1] for row in conn.execute("""
+            EXPLAIN QUERY PLAN
+            SELECT o.* FROM merchant_offers mo JOIN offers o ON o.id = mo.offer_id WHERE mo.merchant_id = 1
+        """))
+        conn.close()
+        assert "SCAN" not in plan, plan
+
+        # 下架後同步移除；重新初始化不重建 (版本未變)
+        database.upsert_bank_offers("測試銀行", [{"title": "全家便利商店刷卡滿額贈", "url": "https://c"}])
+        assert backend_db.fetch_merchant_offers("星巴克")["count"] == 1
+        database.init_db()
+        assert backend_db.fetch_merchant_offers("全家")["count"] == 1
+    print("✅ 特店索引測試通過")
+
+
+if __name__ == "__main__":
+    test_extract_merchants()
+    test_merchant_index_follows_upserts()
+    print("🎉 特店索引測試全部通過！")
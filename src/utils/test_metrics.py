@@ -0,0 +1,75 @@
+# src/utils/test_metrics.py
+from contextlib import contextmanager
+
+from src.backend.core import metrics
+
+
+@contextmanager
+def _fresh_registry():
+    """以全新的指標儲存區執行，不受其他測試記錄的指標影響"""
+    original, metrics.registry = metrics.registry, metrics.MetricsRegistry()
+    try:
+        yield
+    finally:
+        metrics.registry = original
+
+
+def test_prometheus_text_output():
+    print("正在測試 Prometheus 輸出...")
+    with _fresh_registry():
+        metrics.record_request("GET", "/api/offers/{offer_id}", 200, 0.02, 3000)
+        metrics.record_request("GET", "/api/offers/{offer_id}", 404, 3.0, None)
+        metrics.registry.inc("cache_total", (("result", 'a"b\\c'),), help_text="Escaping.")
+        text = metrics.render_prometheus()
+        lines = text.splitlines()
+        assert text.endswith("\n")
+
+        assert "# HELP http_request_duration_seconds HTTP request latency by route." in lines
+        assert "# TYPE http_request_duration_seconds histogram" in lines
+        assert "# TYPE http_requests_total counter" in lines
+        # 直方圖 bucket 為累積計數，以路由樣板 (而非實際路徑) 為標籤
+        labels = 'method="GET",route="/api/offers/{offer_id}"'
+        assert f'http_request_duration_seconds_bucket{{{labels},le="0.025"}} 1' in lines
+        assert f'http_request_duration_seconds_bucket{{{labels},le="2.5"}} 1' in lines
+        assert f'http_request_duration_seconds_bucket{{{labels},le="5"}} 2' in lines
+        assert f'http_request_duration_seconds_bucket{{{labels},le="+Inf"}} 2' in lines
+        assert f"http_request_duration_seconds_sum{{{labels}}} 3.02" in lines
+        assert f"http_request_duration_seconds_count{{{labels}}} 2" in lines
+        assert f'http_requests_total{{{labels},status="404"}} 1' in lines
+        # 沒有回應大小的請求不記錄大小直方圖
+        assert f"http_response_size_bytes_count{{{labels}}} 1" in lines
+        assert 'cache_total{result="a\\"b\\\\c"} 1' in lines
+    print("✅ Prometheus 輸出測試通過")
+
+
+def test_in_flight_gauge_and_server_timing():
+    print("正在測試進行中請求數與 Server-Timing...")
+    with _fresh_registry():
+        metrics.track_in_flight(1)
+        metrics.track_in_flight(1)
+        metrics.track_in_flight(-1)
+        assert "http_requests_in_flight 1" in metrics.render_prometheus().splitlines()
+        metrics.track_in_flight(-1)
+        assert "http_requests_in_flight 0" in metrics.render_prometheus().splitlines()
+
+        # 請求外的 span 只記錄直方圖；請求內的同名 span 在標頭中加總
+        with metrics.span("sqlite"):
+            pass
+        token = metrics.begin_request()
+        metrics._request_spans.get().extend([("sqlite", 0.002), ("serialize", 0.0005), ("sqlite", 0.003)])
+        with metrics.span("upstream"):
+            pass
+        spans = metrics.end_request(token)
+        assert [name for name, _ in spans] == ["sqlite", "serialize", "sqlite", "upstream"]
+        assert metrics._request_spans.get() is None
+        header = metrics.server_timing_header(spans, 0.0125)
+        assert header.startswith("sqlite;dur=5.0, serialize;dur=0.5, upstream;dur=")
+        assert header.endswith(", total;dur=12.5")
+        assert 'app_span_duration_seconds_count{span="sqlite"} 1' in metrics.render_prometheus().splitlines()
+    print("✅ 進行中請求數與 Server-Timing 測試通過")
+
+
+if __name__ == "__main__":
+    test_prometheus_text_output()
+    test_in_flight_gauge_and_server_timing()
+    print("🎉 效能指標測試全部通過！")
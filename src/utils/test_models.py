@@ -0,0 +1,143 @@
+# src/utils/test_models.py
+import json
+import os
+import sqlite3
+import tracemalloc
+
+import database
+from models import AnnotatedOffer, Card, InvalidCard, InvalidOffer, Offer, fetch_models, offers_json, to_json
+from src.backend.core import database as backend_db
+from src.utils.temp_db import temp_db
+
+ROOT_DB = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "credit_cards.db")
+
+
+def test_validation_at_scraper_boundary():
+    print("正在測試優惠驗證...")
+    offer = Offer.from_scraped({"title": "  星巴克\n買一送一 ", "url": " https://a ", "image": ""}, "測試銀行", "餐飲")
+    assert (offer.bank, offer.category, offer.title, offer.url, offer.image) == \
+        ("測試銀行", "餐飲", "星巴克 買一送一", "https://a", None)
+    for bad in ({"title": "優惠"}, {"title": None}, {}):
+        try:
+            Offer.from_scraped(bad, "測試銀行")
+            assert False, f"應該拋出 InvalidOffer: {bad}"
+        except InvalidOffer:
+            pass
+    assert not hasattr(offer, "__dict__")
+
+    assert Card.create(" 玉山銀行 ", "Unicard", billing_day=5).bank == "玉山銀行"
+    for args in (("", "Unicard"), ("玉山銀行", " ")):
+        try:
+            Card.create(*args)
+            assert False, f"應該拋出 InvalidCard: {args}"
+        except InvalidCard:
+            pass
+    with temp_db("test_models_cards.db"):
+        try:
+            database.add_card("玉山銀行", "Unicard", payment_day=32)
+            assert False, "應該拋出 InvalidCard"
+        except InvalidCard:
+            pass
+        card_id = database.add_card("玉山銀行", "Unicard")
+        card = database.get_cards()[0]
+        assert isinstance(card, Card) and (card.id, card.bank, card.card_name) == (card_id, "玉山銀行", "Unicard")
+        assert database.get_card(card_id) == card and database.get_card(card_id + 1) is None
+    print("✅ 優惠驗證測試通過")
+
+
+def test_rows_and_json_match_previous_output():
+    print("正在測試資料列與 JSON 輸出...")
+    # 舊資料庫 (只有基本欄位、沒有 image_ok)：圖片照舊輸出
+    conn = sqlite3.connect(ROOT_DB)
+    cursor = conn.cursor()
+    cursor.execute("SELECT * FROM offers WHERE LENGTH(title) > 2")
+    offers = fetch_models(cursor, Offer)
+    conn.row_factory = sqlite3.Row
+    rows = [dict(r) for r in conn.execute("SELECT * FROM offers WHERE LENGTH(title) > 2")]
+    conn.close()
+    decoded = json.loads(offers_json(offers))
+    assert len(decoded) == len(rows) > 0
+    for new, old in zip(decoded, rows):
+        assert {k: new[k] for k in old} == old
+        assert "image_ok" not in new and "cluster_size" not in new
+
+    # 新資料庫：只輸出通過檢查的圖片，摺疊時附上 cluster_size
+    with temp_db("test_models.db"):
+        database.upsert_bank_offers("測試銀行", [
+            Offer.from_scraped({"title": "好圖片優惠", "url": "https://a", "image": "https://img/a.png"}, "測試銀行", "餐飲"),
+            {"title": "字典也可以寫入", "url": "https://b"},
+        ])
+        database.save_image_checks([{"url": "https://img/a.png", "ok": True}])
+        decoded = json.loads(offers_json(backend_db.fetch_offers(collapse=True)))
+        assert [(o["title"], o["image"], o["cluster_size"]) for o in decoded] == [
+            ("好圖片優惠", "https://img/a.png", 1), ("字典也可以寫入", None, 1),
+        ]
+
+        # 附加欄位 (推薦分數、適用卡片) 與優惠欄位合併輸出，Card 同樣經由 to_dict
+        card = Card("測試銀行", "測試卡", id=7)
+        annotated = [AnnotatedOffer(o, {"score": 1.0, "cards": [card]}) for o in backend_db.fetch_offers()]
+        decoded = json.loads(to_json({"cards": [card], "offers": annotated}))
+        assert decoded["cards"] == [card.to_dict()]
+        assert [(o["title"], o["image"], o["score"], o["cards"][0]["id"]) for o in decoded["offers"]] == [
+            ("好圖片優惠", "https://img/a.png", 1.0, 7), ("字典也可以寫入", None, 1.0, 7),
+        ]
+        assert "image_ok" not in decoded["offers"][0] and annotated[0].bank == "測試銀行"
+    print("✅ 資料列與 JSON 輸出測試通過")
+
+
+def test_init_db_normalizes_legacy_titles():
+    print("正在測試舊標題正規化...")
+    with temp_db("test_models_titles.db", source=ROOT_DB):
+        conn = database.get_connection()
+        rows = conn.execute("SELECT bank, category, title, url, image FROM offers WHERE title LIKE '%' || char(10) || '%'").fetchall()
+        bank = rows[0]["bank"]
+        scraped = [dict(r) for r in conn.execute("SELECT category, title, url, image FROM offers WHERE bank = ?", (bank,))]
+        conn.close()
+        database.init_db()
+
+        offers = []
+        for raw in scraped:
+            try:
+                offers.append(Offer.from_scraped(raw, bank))
+            except InvalidOffer:
+                pass
+        # 爬到與之前相同的優惠 (標題經 from_scraped 正規化)：不應刪除再新增
+        result = database.upsert_bank_offers(bank, offers)
+        assert result["inserted_ids"] == [] and result["deleted_ids"] == []
+        conn = database.get_connection()
+        for table in ("offers", "offer_identities"):
+            assert conn.execute(f"SELECT COUNT(*) FROM {table} WHERE title LIKE '%' || char(10) || '%'").fetchone()[0] == 0
+        assert conn.execute("SELECT COUNT(*) FROM offer_history WHERE valid_to IS NOT NULL").fetchone()[0] == 0
+        conn.close()
+    print("✅ 舊標題正規化測試通過")
+
+
+def test_offer_is_smaller_than_dict_row():
+    print("正在測試記憶體用量...")
+    conn = sqlite3.connect(ROOT_DB)
+    conn.row_factory = sqlite3.Row
+    template = dict(conn.execute("SELECT * FROM offers LIMIT 1").fetchone())
+    conn.close()
+    full = {**Offer(**template).to_dict(), "image_ok": 1}
+
+    def measure(build):
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        items = [build(i) for i in range(5000)]
+        used = tracemalloc.get_traced_memory()[0] - before
+        tracemalloc.stop()
+        assert len(items) == 5000
+        return used
+
+    dict_bytes = measure(lambda i: {**full, "id": i})
+    offer_bytes = measure(lambda i: Offer(**{**full, "id": i}))
+    assert offer_bytes < dict_bytes * 0.7, (offer_bytes, dict_bytes)
+    print(f"✅ 記憶體用量測試通過 (每筆 dict {dict_bytes // 5000} B -> Offer {offer_bytes // 5000} B)")
+
+
+if __name__ == "__main__":
+    test_validation_at_scraper_boundary()
+    test_rows_and_json_match_previous_output()
+    test_init_db_normalizes_legacy_titles()
+    test_offer_is_smaller_than_dict_row()
+    print("🎉 資料模型測試全部通過！")
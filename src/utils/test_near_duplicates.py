@@ -0,0 +1,42 @@
+# src/utils/test_near_duplicates.py
+import near_duplicates
+from models import Offer
+from src.backend.core.database import collapse_clusters
+
+
+def _offer(oid, title, bank="聯邦銀行"):
+    return {"id": oid, "bank": bank, "title": title}
+
+
+def test_cluster_near_duplicates():
+    print("正在測試近似重複分群...")
+    offers = [
+        _offer(1, "Agoda"),
+        _offer(2, "AgodaAgoda訂房刷聯邦卡最優享現折１２％2026/04/01-2026/12/31"),
+        _offer(3, "【中信卡】台北六福萬怡酒店", "中國信託"),
+        _offer(4, "【中信卡】台北艾麗酒店", "中國信託"),
+        _offer(5, "CUBE 信用卡 & Agoda 專屬優惠｜國泰世華信用卡優惠活動", "國泰世華"),
+        _offer(6, "CUBE信用卡 & Agoda 專屬優惠", "國泰世華"),
+        # 不同銀行的同名優惠不合併
+        _offer(7, "Agoda", "玉山銀行"),
+        # 短標題同時是多個不同活動的前綴時，只併入其中一群，不把活動串在一起
+        _offer(8, "台灣虎航"),
+        _offer(9, "台灣虎航刷聯邦卡購買台灣虎航全航線來回機票享最優９５折優惠"),
+        _offer(10, "台灣虎航台灣虎航刷聯邦JCB卡享最高9折及選位優惠"),
+    ]
+    clusters = near_duplicates.cluster(offers)
+    assert clusters[1] == clusters[2] == 2
+    assert clusters[3] != clusters[4]
+    assert clusters[5] == clusters[6]
+    assert clusters[7] == 7
+    assert clusters[9] != clusters[10] and clusters[8] in (clusters[9], clusters[10])
+
+    rows = [Offer.from_dict({**o, "cluster_id": clusters[o["id"]]}) for o in offers]
+    collapsed = collapse_clusters(rows)
+    assert len(collapsed) == len(set(clusters.values()))
+    assert {o.id: o.cluster_size for o in collapsed}[2] == 2
+    print("✅ 近似重複分群測試通過")
+
+
+if __name__ == "__main__":
+    test_cluster_near_duplicates()
@@ -0,0 +1,89 @@
+# src/utils/test_offer_changes.py
+import tempfile
+
+import database
+from src.backend.core import database as backend_db
+from static_build import build_static_data
+from src.utils.temp_db import temp_db
+
+
+def test_upsert_writes_change_log():
+    print("正在測試變更紀錄寫入...")
+    with temp_db("test_changes.db"):
+        database.upsert_bank_offers("測試銀行", [
+            {"title": "優惠A", "url": "https://a", "category": "餐飲", "image": None},
+            {"title": "優惠B", "url": "https://b", "category": "餐飲", "image": None},
+        ])
+        first = backend_db.fetch_offer_changes(0)
+        assert [c["op"] for c in first["changes"]] == ["insert", "insert"]
+        assert not first["reset_required"]
+
+        # 第二次：A 換圖、B 下架、C 新增；未變更的 scraped_at 不應產生紀錄
+        result = database.upsert_bank_offers("測試銀行", [
+            {"title": "優惠A", "url": "https://a", "category": "餐飲", "image": "https://img"},
+            {"title": "優惠C", "url": "https://c", "category": "旅遊", "image": None},
+        ])
+        assert len(result["inserted_ids"]) == 1 and len(result["deleted_ids"]) == 1
+
+        delta = backend_db.fetch_offer_changes(first["next_since"])
+        ops = sorted((c["op"], c.get("title")) for c in delta["changes"])
+        assert ops == [("delete", None), ("insert", "優惠C"), ("update", "優惠A")]
+        assert delta["latest_seq"] == delta["next_since"]
+
+        unchanged = database.upsert_bank_offers("測試銀行", [
+            {"title": "優惠A", "url": "https://a", "category": "餐飲", "image": "https://img"},
+            {"title": "優惠C", "url": "https://c", "category": "旅遊", "image": None},
+        ])
+        assert unchanged["changed_ids"] == []
+        assert backend_db.fetch_offer_changes(delta["next_since"])["changes"] == []
+    print("✅ 變更紀錄測試通過")
+
+
+def test_compacted_log_requires_reset():
+    print("正在測試變更紀錄清除...")
+    with temp_db("test_changes.db"):
+        database.upsert_bank_offers("測試銀行", [{"title": "優惠A", "url": "https://a"}])
+        database.upsert_bank_offers("測試銀行", [{"title": "優惠B", "url": "https://b"}])
+        database.compact_offer_changes(retention_days=-1)
+
+        stale = backend_db.fetch_offer_changes(1)
+        assert stale["reset_required"]
+        current = backend_db.fetch_offer_changes(stale["latest_seq"])
+        assert not current["reset_required"] and current["changes"] == []
+    print("✅ 變更紀錄清除測試通過")
+
+
+def test_changes_from_another_database_require_reset():
+    print("正在測試變更序號來源...")
+    offers = [{"title": "優惠A", "url": "https://a"}, {"title": "優惠B", "url": "https://b"}]
+    # CI 的資料庫：靜態 manifest 帶有序號與來源識別
+    with temp_db("test_changes_ci.db"):
+        database.upsert_bank_offers("測試銀行", offers)
+        manifest = build_static_data(tempfile.mkdtemp())
+        stamp = backend_db.get_data_stamp()
+        assert (manifest["seq"], manifest["source"]) == (stamp["seq"], stamp["source"]) and stamp["source"]
+
+    # 後端自行爬取的資料庫：序號相同但指向不同的變更
+    with temp_db("test_changes_backend.db"):
+        database.upsert_bank_offers("測試銀行", offers)
+        stamp = backend_db.get_data_stamp()
+        assert stamp["seq"] == manifest["seq"] and stamp["source"] != manifest["source"]
+        stale = backend_db.fetch_offer_changes(manifest["seq"], source=manifest["source"])
+        assert stale["reset_required"] and stale["next_source"] == stamp["source"]
+
+        # 來源相同時照常增量同步，next_source 對應 next_since
+        assert not backend_db.fetch_offer_changes(stamp["seq"], source=stamp["source"])["reset_required"]
+        database.upsert_bank_offers("測試銀行", offers[:1])
+        delta = backend_db.fetch_offer_changes(stamp["seq"], source=stamp["source"])
+        assert not delta["reset_required"] and [c["op"] for c in delta["changes"]] == ["delete"]
+        assert delta["next_source"] == backend_db.get_data_stamp()["source"]
+        # 未帶來源的舊用戶端不檢查
+        assert not backend_db.fetch_offer_changes(stamp["seq"])["reset_required"]
+    print("✅ 變更序號來源測試通過")
+
+
+if __name__ == "__main__":
+    test_upsert_writes_change_log()
+    test_compacted_log_requires_reset()
+    test_changes_from_another_database_require_reset()
+    print("🎉 變更紀錄測試全部通過！")
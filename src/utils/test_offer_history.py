@@ -0,0 +1,73 @@
+# src/utils/test_offer_history.py
+import time
+from datetime import datetime, timezone
+
+import database
+from src.backend.core import database as backend_db
+from src.utils.temp_db import temp_db
+
+
+def _titles(as_of):
+    return sorted((o.title, o.visible_image()) for o in backend_db.fetch_offers_as_of(as_of))
+
+
+def _tick():
+    time.sleep(0.002)
+    moment = datetime.now().isoformat()
+    time.sleep(0.002)
+    return moment
+
+
+def test_point_in_time_queries():
+    print("正在測試優惠歷史區間...")
+    with temp_db("test_history.db"):
+        before = _tick()
+        database.upsert_bank_offers("測試銀行", [
+            {"title": "優惠A", "url": "https://a", "category": "餐飲"},
+            {"title": "優惠B", "url": None, "category": "餐飲"},
+        ])
+        day1 = _tick()
+        database.upsert_bank_offers("測試銀行", [
+            {"title": "優惠A", "url": "https://a", "category": "餐飲", "image": "https://img"},
+        ])
+        day2 = _tick()
+        # 沒有變化的執行不應新增歷史列
+        database.upsert_bank_offers("測試銀行", [
+            {"title": "優惠A", "url": "https://a", "category": "餐飲", "image": "https://img"},
+        ])
+        database.upsert_bank_offers("測試銀行", [
+            {"title": "優惠A", "url": "https://a", "category": "餐飲", "image": "https://img"},
+            {"title": "優惠B", "url": None, "category": "餐飲"},
+        ])
+        day3 = _tick()
+
+        assert _titles(before) == []
+        assert _titles(day1) == [("優惠A", None), ("優惠B", None)]
+        assert _titles(day2) == [("優惠A", "https://img")]
+        assert _titles(day3) == [("優惠A", "https://img"), ("優惠B", None)]
+
+        conn = database.get_connection()
+        assert conn.execute("SELECT COUNT(*) FROM offer_identities").fetchone()[0] == 2
+        # A: 兩個版本；B: 下架前後各一個區間
+        assert conn.execute("SELECT COUNT(*) FROM offer_history").fetchone()[0] == 4
+        conn.close()
+
+        reappeared = [o for o in backend_db.fetch_offers_as_of(day3) if o.title == "優惠B"][0]
+        assert reappeared.url is None and reappeared.extra["first_seen"] < day1
+        assert backend_db.normalize_as_of("2026-01-02") == "2026-01-02T23:59:59.999999"
+    print("✅ 優惠歷史區間測試通過")
+
+
+def test_as_of_offsets_convert_to_local_time():
+    print("正在測試帶時區的 as_of...")
+    # 資料庫記錄的是本地時間：同一時刻不論以何種時區表示都應換算為相同的本地時間
+    utc = backend_db.normalize_as_of("2026-01-02T01:00:00+00:00")
+    assert utc == backend_db.normalize_as_of("2026-01-02T09:00:00+08:00") == backend_db.normalize_as_of("2026-01-02T01:00:00Z")
+    assert utc == datetime(2026, 1, 2, 1, tzinfo=timezone.utc).astimezone().replace(tzinfo=None).isoformat()
+    assert backend_db.normalize_as_of("2026-01-02T09:00:00") == "2026-01-02T09:00:00"
+    print("✅ 帶時區的 as_of 測試通過")
+
+
+if __name__ == "__main__":
+    test_point_in_time_queries()
+    test_as_of_offsets_convert_to_local_time()
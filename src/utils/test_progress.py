@@ -0,0 +1,62 @@
+# src/utils/test_progress.py
+import database
+from src.backend.core import database as backend_db
+from src.utils.temp_db import temp_db
+
+
+def test_run_end_without_run_id_attaches_to_latest_run():
+    print("正在測試補寫的結束事件...")
+    with temp_db("test_progress.db"):
+        database.add_progress_event({"event": "run_start", "run_id": "old"})
+        database.add_progress_event({"event": "run_end", "run_id": "old", "status": "ok"})
+        database.add_progress_event({"event": "run_start", "run_id": "new"})
+        database.add_progress_event({"event": "page", "run_id": "new", "bank": "玉山"})
+        # 後端工作管理中止子行程時補寫的 run_end 沒有 run_id
+        database.add_progress_event({"event": "run_end", "status": "timeout", "job_id": "j1"})
+        # 不在進度事件清單內的事件不寫入
+        database.add_progress_event({"event": "retry", "run_id": "new"})
+
+        conn = backend_db.get_db()
+        events = backend_db.fetch_progress_events(conn)
+        conn.close()
+        assert [(e["event"], e["run_id"]) for e in events] == [
+            ("run_start", "old"), ("run_end", "old"), ("run_start", "new"), ("page", "new"), ("run_end", "new"),
+        ]
+        assert events[-1]["status"] == "timeout" and events[-1]["job_id"] == "j1"
+    print("✅ 補寫的結束事件測試通過")
+
+
+def test_snapshot_and_data_version_follow_writes():
+    print("正在測試進度訂閱起點...")
+    with temp_db("test_progress.db"):
+        conn = backend_db.get_db()
+        try:
+            assert backend_db.get_progress_snapshot(conn) == (0, False)
+
+            # 其他連線提交後 data_version 改變 (SSE 以此判斷是否需要查詢新事件)
+            version = backend_db.get_data_version(conn)
+            database.add_progress_event({"event": "run_start", "run_id": "r1"})
+            assert backend_db.get_data_version(conn) != version
+            version = backend_db.get_data_version(conn)
+            assert backend_db.get_data_version(conn) == version
+
+            # 執行中：從 run_start 之前開始重播
+            database.add_progress_event({"event": "bank_start", "run_id": "r1", "bank": "玉山"})
+            start_id = backend_db.fetch_progress_events(conn)[0]["id"]
+            assert backend_db.get_progress_snapshot(conn) == (start_id - 1, True)
+
+            # 結束後：從最新一筆之後開始
+            database.add_progress_event({"event": "run_end", "run_id": "r1", "status": "ok"})
+            assert backend_db.get_data_version(conn) != version
+            latest_id = backend_db.fetch_progress_events(conn)[-1]["id"]
+            assert backend_db.get_progress_snapshot(conn) == (latest_id, False)
+            assert backend_db.fetch_progress_events(conn, latest_id) == []
+        finally:
+            conn.close()
+    print("✅ 進度訂閱起點測試通過")
+
+
+if __name__ == "__main__":
+    test_run_end_without_run_id_attaches_to_latest_run()
+    test_snapshot_and_data_version_follow_writes()
+    print("🎉 爬蟲進度測試全部通過！")
@@ -0,0 +1,71 @@
+# src/utils/test_recommendations.py
+import database
+from recommendations import card_matches, card_scopes, offer_value
+from src.backend.core import database as backend_db
+from src.backend.core.metrics import registry
+from src.utils.temp_db import temp_db
+
+
+def test_card_scopes_and_values():
+    print("正在測試卡別解析...")
+    assert card_scopes("【中信卡】博客來") == []
+    assert card_scopes("【中信JCB卡】日本優惠情報") == [{"jcb"}]
+    assert card_scopes("聯邦Visa御璽卡預訂指定餐廳") == [{"visa", "御璽"}]
+    assert card_scopes("玉山Unicard｜特爾電力") == [{"unicard"}]
+    assert card_scopes("CUBE信用卡 & Hotels.com") == [{"cube"}]
+    assert card_scopes("刷國泰世華萬事達卡享") == [{"mastercard"}]
+
+    assert card_matches({"card_name": "中信JCB晶緻卡"}, card_scopes("【中信JCB卡】日本"))
+    assert not card_matches({"card_name": "uniopen聯名卡"}, card_scopes("【中信JCB卡】日本"))
+    assert card_matches({"card_name": "M世界卡"}, card_scopes("聯邦M卡海外實體商店3%"))
+    assert not card_matches({"card_name": "SIM卡友"}, card_scopes("聯邦M卡海外實體商店3%"))
+    assert card_matches({"card_name": "World卡", "card_type": "Mastercard"}, card_scopes("國泰世華萬事達卡"))
+
+    assert offer_value("最高享12%回饋") == 12
+    assert offer_value("兩人同行8折優惠") == 20
+    assert offer_value("享85折，最高折抵100%") == 15
+    print("✅ 卡別解析測試通過")
+
+
+def test_recommendations_follow_cards_and_offers():
+    print("正在測試推薦引擎...")
+    with temp_db("test_recommendations.db"):
+        jcb = database.add_card("中國信託", "中信JCB晶緻卡")
+        uniopen = database.add_card("中國信託", "uniopen聯名卡")
+        database.upsert_bank_offers("中國信託", [
+            {"title": "【中信卡】星巴克買一送一", "url": "https://a"},
+            {"title": "【中信JCB卡】日本消費最高10%回饋", "url": "https://b"},
+            {"title": "【中信卡】博客來滿額享5%", "url": "https://c"},
+        ])
+        database.upsert_bank_offers("玉山銀行", [{"title": "玉山卡星巴克9折", "url": "https://d"}])
+
+        result = backend_db.fetch_recommendations()
+        titles = [o.title for o in result["offers"]]
+        assert titles == ["【中信JCB卡】日本消費最高10%回饋", "【中信卡】博客來滿額享5%", "【中信卡】星巴克買一送一"]
+        assert [c.id for c in result["offers"][0].extra["cards"]] == [jcb]
+        assert sorted(c.id for c in result["offers"][1].extra["cards"]) == [jcb, uniopen]
+        assert [o.title for o in backend_db.fetch_recommendations(card_ids=[uniopen])["offers"]] == titles[1:]
+        assert backend_db.fetch_recommendations("not-a-merchant") is None
+
+        # 相同版本命中快取
+        hits = registry._counters.get("recommendation_cache_total", {}).get((("result", "hit"),), 0)
+        assert backend_db.fetch_recommendations() is result
+        assert registry._counters["recommendation_cache_total"][(("result", "hit"),)] == hits + 1
+
+        # 新增卡片 / 優惠 / 刪除卡片後結果隨之更新
+        esun = database.add_card("玉山銀行", "Unicard")
+        starbucks = backend_db.fetch_recommendations("starbucks")
+        assert [o.title for o in starbucks["offers"]] == ["玉山卡星巴克9折", "【中信卡】星巴克買一送一"]
+        assert starbucks["merchant"] == "星巴克"
+
+        database.upsert_bank_offers("中國信託", [{"title": "【中信卡】星巴克買一送一", "url": "https://a"}])
+        assert len(backend_db.fetch_recommendations(card_ids=[jcb])["offers"]) == 1
+        database.delete_card(esun)
+        assert [o.title for o in backend_db.fetch_recommendations("星巴克")["offers"]] == ["【中信卡】星巴克買一送一"]
+    print("✅ 推薦引擎測試通過")
+
+
+if __name__ == "__main__":
+    test_card_scopes_and_values()
+    test_recommendations_follow_cards_and_offers()
+    print("🎉 推薦引擎測試全部通過！")
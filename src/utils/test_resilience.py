@@ -0,0 +1,117 @@
+# src/utils/test_resilience.py
+import asyncio
+
+import database
+from scrapers.base import BaseScraper, SCROLL_TO_BOTTOM
+from scrapers.resilience import CircuitOpenError, DatabaseStateStore, MemoryStateStore
+from src.utils.temp_db import temp_db
+
+
+class FakePage:
+    """模擬 Playwright Page：依分類網址回傳優惠，fail 中的網址在失敗次數用完前拋出例外"""
+
+    def __init__(self, site):
+        self.site = site
+        self.url = None
+
+    async def goto(self, url, **kwargs):
+        self.url = url
+
+    async def wait_for_timeout(self, ms):
+        pass
+
+    async def evaluate(self, script):
+        if script == SCROLL_TO_BOTTOM:
+            return None
+        self.site["extracts"].append(self.url)
+        if self.site["fail"].get(self.url, 0) > 0:
+            self.site["fail"][self.url] -= 1
+            raise RuntimeError("timeout")
+        return [{"title": f"{self.url}-優惠", "url": self.url, "image": None}]
+
+    async def close(self):
+        pass
+
+
+class FakeContext:
+    def __init__(self, fail=None):
+        self.site = {"fail": dict(fail or {}), "extracts": []}
+
+    async def new_page(self):
+        return FakePage(self.site)
+
+
+class FakeScraper(BaseScraper):
+    config = {
+        "code": "fake",
+        "bank_name": "測試銀行",
+        "categories": [{"name": "餐飲", "url": "https://a"}, {"name": "旅遊", "url": "https://b"}],
+        "extract_script": "extract",
+        "settle_ms": 0,
+        "pagination": {"strategy": "single", "scroll_wait_ms": 0},
+        "retry": {"page_attempts": 2, "category_attempts": 2, "base_delay": 0, "max_delay": 0},
+    }
+
+
+def test_page_retry_recovers():
+    print("正在測試分頁重試...")
+    context = FakeContext(fail={"https://a": 1})
+    offers = asyncio.run(FakeScraper().scrape(context))
+    assert sorted(o.category for o in offers) == ["旅遊", "餐飲"]
+    assert context.site["extracts"].count("https://a") == 2
+    print("✅ 分頁重試測試通過")
+
+
+def test_rerun_resumes_from_checkpoint():
+    print("正在測試檢查點續爬...")
+    store = MemoryStateStore()
+    # 「旅遊」連續失敗超過所有重試次數：整個銀行失敗，但「餐飲」的進度已保存
+    failing = FakeContext(fail={"https://b": 10})
+    try:
+        asyncio.run(FakeScraper(state_store=store).scrape(failing))
+        assert False, "應該拋出例外"
+    except RuntimeError:
+        pass
+    assert store.load_checkpoints("測試銀行")["餐飲"]["complete"]
+
+    rerun = FakeContext()
+    offers = asyncio.run(FakeScraper(state_store=store).scrape(rerun))
+    assert rerun.site["extracts"] == ["https://b"]
+    assert sorted(o.category for o in offers) == ["旅遊", "餐飲"]
+    print("✅ 檢查點續爬測試通過")
+
+
+def test_circuit_breaker_persists():
+    print("正在測試斷路器...")
+    with temp_db("test_resilience.db"):
+        store = DatabaseStateStore()
+
+        for _ in range(2):
+            try:
+                asyncio.run(FakeScraper(state_store=store).scrape(FakeContext(fail={"https://a": 10, "https://b": 10})))
+            except Exception:
+                pass
+        state = database.get_circuit_breaker("測試銀行")
+        assert state["opened_until"] and state["trips"] == 1
+
+        # 跳脫後的新執行 (新的爬蟲實例) 不再連線
+        context = FakeContext()
+        try:
+            asyncio.run(FakeScraper(state_store=store).scrape(context))
+            assert False, "應該拋出 CircuitOpenError"
+        except CircuitOpenError:
+            pass
+        assert context.site["extracts"] == []
+
+        # 冷卻結束後 (half-open) 成功即重置
+        database.save_circuit_breaker("測試銀行", {**state, "opened_until": "2000-01-01T00:00:00"})
+        asyncio.run(FakeScraper(state_store=store).scrape(FakeContext()))
+        assert database.get_circuit_breaker("測試銀行")["trips"] == 0
+    print("✅ 斷路器測試通過")
+
+
+if __name__ == "__main__":
+    test_page_retry_recovers()
+    test_rerun_resumes_from_checkpoint()
+    test_circuit_breaker_persists()
+    print("🎉 爬蟲容錯測試全部通過！")
@@ -0,0 +1,80 @@
+# src/utils/test_saved_searches.py
+import json
+import os
+import tempfile
+
+import database
+from saved_searches import deliver_notifications, file_sink, parse_query, search_anchors, search_matches
+from src.utils.temp_db import temp_db
+
+
+def test_parse_query_and_anchors():
+    print("正在測試搜尋解析...")
+    assert parse_query("旅遊 + 國泰世華") == ["旅遊", "國泰世華"]
+    assert parse_query("  Starbucks，星巴克  ") == ["starbucks", "星巴克"]
+    # 錨點取最長的詞；特店別名每個寫法各一個錨點
+    assert search_anchors(["旅遊", "國泰世華"]) == {"國泰"}
+    assert search_anchors(["starbucks"]) == {"st", "星巴"}
+    assert search_anchors([], bank="玉山銀行") == {"bank:玉山銀行"}
+
+    offer = {"bank": "國泰世華", "category": "旅遊優惠", "canonical_category": "travel", "title": "日本訂房享8折"}
+    assert search_matches({"query": "旅遊 + 國泰世華"}, offer)
+    assert not search_matches({"query": "旅遊 + 國泰世華", "bank": "玉山銀行"}, offer)
+    assert search_matches({"query": "訂房", "category": "travel"}, offer)
+    assert search_matches({"query": "STARBUCKS"}, {**offer, "title": "星巴克買一送一"})
+    print("✅ 搜尋解析測試通過")
+
+
+def test_new_offers_percolate_to_outbox():
+    print("正在測試新優惠通知...")
+    with temp_db("test_saved_searches.db"):
+        database.upsert_bank_offers("國泰世華", [{"title": "星巴克買一送一", "url": "https://old", "category": "餐飲優惠"}])
+
+        starbucks = database.add_saved_search("starbucks", name="咖啡")
+        travel = database.add_saved_search("旅遊 + 國泰世華", webhook_url="https://hooks.example/travel")
+        esun = database.add_saved_search("", bank="玉山銀行")
+
+        result = database.upsert_bank_offers("國泰世華", [
+            {"title": "星巴克買一送一", "url": "https://old", "category": "餐飲優惠"},
+            {"title": "星巴克好友分享日", "url": "https://a", "category": "餐飲優惠"},
+            {"title": "日本訂房享8折", "url": "https://b", "category": "旅遊優惠"},
+            {"title": "全家便利商店滿額贈", "url": "https://c", "category": "超商量販"},
+        ])
+        # 已存在的優惠不通知；每筆新優惠只與錨點相符的搜尋完整比對
+        assert result["notifications"] == 2
+        database.upsert_bank_offers("玉山銀行", [{"title": "玉山Unicard 百貨回饋", "url": "https://d"}])
+        searches = {s["id"]: s for s in database.get_saved_searches()}
+        assert {sid: s["pending_notifications"] for sid, s in searches.items()} == {starbucks: 1, travel: 1, esun: 1}
+
+        # 傳送：成功的標記為已送出，失敗的保留到下次重試
+        out = os.path.join(tempfile.mkdtemp(), "notifications.jsonl")
+        posted = []
+
+        def flaky_webhook(notification):
+            if notification["webhook_url"]:
+                posted.append(notification["payload"])
+                raise ConnectionError("webhook down")
+
+        assert deliver_notifications([file_sink(out), flaky_webhook]) == {"pending": 3, "delivered": 2, "failed": 1}
+        with open(out, encoding="utf-8") as f:
+            lines = [json.loads(line) for line in f]
+        assert [line["offer"]["title"] for line in lines] == ["星巴克好友分享日", "日本訂房享8折", "玉山Unicard 百貨回饋"]
+        assert lines[0]["search"] == {"id": starbucks, "name": "咖啡", "query": "starbucks"}
+        assert posted[0]["offer"]["url"] == "https://b"
+
+        assert deliver_notifications([lambda n: None]) == {"pending": 1, "delivered": 1, "failed": 0}
+        assert deliver_notifications([lambda n: None])["pending"] == 0
+
+        assert database.delete_saved_search(travel) and not database.delete_saved_search(travel)
+        try:
+            database.add_saved_search("  + ")
+            assert False, "空白搜尋應該被拒絕"
+        except ValueError:
+            pass
+    print("✅ 新優惠通知測試通過")
+
+
+if __name__ == "__main__":
+    test_parse_query_and_anchors()
+    test_new_offers_percolate_to_outbox()
+    print("🎉 儲存搜尋測試全部通過！")
@@ -0,0 +1,83 @@
+# src/utils/test_scheduler.py
+from datetime import datetime, timedelta
+
+import database
+from src.backend.core.scheduler import CrawlScheduler, plan_intervals
+from src.utils.temp_db import temp_db
+
+
+def test_intervals_follow_change_rate_within_budget():
+    print("正在測試爬取間隔分配...")
+    banks = {
+        "變動多": {"change_rate": 2.0, "duration_seconds": 300},
+        "變動少": {"change_rate": 0.05, "duration_seconds": 300},
+        "很慢的": {"change_rate": 2.0, "duration_seconds": 1200},
+        "沒變動": {"change_rate": 0.0, "duration_seconds": 300},
+    }
+    budget = 0.75 * sum(s["duration_seconds"] for s in banks.values())  # 每天全爬一次的 75%
+    intervals = plan_intervals(banks, budget)
+    spent = sum(banks[b]["duration_seconds"] * 24 / h for b, h in intervals.items())
+    assert spent <= budget + 1e-6, (spent, budget)
+    assert intervals["變動多"] < 24 < intervals["變動少"] <= intervals["沒變動"] == 72
+    # 相同變更率時，爬一次較貴的銀行間隔較長 (∝ √耗時)
+    assert abs(intervals["很慢的"] / intervals["變動多"] - 2) < 1e-6
+
+    # 預算充足時不短於下限；預算不夠時整體拉長 (上限讓步給預算)
+    assert set(plan_intervals(banks, 10 ** 6).values()) == {4}
+    tight = plan_intervals(banks, 60)
+    assert sum(banks[b]["duration_seconds"] * 24 / h for b, h in tight.items()) <= 60 + 1e-6
+    assert min(tight.values()) > 72
+    print("✅ 爬取間隔分配測試通過")
+
+
+class FakeJobManager:
+    def __init__(self):
+        self.busy = False
+        self.last_finished_at = None
+        self.submitted = []
+
+    def submit(self, bank_code, bank_name):
+        self.submitted.append(bank_code)
+        self.busy = True
+        return bank_code, False
+
+
+def test_scheduler_staggers_due_banks():
+    print("正在測試爬取排程...")
+    with temp_db("test_scheduler.db"):
+        start = datetime(2026, 1, 1, 8)
+        for bank in ("中國信託", "國泰世華", "聯邦銀行", "玉山銀行"):
+            database.record_bank_crawl(bank, 0, 100, 200, now=start.isoformat())
+        # 變更率為移動平均：中國信託每次爬都有變動，玉山銀行幾乎不變
+        for day, changes in enumerate((48, 24), start=1):
+            now = (start + timedelta(days=day)).isoformat()
+            stats = database.record_bank_crawl("中國信託", changes, 100, 400, now=now)
+            for bank in ("國泰世華", "聯邦銀行", "玉山銀行"):
+                database.record_bank_crawl(bank, 1, 100, 200, now=now)
+        assert abs(stats["change_rate"] - (0.3 * 1 + 0.7 * 2)) < 1e-9
+        assert abs(stats["duration_seconds"] - (0.3 * 400 + 0.7 * (0.3 * 400 + 0.7 * 200))) < 1e-9
+        assert stats["crawls"] == 3
+
+        manager = FakeJobManager()
+        scheduler = CrawlScheduler(manager)
+        last = start + timedelta(days=2)
+        plan = scheduler.plan(last)
+        assert plan["planned_seconds"] <= plan["budget_seconds"] < plan["daily_full_seconds"]
+        assert plan["banks"][0]["bank"] == "ctbc" and not plan["banks"][0]["due"]
+
+        now = datetime.fromisoformat(plan["banks"][0]["next_run_at"]) + timedelta(minutes=1)
+        assert scheduler.tick(now) == "ctbc"
+        # 執行中或剛結束時不排入第二個工作；同一家銀行排入後未成功也不會立刻重排
+        assert scheduler.tick(now) is None
+        manager.busy = False
+        manager.last_finished_at = now.isoformat()
+        assert scheduler.tick(now + timedelta(minutes=1)) is None
+        assert scheduler.tick(now + timedelta(minutes=10)) is None
+        assert manager.submitted == ["ctbc"]
+    print("✅ 爬取排程測試通過")
+
+
+if __name__ == "__main__":
+    test_intervals_follow_change_rate_within_budget()
+    test_scheduler_staggers_due_banks()
+    print("🎉 爬取排程測試全部通過！")
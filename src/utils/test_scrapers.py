@@ -0,0 +1,199 @@
+# src/utils/test_scrapers.py
+import asyncio
+
+import scrapers
+from scrapers.base import SCROLL_TO_BOTTOM, BaseScraper
+from scrapers.resilience import MemoryStateStore
+
+
+class FakeButton:
+    def __init__(self, site, action, disabled=False, visible=True):
+        self.site = site
+        self.action = action
+        self.disabled = disabled
+        self.visible = visible
+
+    async def click(self):
+        self.site.clicks.append(self.action)
+        self.site.perform(self.action)
+
+    async def evaluate(self, script):
+        if script == "el => el.click()":
+            await self.click()
+            return None
+        return self.disabled
+
+    async def scroll_into_view_if_needed(self):
+        pass
+
+    async def is_visible(self):
+        return self.visible
+
+
+class FakeSite:
+    """
+    模擬分頁的優惠列表頁面：pages 為每一頁的優惠標題。
+    mode 決定頁面上的分頁元件 ("next"、"numbered" 或 "load_more")；
+    load_more 模式下每次展開附加下一頁，提取時回傳目前已展開的全部優惠。
+    """
+
+    def __init__(self, pages, mode):
+        self.pages = pages
+        self.mode = mode
+        self.current = 1
+        self.clicks = []
+        self.extracts = []
+
+    def perform(self, action):
+        self.current = self.current + 1 if action in ("next", "more") else int(action)
+
+    async def goto(self, url, **kwargs):
+        pass
+
+    async def wait_for_timeout(self, ms):
+        pass
+
+    async def close(self):
+        pass
+
+    async def evaluate(self, script):
+        if script == SCROLL_TO_BOTTOM:
+            return None
+        if script == "pages":
+            return list(range(1, len(self.pages) + 1))
+        if script.startswith("document.querySelectorAll"):
+            return sum(len(p) for p in self.pages[:self.current])
+        self.extracts.append(self.current)
+        shown = self.pages[:self.current] if self.mode == "load_more" else [self.pages[self.current - 1]]
+        return [{"title": title, "url": f"https://bank/{title}"} for page in shown for title in page]
+
+    async def query_selector(self, selector):
+        last = self.current >= len(self.pages)
+        if selector == "next" and self.mode == "next":
+            return FakeButton(self, "next", disabled=last)
+        if selector.startswith("page-") and self.mode == "numbered":
+            return FakeButton(self, selector[len("page-"):])
+        if selector == "more" and self.mode == "load_more":
+            return FakeButton(self, "more", visible=not last)
+        return None
+
+
+class FakeContext:
+    def __init__(self, site):
+        self.site = site
+
+    async def new_page(self):
+        return self.site
+
+
+PAGES = [["第一頁優惠甲", "第一頁優惠乙"], ["第二頁優惠甲", "第一頁優惠乙"], ["第三頁優惠甲"]]
+
+
+def _scrape(pagination, mode, pages=PAGES):
+    class PagedScraper(BaseScraper):
+        config = {
+            "code": "paged",
+            "bank_name": "測試銀行",
+            "categories": [{"name": "餐飲", "url": "https://bank/list"}],
+            "extract_script": "extract",
+            "settle_ms": 0,
+            "pagination": {"scroll_wait_ms": 0, "wait_ms": 0, **pagination},
+            "retry": {"page_attempts": 1, "category_attempts": 1, "base_delay": 0, "max_delay": 0},
+        }
+
+    site = FakeSite(pages, mode)
+    store = MemoryStateStore()
+    offers = asyncio.run(PagedScraper(state_store=store).scrape(FakeContext(site)))
+    return [o.title for o in offers], site, store.load_checkpoints("測試銀行")["餐飲"]
+
+
+def test_next_button_pagination():
+    print("正在測試「下一頁」分頁...")
+    titles, site, checkpoint = _scrape(
+        {"strategy": "next_button", "next_selector": "next", "disabled_check": "disabled", "max_pages": 10}, "next")
+    # 按鈕停用時結束；跨頁重複的標題只保留第一次出現
+    assert titles == ["第一頁優惠甲", "第一頁優惠乙", "第二頁優惠甲", "第三頁優惠甲"]
+    assert site.extracts == [1, 2, 3] and site.clicks == ["next", "next"]
+    assert checkpoint["complete"] and sorted(checkpoint["pages"]) == [1, 2, 3]
+
+    # max_pages 為安全閥；click_via_js 以 evaluate 點擊
+    titles, site, _ = _scrape({"strategy": "next_button", "next_selector": "next", "disabled_check": "disabled",
+                               "max_pages": 2, "click_via_js": True, "scroll_into_view": True}, "next")
+    assert site.extracts == [1, 2] and site.clicks == ["next"] and len(titles) == 3
+    print("✅ 「下一頁」分頁測試通過")
+
+
+def test_numbered_pagination():
+    print("正在測試頁碼分頁...")
+    pagination = {"strategy": "numbered", "pages_script": "pages", "page_selector": "page-{page}", "max_pages": 10}
+    titles, site, _ = _scrape(pagination, "numbered")
+    assert titles == ["第一頁優惠甲", "第一頁優惠乙", "第二頁優惠甲", "第三頁優惠甲"]
+    assert site.extracts == [1, 2, 3] and site.clicks == ["2", "3"]
+
+    _, site, _ = _scrape({**pagination, "max_pages": 2}, "numbered")
+    assert site.extracts == [1, 2]
+    print("✅ 頁碼分頁測試通過")
+
+
+def test_load_more_pagination():
+    print("正在測試「展開更多」分頁...")
+    pagination = {"strategy": "load_more", "load_more_selectors": ["missing", "more"], "max_clicks": 10,
+                  "count_selector": "a.card", "click_scroll_wait_ms": 0}
+    titles, site, checkpoint = _scrape(pagination, "load_more")
+    # 按鈕不再顯示時停止，展開後的整份列表只提取一次
+    assert titles == ["第一頁優惠甲", "第一頁優惠乙", "第二頁優惠甲", "第三頁優惠甲"]
+    assert site.clicks == ["more", "more"] and site.extracts == [3]
+    assert list(checkpoint["pages"]) == [1]
+
+    _, site, _ = _scrape({**pagination, "max_clicks": 1}, "load_more")
+    assert site.clicks == ["more"] and site.extracts == [2]
+    print("✅ 「展開更多」分頁測試通過")
+
+
+def test_unknown_strategy_fails_category():
+    print("正在測試未知的分頁策略...")
+    try:
+        _scrape({"strategy": "infinite_scroll"}, "next")
+        assert False, "應該拋出例外"
+    except ValueError as e:
+        assert "infinite_scroll" in str(e)
+    print("✅ 未知的分頁策略測試通過")
+
+
+def test_scraper_registry():
+    print("正在測試爬蟲註冊表...")
+    assert list(scrapers.AVAILABLE_SCRAPERS) == ["ctbc", "cathay", "ubot", "esun"]
+    for code, scraper_class in scrapers.AVAILABLE_SCRAPERS.items():
+        config = scraper_class.config
+        assert config["code"] == code and config["bank_name"] and config["categories"]
+        # 每個銀行的分頁策略都有對應的實作
+        strategy = config.get("pagination", {}).get("strategy", "single")
+        assert hasattr(BaseScraper, f"_paginate_{strategy}"), (code, strategy)
+
+    store = MemoryStateStore()
+    scraper = scrapers.get_scraper("ESUN", state_store=store)
+    assert isinstance(scraper, scrapers.ESUNScraper) and scraper.code == "esun" and scraper.state_store is store
+    try:
+        scrapers.get_scraper("unknown")
+        assert False, "應該拋出例外"
+    except ValueError:
+        pass
+    all_scrapers = scrapers.get_all_scrapers(store)
+    assert [s.code for s in all_scrapers] == ["ctbc", "cathay", "ubot", "esun"]
+    assert all(s.state_store is store for s in all_scrapers)
+
+    # 圖片 Referer 依網域 (含子網域) 比對，不比對字尾相同的其他網域
+    assert scrapers.image_referer("https://img.cathay-cube.com/a.png") == "https://www.cathaybk.com.tw/"
+    assert scrapers.image_referer("https://www.ctbcbank.com/b.jpg") == "https://www.ctbcbank.com/"
+    assert scrapers.image_referer("https://notctbcbank.com/b.jpg") == ""
+    assert scrapers.image_referer("not a url") == ""
+    print("✅ 爬蟲註冊表測試通過")
+
+
+if __name__ == "__main__":
+    test_next_button_pagination()
+    test_numbered_pagination()
+    test_load_more_pagination()
+    test_unknown_strategy_fails_category()
+    test_scraper_registry()
+    print("🎉 爬蟲分頁與註冊表測試全部通過！")
@@ -0,0 +1,96 @@
+# src/utils/test_startup_profile.py
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+
+from src.backend.core import database as backend_db
+from startup_profile import PROJECT_DIR, parse_importtime, top_imports
+
+SAMPLE = """import time: self [us] | cumulative | imported package
+import time:       501 |      10687 |     sqlite3.dbapi2
+import time:       471 |      11157 |   sqlite3
+import time:      2527 |      59941 |   urllib.request
+import time:      8727 |      80244 | src.backend.core.database
+"""
+
+
+def test_parse_importtime():
+    print("正在測試 importtime 解析...")
+    rows = parse_importtime(SAMPLE)
+    assert [r["module"] for r in rows] == ["sqlite3.dbapi2", "sqlite3", "urllib.request", "src.backend.core.database"]
+    assert [r["depth"] for r in rows] == [2, 1, 1, 0]
+    top = top_imports(rows, limit=2, max_depth=1)
+    assert [r["module"] for r in top] == ["src.backend.core.database", "urllib.request"]
+    print("✅ importtime 解析測試通過")
+
+
+def test_backend_import_is_lazy():
+    print("正在測試後端延遲載入...")
+    # import 時不應下載資料庫，也不應載入 playwright / urllib.request
+    code = (
+        "import sys, src.backend.core.database, src.backend.core.jobs;"
+        "print(sorted(m for m in ('playwright', 'urllib.request', 'geopy', 'requests') if m in sys.modules))"
+    )
+    env = {**os.environ, "DB_DOWNLOAD_URL": "file:///nonexistent/credit_cards.db"}
+    result = subprocess.run([sys.executable, "-c", code], cwd=PROJECT_DIR, env=env, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+    assert "下載" not in result.stdout
+    assert result.stdout.strip().splitlines()[-1] == "[]"
+    print("✅ 後端延遲載入測試通過")
+
+
+def _make_db(path, title):
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("CREATE TABLE IF NOT EXISTS offers (title TEXT)")
+    conn.execute("DELETE FROM offers")
+    conn.execute("INSERT INTO offers VALUES (?)", (title,))
+    conn.commit()
+    conn.close()
+
+
+def test_bootstrap_db_swaps_under_open_connection():
+    print("正在測試資料庫下載...")
+    directory = tempfile.mkdtemp()
+    source = os.path.join(directory, "remote.db")
+    _make_db(source, "新優惠")
+    original_path, original_url = backend_db.DB_PATH, os.environ.get("DB_DOWNLOAD_URL")
+    backend_db.DB_PATH = os.path.join(directory, "credit_cards.db")
+    try:
+        _make_db(backend_db.DB_PATH, "舊優惠")
+        # 下載期間仍有連線 (例如 SSE 串流) 開著，WAL 中也有尚未寫回主檔的資料
+        conn = backend_db.get_db()
+        assert conn.execute("SELECT title FROM offers").fetchone()[0] == "舊優惠"
+        conn.commit()
+
+        os.environ["DB_DOWNLOAD_URL"] = "file://" + os.path.join(directory, "missing.db")
+        assert backend_db.bootstrap_db() is False
+        assert conn.execute("SELECT title FROM offers").fetchone()[0] == "舊優惠"
+
+        generation = backend_db.DB_GENERATION
+        os.environ["DB_DOWNLOAD_URL"] = "file://" + source
+        assert backend_db.bootstrap_db() is True
+        assert backend_db.DB_GENERATION == generation + 1
+        assert [r[0] for r in conn.execute("SELECT title FROM offers")] == ["新優惠"]
+        assert conn.execute("PRAGMA integrity_check").fetchone()[0] == "ok"
+        conn.close()
+        # 連線全部關閉後重新開啟仍是新內容
+        conn = backend_db.get_db()
+        assert [r[0] for r in conn.execute("SELECT title FROM offers")] == ["新優惠"]
+        conn.close()
+        assert not os.path.exists(backend_db.DB_PATH + ".download")
+    finally:
+        backend_db.DB_PATH = original_path
+        if original_url is None:
+            os.environ.pop("DB_DOWNLOAD_URL", None)
+        else:
+            os.environ["DB_DOWNLOAD_URL"] = original_url
+    print("✅ 資料庫下載測試通過")
+
+if __name__ == "__main__":
+    test_parse_importtime()
+    test_backend_import_is_lazy()
+    test_bootstrap_db_swaps_under_open_connection()
+    print("🎉 冷啟動測試全部通過！")
@@ -0,0 +1,44 @@
+# src/utils/test_static_build.py
+import json
+import os
+
+import database
+import static_build
+from src.utils.temp_db import temp_db
+
+
+def test_build_static_data():
+    print("正在測試靜態資料建置...")
+    with temp_db("test_static.db") as path:
+        database.upsert_bank_offers("中國信託", [
+            {"title": "刷卡滿額回饋", "url": "https://a", "category": "餐飲", "image": None},
+            {"title": "Uber Eats 折扣", "url": "https://b", "category": "外送", "image": None},
+        ])
+        database.upsert_bank_offers("測試銀行", [{"title": "旅遊回饋加碼", "url": "https://c", "category": "旅遊"}])
+
+        out = os.path.join(os.path.dirname(path), "data")
+        manifest = static_build.build_static_data(out)
+        assert manifest["total"] == 3
+        assert [b["name"] for b in manifest["banks"]] == ["中國信託", "測試銀行"]
+        assert manifest["banks"][0]["file"] == "banks/ctbc.json"
+        assert os.path.exists(os.path.join(out, "banks", "ctbc.json.gz"))
+
+        with open(os.path.join(out, "banks", "ctbc.json"), encoding="utf-8") as f:
+            shard = json.load(f)
+        assert {row[shard["fields"].index("title")] for row in shard["rows"]} == {"刷卡滿額回饋", "Uber Eats 折扣"}
+
+        with open(os.path.join(out, "search-index.json"), encoding="utf-8") as f:
+            terms = json.load(f)["terms"]
+        assert len(terms["回饋"]) == 2 and len(terms["uber"]) == 1
+
+        # 內容未變時不改寫，移除的銀行分片會被刪除
+        assert static_build.build_static_data(out)["version"] == manifest["version"]
+        database.upsert_bank_offers("測試銀行", [])
+        rebuilt = static_build.build_static_data(out)
+        assert [b["name"] for b in rebuilt["banks"]] == ["中國信託"]
+        assert len(os.listdir(os.path.join(out, "banks"))) == 2
+    print("✅ 靜態資料建置測試通過")
+
+
+if __name__ == "__main__":
+    test_build_static_data()
@@ -0,0 +1,72 @@
+# src/utils/test_streaming.py
+import asyncio
+
+import database
+from models import Offer
+from scrapers.base import PageBatch
+from src.utils.temp_db import temp_db
+from src.utils.test_resilience import FakeContext, FakeScraper
+
+
+def test_stream_puts_pages_into_bounded_queue():
+    print("正在測試逐頁串流...")
+
+    async def scenario():
+        queue = asyncio.Queue(maxsize=1)
+        staged = []
+
+        async def writer():
+            while True:
+                batch = await queue.get()
+                if batch is None:
+                    return
+                # 寫入端處理時爬蟲只能再放入一批
+                assert queue.qsize() <= 1
+                staged.append(batch)
+                await asyncio.sleep(0)
+
+        task = asyncio.create_task(writer())
+        count = await FakeScraper().stream(FakeContext(fail={"https://a": 1}), queue)
+        await queue.put(None)
+        await task
+        return count, staged
+
+    count, staged = asyncio.run(scenario())
+    assert count == 2
+    assert sorted((b.category, b.category_order, b.page) for b in staged) == [("旅遊", 1, 1), ("餐飲", 0, 1)]
+    assert all(isinstance(b, PageBatch) and b.bank == "測試銀行" for b in staged)
+    print("✅ 逐頁串流測試通過")
+
+
+def test_staged_offers_commit_per_bank():
+    print("正在測試暫存合併...")
+    with temp_db("test_streaming.db"):
+        database.upsert_bank_offers("測試銀行", [{"title": "舊優惠會被刪除", "url": "https://old"},
+                                              {"title": "續存的優惠", "url": "https://keep"}])
+
+        def offer(title, url, category):
+            return Offer("測試銀行", title, category, url)
+
+        # 分類並行完成的順序不固定；重試時重複放入的分頁不重複暫存
+        database.stage_offers("測試銀行", 1, [offer("兩個分類都有", "https://b", "旅遊"), offer("續存的優惠", "https://keep", "旅遊")])
+        database.stage_offers("測試銀行", 0, [offer("兩個分類都有", "https://a", "餐飲"), offer("已結束的活動", "https://expired", "餐飲")])
+        assert database.stage_offers("測試銀行", 1, [offer("續存的優惠", "https://keep", "旅遊")]) == 0
+
+        # 合併前 offers 不受影響 (爬取中斷時不會刪除任何優惠)
+        assert {o["title"] for o in database.get_offers()} == {"舊優惠會被刪除", "續存的優惠"}
+        result = database.commit_staged_offers("測試銀行", exclude_urls={"https://expired"})
+        assert result["offers"] == 2 and len(result["inserted_ids"]) == 1 and len(result["deleted_ids"]) == 1
+        # 相同標題以先出現的分類為準
+        assert {(o["title"], o["category"]) for o in database.get_offers()} == {("兩個分類都有", "餐飲"), ("續存的優惠", "旅遊")}
+
+        # 爬取失敗：丟棄暫存，offers 維持原狀
+        database.stage_offers("測試銀行", 0, [offer("失敗時的半套資料", "https://partial", "餐飲")])
+        assert database.discard_staged_offers("測試銀行") == 1
+        assert len(database.get_offers()) == 2
+    print("✅ 暫存合併測試通過")
+
+
+if __name__ == "__main__":
+    test_stream_puts_pages_into_bounded_queue()
+    test_staged_offers_commit_per_bank()
+    print("🎉 串流寫入測試全部通過！")
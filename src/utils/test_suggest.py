@@ -0,0 +1,101 @@
+# src/utils/test_suggest.py
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+
+import database
+from src.backend.core import database as backend_db
+from src.backend.core.suggest import SuggestIndex, load_entries, suggest_service
+from src.utils.temp_db import temp_db
+
+ROOT_DB = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "credit_cards.db")
+
+
+def test_suggest_index_ranking():
+    print("正在測試輸入提示排名...")
+    index = SuggestIndex([
+        {"text": "星巴克買一送一", "kind": "offer"},
+        {"text": "星巴克好友分享日", "kind": "offer"},
+        {"text": "星巴克", "kind": "merchant", "count": 5},
+        {"text": "路易莎咖啡與星巴克雙重好禮", "kind": "offer"},
+        {"text": "Hotels.com 全球訂房", "kind": "offer"},
+        {"text": "旅遊住宿", "kind": "canonical_category", "value": "travel", "count": 30},
+        {"text": "星巴克買一送一", "kind": "offer"},
+    ])
+    assert [s["text"] for s in index.suggest("星巴克")] == [
+        "星巴克", "星巴克買一送一", "星巴克好友分享日", "路易莎咖啡與星巴克雙重好禮",
+    ]
+    # 短前綴使用預先算好的前幾名，結果與一般查詢的規則相同
+    assert [s["text"] for s in index.suggest("星", 2)] == ["星巴克", "星巴克買一送一"]
+    assert index.suggest("星巴克買一送一")[0]["count"] == 2
+    # 中文 n-gram：從標題中間開始也能比對；英數只從單字開頭比對
+    assert [s["text"] for s in index.suggest("巴克好友")] == ["星巴克好友分享日"]
+    assert [s["text"] for s in index.suggest("ＨＯＴＥＬＳ")] == ["Hotels.com 全球訂房"]
+    assert index.suggest("otels") == []
+    assert index.suggest("旅遊")[0] == {"text": "旅遊住宿", "kind": "canonical_category", "value": "travel", "count": 30}
+    # 超過鍵長度的查詢仍需全文包含
+    assert [s["text"] for s in index.suggest("路易莎咖啡與星巴克雙重好禮")] == ["路易莎咖啡與星巴克雙重好禮"]
+    assert index.suggest("路易莎咖啡與星巴克雙重好康") == []
+    assert index.suggest("  ") == []
+    print("✅ 輸入提示排名測試通過")
+
+
+def test_suggest_is_fast_on_catalogue():
+    print("正在測試輸入提示速度...")
+    conn = sqlite3.connect(ROOT_DB)
+    conn.row_factory = sqlite3.Row
+    index = SuggestIndex(load_entries(conn))
+    conn.close()
+    queries = ["星", "卡", "信用卡", "國泰", "日本", "回饋", "a", "hotel", "玉山", "滿額"]
+    start = time.perf_counter()
+    for _ in range(100):
+        for q in queries:
+            index.suggest(q, 10)
+    per_query_ms = (time.perf_counter() - start) * 1000 / (100 * len(queries))
+    assert per_query_ms < 1.0, per_query_ms
+    print(f"✅ 輸入提示速度測試通過 ({len(index)} 筆，平均 {per_query_ms * 1000:.0f} µs)")
+
+
+def test_suggest_service_rebuilds_on_data_change():
+    print("正在測試輸入提示重建...")
+    with temp_db("test_suggest.db") as path:
+        database.upsert_bank_offers("測試銀行", [{"title": "星巴克買一送一", "url": "https://a"}])
+        suggest_service.invalidate()
+        assert [s["text"] for s in suggest_service.suggest("星巴")] == ["星巴克", "星巴克買一送一"]
+        builds = suggest_service.builds
+
+        # 版本檢查的間隔內直接使用現有索引
+        database.upsert_bank_offers("測試銀行", [
+            {"title": "星巴克買一送一", "url": "https://a"}, {"title": "星巴克好友分享日", "url": "https://b"},
+        ])
+        suggest_service.suggest("星巴")
+        assert suggest_service.builds == builds
+        # 間隔過後檢查版本：變更序號改變才重建
+        suggest_service._checked_at = 0.0
+        assert len(suggest_service.suggest("星巴")) == 3 and suggest_service.builds == builds + 1
+        suggest_service._checked_at = 0.0
+        suggest_service.suggest("星巴")
+        assert suggest_service.builds == builds + 1
+
+        # 資料庫檔案被換掉 (例如手動以新檔案覆蓋) 也會重建
+        other = os.path.join(tempfile.mkdtemp(), "other.db")
+        shutil.copy(path, other)
+        os.replace(other, path)
+        suggest_service._checked_at = 0.0
+        suggest_service.suggest("星巴")
+        assert suggest_service.builds == builds + 2
+        # bootstrap_db 寫入下載的資料庫後也會重建
+        backend_db.DB_GENERATION += 1
+        suggest_service._checked_at = 0.0
+        suggest_service.suggest("星巴")
+        assert suggest_service.builds == builds + 3
+    print("✅ 輸入提示重建測試通過")
+
+
+if __name__ == "__main__":
+    test_suggest_index_ranking()
+    test_suggest_is_fast_on_catalogue()
+    test_suggest_service_rebuilds_on_data_change()
+    print("🎉 輸入提示測試全部通過！")
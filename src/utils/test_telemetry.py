@@ -0,0 +1,85 @@
+# src/utils/test_telemetry.py
+import asyncio
+import json
+import os
+import tempfile
+
+from scrapers.telemetry import ScrapeTelemetry
+
+
+class FakePage:
+    async def wait_for_timeout(self, ms):
+        pass
+
+
+def test_summary_aggregates_per_bank():
+    print("正在測試遙測彙整...")
+    telemetry = ScrapeTelemetry(events_file="")
+    events = []
+    telemetry.add_sink(events.append)
+
+    with telemetry.span("bank", bank="玉山") as info:
+        for category in ("餐飲", "旅遊"):
+            with telemetry.span("category", category=category):
+                for offers in (10, 5):
+                    with telemetry.span("page", offers=offers):
+                        pass
+        asyncio.run(telemetry.wait(FakePage(), 0))
+        with telemetry.span("extract"):
+            pass
+        telemetry.count_retry()
+        telemetry.count_retry()
+        info["offers"] = 30
+    try:
+        with telemetry.span("bank", bank="國泰"):
+            telemetry.count_retry()
+            with telemetry.span("upsert"):
+                raise RuntimeError("timeout")
+    except RuntimeError:
+        pass
+    # 不在任何銀行內的重試不計入
+    telemetry.count_retry()
+
+    summary = telemetry.summary("partial")
+    esun, cathay = summary["banks"]["玉山"], summary["banks"]["國泰"]
+    assert (esun["status"], esun["offers"], esun["categories"], esun["pages"]) == ("ok", 30, 2, 4)
+    assert esun["offers_per_page"] == 7.5 and esun["retries"] == 2
+    assert esun["wait_seconds"] >= 0 and esun["extract_seconds"] >= 0
+    assert (cathay["status"], cathay["offers"], cathay["pages"], cathay["offers_per_page"]) == ("error", 0, 0, 0)
+    assert summary["status"] == "partial" and summary["total_offers"] == 30 and summary["retries"] == 3
+    assert summary["run_id"] == telemetry.run_id and summary["duration_seconds"] >= 0
+
+    # 事件帶有 context 中的銀行與分類，失敗的階段記錄錯誤
+    pages = [e for e in events if e["event"] == "page"]
+    assert [(e["bank"], e["category"], e["offers"]) for e in pages[:2]] == [("玉山", "餐飲", 10), ("玉山", "餐飲", 5)]
+    upsert = next(e for e in events if e["event"] == "upsert")
+    assert upsert["bank"] == "國泰" and upsert["status"] == "error" and upsert["error"] == "timeout"
+    assert [e["event"] for e in events][:2] == ["bank_start", "category_start"]
+    print("✅ 遙測彙整測試通過")
+
+
+def test_events_file_is_written_in_background_and_rotated():
+    print("正在測試遙測事件檔輪替...")
+    path = os.path.join(tempfile.mkdtemp(), "events.jsonl")
+    telemetry = ScrapeTelemetry(events_file=path)
+    telemetry.max_bytes = 300
+    for i in range(10):
+        telemetry.emit("page", bank="玉山", page=i)
+    telemetry.flush()
+
+    # 超過上限時輪替為 .1，只保留一份舊檔
+    assert os.path.getsize(path) < 300 + 100
+    with open(path + ".1", encoding="utf-8") as f:
+        rotated = [json.loads(line) for line in f]
+    with open(path, encoding="utf-8") as f:
+        current = [json.loads(line) for line in f]
+    assert [e["page"] for e in rotated + current] == list(range(10 - len(rotated) - len(current), 10))
+    assert current[-1]["page"] == 9 and current[-1]["run_id"] == telemetry.run_id
+    assert not os.path.exists(path + ".2")
+    print("✅ 遙測事件檔輪替測試通過")
+
+
+if __name__ == "__main__":
+    test_summary_aggregates_per_bank()
+    test_events_file_is_written_in_background_and_rotated()
+    print("🎉 遙測測試全部通過！")
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+"""
+後端冷啟動量測
+Render 免費方案閒置後會停機，第一個請求要等行程重新啟動，冷啟動時間使用者看得到。
+
+- measure_imports(): 以 `python -X importtime` 匯入後端模組，列出累計耗時最高的套件
+- measure_startup(): 啟動 uvicorn，量測從行程開始到 /api/status 第一次回應 200 的時間
+
+用法:
+    python startup_profile.py                 # 兩者都量測
+    python startup_profile.py --imports-only  # 不需安裝 uvicorn
+    python startup_profile.py --runs 5 --budget-ms 800
+"""
+
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+from typing import Dict, List, Optional
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_MODULE = "src.backend.main"
+DEFAULT_BUDGET_MS = 500
+
+
+def parse_importtime(stderr: str) -> List[Dict]:
+    """
+    解析 -X importtime 的輸出 (每行: `import time: self [us] | cumulative | imported package`)。
+    回傳 [{"module", "self_us", "cumulative_us", "depth"}]，依輸出順序。
+    """
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3 or not parts[0].strip().isdigit():
+            continue  # 標題列
+        name = parts[2].rstrip()
+        stripped = name.lstrip()
+        rows.append({
+            "module": stripped,
+            "self_us": int(parts[0]),
+            "cumulative_us": int(parts[1]),
+            # 每多一層巢狀匯入縮排兩個空白 (第一層前面有一個空白)
+            "depth": (len(name) - len(stripped) - 1) // 2,
+        })
+    return rows
+
+
+def top_imports(rows: List[Dict], limit: int = 15, max_depth: int = 2) -> List[Dict]:
+    """累計耗時最高的匯入 (只看前幾層，較深層的已包含在上層的累計時間中)"""
+    shallow = [r for r in rows if r["depth"] <= max_depth]
+    return sorted(shallow, key=lambda r: r["cumulative_us"], reverse=True)[:limit]
+
+
+def measure_imports(module: str = BACKEND_MODULE) -> List[Dict]:
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=PROJECT_DIR, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    return parse_importtime(result.stderr)
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def measure_startup(timeout: float = 30.0) -> Optional[float]:
+    """
+    啟動一次 uvicorn，回傳行程開始到 /api/status 回應 200 的毫秒數 (逾時回傳 None)。
+    停用瀏覽器預熱，量測的是後端本身可以開始服務的時間。
+    """
+    port = _free_port()
+    env = {**os.environ, "BROWSER_POOL_WARM": "0"}
+    url = f"http://127.0.0.1:{port}/api/status"
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", f"{BACKEND_MODULE}:app", "--port", str(port), "--log-level", "warning"],
+        cwd=PROJECT_DIR, env=env,
+    )
+    try:
+        while time.perf_counter() - started < timeout:
+            if process.poll() is not None:
+                raise RuntimeError(f"uvicorn 提前結束 (exit {process.returncode})")
+            try:
+                with urllib.request.urlopen(url, timeout=1) as response:
+                    if response.status == 200:
+                        return (time.perf_counter() - started) * 1000
+            except OSError:
+                time.sleep(0.01)
+        return None
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="量測後端的 import 時間與冷啟動延遲")
+    parser.add_argument("--runs", type=int, default=3, help="冷啟動量測次數 (取中位數)")
+    parser.add_argument("--top", type=int, default=15, help="列出累計耗時最高的匯入數量")
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS, help="冷啟動中位數超過此值時以非零狀態結束")
+    parser.add_argument("--imports-only", action="store_true", help="只量測 import 時間")
+    args = parser.parse_args()
+
+    rows = measure_imports()
+    total = next((r for r in rows if r["module"] == BACKEND_MODULE), None)
+    print(f"匯入 {BACKEND_MODULE}: {total['cumulative_us'] / 1000:.1f} ms" if total else f"匯入 {BACKEND_MODULE}")
+    for row in top_imports(rows, args.top):
+        print(f"  {row['cumulative_us'] / 1000:8.1f} ms  {'  ' * row['depth']}{row['module']}")
+
+    if not args.imports_only:
+        samples = [measure_startup() for _ in range(max(1, args.runs))]
+        if None in samples:
+            print("冷啟動量測逾時")
+            sys.exit(1)
+        median = statistics.median(samples)
+        print(f"冷啟動至 /api/status 回應: 中位數 {median:.0f} ms (各次: {', '.join(f'{s:.0f}' for s in samples)})")
+        if median > args.budget_ms:
+            print(f"超過預算 {args.budget_ms:.0f} ms")
+            sys.exit(1)
@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+"""
+靜態資料建置
+爬蟲完成後把資料庫內容輸出到 docs/data/，讓 GitHub Pages 前端不需要後端 API 即可查詢:
+
+    manifest.json            篩選清單、各分片的檔名 / 筆數 / 內容雜湊、標準分類筆數、資料版本、
+                             變更序號與來源識別 (用戶端改用後端增量同步時一併送出，見 get_change_source)
+    banks/<code>.json        各銀行的優惠分片
+    categories/<slug>.json   各分類的優惠分片
+    search-index.json        標題的 n-gram 倒排索引 (CJK 以二字詞、英數以單字為單位)
+
+所有 JSON 皆為最小化格式，並另外輸出 .gz (以及安裝 brotli 時的 .br) 預壓縮檔。
+分片內容以 {"fields": [...], "rows": [[...], ...]} 表示，避免每筆重複欄位名稱。
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import re
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from categories import CANONICAL_CATEGORIES
+from exporters import atomic_write_bytes
+
+try:
+    import brotli
+except ImportError:  # 選用相依套件，未安裝時只輸出 gzip
+    brotli = None
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_OUTPUT_DIR = os.path.join(BASE_DIR, "docs", "data")
+
+FIELDS = ["id", "bank", "category", "title", "url", "image", "cluster_id", "canonical_category"]
+NGRAM = 2
+
+_WORD_RE = re.compile(r"[0-9a-z]+")
+_CJK_RE = re.compile(r"[\u3400-\u9fff\uf900-\ufaff]+")
+
+
+def search_terms(text: str) -> set:
+    """切出索引詞：CJK 連續字串取二字詞 (單字時取單字)，英數取整個單字"""
+    text = (text or "").lower()
+    terms = set(_WORD_RE.findall(text))
+    for run in _CJK_RE.findall(text):
+        if len(run) < NGRAM:
+            terms.add(run)
+        for i in range(len(run) - NGRAM + 1):
+            terms.add(run[i:i + NGRAM])
+    return terms
+
+
+def build_search_index(offers: List[Dict]) -> Dict:
+    """標題倒排索引：詞 -> 依 id 排序的優惠 id 列表"""
+    postings: Dict[str, List[int]] = {}
+    for offer in sorted(offers, key=lambda o: o["id"]):
+        for term in search_terms(offer["title"]):
+            postings.setdefault(term, []).append(offer["id"])
+    return {"ngram": NGRAM, "terms": dict(sorted(postings.items()))}
+
+
+def slugify(name: str, prefix: str) -> str:
+    """中文名稱無法直接當檔名，改用穩定的短雜湊"""
+    return f"{prefix}-{hashlib.sha1(name.encode('utf-8')).hexdigest()[:10]}"
+
+
+def bank_slugs() -> Dict[str, str]:
+    """銀行名稱 -> 銀行代碼 (與 scrapers.AVAILABLE_SCRAPERS 相同)"""
+    try:
+        from scrapers import AVAILABLE_SCRAPERS
+        return {cls.config["bank_name"]: code for code, cls in AVAILABLE_SCRAPERS.items()}
+    except Exception:
+        return {}
+
+
+def minify(payload) -> bytes:
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def write_compressed(path: str, data: bytes) -> bool:
+    """
+    原子性寫出檔案與預壓縮版本；內容未變時不改寫，避免產生無意義的 git 異動。
+    回傳主檔是否有改寫。
+    """
+    written = atomic_write_bytes(path, data)
+    # mtime=0 讓相同內容產生相同的壓縮檔
+    atomic_write_bytes(path + ".gz", gzip.compress(data, compresslevel=9, mtime=0))
+    if brotli is not None:
+        atomic_write_bytes(path + ".br", brotli.compress(data))
+    return written
+
+
+def format_last_update(value: Optional[str]) -> Optional[str]:
+    """與 /api/filters 相同的顯示格式 (YYYY-MM-DD HH:MM)"""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(str(value).split(".")[0]).strftime("%Y-%m-%d %H:%M")
+    except ValueError:
+        return value
+
+
+def _shard(offers: List[Dict]) -> Dict:
+    return {"fields": FIELDS, "rows": [[o[f] for f in FIELDS] for o in offers]}
+
+
+def _content_hash(data: bytes) -> str:
+    return hashlib.sha1(data).hexdigest()[:12]
+
+
+def load_offers(conn) -> List[Dict]:
+    """
+    與 API 相同：略過空白或過短的標題，只保留通過檢查的圖片 (image_checks.py)。
+    cluster_id 由 near_duplicates.py 寫入，供前端合併近似重複。
+    """
+    columns = ["CASE WHEN image_ok = 1 THEN image END" if f == "image" else f for f in FIELDS]
+    rows = conn.execute(
+        f"SELECT {', '.join(columns)} FROM offers ORDER BY bank, category, id"
+    ).fetchall()
+    return [dict(zip(FIELDS, row)) for row in rows if row[3] and len(str(row[3])) > 2]
+
+
+def build_static_data(output_dir: str = DEFAULT_OUTPUT_DIR, conn=None) -> Dict:
+    """
+    從資料庫建置靜態資料，回傳 manifest。
+    conn 為 None 時使用 database.get_connection()。
+    """
+    own_conn = conn is None
+    if own_conn:
+        from database import get_connection
+        conn = get_connection()
+    try:
+        offers = load_offers(conn)
+        try:
+            row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'offer_changes'").fetchone()
+            seq = row[0] if row else 0
+            row = conn.execute("SELECT changed_at FROM offer_changes WHERE seq = ?", (seq,)).fetchone()
+            source = row[0] if row else ""
+        except Exception:
+            seq, source = 0, ""
+        last_update = conn.execute("SELECT MAX(scraped_at) FROM offers").fetchone()[0]
+    finally:
+        if own_conn:
+            conn.close()
+
+    written = []
+    expected = set()
+
+    def emit(relpath: str, payload) -> Dict:
+        data = minify(payload)
+        path = os.path.join(output_dir, relpath)
+        expected.update({path, path + ".gz", path + ".br"})
+        if write_compressed(path, data):
+            written.append(relpath)
+        return {"file": relpath.replace(os.sep, "/"), "hash": _content_hash(data), "bytes": len(data)}
+
+    by_bank: Dict[str, List[Dict]] = {}
+    by_category: Dict[str, List[Dict]] = {}
+    for offer in offers:
+        by_bank.setdefault(offer["bank"], []).append(offer)
+        if offer["category"]:
+            by_category.setdefault(offer["category"], []).append(offer)
+
+    codes = bank_slugs()
+    banks = []
+    for name in sorted(by_bank):
+        slug = codes.get(name) or slugify(name, "bank")
+        entry = emit(os.path.join("banks", f"{slug}.json"), _shard(by_bank[name]))
+        banks.append({"name": name, "count": len(by_bank[name]), **entry})
+
+    categories = []
+    for name in sorted(by_category):
+        entry = emit(os.path.join("categories", f"{slugify(name, 'cat')}.json"), _shard(by_category[name]))
+        categories.append({"name": name, "count": len(by_category[name]), **entry})
+
+    search_index = emit("search-index.json", build_search_index(offers))
+
+    facet_counts: Dict[str, int] = {}
+    for offer in offers:
+        if offer["canonical_category"]:
+            facet_counts[offer["canonical_category"]] = facet_counts.get(offer["canonical_category"], 0) + 1
+    facets = [{"key": key, "label": label, "count": facet_counts[key]}
+              for key, label in CANONICAL_CATEGORIES.items() if facet_counts.get(key)]
+
+    # 資料版本只取決於內容，內容未變時 manifest 也不會改變
+    version = _content_hash("".join(b["hash"] for b in banks + categories).encode() + search_index["hash"].encode())
+    manifest = {
+        "version": version,
+        "seq": seq,
+        "source": source,
+        "last_update": format_last_update(last_update),
+        "total": len(offers),
+        "fields": FIELDS,
+        "banks": banks,
+        "categories": categories,
+        "facets": facets,
+        "search_index": search_index,
+    }
+    emit("manifest.json", manifest)
+
+    # 移除已不存在的銀行 / 分類分片
+    for sub in ("banks", "categories"):
+        folder = os.path.join(output_dir, sub)
+        if not os.path.isdir(folder):
+            continue
+        for filename in os.listdir(folder):
+            path = os.path.join(folder, filename)
+            if path not in expected:
+                os.remove(path)
+
+    print(f"已建置靜態資料: {len(offers)} 筆優惠、{len(banks)} 家銀行、{len(categories)} 個分類，"
+          f"更新 {len(written)} 個檔案 -> {output_dir}")
+    return manifest
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="輸出 GitHub Pages 使用的靜態資料")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT_DIR, help="輸出目錄 (預設 docs/data)")
+    args = parser.parse_args()
+    build_static_data(args.output)